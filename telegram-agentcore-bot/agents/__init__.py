@@ -3,6 +3,7 @@ Agent 邏輯模組
 提供 Agent 實作和管理
 """
 
+from .agent_pool import AgentPool, agent_pool, get_shared_model
 from .conversation_agent import ConversationAgent
 
-__all__ = ["ConversationAgent"]
+__all__ = ["ConversationAgent", "AgentPool", "agent_pool", "get_shared_model"]
@@ -0,0 +1,161 @@
+"""
+Agent 池模組
+在同一個 Lambda 容器內重用 BedrockModel 與每個 session 的 ConversationAgent
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+from strands.models import BedrockModel
+
+from config.settings import settings
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 共用模型快取（依 model_id 區分）
+_shared_models: dict[str, Any] = {}
+_shared_models_lock = threading.Lock()
+
+
+def get_shared_model(model_id: str | None = None) -> Any:
+    """
+    取得容器層級共用的 BedrockModel（內含 bedrock-runtime 客戶端）
+
+    Args:
+        model_id: 模型 ID（預設使用 settings.BEDROCK_MODEL_ID）
+
+    Returns:
+        BedrockModel 實例
+    """
+    model_id = model_id or settings.BEDROCK_MODEL_ID
+
+    with _shared_models_lock:
+        model = _shared_models.get(model_id)
+        if model is None:
+            model = BedrockModel(model_id=model_id, region_name=settings.AWS_REGION)
+            _shared_models[model_id] = model
+            logger.info(f"✅ 共用模型已建立: {model_id}")
+
+    return model
+
+
+class AgentPool:
+    """每個 (actor, session) 的 ConversationAgent LRU 池"""
+
+    def __init__(self, max_size: int = 32, idle_ttl: float = 900.0):
+        """
+        初始化 Agent 池
+
+        Args:
+            max_size: 最多保留的 Agent 數量
+            idle_ttl: 閒置多久（秒）後淘汰
+        """
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self._entries: OrderedDict[tuple[str, str], dict[str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(
+        self, actor_id: str, session_id: str, factory: Callable[[], Any]
+    ) -> tuple[Any, bool]:
+        """
+        取得 (actor, session) 對應的 Agent，不存在時使用 factory 建立
+
+        Args:
+            actor_id: Actor ID
+            session_id: Session ID
+            factory: 建立新 Agent 的函數
+
+        Returns:
+            (Agent, 是否命中池)
+        """
+        key = (actor_id, session_id)
+        now = time.monotonic()
+
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry["last_used"] = now
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["agent"], True
+            self.misses += 1
+
+        # 在鎖外建立，避免阻塞其他 session
+        agent = factory()
+
+        with self._lock:
+            self._entries[key] = {"agent": agent, "last_used": time.monotonic()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                evicted_key, _ = self._entries.popitem(last=False)
+                logger.info(f"♻️ Agent 池已滿，淘汰 session: {evicted_key[1]}")
+
+        return agent, False
+
+    def contains(self, actor_id: str, session_id: str) -> bool:
+        """
+        是否有 (actor, session) 對應且未閒置逾時的 Agent（不更新使用時間）
+
+        Args:
+            actor_id: Actor ID
+            session_id: Session ID
+
+        Returns:
+            是否存在
+        """
+        with self._lock:
+            entry = self._entries.get((actor_id, session_id))
+            return entry is not None and time.monotonic() - entry["last_used"] <= self.idle_ttl
+
+    def discard(self, actor_id: str, session_id: str) -> None:
+        """移除指定 (actor, session) 的 Agent"""
+        with self._lock:
+            self._entries.pop((actor_id, session_id), None)
+
+    def clear(self) -> None:
+        """清空 Agent 池"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def _evict_idle(self, now: float) -> None:
+        """淘汰閒置過久的 Agent（呼叫端需持有鎖）"""
+        expired = [
+            key for key, entry in self._entries.items() if now - entry["last_used"] > self.idle_ttl
+        ]
+        for key in expired:
+            del self._entries[key]
+
+        if expired:
+            logger.info(f"♻️ 淘汰 {len(expired)} 個閒置 Agent")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> dict[str, Any]:
+        """
+        取得池統計資訊
+
+        Returns:
+            統計資訊字典
+        """
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "idle_ttl": self.idle_ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# 建立全域 Agent 池實例
+agent_pool = AgentPool(max_size=settings.AGENT_POOL_MAX_SIZE, idle_ttl=settings.AGENT_POOL_IDLE_TTL)
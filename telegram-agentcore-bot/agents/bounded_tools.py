@@ -0,0 +1,238 @@
+"""
+工具並行限制
+模型在同一個回應中要求多個工具時，Strands 的 ConcurrentToolExecutor 會同時執行並依原順序
+回傳結果；這裡包裝每個工具，在容器共用的有界執行緒池中執行，加上每次呼叫的逾時、
+單一回合的並行上限與各工具的並行上限（例如瀏覽器 session 成本高，同時只開少數幾個）
+"""
+
+import asyncio
+import threading
+import time
+from collections.abc import AsyncGenerator
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
+from strands.types.tools import AgentTool
+
+from config.settings import settings
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 等待並行名額時的輪詢間隔（秒）；不以執行緒阻塞等待，避免占用 asyncio 的執行緒池
+_ACQUIRE_POLL_SECONDS = 0.05
+
+# 各工具的並行限制（容器內共用，跨 session 與 SQS worker）
+_tool_limiters: dict[str, threading.BoundedSemaphore] = {}
+_tool_limiters_lock = threading.Lock()
+
+# 執行工具的有界執行緒池（容器內共用）；逾時的工具留在池中執行完畢，
+# 不阻塞 Agent 的事件迴圈結束
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.TOOL_EXECUTOR_WORKERS, thread_name_prefix="tool"
+            )
+        return _executor
+
+
+def parse_tool_settings(spec: str) -> dict[str, float]:
+    """
+    解析「工具名稱=數值」設定
+
+    Args:
+        spec: 例如 "browse_website_official=2,read_file=1"
+
+    Returns:
+        {工具名稱: 數值}
+    """
+    values = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        try:
+            values[name.strip()] = float(value)
+        except ValueError:
+            continue
+    return {name: value for name, value in values.items() if name}
+
+
+def get_tool_limiter(tool_name: str) -> threading.BoundedSemaphore | None:
+    """
+    取得工具的並行限制
+
+    Args:
+        tool_name: 工具名稱
+
+    Returns:
+        BoundedSemaphore，未設定上限時為 None
+    """
+    limit = parse_tool_settings(settings.TOOL_CONCURRENCY_LIMITS).get(tool_name)
+    if not limit or limit < 1:
+        return None
+
+    with _tool_limiters_lock:
+        limiter = _tool_limiters.get(tool_name)
+        if limiter is None:
+            limiter = threading.BoundedSemaphore(int(limit))
+            _tool_limiters[tool_name] = limiter
+        return limiter
+
+
+def reset_tool_limiters() -> None:
+    """清除各工具的並行限制（測試用）"""
+    with _tool_limiters_lock:
+        _tool_limiters.clear()
+
+
+def _release(limiters: list[threading.BoundedSemaphore]) -> None:
+    for limiter in limiters:
+        limiter.release()
+
+
+async def _acquire(semaphore: threading.BoundedSemaphore, timeout: float) -> bool:
+    """在逾時前取得名額"""
+    deadline = time.monotonic() + timeout
+    while not semaphore.acquire(blocking=False):
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(_ACQUIRE_POLL_SECONDS)
+    return True
+
+
+class BoundedTool(AgentTool):
+    """為工具加上逾時與並行限制的包裝（其餘行為轉交原本的工具）"""
+
+    def __init__(
+        self,
+        tool: AgentTool,
+        turn_limiter: threading.BoundedSemaphore,
+        timeout: float,
+        tool_limiter: threading.BoundedSemaphore | None = None,
+    ):
+        """
+        初始化包裝
+
+        Args:
+            tool: 原本的工具
+            turn_limiter: 同一個 Agent 的並行上限（所有工具共用）
+            timeout: 每次呼叫的逾時（秒，含等待名額的時間）
+            tool_limiter: 此工具的並行上限（可選）
+        """
+        super().__init__()
+        self._tool = tool
+        self._turn_limiter = turn_limiter
+        self._tool_limiter = tool_limiter
+        self.timeout = timeout
+
+    @property
+    def tool_name(self) -> str:
+        return self._tool.tool_name
+
+    @property
+    def tool_spec(self) -> Any:
+        return self._tool.tool_spec
+
+    @property
+    def tool_type(self) -> str:
+        return self._tool.tool_type
+
+    @property
+    def supports_hot_reload(self) -> bool:
+        return self._tool.supports_hot_reload
+
+    def get_display_properties(self) -> dict[str, str]:
+        return self._tool.get_display_properties()
+
+    async def stream(
+        self, tool_use: Any, invocation_state: dict[str, Any], **kwargs: Any
+    ) -> AsyncGenerator[Any, None]:
+        """
+        取得名額後在執行緒池中執行工具；逾時或名額不足時回傳錯誤結果，讓模型繼續回覆
+
+        同步工具無法中斷：逾時後不再等待，名額在工具實際結束時才釋放
+        """
+        start = time.monotonic()
+        acquired: list[threading.BoundedSemaphore] = []
+        for limiter in (self._tool_limiter, self._turn_limiter):
+            if limiter is None:
+                continue
+            if not await _acquire(limiter, self.timeout - (time.monotonic() - start)):
+                _release(acquired)
+                yield self._error(tool_use, "目前同時執行的工具過多，請稍後再試")
+                return
+            acquired.append(limiter)
+
+        try:
+            future: Future = _get_executor().submit(
+                self._collect, tool_use, invocation_state, kwargs
+            )
+        except Exception:
+            _release(acquired)
+            raise
+        # 執行完畢（或在開始前取消）時釋放名額
+        future.add_done_callback(lambda _: _release(acquired))
+
+        remaining = self.timeout - (time.monotonic() - start)
+        try:
+            events = await asyncio.wait_for(asyncio.wrap_future(future), max(remaining, 0.001))
+        except TimeoutError:
+            logger.warning(
+                f"⏱️ 工具執行逾時: {self.tool_name} ({self.timeout:.0f}s)",
+                extra={"event_type": "tool_timeout", "tool": self.tool_name},
+            )
+            yield self._error(tool_use, f"工具執行逾時（{self.timeout:.0f} 秒）")
+            return
+
+        for event in events:
+            yield event
+
+    def _collect(
+        self, tool_use: Any, invocation_state: dict[str, Any], kwargs: dict[str, Any]
+    ) -> list[Any]:
+        """在執行緒池中以獨立的事件迴圈執行原本的工具，收集所有事件"""
+
+        async def collect() -> list[Any]:
+            return [
+                event async for event in self._tool.stream(tool_use, invocation_state, **kwargs)
+            ]
+
+        return asyncio.run(collect())
+
+    @staticmethod
+    def _error(tool_use: Any, message: str) -> dict[str, Any]:
+        return {
+            "toolUseId": str(tool_use.get("toolUseId")),
+            "status": "error",
+            "content": [{"text": message}],
+        }
+
+
+def bound_tools(tools: list[Any]) -> list[Any]:
+    """
+    包裝工具列表（同一組包裝共用單一回合的並行上限）
+
+    Args:
+        tools: 工具列表（非 AgentTool 的項目保持不變）
+
+    Returns:
+        包裝後的工具列表
+    """
+    turn_limiter = threading.BoundedSemaphore(max(1, settings.TOOL_MAX_CONCURRENCY))
+    timeouts = parse_tool_settings(settings.TOOL_TIMEOUTS)
+    return [
+        BoundedTool(
+            tool,
+            turn_limiter,
+            timeout=timeouts.get(tool.tool_name, settings.TOOL_CALL_TIMEOUT),
+            tool_limiter=get_tool_limiter(tool.tool_name),
+        )
+        if isinstance(tool, AgentTool) and not isinstance(tool, BoundedTool)
+        else tool
+        for tool in tools
+    ]
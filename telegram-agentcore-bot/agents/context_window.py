@@ -0,0 +1,454 @@
+"""
+Context 視窗管理
+每次呼叫模型前依 token 預算整理對話歷史：
+限制 Memory 檢索內容、壓縮或移除較早的工具結果、縮小較早的圖片，
+並將較早的回合整理為滾動摘要
+"""
+
+import io
+from collections.abc import Callable, Iterator
+from typing import Any
+
+from strands.agent.conversation_manager import SlidingWindowConversationManager
+from strands.hooks import BeforeModelCallEvent, HookRegistry
+
+from utils.context_analyzer import (
+    analyze_context_size,
+    get_truncation_suggestion,
+    should_truncate_context,
+)
+from utils.file_types import image_dimensions
+from utils.logger import get_logger
+from utils.token_accounting import (
+    MESSAGE_OVERHEAD_TOKENS,
+    calibration,
+    count_content_tokens,
+    count_text_tokens,
+    truncate_text,
+)
+
+logger = get_logger(__name__)
+
+# AgentCore Memory 注入檢索結果時使用的標籤（AgentCoreMemoryConfig.context_tag 預設值）
+MEMORY_CONTEXT_TAG = "user_context"
+# 滾動摘要的標籤
+SUMMARY_TAG = "conversation_summary"
+
+# 超過預算時整理到預算的比例以下，避免每次呼叫都重新整理
+TARGET_RATIO = 0.8
+
+# 摘要中每則訊息保留的字元數
+SUMMARY_SNIPPET_CHARS = 200
+
+TOOL_RESULT_OMITTED = "[已省略較早的工具結果]"
+IMAGE_OMITTED = "[已省略較早的圖片]"
+
+# get_truncation_suggestion 的建議對應的策略
+_SUGGESTED_STRATEGIES = {
+    "limit_memory": "drop_old_memory",
+    "summarize_tool_results": "compress_tool_results",
+    "downsample_images": "downsample_images",
+    "truncate_messages": "summarize_history",
+}
+
+# 沒有特別建議時的策略順序（由影響最小到最大）
+_DEFAULT_STRATEGY_ORDER = [
+    "compress_tool_results",
+    "downsample_images",
+    "drop_old_memory",
+    "summarize_history",
+    "drop_tool_results",
+]
+
+
+def _tagged(text: str, tag: str) -> bool:
+    return text.startswith(f"<{tag}>")
+
+
+def _untag(text: str, tag: str) -> str:
+    return text.removeprefix(f"<{tag}>").removesuffix(f"</{tag}>")
+
+
+def _is_memory_block(block: dict[str, Any]) -> bool:
+    return isinstance(block.get("text"), str) and _tagged(block["text"], MEMORY_CONTEXT_TAG)
+
+
+def _is_summary_block(block: dict[str, Any]) -> bool:
+    return isinstance(block.get("text"), str) and _tagged(block["text"], SUMMARY_TAG)
+
+
+def _is_turn_start(message: dict[str, Any]) -> bool:
+    """使用者發起的新回合（不是回傳工具結果的訊息）"""
+    return message.get("role") == "user" and not any(
+        "toolResult" in block for block in message.get("content", [])
+    )
+
+
+def _iter_blocks(content: list[dict[str, Any]]) -> Iterator[tuple[list[dict[str, Any]], int]]:
+    """走訪內容區塊（含工具結果內的區塊），回傳 (所在列表, 索引) 以便原地替換"""
+    for index, block in enumerate(content):
+        yield content, index
+        tool_result = block.get("toolResult")
+        if isinstance(tool_result, dict) and isinstance(tool_result.get("content"), list):
+            yield from _iter_blocks(tool_result["content"])
+
+
+class ContextWindowManager(SlidingWindowConversationManager):
+    """
+    依 token 預算管理對話歷史
+
+    - 每次呼叫模型前：限制 Memory 內容，超過預算時依建議依序套用策略直到低於目標
+    - 訊息數超過視窗時：較早的回合併入滾動摘要，而不是直接丟棄
+    - 目前回合（最後一則使用者訊息之後）的內容不會被修改
+    """
+
+    def __init__(
+        self,
+        token_budget: int,
+        overhead_tokens: int = 0,
+        keep_turns: int = 4,
+        memory_max_tokens: int = 2000,
+        tool_result_max_tokens: int = 500,
+        summary_max_tokens: int = 2000,
+        image_max_edge: int = 512,
+        window_size: int = 40,
+    ):
+        """
+        初始化管理器
+
+        Args:
+            token_budget: 每次呼叫的 prompt token 預算
+            overhead_tokens: 固定開銷（system prompt、工具定義）
+            keep_turns: 摘要時完整保留的最近回合數
+            memory_max_tokens: 單一 Memory 檢索區塊的 token 上限
+            tool_result_max_tokens: 壓縮後每個工具結果的 token 上限
+            summary_max_tokens: 滾動摘要的 token 上限
+            image_max_edge: 縮小較早圖片時的長邊上限（像素）
+            window_size: 訊息數上限（超過時將較早回合併入摘要）
+        """
+        super().__init__(window_size=window_size)
+        self.token_budget = token_budget
+        self.overhead_tokens = overhead_tokens
+        self.keep_turns = max(1, keep_turns)
+        self.memory_max_tokens = memory_max_tokens
+        self.tool_result_max_tokens = tool_result_max_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.image_max_edge = image_max_edge
+        self.summary = ""
+
+        self._strategies: dict[str, Callable[[list[dict[str, Any]]], bool]] = {
+            "compress_tool_results": self._compress_tool_results,
+            "downsample_images": self._downsample_images,
+            "drop_old_memory": self._drop_old_memory,
+            "summarize_history": self._summarize_old_turns,
+            "drop_tool_results": self._drop_tool_results,
+        }
+
+    def register_hooks(self, registry: HookRegistry, **kwargs: Any) -> None:
+        super().register_hooks(registry, **kwargs)
+        registry.add_callback(BeforeModelCallEvent, self._on_before_model_call_budget)
+
+    def _on_before_model_call_budget(self, event: BeforeModelCallEvent) -> None:
+        """呼叫模型前套用預算（失敗不影響呼叫）"""
+        try:
+            self.enforce_budget(event.agent.messages)
+        except Exception as e:
+            logger.warning(f"⚠️ Context 管理失敗，以原始內容呼叫模型: {e}", exc_info=True)
+
+    def analyze(self, messages: list[dict[str, Any]]) -> dict[str, Any]:
+        """
+        分析訊息列表的 token 分布（Memory / 工具結果 / 圖片 / 其他）
+
+        Args:
+            messages: Agent 的訊息列表
+
+        Returns:
+            analyze_context_size 的結果（total_tokens 已套用校正比例）
+        """
+        memory, tool_results, other = [], [], []
+        for message in messages:
+            for block in message.get("content", []):
+                if _is_memory_block(block):
+                    memory.append(block)
+                elif "toolResult" in block:
+                    tool_results.append(block)
+                else:
+                    other.append(block)
+
+        analysis = analyze_context_size(
+            messages=other,
+            memory_context=memory,
+            tool_results=tool_results,
+            history_tokens=self.overhead_tokens + len(messages) * MESSAGE_OVERHEAD_TOKENS,
+        )
+        analysis["total_tokens"] = calibration.apply(analysis["total_tokens"])
+        return analysis
+
+    def enforce_budget(self, messages: list[dict[str, Any]]) -> list[str]:
+        """
+        套用 token 預算
+
+        Args:
+            messages: Agent 的訊息列表（原地修改）
+
+        Returns:
+            已套用的策略名稱
+        """
+        applied = []
+        self._restore_summary(messages)
+
+        analysis = self.analyze(messages)
+        if self._cap_memory(messages):
+            analysis = self._record("cap_memory", analysis, messages, applied)
+
+        if not should_truncate_context(analysis, self.token_budget):
+            return applied
+
+        suggestion = get_truncation_suggestion(analysis, self.token_budget)
+        suggested = [_SUGGESTED_STRATEGIES[name] for name in suggestion["suggestions"]]
+        order = suggested + [name for name in _DEFAULT_STRATEGY_ORDER if name not in suggested]
+        target = int(self.token_budget * TARGET_RATIO)
+
+        for name in order:
+            if self._strategies[name](messages):
+                analysis = self._record(name, analysis, messages, applied)
+                if analysis["total_tokens"] <= target:
+                    break
+        else:
+            logger.warning(
+                f"⚠️ Context 仍超過預算: {analysis['total_tokens']} tokens "
+                f"(預算 {self.token_budget})",
+                extra={
+                    "event_type": "context_management",
+                    "strategy": None,
+                    "tokens_after": analysis["total_tokens"],
+                    "token_budget": self.token_budget,
+                },
+            )
+
+        return applied
+
+    def _record(
+        self,
+        strategy: str,
+        before: dict[str, Any],
+        messages: list[dict[str, Any]],
+        applied: list[str],
+    ) -> dict[str, Any]:
+        """重新分析並記錄策略的效果"""
+        after = self.analyze(messages)
+        applied.append(strategy)
+        logger.info(
+            f"✂️ Context 管理: {strategy} "
+            f"({before['total_tokens']} → {after['total_tokens']} tokens)",
+            extra={
+                "event_type": "context_management",
+                "strategy": strategy,
+                "tokens_before": before["total_tokens"],
+                "tokens_after": after["total_tokens"],
+                "token_budget": self.token_budget,
+            },
+        )
+        return after
+
+    @staticmethod
+    def _current_turn_start(messages: list[dict[str, Any]]) -> int:
+        """目前回合的起點（之前的內容才可修改）"""
+        for index in range(len(messages) - 1, -1, -1):
+            if _is_turn_start(messages[index]):
+                return index
+        return 0
+
+    def _cap_memory(self, messages: list[dict[str, Any]]) -> bool:
+        """限制每個 Memory 檢索區塊的大小（以行為單位截斷）"""
+        changed = False
+        for message in messages:
+            content = message.get("content", [])
+            for index, block in enumerate(content):
+                if not _is_memory_block(block):
+                    continue
+                inner = _untag(block["text"], MEMORY_CONTEXT_TAG)
+                if count_text_tokens(inner) <= self.memory_max_tokens:
+                    continue
+                capped = truncate_text(inner, self.memory_max_tokens)
+                capped = capped.rsplit("\n", 1)[0] if "\n" in capped else capped
+                content[index] = {"text": f"<{MEMORY_CONTEXT_TAG}>{capped}</{MEMORY_CONTEXT_TAG}>"}
+                changed = True
+        return changed
+
+    def _drop_old_memory(self, messages: list[dict[str, Any]]) -> bool:
+        """移除較早回合的 Memory 檢索區塊（只保留目前回合的檢索結果）"""
+        changed = False
+        for message in messages[: self._current_turn_start(messages)]:
+            content = message.get("content", [])
+            kept = [block for block in content if not _is_memory_block(block)]
+            if kept and len(kept) < len(content):
+                content[:] = kept
+                changed = True
+        return changed
+
+    def _compress_tool_results(self, messages: list[dict[str, Any]]) -> bool:
+        """將較早的工具結果截斷為開頭的一段文字"""
+        changed = False
+        for message in messages[: self._current_turn_start(messages)]:
+            for block in message.get("content", []):
+                tool_result = block.get("toolResult")
+                if not isinstance(tool_result, dict):
+                    continue
+                tokens = count_content_tokens(tool_result.get("content")).total
+                if tokens <= self.tool_result_max_tokens:
+                    continue
+                text = "\n".join(
+                    item["text"]
+                    for item in tool_result.get("content", [])
+                    if isinstance(item.get("text"), str)
+                )
+                compressed = truncate_text(text, self.tool_result_max_tokens)
+                tool_result["content"] = [
+                    {"text": f"{compressed}\n…（已截斷，原約 {tokens} tokens）"}
+                ]
+                changed = True
+        return changed
+
+    def _drop_tool_results(self, messages: list[dict[str, Any]]) -> bool:
+        """以佔位文字取代較早的工具結果（保留 toolUseId 與狀態）"""
+        changed = False
+        placeholder = [{"text": TOOL_RESULT_OMITTED}]
+        for message in messages[: self._current_turn_start(messages)]:
+            for block in message.get("content", []):
+                tool_result = block.get("toolResult")
+                if isinstance(tool_result, dict) and tool_result.get("content") != placeholder:
+                    tool_result["content"] = list(placeholder)
+                    changed = True
+        return changed
+
+    def _downsample_images(self, messages: list[dict[str, Any]]) -> bool:
+        """縮小較早回合的圖片；無法處理時以佔位文字取代"""
+        changed = False
+        for message in messages[: self._current_turn_start(messages)]:
+            for container, index in list(_iter_blocks(message.get("content", []))):
+                image = container[index].get("image")
+                if not isinstance(image, dict):
+                    continue
+                data = image.get("source", {}).get("bytes")
+                if not isinstance(data, bytes):
+                    continue
+                dimensions = image_dimensions(data)
+                if dimensions and max(dimensions) <= self.image_max_edge:
+                    continue
+
+                resized = self._resize_image(data, image.get("format", "png"))
+                if resized is None:
+                    container[index] = {"text": IMAGE_OMITTED}
+                else:
+                    image_format, image_bytes = resized
+                    container[index] = {
+                        "image": {"format": image_format, "source": {"bytes": image_bytes}}
+                    }
+                changed = True
+        return changed
+
+    def _resize_image(self, data: bytes, image_format: str) -> tuple[str, bytes] | None:
+        """將圖片長邊縮小至 image_max_edge（Pillow 延遲載入）"""
+        try:
+            from PIL import Image
+
+            with Image.open(io.BytesIO(data)) as img:
+                img.thumbnail((self.image_max_edge, self.image_max_edge))
+                output_format = image_format if image_format in ("jpeg", "png", "webp") else "png"
+                if output_format == "jpeg" and img.mode not in ("RGB", "L"):
+                    img = img.convert("RGB")
+                buffer = io.BytesIO()
+                img.save(buffer, output_format.upper(), quality=85)
+                return output_format, buffer.getvalue()
+        except Exception as e:
+            logger.warning(f"⚠️ 圖片縮小失敗，改為佔位文字: {e}")
+            return None
+
+    def _summarize_old_turns(self, messages: list[dict[str, Any]]) -> bool:
+        """將最近 keep_turns 回合之前的訊息併入滾動摘要"""
+        turn_starts = [i for i, message in enumerate(messages) if _is_turn_start(message)]
+        if len(turn_starts) <= self.keep_turns:
+            return False
+        return self._fold_into_summary(messages, turn_starts[-self.keep_turns])
+
+    def _fold_into_summary(self, messages: list[dict[str, Any]], cut: int) -> bool:
+        """
+        將 messages[:cut] 整理為摘要行並移除（cut 必須是新回合的起點）
+
+        摘要為擷取式（每則訊息的開頭），不額外呼叫模型，延遲固定
+        """
+        if cut <= 0:
+            return False
+
+        lines = self.summary.split("\n") if self.summary else []
+        for message in messages[:cut]:
+            lines.extend(self._summary_lines(message))
+
+        # 超過上限時捨棄最早的摘要行
+        while lines and count_text_tokens("\n".join(lines)) > self.summary_max_tokens:
+            lines.pop(0)
+        self.summary = "\n".join(lines)
+
+        del messages[:cut]
+        self.removed_message_count += cut
+        self._restore_summary(messages)
+        return True
+
+    @staticmethod
+    def _summary_lines(message: dict[str, Any]) -> list[str]:
+        speaker = "使用者" if message.get("role") == "user" else "助理"
+        lines = []
+        for block in message.get("content", []):
+            if "toolUse" in block:
+                lines.append(f"助理使用工具: {block['toolUse'].get('name', '')}")
+            elif "image" in block:
+                lines.append(f"{speaker}: [圖片]")
+            elif isinstance(block.get("text"), str) and not (
+                _is_memory_block(block) or _is_summary_block(block)
+            ):
+                snippet = " ".join(block["text"].split())[:SUMMARY_SNIPPET_CHARS]
+                if snippet:
+                    lines.append(f"{speaker}: {snippet}")
+        return lines
+
+    def _restore_summary(self, messages: list[dict[str, Any]]) -> None:
+        """確保第一則訊息帶有最新的滾動摘要"""
+        if not self.summary or not messages or messages[0].get("role") != "user":
+            return
+
+        content = messages[0].setdefault("content", [])
+        content[:] = [block for block in content if not _is_summary_block(block)]
+        content.insert(0, {"text": f"<{SUMMARY_TAG}>{self.summary}</{SUMMARY_TAG}>"})
+
+    def apply_management(self, agent: Any, **kwargs: Any) -> None:
+        """訊息數超過視窗時，將較早的回合併入摘要（找不到回合起點時沿用滑動視窗）"""
+        messages = agent.messages
+        if len(messages) <= self.window_size:
+            return
+
+        cut = next(
+            (
+                index
+                for index in range(len(messages) - self.window_size, len(messages))
+                if _is_turn_start(messages[index])
+            ),
+            None,
+        )
+        if cut is not None and self._fold_into_summary(messages, cut):
+            logger.info(
+                f"✂️ Context 管理: summarize_history (訊息數超過 {self.window_size})",
+                extra={"event_type": "context_management", "strategy": "summarize_history"},
+            )
+            return
+        super().apply_management(agent, **kwargs)
+
+    def get_state(self) -> dict[str, Any]:
+        state = super().get_state()
+        state["summary"] = self.summary
+        return state
+
+    def restore_from_session(self, state: dict[str, Any]) -> list | None:
+        result = super().restore_from_session(state)
+        self.summary = state.get("summary", "")
+        return result
@@ -3,17 +3,34 @@
 封裝 Agent 的建立和執行邏輯
 """
 
+import threading
 from typing import Any
 
 from strands import Agent
 from strands.models import BedrockModel
 
+from agents.agent_pool import get_shared_model
+from agents.bounded_tools import bound_tools
+from agents.context_window import ContextWindowManager
+from agents.model_router import model_breaker, model_router
 from config.prompts import SYSTEM_PROMPT
 from config.settings import settings
 from utils.context_analyzer import analyze_context_size, log_context_analysis
-from utils.error_messages import format_error_response
+from utils.deadline import Deadline
+from utils.error_messages import ERROR_MESSAGES, format_error_response
 from utils.logger import get_logger
-from utils.retry_handler import retry_with_fallback
+from utils.retry_handler import (
+    cascade_retry_handler,
+    default_retry_handler,
+    is_transient_error,
+    retry_with_fallback,
+)
+from utils.token_accounting import (
+    TokenLedger,
+    calibration,
+    count_content_tokens,
+    reported_input_tokens,
+)
 
 logger = get_logger(__name__)
 
@@ -21,53 +38,155 @@ logger = get_logger(__name__)
 class ConversationAgent:
     """對話 Agent 類"""
 
-    def __init__(self, tools: list[Any], session_manager: Any = None):
+    def __init__(self, tools: list[Any], session_manager: Any = None, model: Any = None):
         """
         初始化對話 Agent
 
         Args:
-            tools: 工具列表
+            tools: 工具列表（同一回應中的多個工具並行執行，加上逾時與並行上限）
             session_manager: Session Manager (可選)
+            model: 共用的模型實例 (可選，未提供時建立新的 BedrockModel)
         """
-        self.tools = tools
+        self.tools = bound_tools(tools)
         self.session_manager = session_manager
+        self.model = model
+        overhead_tokens = self._estimate_overhead_tokens()
+        self.context_window = self._create_context_window(overhead_tokens)
         self.agent = self._create_agent()
+        self.token_ledger = TokenLedger(overhead_tokens=overhead_tokens)
 
-    def _create_agent(self) -> Agent:
+    @staticmethod
+    def _create_context_window(overhead_tokens: int) -> ContextWindowManager | None:
+        """
+        建立 context 視窗管理器（跨 Agent 重建沿用，保留滾動摘要）
+
+        Args:
+            overhead_tokens: 每次呼叫固定的開銷
+
+        Returns:
+            ContextWindowManager，未啟用時為 None（使用 Strands 預設的滑動視窗）
+        """
+        if not settings.CONTEXT_MANAGEMENT_ENABLED:
+            return None
+
+        return ContextWindowManager(
+            token_budget=settings.CONTEXT_TOKEN_BUDGET,
+            overhead_tokens=overhead_tokens,
+            keep_turns=settings.CONTEXT_KEEP_TURNS,
+            memory_max_tokens=settings.CONTEXT_MEMORY_MAX_TOKENS,
+            tool_result_max_tokens=settings.CONTEXT_TOOL_RESULT_MAX_TOKENS,
+            summary_max_tokens=settings.CONTEXT_SUMMARY_MAX_TOKENS,
+            image_max_edge=settings.CONTEXT_IMAGE_MAX_EDGE,
+        )
+
+    def _create_agent(self, messages: list | None = None) -> Agent:
         """
         建立 Agent 實例
 
+        Args:
+            messages: 沿用的對話訊息 (可選)
+
         Returns:
             Agent 實例
         """
         try:
-            # 建立 Bedrock 模型
-            model = BedrockModel(
-                model_id=settings.BEDROCK_MODEL_ID, region_name=settings.AWS_REGION
-            )
+            # 建立 Bedrock 模型（未注入共用模型時）
+            if self.model is None:
+                self.model = BedrockModel(
+                    model_id=settings.BEDROCK_MODEL_ID, region_name=settings.AWS_REGION
+                )
+
+            agent_kwargs = {
+                "model": self.model,
+                "session_manager": self.session_manager,
+                "system_prompt": SYSTEM_PROMPT,
+                "tools": self.tools,
+                # 重試與備援模型由 RetryHandler 處理，不使用 strands 內建的 throttling 重試
+                "retry_strategy": None,
+            }
+            if messages:
+                agent_kwargs["messages"] = messages
+            if self.context_window is not None:
+                agent_kwargs["conversation_manager"] = self.context_window
 
             # 建立 Agent
-            agent = Agent(
-                model=model,
-                session_manager=self.session_manager,
-                system_prompt=SYSTEM_PROMPT,
-                tools=self.tools,
-            )
+            agent = Agent(**agent_kwargs)
 
-            logger.info(f"✅ Agent 建立成功 (模型: {settings.BEDROCK_MODEL_ID})")
+            logger.info(f"✅ Agent 建立成功 (模型: {self._model_id()})")
             return agent
 
         except Exception as e:
             logger.error(f"❌ Agent 建立失敗: {str(e)}", exc_info=True)
             raise
 
-    def process_message(self, message: str, images: list[dict] | None = None) -> dict[str, Any]:
+    def _estimate_overhead_tokens(self) -> int:
+        """估算每次呼叫固定的開銷：system prompt 與工具定義"""
+        tool_specs = [
+            spec
+            for spec in (getattr(tool, "tool_spec", None) for tool in self.tools)
+            if isinstance(spec, dict)
+        ]
+        return count_content_tokens(SYSTEM_PROMPT).total + count_content_tokens(tool_specs).total
+
+    def _sync_token_ledger(self) -> None:
+        """將 Agent 目前的對話歷史同步到 token 帳本（只計算新增的訊息）"""
+        messages = getattr(self.agent, "messages", None)
+        self.token_ledger.sync(messages if isinstance(messages, list) else [])
+
+    @staticmethod
+    def _record_token_usage(agent_result: Any, estimated: int) -> None:
+        """
+        以 Bedrock 回報的用量校正估算值
+
+        只比較本次呼叫第一個 cycle（之後的 cycle 含工具結果，不在呼叫前的估算範圍內）
+
+        Args:
+            agent_result: Agent 執行結果
+            estimated: 呼叫前估算的 prompt token 數
+        """
+        try:
+            usage = agent_result.metrics.agent_invocations[-1].cycles[0].usage
+        except (AttributeError, IndexError, TypeError):
+            return
+
+        reported = reported_input_tokens(usage)
+        if reported is not None:
+            calibration.record(estimated, reported)
+
+    def swap_session_manager(self, session_manager: Any) -> None:
+        """
+        替換 Session Manager，保留目前的對話狀態與模型
+
+        Args:
+            session_manager: 新的 Session Manager (可為 None)
+        """
+        if session_manager is self.session_manager:
+            return
+
+        messages = list(getattr(self.agent, "messages", None) or [])
+        self.session_manager = session_manager
+        self.agent = self._create_agent(messages=messages)
+        logger.info(f"🔄 Session Manager 已替換 (保留 {len(messages)} 則訊息)")
+
+    def process_message(
+        self,
+        message: str,
+        images: list[dict] | None = None,
+        stream_handler: Any = None,
+        attachment_text: str | None = None,
+        deadline: Deadline | None = None,
+    ) -> dict[str, Any]:
         """
         處理用戶訊息（支援圖片）- 帶重試和友善錯誤處理
 
         Args:
             message: 用戶訊息文字
             images: 圖片列表，格式 [{"data": base64_str, "media_type": "image/jpeg"}, ...]
+            stream_handler: 串流文字回呼（可選，例如 DeltaPublisher）
+            attachment_text: 附件處理結果（可選，以獨立的文字區塊放在訊息之後，
+                Memory 檢索只以使用者訊息查詢）
+            deadline: 處理期限（可選，通常來自 Lambda 剩餘時間）；到期前取消模型呼叫，
+                回覆目前的結果
 
         Returns:
             處理結果字典
@@ -91,11 +210,19 @@ class ConversationAgent:
         else:
             content = message
 
-        # 分析 context 大小（用於診斷）
+        if attachment_text:
+            if isinstance(content, str):
+                content = [{"text": content}] if content else []
+            content.append({"text": attachment_text})
+
+        # 分析 context 大小（對話歷史由 token 帳本逐回合累計）
+        self._sync_token_ledger()
+        estimated_tokens = self.token_ledger.estimate(pending=content)
         context_analysis = analyze_context_size(
             messages=content,
             memory_context=None,  # 無法直接獲取，在 processor_entry 層級分析
             images=images,
+            history_tokens=self.token_ledger.estimate(),
         )
         log_context_analysis(context_analysis, operation="process_message")
 
@@ -107,38 +234,49 @@ class ConversationAgent:
         }
 
         # 定義降級函數（無 Memory 重試）
-        def fallback_without_memory():
+        def fallback_without_memory(model: Any):
             """降級策略：不使用 Memory 重新執行"""
             if self.session_manager:
                 logger.info("🔄 降級：不使用 Memory 重新執行")
-                # 創建無 Memory 的臨時 agent
-                from strands.models import BedrockModel
-
-                temp_model = BedrockModel(
-                    model_id=settings.BEDROCK_MODEL_ID, region_name=settings.AWS_REGION
-                )
+                # 創建無 Memory 的臨時 agent（沿用同一個模型實例）
                 temp_agent = Agent(
-                    model=temp_model,
+                    model=model,
                     session_manager=None,
                     system_prompt=SYSTEM_PROMPT,
                     tools=self.tools,
+                    retry_strategy=None,
                 )
-                return temp_agent(content)
+                return self._invoke(temp_agent, content, stream_handler, deadline)
             else:
                 # 已經沒有 Memory，無法降級
                 raise Exception("Already without memory, cannot fallback further")
 
-        # 執行帶重試的 Agent 調用
-        result_dict = retry_with_fallback(
-            func=lambda: self.agent(content),
-            fallback_func=fallback_without_memory if self.session_manager else None,
+        # 依請求複雜度選擇模型，throttling / 逾時時依序改用備援模型
+        tool_calls_before = self._tool_call_counts(self.agent)
+        route = model_router.route(
+            message,
+            has_images=bool(images),
+            has_attachments=bool(attachment_text),
+            primary_model_id=self._model_id(),
+        )
+        result_dict, model_id = self._invoke_with_cascade(
+            route.models,
+            content,
+            stream_handler=stream_handler,
+            deadline=deadline,
             context=retry_context,
+            fallback_func=fallback_without_memory if self.session_manager else None,
         )
 
         # 處理執行結果
         if result_dict["success"]:
-            # 提取回應文字
             agent_result = result_dict["result"]
+
+            # 期限前被取消：回覆目前的進度（或「仍在處理」）
+            if getattr(agent_result, "stop_reason", None) == "cancelled":
+                return {**self._deadline_response(stream_handler), "model": model_id}
+
+            # 提取回應文字
             response_text = self._extract_response(agent_result)
 
             # 記錄成功信息
@@ -153,7 +291,17 @@ class ConversationAgent:
 
             logger.info(extra_info)
 
-            return {"success": True, "response": response_text}
+            # 降級模式不含對話歷史，與呼叫前的估算不可比較
+            if not used_fallback:
+                self._record_token_usage(agent_result, estimated_tokens)
+
+            return {
+                "success": True,
+                "response": response_text,
+                "model": model_id,
+                # 降級模式使用臨時 Agent，無法得知呼叫過的工具
+                "tools_used": None if used_fallback else self._tools_used(tool_calls_before),
+            }
 
         else:
             # 執行失敗，返回友善錯誤訊息
@@ -179,8 +327,194 @@ class ConversationAgent:
                 "response": friendly_message,
                 "error": str(error),
                 "error_type": result_dict.get("error_type"),
+                "model": model_id,
             }
 
+    def _invoke_with_cascade(
+        self,
+        model_ids: list[str],
+        content: Any,
+        stream_handler: Any = None,
+        deadline: Deadline | None = None,
+        context: dict[str, Any] | None = None,
+        fallback_func: Any = None,
+    ) -> tuple[dict[str, Any], str]:
+        """
+        依序以各模型執行（各自的斷路器），暫時性錯誤時改用下一個模型
+
+        還有備援模型時只做少量重試（MODEL_CASCADE_ATTEMPTS）；最後一個模型使用完整重試
+        與無 Memory 降級
+
+        Args:
+            model_ids: 依序嘗試的模型 ID
+            content: 訊息內容
+            stream_handler: 串流文字回呼（可選）
+            deadline: 處理期限（可選）
+            context: 執行上下文（用於日誌）
+            fallback_func: 無 Memory 降級函數（接收模型實例，可選）
+
+        Returns:
+            (執行結果字典, 實際使用的模型 ID)
+        """
+        result_dict: dict[str, Any] = {}
+        model_id = model_ids[0]
+        for position, model_id in enumerate(model_ids):
+            model = self._resolve_model(model_id)
+            is_last = position == len(model_ids) - 1
+
+            def invoke(model: Any = model) -> Any:
+                return self._invoke(self.agent, content, stream_handler, deadline, model=model)
+
+            def fallback(model: Any = model) -> Any:
+                return fallback_func(model)
+
+            result_dict = retry_with_fallback(
+                func=invoke,
+                fallback_func=fallback if fallback_func and is_last else None,
+                context={**(context or {}), "model": model_id},
+                deadline=deadline,
+                breaker=model_breaker(model_id),
+                handler=default_retry_handler if is_last else cascade_retry_handler,
+            )
+            if result_dict["success"] or is_last:
+                break
+
+            error = result_dict.get("error")
+            if not is_transient_error(error) or (
+                deadline is not None and deadline.expired(default_retry_handler.min_attempt_seconds)
+            ):
+                break
+
+            logger.warning(
+                f"🔀 模型 {model_id} 暫時無法使用，改用 {model_ids[position + 1]}",
+                extra={
+                    "event_type": "model_fallback",
+                    "from_model": model_id,
+                    "to_model": model_ids[position + 1],
+                    "error_type": result_dict.get("error_type"),
+                },
+            )
+
+        return result_dict, model_id
+
+    @staticmethod
+    def _tool_call_counts(agent: Any) -> dict[str, int]:
+        """取得 Agent 累計的各工具呼叫次數"""
+        tool_metrics = getattr(getattr(agent, "event_loop_metrics", None), "tool_metrics", None)
+        if not isinstance(tool_metrics, dict):
+            return {}
+        return {name: getattr(metric, "call_count", 0) for name, metric in tool_metrics.items()}
+
+    def _tools_used(self, before: dict[str, int]) -> list[str]:
+        """
+        本回合呼叫過的工具（比較呼叫前後的累計次數）
+
+        Args:
+            before: 呼叫前的累計次數
+
+        Returns:
+            工具名稱列表
+        """
+        after = self._tool_call_counts(self.agent)
+        return sorted(name for name, count in after.items() if count > before.get(name, 0))
+
+    def _resolve_model(self, model_id: str) -> Any:
+        """取得模型實例（目前模型直接沿用，其他模型使用容器內共用的實例）"""
+        if model_id == self._model_id():
+            return self.model
+        return get_shared_model(model_id)
+
+    def _model_id(self) -> str:
+        """取得 Agent 的主要模型 ID（斷路器的 key）"""
+        get_config = getattr(self.model, "get_config", None)
+        if callable(get_config):
+            try:
+                model_id = get_config().get("model_id")
+                if isinstance(model_id, str):
+                    return model_id
+            except Exception:
+                pass
+        return settings.BEDROCK_MODEL_ID
+
+    @staticmethod
+    def _deadline_response(stream_handler: Any = None) -> dict[str, Any]:
+        """
+        期限前取消時的回覆：已串流的部分文字加上提示，沒有文字時回覆「仍在處理」
+
+        Args:
+            stream_handler: 串流文字回呼（可選，含已產生的文字）
+
+        Returns:
+            處理結果字典
+        """
+        partial = (getattr(stream_handler, "text", "") or "").strip()
+        if partial:
+            response = f"{partial}\n\n{ERROR_MESSAGES['deadline_partial']}"
+        else:
+            response = ERROR_MESSAGES["deadline_pending"]
+
+        logger.warning(
+            "⏱️ 處理期限將至，已取消模型呼叫",
+            extra={"event_type": "deadline_exceeded", "partial_chars": len(partial)},
+        )
+        return {"success": True, "response": response, "deadline_exceeded": True}
+
+    @staticmethod
+    def _invoke(
+        agent: Agent,
+        content: Any,
+        stream_handler: Any = None,
+        deadline: Deadline | None = None,
+        model: Any = None,
+    ) -> Any:
+        """
+        執行 Agent，有串流回呼時暫時替換 callback_handler，指定模型時暫時替換 model
+
+        Args:
+            agent: Agent 實例
+            content: 訊息內容
+            stream_handler: 串流文字回呼（可選）
+            deadline: 處理期限（可選）；保留 AGENT_DEADLINE_RESERVE_SECONDS 後取消呼叫，
+                Agent 以 stop_reason="cancelled" 結束並可繼續使用
+            model: 本次使用的模型實例（可選，結束後還原 Agent 原本的模型）
+
+        Returns:
+            Agent 執行結果
+        """
+        timer = None
+        if deadline is not None and hasattr(agent, "cancel"):
+            timer = threading.Timer(
+                max(0.0, deadline.remaining(settings.AGENT_DEADLINE_RESERVE_SECONDS)),
+                agent.cancel,
+            )
+            timer.daemon = True
+            timer.start()
+
+        previous_model = getattr(agent, "model", None)
+        swap_model = model is not None and model is not previous_model
+        if swap_model:
+            agent.model = model
+
+        try:
+            if stream_handler is None:
+                return agent(content)
+
+            # 每次嘗試重新累積，避免重試時重複前一次的片段
+            if hasattr(stream_handler, "reset"):
+                stream_handler.reset()
+
+            previous_handler = agent.callback_handler
+            agent.callback_handler = stream_handler
+            try:
+                return agent(content)
+            finally:
+                agent.callback_handler = previous_handler
+        finally:
+            if swap_model:
+                agent.model = previous_model
+            if timer is not None:
+                timer.cancel()
+
     def _build_multimodal_content(self, text: str, images: list[dict]) -> list[dict]:
         """
         構建 Bedrock Converse API 格式的多模態內容
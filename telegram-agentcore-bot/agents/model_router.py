@@ -0,0 +1,195 @@
+"""
+模型路由
+依請求的複雜度選擇模型（簡單的請求使用較快的模型），並提供 throttling / 逾時時的備援順序
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any
+
+from config.settings import settings
+from utils.circuit_breaker import CLOSED, CircuitBreaker, get_circuit_breaker
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+SIMPLE = "simple"
+STANDARD = "standard"
+
+# 可能需要工具（瀏覽、計算、天氣、時間、檔案）的訊息
+_TOOL_HINT_RE = re.compile(
+    r"https?://|www\.|\d\s*[-+*/^%]\s*\d|"
+    r"網址|網站|網頁|搜尋|查詢|瀏覽|計算|算一下|天氣|氣溫|幾點|時間|日期|檔案|文件|"
+    r"分析|程式|步驟|比較|總結|摘要|翻譯|"
+    r"\b(browse|search|weather|calculate|compute|time|date|file|analy[sz]e|code|"
+    r"compare|summari[sz]e|translate)\b",
+    re.IGNORECASE,
+)
+
+
+def model_breaker(model_id: str) -> CircuitBreaker:
+    """
+    取得模型的斷路器（容器內共用）
+
+    Args:
+        model_id: 模型 ID
+
+    Returns:
+        CircuitBreaker
+    """
+    return get_circuit_breaker(
+        model_id,
+        failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+        recovery_timeout=settings.CIRCUIT_BREAKER_RECOVERY_SECONDS,
+    )
+
+
+@dataclass
+class RouteDecision:
+    """路由結果"""
+
+    tier: str
+    reason: str
+    # 依序嘗試的模型 ID（第一個為主要模型）
+    models: list[str] = field(default_factory=list)
+
+
+def classify_request(
+    message: str, has_images: bool = False, has_attachments: bool = False
+) -> tuple[str, str]:
+    """
+    以低成本的規則判斷請求複雜度（不呼叫模型）
+
+    Args:
+        message: 使用者訊息
+        has_images: 是否含圖片
+        has_attachments: 是否含檔案處理結果
+
+    Returns:
+        (tier, reason)
+    """
+    if has_images:
+        return STANDARD, "images"
+    if has_attachments:
+        return STANDARD, "attachments"
+    if len(message) > settings.MODEL_ROUTER_SIMPLE_MAX_CHARS:
+        return STANDARD, "length"
+    if message.count("\n") >= 2:
+        return STANDARD, "multiline"
+    if _TOOL_HINT_RE.search(message):
+        return STANDARD, "tool_hint"
+    return SIMPLE, "short"
+
+
+class ModelRouter:
+    """選擇本回合的模型與備援順序"""
+
+    def __init__(
+        self,
+        primary_model_id: str,
+        fast_model_id: str = "",
+        fallback_model_ids: list[str] | None = None,
+        enabled: bool = True,
+    ):
+        """
+        初始化模型路由
+
+        Args:
+            primary_model_id: 主要模型 ID
+            fast_model_id: 簡單請求使用的模型 ID（空字串表示不分流）
+            fallback_model_ids: 備援模型 ID（依序嘗試）
+            enabled: 是否啟用分流與備援（停用時只使用主要模型）
+        """
+        self.primary_model_id = primary_model_id
+        self.fast_model_id = fast_model_id
+        self.fallback_model_ids = list(fallback_model_ids or [])
+        self.enabled = enabled
+
+    def route(
+        self,
+        message: str,
+        has_images: bool = False,
+        has_attachments: bool = False,
+        primary_model_id: str | None = None,
+    ) -> RouteDecision:
+        """
+        決定本回合的模型順序
+
+        斷路器開啟中的模型移到最後（仍保留，全部開啟時由重試處理器快速失敗）
+
+        Args:
+            message: 使用者訊息
+            has_images: 是否含圖片
+            has_attachments: 是否含檔案處理結果
+            primary_model_id: 主要模型 ID（預設使用初始化時的設定，例如 Agent 注入的模型）
+
+        Returns:
+            RouteDecision
+        """
+        primary = primary_model_id or self.primary_model_id
+        if not self.enabled:
+            return RouteDecision(tier=STANDARD, reason="disabled", models=[primary])
+
+        tier, reason = classify_request(message, has_images, has_attachments)
+        candidates = [primary, *self.fallback_model_ids]
+        if tier == SIMPLE and self.fast_model_id:
+            candidates.insert(0, self.fast_model_id)
+
+        models = list(dict.fromkeys(candidates))
+        available = [m for m in models if model_breaker(m).state == CLOSED]
+        models = available + [m for m in models if m not in available]
+
+        decision = RouteDecision(tier=tier, reason=reason, models=models)
+        logger.info(
+            f"🧭 模型路由: {tier} ({reason}) → {models[0]}",
+            extra={
+                "event_type": "model_route",
+                "tier": tier,
+                "reason": reason,
+                "model": models[0],
+                "chain": models,
+            },
+        )
+        return decision
+
+    def preferred_model(
+        self, message: str, has_images: bool = False, has_attachments: bool = False
+    ) -> str:
+        """
+        取得請求原本會分派到的模型（不考慮斷路器與備援，不記錄日誌）
+
+        Args:
+            message: 使用者訊息
+            has_images: 是否含圖片
+            has_attachments: 是否含檔案處理結果
+
+        Returns:
+            模型 ID
+        """
+        if self.enabled and self.fast_model_id:
+            if classify_request(message, has_images, has_attachments)[0] == SIMPLE:
+                return self.fast_model_id
+        return self.primary_model_id
+
+    def get_config(self) -> dict[str, Any]:
+        """
+        取得路由設定
+
+        Returns:
+            設定字典
+        """
+        return {
+            "enabled": self.enabled,
+            "primary": self.primary_model_id,
+            "fast": self.fast_model_id,
+            "fallbacks": self.fallback_model_ids,
+        }
+
+
+# 全域模型路由
+model_router = ModelRouter(
+    primary_model_id=settings.BEDROCK_MODEL_ID,
+    fast_model_id=settings.BEDROCK_FAST_MODEL_ID,
+    fallback_model_ids=settings.BEDROCK_FALLBACK_MODEL_IDS,
+    enabled=settings.MODEL_ROUTING_ENABLED,
+)
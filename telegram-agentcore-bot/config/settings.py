@@ -20,22 +20,217 @@ class Settings:
         self.MEMORY_ID = os.getenv("BEDROCK_AGENTCORE_MEMORY_ID")
         self.MEMORY_ENABLED = self.MEMORY_ID is not None
 
+        # Memory 檢索快取（容器內共用，長期記憶記錄異動時失效）
+        self.MEMORY_RETRIEVAL_CACHE_ENABLED = (
+            os.getenv("MEMORY_RETRIEVAL_CACHE_ENABLED", "true").lower() == "true"
+        )
+        self.MEMORY_RETRIEVAL_CACHE_TTL = int(os.getenv("MEMORY_RETRIEVAL_CACHE_TTL", "60"))  # 秒
+        self.MEMORY_RETRIEVAL_CACHE_SIZE = int(os.getenv("MEMORY_RETRIEVAL_CACHE_SIZE", "256"))
+
+        # 圖片對話的 Memory：寫入時以 S3 參照與說明文字取代圖片 bytes
+        self.MEMORY_IMAGE_REFERENCES_ENABLED = (
+            os.getenv("MEMORY_IMAGE_REFERENCES_ENABLED", "true").lower() == "true"
+        )
+        # 載入時的還原方式：caption（說明文字）或 bytes（從 S3 讀回圖片）
+        self.MEMORY_IMAGE_REHYDRATE = os.getenv("MEMORY_IMAGE_REHYDRATE", "caption")
+
+        # Memory 延後寫入（先發布回覆，再寫入對話事件與審計記錄）
+        self.MEMORY_WRITE_BEHIND_ENABLED = (
+            os.getenv("MEMORY_WRITE_BEHIND_ENABLED", "true").lower() == "true"
+        )
+        # 每回合緩衝的事件上限（AgentCore Memory 上限 100，達到時立即寫入）
+        self.MEMORY_WRITE_BEHIND_BATCH_SIZE = int(
+            os.getenv("MEMORY_WRITE_BEHIND_BATCH_SIZE", "100")
+        )
+        self.MEMORY_WRITE_MAX_ATTEMPTS = int(os.getenv("MEMORY_WRITE_MAX_ATTEMPTS", "3"))
+        # 延後寫入保留的 Lambda 剩餘時間（毫秒），不足時留到下一次 invocation
+        self.MEMORY_FLUSH_RESERVE_MS = int(os.getenv("MEMORY_FLUSH_RESERVE_MS", "2000"))
+
         # 日誌配置
         self.LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
+        # Processor 變體：full（所有工具）或 text（純文字訊息用的輕量版本，
+        # 不載入 Code Interpreter 與遠端瀏覽器，冷啟動較快、記憶體較小）
+        self.PROCESSOR_PROFILE = os.getenv("PROCESSOR_PROFILE", "full").lower()
+        text_only = self.PROCESSOR_PROFILE == "text"
+
         # 瀏覽器配置
         self.BROWSER_TIMEOUT = int(os.getenv("BROWSER_TIMEOUT", "30000"))
-        self.BROWSER_ENABLED = os.getenv("BROWSER_ENABLED", "true").lower() == "true"
+        self.BROWSER_ENABLED = (
+            os.getenv("BROWSER_ENABLED", "true").lower() == "true" and not text_only
+        )
+        # 容器內重用的 AgentCore Browser session
+        self.BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+        self.BROWSER_SESSION_IDLE_TTL = int(os.getenv("BROWSER_SESSION_IDLE_TTL", "240"))
+        self.BROWSER_SESSION_TIMEOUT = int(os.getenv("BROWSER_SESSION_TIMEOUT", "900"))
+        # 連線到遠端瀏覽器的 Playwright driver 數量（每個 driver 是一個 Node 程序）
+        self.BROWSER_DRIVER_THREADS = int(os.getenv("BROWSER_DRIVER_THREADS", "2"))
+        # 不載入的資源類型（只需要文字內容）
+        self.BROWSER_BLOCKED_RESOURCES = [
+            t.strip()
+            for t in os.getenv("BROWSER_BLOCKED_RESOURCES", "image,font,media").split(",")
+            if t.strip()
+        ]
+        # 先以 HTTP GET 擷取靜態網頁，需要 JavaScript 時才改用瀏覽器
+        self.BROWSE_HTTP_FIRST = os.getenv("BROWSE_HTTP_FIRST", "true").lower() == "true"
+        self.BROWSE_HTTP_MAX_BYTES = int(os.getenv("BROWSE_HTTP_MAX_BYTES", str(2 * 1024 * 1024)))
+        self.BROWSE_HTTP_TIMEOUT = float(os.getenv("BROWSE_HTTP_TIMEOUT", "8"))
+        self.BROWSE_HTTP_CACHE_SIZE = int(os.getenv("BROWSE_HTTP_CACHE_SIZE", "64"))
+        # 有 script 的網頁擷取到的文字低於此字數時，視為需要 JavaScript
+        self.BROWSE_MIN_TEXT_CHARS = int(os.getenv("BROWSE_MIN_TEXT_CHARS", "200"))
+        # 同時瀏覽多個網址：網址數上限、並行數、每頁與總 token 預算、整體逾時（秒）
+        self.BROWSE_MULTI_MAX_URLS = int(os.getenv("BROWSE_MULTI_MAX_URLS", "5"))
+        self.BROWSE_MULTI_CONCURRENCY = int(os.getenv("BROWSE_MULTI_CONCURRENCY", "4"))
+        self.BROWSE_MULTI_PAGE_TOKENS = int(os.getenv("BROWSE_MULTI_PAGE_TOKENS", "1500"))
+        self.BROWSE_MULTI_TOTAL_TOKENS = int(os.getenv("BROWSE_MULTI_TOTAL_TOKENS", "5000"))
+        self.BROWSE_MULTI_TIMEOUT = float(os.getenv("BROWSE_MULTI_TIMEOUT", "50"))
+        # DOM 載入後，內容連續多久（毫秒）沒有變化視為穩定；最多等待的時間（毫秒）
+        self.BROWSER_STABLE_MS = int(os.getenv("BROWSER_STABLE_MS", "500"))
+        self.BROWSER_STABLE_MAX_MS = int(os.getenv("BROWSER_STABLE_MAX_MS", "5000"))
 
         # 檔案處理配置
-        self.FILE_ENABLED = os.getenv("FILE_ENABLED", "false").lower() == "true"
+        self.FILE_ENABLED = os.getenv("FILE_ENABLED", "false").lower() == "true" and not text_only
         self.FILE_STORAGE_BUCKET = os.getenv("FILE_STORAGE_BUCKET", "")
         self.FILE_SESSION_TIMEOUT = int(os.getenv("FILE_SESSION_TIMEOUT", "300"))  # 5 分鐘
+        self.FILE_SESSION_POOL_SIZE = int(os.getenv("FILE_SESSION_POOL_SIZE", "2"))
+        self.FILE_SESSION_IDLE_TTL = int(os.getenv("FILE_SESSION_IDLE_TTL", "120"))  # 2 分鐘
+
+        # S3 讀取：超過門檻的檔案落地 /tmp 並以 mmap 存取
+        self.FILE_SPILL_THRESHOLD_BYTES = int(
+            os.getenv("FILE_SPILL_THRESHOLD_BYTES", str(8 * 1024 * 1024))
+        )  # 8 MB
+        # 圖片大小上限（Converse API 單張圖片上限 3.75 MB）
+        self.IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(3840 * 1024)))
+
+        # 本地檔案分析（支援的文字檔不經過 Code Interpreter）
+        self.FILE_LOCAL_ANALYSIS_ENABLED = (
+            os.getenv("FILE_LOCAL_ANALYSIS_ENABLED", "true").lower() == "true"
+        )
+        self.FILE_LOCAL_ANALYSIS_MAX_BYTES = int(
+            os.getenv("FILE_LOCAL_ANALYSIS_MAX_BYTES", str(20 * 1024 * 1024))
+        )  # 20 MB
+
+        # 檔案分析結果快取（記憶體 LRU + 可選的 DynamoDB）
+        self.FILE_RESULT_CACHE_ENABLED = (
+            os.getenv("FILE_RESULT_CACHE_ENABLED", "true").lower() == "true"
+        )
+        self.FILE_RESULT_CACHE_SIZE = int(os.getenv("FILE_RESULT_CACHE_SIZE", "128"))
+        self.FILE_RESULT_CACHE_TTL = int(os.getenv("FILE_RESULT_CACHE_TTL", "86400"))  # 1 天
+        self.FILE_RESULT_CACHE_TABLE = os.getenv("FILE_RESULT_CACHE_TABLE", "")
+
+        # 工具結果快取（記憶體 LRU，設定表名稱時加上 DynamoDB 層）
+        self.TOOL_CACHE_ENABLED = os.getenv("TOOL_CACHE_ENABLED", "true").lower() == "true"
+        self.TOOL_CACHE_SIZE = int(os.getenv("TOOL_CACHE_SIZE", "256"))
+        self.TOOL_CACHE_TABLE = os.getenv("TOOL_CACHE_TABLE", "")
+        self.TOOL_CACHE_WEATHER_TTL = int(os.getenv("TOOL_CACHE_WEATHER_TTL", "600"))  # 秒
+        # 網頁過期後以 ETag / Last-Modified 條件請求確認未變更
+        self.TOOL_CACHE_BROWSE_TTL = int(os.getenv("TOOL_CACHE_BROWSE_TTL", "300"))  # 秒
+
+        # 工具並行執行（同一個模型回應中的多個工具同時執行，結果依原順序回傳）
+        # 執行工具的執行緒數（容器內共用）
+        self.TOOL_EXECUTOR_WORKERS = int(os.getenv("TOOL_EXECUTOR_WORKERS", "16"))
+        # 單一 Agent 同時執行的工具上限
+        self.TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+        # 每次工具呼叫的逾時（秒），可依工具覆寫
+        self.TOOL_CALL_TIMEOUT = float(os.getenv("TOOL_CALL_TIMEOUT", "60"))
+        self.TOOL_TIMEOUTS = os.getenv(
+            "TOOL_TIMEOUTS",
+            "browse_website_official=45,browse_website_backup=45,browse_websites=60,read_file=120",
+        )
+        # 各工具在容器內同時執行的上限（瀏覽器 session 成本高）
+        self.TOOL_CONCURRENCY_LIMITS = os.getenv(
+            "TOOL_CONCURRENCY_LIMITS",
+            "browse_website_official=2,browse_website_backup=1,browse_websites=1",
+        )
 
         # Agent 配置
         self.AGENT_NAME = os.getenv("AGENT_NAME", "Telegram Agent")
         self.DEFAULT_SESSION_ID = os.getenv("DEFAULT_SESSION_ID", "default")
 
+        # Agent 池配置（容器內重用）
+        self.AGENT_POOL_MAX_SIZE = int(os.getenv("AGENT_POOL_MAX_SIZE", "32"))
+        self.AGENT_POOL_IDLE_TTL = int(os.getenv("AGENT_POOL_IDLE_TTL", "900"))  # 15 分鐘
+
+        # 模型呼叫的期限與斷路器（期限來自 Lambda 剩餘時間）
+        # 剩餘時間少於此值時不再重試或降級（秒）
+        self.RETRY_MIN_ATTEMPT_SECONDS = float(os.getenv("RETRY_MIN_ATTEMPT_SECONDS", "20"))
+        # 保留給發布回覆與寫入 Memory 的時間，到期前取消模型呼叫並回覆目前結果（秒）
+        self.AGENT_DEADLINE_RESERVE_SECONDS = float(
+            os.getenv("AGENT_DEADLINE_RESERVE_SECONDS", "10")
+        )
+        self.CIRCUIT_BREAKER_FAILURE_THRESHOLD = int(
+            os.getenv("CIRCUIT_BREAKER_FAILURE_THRESHOLD", "5")
+        )
+        self.CIRCUIT_BREAKER_RECOVERY_SECONDS = float(
+            os.getenv("CIRCUIT_BREAKER_RECOVERY_SECONDS", "30")
+        )
+
+        # 模型路由：簡單的請求使用較快的模型，throttling / 逾時時依序改用備援模型
+        self.MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "true").lower() == "true"
+        # 簡單請求使用的模型（未設定時一律使用 BEDROCK_MODEL_ID）
+        self.BEDROCK_FAST_MODEL_ID = os.getenv("BEDROCK_FAST_MODEL_ID", "")
+        # 備援模型（逗號分隔，依序嘗試）
+        self.BEDROCK_FALLBACK_MODEL_IDS = [
+            m.strip() for m in os.getenv("BEDROCK_FALLBACK_MODEL_IDS", "").split(",") if m.strip()
+        ]
+        # 簡單請求的字數上限
+        self.MODEL_ROUTER_SIMPLE_MAX_CHARS = int(os.getenv("MODEL_ROUTER_SIMPLE_MAX_CHARS", "80"))
+        # 還有備援模型時，每個模型的嘗試次數（最後一個模型使用完整重試）
+        self.MODEL_CASCADE_ATTEMPTS = int(os.getenv("MODEL_CASCADE_ATTEMPTS", "1"))
+
+        # 回應快取（選用）：重複的無狀態問題直接回覆快取結果
+        self.RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+        self.RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+        # 可快取訊息的字數上限
+        self.RESPONSE_CACHE_MAX_CHARS = int(os.getenv("RESPONSE_CACHE_MAX_CHARS", "200"))
+        # 各工具類別的存活時間（秒，0 或未列出表示不快取；回合中使用多種工具時取最短者）
+        # 沒有使用工具的回覆（general）預設不快取，需要時明確設定 general=秒數
+        self.RESPONSE_CACHE_TTLS = os.getenv(
+            "RESPONSE_CACHE_TTLS",
+            "time=30,weather=600,calculator=86400,browse=300,file=0",
+        )
+        # Session 在這段時間內有對話紀錄時不使用快取（秒，追問需要對話歷史）
+        self.RESPONSE_CACHE_HISTORY_WINDOW = int(os.getenv("RESPONSE_CACHE_HISTORY_WINDOW", "1800"))
+        # 不使用快取的使用者 ID（逗號分隔）
+        self.RESPONSE_CACHE_BYPASS_USERS = [
+            u.strip() for u in os.getenv("RESPONSE_CACHE_BYPASS_USERS", "").split(",") if u.strip()
+        ]
+
+        # Context 視窗管理（每次呼叫模型前檢查 token 預算）
+        self.CONTEXT_MANAGEMENT_ENABLED = (
+            os.getenv("CONTEXT_MANAGEMENT_ENABLED", "true").lower() == "true"
+        )
+        self.CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "100000"))
+        self.CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "4"))
+        self.CONTEXT_MEMORY_MAX_TOKENS = int(os.getenv("CONTEXT_MEMORY_MAX_TOKENS", "2000"))
+        self.CONTEXT_TOOL_RESULT_MAX_TOKENS = int(
+            os.getenv("CONTEXT_TOOL_RESULT_MAX_TOKENS", "500")
+        )
+        self.CONTEXT_SUMMARY_MAX_TOKENS = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", "2000"))
+        self.CONTEXT_IMAGE_MAX_EDGE = int(os.getenv("CONTEXT_IMAGE_MAX_EDGE", "512"))
+
+        # SQS 批次處理配置（排序佇列與舊版路徑）
+        self.SQS_MAX_WORKERS = int(os.getenv("SQS_MAX_WORKERS", "4"))
+        self.SQS_PUBLISH_COMPLETION = os.getenv("SQS_PUBLISH_COMPLETION", "true").lower() == "true"
+        # 處理下一筆記錄所需的最少 Lambda 剩餘時間（秒），不足時留待重新投遞
+        self.SQS_MIN_REMAINING_SECONDS = float(os.getenv("SQS_MIN_REMAINING_SECONDS", "60"))
+        # Session 排序佇列（SQS FIFO，MessageGroupId = session）
+        self.ORDERING_QUEUE_URL = os.getenv("ORDERING_QUEUE_URL", "")
+        # 高優先順序（routing.priority = high）的排序佇列，未設定時與一般訊息共用佇列
+        self.PRIORITY_ORDERING_QUEUE_URL = os.getenv("PRIORITY_ORDERING_QUEUE_URL", "")
+        # 媒體 / 檔案訊息的排序佇列（由 full profile 的 Processor 消費），未設定時與文字訊息共用佇列
+        self.MEDIA_ORDERING_QUEUE_URL = os.getenv("MEDIA_ORDERING_QUEUE_URL", "")
+
+        # 串流輸出配置（message.delta 事件）
+        self.STREAMING_ENABLED = os.getenv("STREAMING_ENABLED", "false").lower() == "true"
+        self.STREAMING_CHANNELS = [
+            c.strip()
+            for c in os.getenv("STREAMING_CHANNELS", "telegram,web").split(",")
+            if c.strip()
+        ]
+        self.STREAM_DELTA_INTERVAL = float(os.getenv("STREAM_DELTA_INTERVAL", "1.0"))  # 秒
+        self.STREAM_DELTA_MIN_CHARS = int(os.getenv("STREAM_DELTA_MIN_CHARS", "40"))
+
     @property
     def is_production(self) -> bool:
         """檢查是否為生產環境"""
@@ -68,6 +263,7 @@ class Settings:
             f"  AWS Region: {self.AWS_REGION}\n"
             f"  Model: {self.BEDROCK_MODEL_ID}\n"
             f"  Memory: {'Enabled' if self.MEMORY_ENABLED else 'Disabled'}\n"
+            f"  Profile: {self.PROCESSOR_PROFILE}\n"
             f"  Browser: {'Enabled' if self.BROWSER_ENABLED else 'Disabled'}\n"
             f"  Environment: {'Production' if self.is_production else 'Development'}"
         )
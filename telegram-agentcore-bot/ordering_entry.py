@@ -0,0 +1,132 @@
+"""
+Session 排序入口
+EventBridge 會同時觸發多個 Processor，同一個 session 連續的兩則訊息可能並行處理，
+造成 Memory 寫入交錯、回覆順序錯亂。此 Lambda 將訊息轉送到 SQS FIFO 佇列
+（MessageGroupId = session），Processor 以批次消費：同一個 session 一次只處理一則，
+不同 session 完全並行。routing.priority 為 high 的訊息進入獨立的佇列，
+一般佇列的並行數上限低於 Processor 的保留並行數，高優先訊息不會排在一般流量之後；媒體與檔案訊息
+（或帶有附件的訊息）進入 full profile Processor 消費的媒體佇列，同一個 session 的媒體同樣依序處理。
+所有 message.received 事件都經過此 Lambda，佇列（lane）在這裡決定
+"""
+
+import hashlib
+import json
+from typing import Any
+
+import boto3
+
+from config.settings import settings
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# SQS 客戶端（延遲初始化）
+_sqs_client = None
+
+
+def get_sqs_client():
+    """獲取 SQS 客戶端單例"""
+    global _sqs_client
+    if _sqs_client is None:
+        _sqs_client = boto3.client("sqs")
+    return _sqs_client
+
+
+def session_group_id(message: dict[str, Any]) -> str:
+    """
+    取得訊息的排序群組（與 Processor 使用相同的 session 規則）
+
+    以雜湊表示，群組 ID 不含使用者識別資訊，也符合 SQS 的長度與字元限制
+
+    Args:
+        message: 標準化訊息
+
+    Returns:
+        MessageGroupId
+    """
+    channel = message.get("channel", {}).get("type", "unknown")
+    user_id = str(message.get("user", {}).get("id", "unknown"))
+    session_id = message.get("context", {}).get("sessionId") or user_id
+    digest = hashlib.sha256(f"{channel}:{session_id}".encode()).hexdigest()[:32]
+    return f"session-{digest}"
+
+
+def lane_queue_url(message: dict[str, Any]) -> str:
+    """
+    依訊息類型與 routing.priority 選擇處理佇列
+
+    Args:
+        message: 標準化訊息
+
+    Returns:
+        佇列 URL（非文字或帶有附件的訊息進入媒體佇列；high 進入高優先佇列；
+        normal / low 進入一般佇列，由 Processor 在批次內排序）
+    """
+    content = message.get("content", {})
+    is_media = content.get("messageType", "text") != "text" or bool(content.get("attachments"))
+    if is_media and settings.MEDIA_ORDERING_QUEUE_URL:
+        return settings.MEDIA_ORDERING_QUEUE_URL
+    priority = message.get("routing", {}).get("priority", "normal")
+    if priority == "high" and settings.PRIORITY_ORDERING_QUEUE_URL:
+        return settings.PRIORITY_ORDERING_QUEUE_URL
+    return settings.ORDERING_QUEUE_URL
+
+
+def enqueue_message(event: dict[str, Any]) -> str:
+    """
+    將 EventBridge 事件轉送到排序佇列
+
+    Args:
+        event: EventBridge 事件（message.received）
+
+    Returns:
+        MessageGroupId
+    """
+    detail = event.get("detail", {})
+    group_id = session_group_id(detail)
+    # EventBridge 至少投遞一次：同一則訊息在去重時間窗內只會進入佇列一次
+    message_id = str(detail.get("messageId") or event.get("id", ""))
+    dedup_id = hashlib.sha256(message_id.encode()).hexdigest()
+
+    get_sqs_client().send_message(
+        QueueUrl=lane_queue_url(detail),
+        MessageBody=json.dumps(
+            {"detail-type": event.get("detail-type"), "detail": detail}, ensure_ascii=False
+        ),
+        MessageGroupId=group_id,
+        MessageDeduplicationId=dedup_id,
+    )
+    return group_id
+
+
+def handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
+    """
+    Lambda 入口函數 - 將 message.received 事件轉送到排序佇列
+
+    轉送失敗時拋出例外，由 EventBridge / Lambda 非同步呼叫重試
+
+    Args:
+        event: EventBridge 事件
+        context: Lambda context
+
+    Returns:
+        處理結果
+    """
+    detail_type = event.get("detail-type", "")
+    if detail_type != "message.received":
+        logger.warning(f"Unsupported detail-type: {detail_type}")
+        return {"statusCode": 200, "body": "Event ignored"}
+
+    message_id = event.get("detail", {}).get("messageId", "unknown")
+    group_id = enqueue_message(event)
+
+    logger.info(
+        "Message queued for ordered processing",
+        extra={
+            "event_type": "ordering_enqueue",
+            "message_id": message_id,
+            "group_id": group_id,
+            "priority": event.get("detail", {}).get("routing", {}).get("priority", "normal"),
+        },
+    )
+    return {"statusCode": 200, "body": json.dumps({"message_id": message_id, "status": "queued"})}
@@ -5,23 +5,51 @@ EventBridge Processor Entry Point
 
 import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
 import boto3
 
+from agents.agent_pool import agent_pool, get_shared_model
 from agents.conversation_agent import ConversationAgent
+from agents.model_router import model_router
+from config.settings import settings
 from services.file_service import file_service
+from services.memory_image_refs import image_reference_store
 from services.memory_service import MemoryService
+from services.memory_write_behind import memory_write_behind
+from services.response_cache import ResponseCache, parse_category_ttls, toolset_version
 from tools import AVAILABLE_TOOLS
 from utils.audit import MemoryAuditLogger
+from utils.deadline import Deadline, message_age
+from utils.error_messages import ERROR_MESSAGES
+from utils.file_types import SNIFF_BYTES, converse_image_format
 from utils.logger import get_logger
 from utils.security import secure_actor_id, validate_user_id
+from utils.stream_publisher import DeltaPublisher
 
 logger = get_logger(__name__)
 
+# routing.priority 的處理順序（數字越小越優先）
+PRIORITY_RANKS = {"high": 0, "normal": 1, "low": 2}
+
 # 初始化 Memory 服務（全域單例）
 memory_service = MemoryService()
 
+# 回應快取（選用，容器內共用）；工具組變更時 key 隨之改變
+response_cache = (
+    ResponseCache(
+        category_ttls=parse_category_ttls(settings.RESPONSE_CACHE_TTLS),
+        max_size=settings.RESPONSE_CACHE_SIZE,
+        max_chars=settings.RESPONSE_CACHE_MAX_CHARS,
+        bypass_users=settings.RESPONSE_CACHE_BYPASS_USERS,
+    )
+    if settings.RESPONSE_CACHE_ENABLED
+    else None
+)
+TOOLSET_VERSION = toolset_version(AVAILABLE_TOOLS)
+
 # EventBridge 客戶端
 _eventbridge_client = None
 
@@ -34,13 +62,25 @@ def get_eventbridge_client():
     return _eventbridge_client
 
 
+# SQS 客戶端（延遲初始化）
+_sqs_client = None
+
+
+def get_sqs_client():
+    """取得 SQS 客戶端單例"""
+    global _sqs_client
+    if _sqs_client is None:
+        _sqs_client = boto3.client("sqs")
+    return _sqs_client
+
+
 def handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
     """
     Lambda 入口函數 - 處理 EventBridge 事件
 
     支援兩種觸發來源：
     1. EventBridge: event['detail'] 包含標準化訊息
-    2. SQS (向後兼容): event['Records'] 包含 SQS 訊息
+    2. SQS: event['Records'] 包含排序佇列（FIFO）的標準化訊息，或舊版的 Telegram 原始訊息
 
     Args:
         event: EventBridge 事件或 SQS 事件
@@ -60,8 +100,8 @@ def handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
     try:
         # 判斷事件來源
         if "Records" in event:
-            # SQS 事件（向後兼容）
-            logger.info("Processing SQS event (legacy mode)")
+            # SQS 事件（排序佇列或舊版）
+            logger.info("Processing SQS event")
             return process_sqs_event(event, context)
         elif "detail" in event:
             # EventBridge 事件（新架構）
@@ -105,20 +145,101 @@ def process_eventbridge_event(event: dict[str, Any], context: Any) -> dict[str,
         extra={"message_id": message_id, "channel": channel_type},
     )
 
-    # 處理訊息
-    result = process_normalized_message(normalized_message)
+    # 處理訊息（期限來自 Lambda 剩餘時間，到期前回覆目前的進度）
+    result = process_and_publish(normalized_message, deadline=Deadline.from_context(context))
+
+    # 回覆已送出，再寫入延後的 Memory 事件與審計記錄
+    flush_memory_writes(context)
+
+    return {
+        "statusCode": 200,
+        "body": json.dumps(
+            {"message_id": message_id, "status": "processed" if result.get("success") else "failed"}
+        ),
+    }
+
+
+def process_and_publish(
+    normalized_message: dict[str, Any], deadline: Deadline | None = None
+) -> dict[str, Any]:
+    """
+    處理標準化訊息並發布完成 / 失敗事件
+
+    訊息已超過入口設定的期限時不呼叫模型，直接回覆請使用者重新傳送；
+    未過期時，處理期限取 Lambda 期限與訊息期限中較早者
+
+    Args:
+        normalized_message: 標準化訊息
+        deadline: 處理期限（可選）
+
+    Returns:
+        處理結果
+    """
+    message_deadline = Deadline.from_message(normalized_message)
+    expired = message_deadline is not None and message_deadline.expired()
+    log_message_age(normalized_message, "processor", expired)
+
+    if expired:
+        result = expired_message_result(normalized_message)
+    else:
+        result = process_normalized_message(
+            normalized_message, deadline=Deadline.earliest(deadline, message_deadline)
+        )
 
     # 發布處理完成事件
     if result.get("success"):
         publish_completion_event(normalized_message, result)
     else:
         publish_failure_event(normalized_message, result)
+    return result
+
+
+def log_message_age(message: dict[str, Any], stage: str, expired: bool) -> None:
+    """
+    記錄訊息到達此階段時的等待時間（排隊延遲指標）
+
+    Args:
+        message: 標準化訊息
+        stage: 階段名稱
+        expired: 是否已超過訊息期限
+    """
+    age = message_age(message)
+    logger.info(
+        f"Message age at {stage}",
+        extra={
+            "event_type": "message_age",
+            "stage": stage,
+            "message_id": message.get("messageId"),
+            "message_type": message.get("content", {}).get("messageType", "text"),
+            "priority": message.get("routing", {}).get("priority", "normal"),
+            "age_ms": int(age * 1000) if age is not None else None,
+            "expired": expired,
+        },
+    )
+
+
+def expired_message_result(message: dict[str, Any]) -> dict[str, Any]:
+    """
+    已過期訊息的處理結果（不呼叫模型，也不寫入 Memory）
+
+    Args:
+        message: 標準化訊息
 
+    Returns:
+        處理結果
+    """
+    user_id = str(message.get("user", {}).get("id", "unknown"))
+    logger.warning(
+        "Message expired before processing, asking user to resend",
+        extra={"event_type": "message_expired", "message_id": message.get("messageId")},
+    )
     return {
-        "statusCode": 200,
-        "body": json.dumps(
-            {"message_id": message_id, "status": "processed" if result.get("success") else "failed"}
-        ),
+        "success": True,
+        "response": ERROR_MESSAGES["message_expired"],
+        "user_id": user_id,
+        "session_id": message.get("context", {}).get("sessionId", user_id),
+        "streamed": False,
+        "expired": True,
     }
 
 
@@ -151,16 +272,19 @@ def process_image_attachments(attachments: list, user_id: str) -> list:
             )
 
             # 從 S3 讀取圖片（直接用 bytes，不需要 base64）
-            image_bytes = file_service.read_from_s3(s3_url)
+            image_bytes = file_service.read_from_s3(s3_url, max_bytes=settings.IMAGE_MAX_BYTES)
             if not image_bytes:
                 logger.warning(f"Failed to read image from S3: {filename}")
                 continue
 
-            # 判斷圖片格式（Converse API 格式）
-            image_format = _detect_image_format(filename)
+            # 判斷圖片格式（Converse API 格式，優先以 magic bytes 判斷）
+            image_format = _detect_image_format(filename, image_bytes[:SNIFF_BYTES])
 
             images_data.append({"bytes": image_bytes, "format": image_format})
 
+            # 寫入 Memory 時以 S3 參照取代 bytes
+            image_reference_store.register(image_bytes, s3_url, image_format, filename)
+
             logger.info(
                 f"✅ Image prepared for Converse API: {filename} ({image_format}, {len(image_bytes)} bytes)"
             )
@@ -171,18 +295,23 @@ def process_image_attachments(attachments: list, user_id: str) -> list:
     return images_data
 
 
-def _detect_image_format(filename: str) -> str:
+def _detect_image_format(filename: str, head: bytes = b"") -> str:
     """
-    根據檔案名稱判斷圖片格式（Converse API 格式）
+    判斷圖片格式（Converse API 格式）
 
     Args:
         filename: 檔案名稱
+        head: 圖片開頭的 bytes（可辨識時優先於副檔名）
 
     Returns:
         圖片格式：'jpeg' | 'png' | 'gif' | 'webp'
     """
     import os
 
+    detected = converse_image_format(head)
+    if detected:
+        return detected
+
     ext = os.path.splitext(filename)[1].lower()
 
     formats = {".jpg": "jpeg", ".jpeg": "jpeg", ".png": "png", ".gif": "gif", ".webp": "webp"}
@@ -190,13 +319,19 @@ def _detect_image_format(filename: str) -> str:
     return formats.get(ext, "jpeg")
 
 
-def process_file_attachments(attachments: list, user_id: str) -> str | None:
+def process_file_attachments(
+    attachments: list, user_id: str, session_id: str | None = None
+) -> str | None:
     """
     處理檔案附件（非圖片）
 
+    同一則訊息的檔案在同一個 Code Interpreter session 中批次處理，
+    並以 (user_id, session_id) 綁定 session，同一對話的後續檔案可重用。
+
     Args:
         attachments: 附件列表
         user_id: 用戶 ID
+        session_id: 對話 session ID（用於 session 綁定）
 
     Returns:
         檔案處理結果文字，或 None
@@ -206,49 +341,57 @@ def process_file_attachments(attachments: list, user_id: str) -> str | None:
         return None
 
     results = []
+    files = []
 
     for attachment in attachments:
-        try:
-            # 檢查是否有權限被拒絕標記
-            if attachment.get("permission_denied"):
-                logger.info(
-                    f"File permission denied for {attachment.get('type')}",
-                    extra={"user_id": user_id},
-                )
-                continue
+        # 檢查是否有權限被拒絕標記
+        if attachment.get("permission_denied"):
+            logger.info(
+                f"File permission denied for {attachment.get('type')}",
+                extra={"user_id": user_id},
+            )
+            continue
 
-            # 檢查是否有 S3 URL
-            s3_url = attachment.get("s3_url")
-            if not s3_url:
-                logger.warning(f"No S3 URL in attachment: {attachment}")
-                continue
+        # 檢查是否有 S3 URL
+        s3_url = attachment.get("s3_url")
+        if not s3_url:
+            logger.warning(f"No S3 URL in attachment: {attachment}")
+            continue
 
-            # 提取檔案資訊
-            filename = attachment.get("file_name", "unknown")
-            task = attachment.get("task", "摘要此檔案的內容")
+        # 提取檔案資訊
+        filename = attachment.get("file_name", "unknown")
+        task = attachment.get("task", "摘要此檔案的內容")
 
-            logger.info(
-                f"📁 Processing file: {filename}",
-                extra={"user_id": user_id, "file_name": filename, "task": task, "s3_url": s3_url},
-            )
+        logger.info(
+            f"📁 Processing file: {filename}",
+            extra={"user_id": user_id, "file_name": filename, "task": task, "s3_url": s3_url},
+        )
+        files.append({"s3_url": s3_url, "filename": filename, "task": task})
 
-            # 使用 file_service 處理檔案
-            process_result = file_service.process_file(
-                s3_url=s3_url, filename=filename, task=task, user_id=user_id
-            )
+    if not files:
+        return None
 
-            if process_result.get("success"):
-                result_text = process_result.get("result", "處理完成")
-                results.append(f"📁 檔案：{filename}\n{result_text}")
-                logger.info(f"✅ File processed successfully: {filename}")
-            else:
-                error = process_result.get("error", "未知錯誤")
-                results.append(f"❌ 檔案 {filename} 處理失敗：{error}")
-                logger.warning(f"File processing failed: {filename} - {error}")
+    affinity_key = f"{user_id}:{session_id or user_id}"
 
-        except Exception as e:
-            logger.error(f"Error processing attachment: {e}", exc_info=True)
-            results.append(f"❌ 處理附件時發生錯誤：{str(e)}")
+    try:
+        # 使用 file_service 批次處理檔案
+        process_results = file_service.process_files(
+            files, user_id=user_id, affinity_key=affinity_key
+        )
+    except Exception as e:
+        logger.error(f"Error processing attachment: {e}", exc_info=True)
+        return f"❌ 處理附件時發生錯誤：{str(e)}"
+
+    for file_info, process_result in zip(files, process_results, strict=True):
+        filename = file_info["filename"]
+        if process_result.get("success"):
+            result_text = process_result.get("result", "處理完成")
+            results.append(f"📁 檔案：{filename}\n{result_text}")
+            logger.info(f"✅ File processed successfully: {filename}")
+        else:
+            error = process_result.get("error", "未知錯誤")
+            results.append(f"❌ 檔案 {filename} 處理失敗：{error}")
+            logger.warning(f"File processing failed: {filename} - {error}")
 
     if results:
         return "\n\n".join(results)
@@ -258,84 +401,295 @@ def process_file_attachments(attachments: list, user_id: str) -> str | None:
 
 def process_sqs_event(event: dict[str, Any], context: Any) -> dict[str, Any]:
     """
-    處理 SQS 事件（向後兼容現有系統）
+    處理 SQS 事件（排序佇列與舊版 Telegram 佇列）
+
+    同一個 session（FIFO 的 MessageGroupId；舊版為 chat）的訊息依序處理，
+    不同 session 之間以有限的 worker 並行處理，routing.priority 較高的 session 先開始。
+    回傳 batchItemFailures，只讓失敗的訊息重新投遞
+    （事件來源需啟用 ReportBatchItemFailures）。
 
     Args:
         event: SQS 事件
         context: Lambda context
 
     Returns:
-        處理結果
+        處理結果（包含 batchItemFailures）
     """
     records = event.get("Records", [])
+    deadline = Deadline.from_context(context)
+
+    # 依 session 分組，保留組內順序
+    groups: dict[str, list[dict[str, Any]]] = {}
+    for index, record in enumerate(records):
+        groups.setdefault(_sqs_group_key(record, index), []).append(record)
 
-    for record in records:
+    # worker 數少於 session 數時，高優先順序的 session 先處理
+    ordered_groups = sorted(
+        groups.values(), key=lambda group: min(_sqs_priority_rank(r) for r in group)
+    )
+
+    failures: list[str] = []
+    max_workers = max(1, min(settings.SQS_MAX_WORKERS, len(groups)))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        group_results = executor.map(
+            lambda group: _process_sqs_group(group, deadline), ordered_groups
+        )
+        for group_failures in group_results:
+            failures.extend(group_failures)
+
+    flush_memory_writes(context)
+
+    logger.info(
+        "SQS batch processed",
+        extra={
+            "records": len(records),
+            "groups": len(groups),
+            "workers": max_workers,
+            "failed": len(failures),
+        },
+    )
+
+    return {
+        "statusCode": 200,
+        "body": json.dumps({"processed": len(records) - len(failures), "failed": len(failures)}),
+        "batchItemFailures": [{"itemIdentifier": message_id} for message_id in failures],
+    }
+
+
+def _sqs_group_key(record: dict[str, Any], index: int) -> str:
+    """
+    取得 SQS 訊息的分組 key（FIFO 佇列的 MessageGroupId，舊版為 chat ID）
+
+    Args:
+        record: SQS 記錄
+        index: 記錄在批次中的位置（無法解析時自成一組）
+
+    Returns:
+        分組 key
+    """
+    group_id = record.get("attributes", {}).get("MessageGroupId")
+    if group_id:
+        return group_id
+
+    try:
+        message = json.loads(record.get("body", "{}")).get("message", {})
+        chat_id = message.get("chat", {}).get("id") or message.get("from", {}).get("id")
+        if chat_id is not None:
+            return str(chat_id)
+    except (json.JSONDecodeError, AttributeError):
+        pass
+    return f"record-{index}"
+
+
+def _sqs_priority_rank(record: dict[str, Any]) -> int:
+    """
+    取得 SQS 記錄的優先順序（數字越小越優先；無 routing 資訊時視為 normal）
+
+    Args:
+        record: SQS 記錄
+
+    Returns:
+        優先順序
+    """
+    try:
+        detail = json.loads(record.get("body", "{}")).get("detail", {})
+        priority = detail.get("routing", {}).get("priority", "normal")
+    except (json.JSONDecodeError, AttributeError):
+        priority = "normal"
+    return PRIORITY_RANKS.get(priority, PRIORITY_RANKS["normal"])
+
+
+def _process_sqs_group(
+    records: list[dict[str, Any]], deadline: Deadline | None = None
+) -> list[str]:
+    """
+    依序處理同一個 session 的 SQS 記錄
+
+    某筆失敗後，同組後續記錄也回報失敗，重新投遞時維持原本順序；
+    Lambda 剩餘時間不足以處理下一筆時，其餘記錄留待重新投遞。
+
+    Args:
+        records: 同一個 session 的 SQS 記錄（依原始順序）
+        deadline: Lambda 期限（可選）
+
+    Returns:
+        失敗記錄的 messageId 列表
+    """
+    for position, record in enumerate(records):
+        if deadline is not None and deadline.expired(reserve=settings.SQS_MIN_REMAINING_SECONDS):
+            logger.warning(
+                "Not enough time left for queued records, returning them for redelivery",
+                extra={"deferred": len(records) - position},
+            )
+            release_deferred_records(records[position:])
+            return [r.get("messageId", "") for r in records[position:]]
         try:
-            body = json.loads(record.get("body", "{}"))
+            process_sqs_record(record, deadline=deadline)
+        except Exception as e:
+            logger.error(
+                f"Failed to process SQS record: {e}",
+                extra={"sqs_message_id": record.get("messageId")},
+                exc_info=True,
+            )
+            return [r.get("messageId", "") for r in records[position:]]
+    return []
 
-            # 從 Telegram 原始格式提取訊息
-            message = body.get("message", {})
-            from_user = message.get("from", {})
-            user_id = str(from_user.get("id", "unknown"))
-            text = message.get("text", "")
 
-            if text:
-                logger.info(
-                    f"Processing SQS message from Telegram user {user_id}",
-                    extra={"memory_enabled": memory_service.enabled},
-                )
+def release_deferred_records(records: list[dict[str, Any]]) -> None:
+    """
+    將尚未處理的記錄立即放回佇列（visibility timeout 設為 0）
 
-                # 建立帶 Memory 的 Agent（與 EventBridge 處理一致）
-                session_manager = None
-                if memory_service.enabled:
-                    try:
-                        # 建立 Memory 上下文
-                        memory_context = type(
-                            "MemoryContext",
-                            (),
-                            {
-                                "session_id": user_id,  # SQS 事件使用 user_id 作為 session_id
-                                "headers": {
-                                    "X-Amzn-Bedrock-AgentCore-Runtime-Custom-Actor-Id": user_id
-                                },
-                            },
-                        )()
-
-                        # 取得 Session Manager
-                        session_manager = memory_service.get_session_manager(memory_context)
-
-                        if session_manager:
-                            logger.info(
-                                "Memory session created for SQS event", extra={"user_id": user_id}
-                            )
-                    except Exception as mem_error:
-                        logger.warning(
-                            f"Failed to create memory session for SQS, using stateless mode: {mem_error}",
-                            extra={"user_id": user_id},
-                        )
-
-                # 建立 Agent
-                agent = ConversationAgent(tools=AVAILABLE_TOOLS, session_manager=session_manager)
-
-                # 處理訊息
-                agent.process_message(text)
+    因時間不足而延後的記錄沒有失敗，不需要等到 visibility timeout 結束才重新投遞；
+    失敗只記錄，記錄仍會在 visibility timeout 後重新投遞
 
-                logger.info(
-                    "SQS message processed",
-                    extra={"user_id": user_id, "has_memory": session_manager is not None},
+    Args:
+        records: 延後處理的 SQS 記錄（同一個佇列）
+    """
+    entries = [
+        {"Id": str(index), "ReceiptHandle": record["receiptHandle"], "VisibilityTimeout": 0}
+        for index, record in enumerate(records)
+        if record.get("receiptHandle")
+    ]
+    queue_url = sqs_queue_url(records[0].get("eventSourceARN", "")) if records else None
+    if not entries or not queue_url:
+        return
+
+    try:
+        # 單次最多 10 筆（與事件來源的 BatchSize 上限相同）
+        for start in range(0, len(entries), 10):
+            get_sqs_client().change_message_visibility_batch(
+                QueueUrl=queue_url, Entries=entries[start : start + 10]
+            )
+    except Exception as e:
+        logger.warning(
+            f"Failed to release deferred records: {e}",
+            extra={"event_type": "sqs_release_error", "deferred": len(entries)},
+        )
+
+
+def sqs_queue_url(queue_arn: str) -> str | None:
+    """
+    由佇列 ARN 取得佇列 URL
+
+    Args:
+        queue_arn: arn:aws:sqs:<region>:<account>:<name>
+
+    Returns:
+        佇列 URL，格式不符時為 None
+    """
+    parts = queue_arn.split(":")
+    if len(parts) != 6 or parts[2] != "sqs":
+        return None
+    _, _, _, region, account, name = parts
+    return f"https://sqs.{region}.amazonaws.com/{account}/{name}"
+
+
+def process_sqs_record(record: dict[str, Any], deadline: Deadline | None = None) -> None:
+    """
+    處理單筆 SQS 記錄，失敗時拋出例外
+
+    排序佇列的記錄為 EventBridge 轉送的標準化訊息；其餘為舊版的 Telegram 原始格式
+
+    Args:
+        record: SQS 記錄
+        deadline: 處理期限（可選）
+    """
+    body = json.loads(record.get("body", "{}"))
+
+    if "detail" in body:
+        # 處理結果（含失敗）已回覆使用者，不重新投遞；只有例外才回報失敗
+        if body.get("detail-type") == "message.received":
+            process_and_publish(body["detail"], deadline=deadline)
+        return
+
+    # 從 Telegram 原始格式提取訊息
+    message = body.get("message", {})
+    from_user = message.get("from", {})
+    user_id = str(from_user.get("id", "unknown"))
+    text = message.get("text", "")
+
+    if not text:
+        return
+
+    logger.info(
+        f"Processing SQS message from Telegram user {user_id}",
+        extra={"memory_enabled": memory_service.enabled},
+    )
+
+    def build_agent():
+        """建立帶 Memory 的 Agent（與 EventBridge 處理一致）"""
+        session_manager = None
+        if memory_service.enabled:
+            try:
+                # 建立 Memory 上下文
+                memory_context = type(
+                    "MemoryContext",
+                    (),
+                    {
+                        "session_id": user_id,  # SQS 事件使用 user_id 作為 session_id
+                        "headers": {"X-Amzn-Bedrock-AgentCore-Runtime-Custom-Actor-Id": user_id},
+                    },
+                )()
+
+                # 取得 Session Manager
+                session_manager = memory_service.get_session_manager(memory_context)
+
+                if session_manager:
+                    logger.info("Memory session created for SQS event", extra={"user_id": user_id})
+            except Exception as mem_error:
+                logger.warning(
+                    f"Failed to create memory session for SQS, using stateless mode: {mem_error}",
+                    extra={"user_id": user_id},
                 )
-        except Exception as e:
-            logger.error(f"Failed to process SQS record: {e}", exc_info=True)
 
-    return {"statusCode": 200, "body": json.dumps({"processed": len(records)})}
+        return ConversationAgent(
+            tools=AVAILABLE_TOOLS,
+            session_manager=session_manager,
+            model=get_shared_model(),
+        )
+
+    # 取得 Agent（容器內重用）
+    agent, _ = agent_pool.acquire(user_id, user_id, build_agent)
+    session_manager = agent.session_manager
+
+    # 處理訊息
+    response_dict = agent.process_message(text)
+    if isinstance(response_dict, dict) and response_dict.get("success") is False:
+        agent_pool.discard(user_id, user_id)
+        raise RuntimeError(response_dict.get("error", "Agent processing failed"))
+
+    response_text = (
+        response_dict.get("response", "") if isinstance(response_dict, dict) else str(response_dict)
+    )
 
+    logger.info(
+        "SQS message processed",
+        extra={"user_id": user_id, "has_memory": session_manager is not None},
+    )
+
+    # 舊版記錄也發布完成事件，讓 Response Router 回覆使用者
+    if settings.SQS_PUBLISH_COMPLETION:
+        chat_id = str(message.get("chat", {}).get("id", user_id))
+        original_message = {
+            "messageId": record.get("messageId", "unknown"),
+            "channel": {"type": "telegram", "channelId": chat_id},
+            "user": {"id": chat_id, "channelUserId": user_id},
+        }
+        publish_completion_event(
+            original_message, {"response": response_text, "session_id": user_id}
+        )
 
-def process_normalized_message(normalized: dict[str, Any]) -> dict[str, Any]:
+
+def process_normalized_message(
+    normalized: dict[str, Any], deadline: Deadline | None = None
+) -> dict[str, Any]:
     """
     處理標準化訊息
 
     Args:
         normalized: 標準化的訊息物件
+        deadline: 處理期限（可選）
 
     Returns:
         處理結果
@@ -367,6 +721,41 @@ def process_normalized_message(normalized: dict[str, Any]) -> dict[str, Any]:
             },
         )
 
+        # 生成安全的 actor_id（雜湊化）
+        secure_user_id = secure_actor_id(user_id)
+
+        # 重複的無狀態問題直接回覆快取結果（不建立 Agent）；
+        # 只用於 session 最近沒有對話的回合，追問需要對話歷史
+        cache_key = None
+        turn_start = time.perf_counter()
+        if (
+            response_cache is not None
+            and message_type == "text"
+            and response_cache.is_cacheable(text, user_id, has_attachments=bool(attachments))
+            and not session_has_recent_history(secure_user_id, session_id)
+        ):
+            cache_key = response_cache.build_key(
+                text, TOOLSET_VERSION, model_router.preferred_model(text)
+            )
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                memory_service.append_turn(secure_user_id, session_id, text, cached["response"])
+                return {
+                    "success": True,
+                    "response": cached["response"],
+                    "user_id": user_id,
+                    "session_id": session_id,
+                    "streamed": False,
+                    "cached": True,
+                    "model": cached["model"],
+                }
+
+        # 預先檢索長期記憶，與附件下載同時進行
+        # （圖片訊息的第一個內容區塊是圖片，Session Manager 不檢索長期記憶；
+        # 可快取的問題不使用 Memory，不需要檢索）
+        if text and cache_key is None and not any(a.get("type") == "photo" for a in attachments):
+            memory_service.prefetch(secure_user_id, text)
+
         # 分離圖片附件和其他檔案附件
         image_attachments = []
         file_attachments = []
@@ -380,7 +769,7 @@ def process_normalized_message(normalized: dict[str, Any]) -> dict[str, Any]:
         # 處理非圖片檔案附件
         file_processing_result = None
         if file_attachments:
-            file_processing_result = process_file_attachments(file_attachments, user_id)
+            file_processing_result = process_file_attachments(file_attachments, user_id, session_id)
 
         # 處理圖片附件（轉換為 base64）
         images_data = []
@@ -391,12 +780,13 @@ def process_normalized_message(normalized: dict[str, Any]) -> dict[str, Any]:
         if message_type in ["text", "file", "image", "video", "audio"] and (
             text or file_processing_result or images_data
         ):
-            # 如果有檔案處理結果，添加到訊息文字中
-            full_text = text
-            if file_processing_result:
-                full_text = (
-                    f"{text}\n\n{file_processing_result}" if text else file_processing_result
-                )
+            # 檔案處理結果以獨立的文字區塊放在訊息之後（沒有訊息文字時直接作為訊息）
+            full_text = text or file_processing_result or ""
+            message_kwargs = {}
+            if text and file_processing_result:
+                message_kwargs["attachment_text"] = file_processing_result
+            if deadline is not None:
+                message_kwargs["deadline"] = deadline
             # 驗證 user_id 格式
             if not validate_user_id(user_id):
                 logger.warning(f"Invalid user_id format: {user_id}")
@@ -407,75 +797,79 @@ def process_normalized_message(normalized: dict[str, Any]) -> dict[str, Any]:
                     user_id=user_id,
                 )
 
-            # 生成安全的 actor_id（雜湊化）
-            secure_user_id = secure_actor_id(user_id)
-
-            # 建立帶 Memory 的 Agent
-            session_manager = None
-            if memory_service.enabled:
-                try:
-                    # 建立 Memory 上下文（使用安全的 actor_id）
-                    memory_context = type(
-                        "MemoryContext",
-                        (),
-                        {
-                            "session_id": session_id,
-                            "headers": {
-                                "X-Amzn-Bedrock-AgentCore-Runtime-Custom-Actor-Id": secure_user_id
-                            },
-                        },
-                    )()
-
-                    # 取得 Session Manager
-                    session_manager = memory_service.get_session_manager(memory_context)
+            # 取得 Agent（文字對話從容器內的 Agent 池重用）
+            setup_start = time.perf_counter()
+            pool_hit = False
 
-                    if session_manager:
-                        # 記錄審計日誌：Session 創建成功
-                        MemoryAuditLogger.log_session_created(
-                            user_id=user_id,
-                            actor_id=secure_user_id,
-                            session_id=session_id,
-                            memory_id=memory_service.memory_id,
-                        )
-
-                        logger.info(
-                            "Memory session created with secure actor_id",
-                            extra={
-                                "user_id": user_id,
-                                "secure_actor_id": secure_user_id,
-                                "session_id": session_id,
-                            },
-                        )
-                except Exception as mem_error:
-                    # 記錄審計日誌：Session 創建失敗
-                    MemoryAuditLogger.log_session_failed(
-                        user_id=user_id,
-                        actor_id=secure_user_id,
-                        session_id=session_id,
-                        error=str(mem_error),
+            # 圖片以 S3 參照寫入 Memory；未啟用參照時圖片對話不使用 Memory（bytes 無法序列化）
+            # 可快取的問題會回覆給其他用戶，以不含長期記憶與對話歷史的 Agent 產生
+            stateless = cache_key is not None or (
+                bool(images_data) and not settings.MEMORY_IMAGE_REFERENCES_ENABLED
+            )
+            if stateless:
+                if cache_key is not None:
+                    logger.info("📦 可快取的問題：以無 Memory 的 Agent 產生回覆")
+                else:
+                    logger.info("🖼️ 圖片分析模式：未啟用圖片參照，暫時禁用 Memory")
+                agent = ConversationAgent(
+                    tools=AVAILABLE_TOOLS,
+                    session_manager=None,
+                    model=get_shared_model(),
+                )
+            else:
+                # 前一次 invocation 未完成的寫入先送出，維持同一 session 的事件順序
+                write_key = memory_service.session_key(secure_user_id, session_id)
+                if memory_write_behind.pending(write_key):
+                    memory_write_behind.flush(write_key)
+
+                def build_agent():
+                    return ConversationAgent(
+                        tools=AVAILABLE_TOOLS,
+                        session_manager=create_memory_session(user_id, secure_user_id, session_id),
+                        model=get_shared_model(),
                     )
 
-                    logger.warning(
-                        f"Failed to create memory session, using stateless mode: {mem_error}",
-                        extra={"user_id": user_id, "secure_actor_id": secure_user_id},
-                    )
+                agent, pool_hit = agent_pool.acquire(secure_user_id, session_id, build_agent)
+
+                # 池中的 Agent 沒有 Memory（例如先前建立失敗）時，嘗試補上
+                if pool_hit and agent.session_manager is None and memory_service.enabled:
+                    session_manager = create_memory_session(user_id, secure_user_id, session_id)
+                    if session_manager:
+                        agent.swap_session_manager(session_manager)
+
+            session_manager = agent.session_manager
+            logger.info(
+                "Agent ready",
+                extra={
+                    "user_id": user_id,
+                    "session_id": session_id,
+                    "agent_pool_hit": pool_hit,
+                    "agent_setup_ms": round((time.perf_counter() - setup_start) * 1000, 2),
+                    "agent_pool_size": len(agent_pool),
+                },
+            )
+
+            # 串流模式：邊生成邊發布 message.delta
+            stream_handler = create_stream_publisher(normalized)
 
-            # 建立 ConversationAgent
-            # 注意：如果有圖片，暫時禁用 Memory（因為 bytes 無法序列化）
             if images_data:
                 logger.info(
-                    "🖼️ 圖片分析模式：暫時禁用 Memory（AgentCore Memory 無法序列化圖片 bytes）"
-                )
-                agent = ConversationAgent(
-                    tools=AVAILABLE_TOOLS,
-                    session_manager=None,  # 圖片分析時不使用 Memory
+                    f"🖼️ 傳遞 {len(images_data)} 張圖片到 Agent",
+                    extra={"has_memory": agent.session_manager is not None},
                 )
-                logger.info(f"🖼️ 傳遞 {len(images_data)} 張圖片到 Agent（無 Memory）")
-                response_dict = agent.process_message(full_text, images=images_data)
-            else:
-                # 純文字對話使用 Memory
-                agent = ConversationAgent(tools=AVAILABLE_TOOLS, session_manager=session_manager)
-                response_dict = agent.process_message(full_text)
+                message_kwargs["images"] = images_data
+
+            response_dict = agent.process_message(
+                full_text, stream_handler=stream_handler, **message_kwargs
+            )
+
+            # 失敗的回合可能留下不完整的對話狀態，不再重用
+            if (
+                not stateless
+                and isinstance(response_dict, dict)
+                and response_dict.get("success") is False
+            ):
+                agent_pool.discard(secure_user_id, session_id)
 
             # 提取回應字串
             response_text = (
@@ -484,12 +878,22 @@ def process_normalized_message(normalized: dict[str, Any]) -> dict[str, Any]:
                 else str(response_dict)
             )
 
+            # 模型對圖片的回覆作為之後還原對話時的圖片說明
+            for image in images_data:
+                image_reference_store.set_caption(image["bytes"], response_text)
+
+            if cache_key is not None and agent.session_manager is None:
+                cache_response(cache_key, text, response_dict, turn_start)
+                if isinstance(response_dict, dict) and response_dict.get("success"):
+                    memory_service.append_turn(secure_user_id, session_id, text, response_text)
+
             logger.info(
                 "Message processed successfully",
                 extra={
                     "user_id": user_id,
                     "response_length": len(response_text),
                     "has_memory": session_manager is not None,
+                    **(stream_handler.get_stats() if stream_handler else {}),
                 },
             )
 
@@ -498,6 +902,11 @@ def process_normalized_message(normalized: dict[str, Any]) -> dict[str, Any]:
                 "response": response_text,
                 "user_id": user_id,
                 "session_id": session_id,
+                "streamed": bool(stream_handler and stream_handler.published),
+                "deadline_exceeded": bool(
+                    isinstance(response_dict, dict) and response_dict.get("deadline_exceeded")
+                ),
+                "model": response_dict.get("model") if isinstance(response_dict, dict) else None,
             }
         else:
             logger.warning(f"Unsupported message type: {message_type}")
@@ -516,6 +925,172 @@ def process_normalized_message(normalized: dict[str, Any]) -> dict[str, Any]:
         }
 
 
+def session_has_recent_history(secure_user_id: str, session_id: str) -> bool:
+    """
+    Session 最近是否有對話（容器內的 Agent 池、等待寫入的事件或 Memory 中的最近事件）
+
+    Args:
+        secure_user_id: 雜湊後的 actor_id
+        session_id: Session ID
+
+    Returns:
+        是否有最近的對話
+    """
+    if agent_pool.contains(secure_user_id, session_id):
+        return True
+    if memory_write_behind.pending(memory_service.session_key(secure_user_id, session_id)):
+        return True
+    return memory_service.has_recent_events(
+        secure_user_id, session_id, settings.RESPONSE_CACHE_HISTORY_WINDOW
+    )
+
+
+def cache_response(cache_key: str, text: str, response_dict: Any, turn_start: float) -> None:
+    """
+    寫入回應快取（只快取原本分派的模型完整回覆的結果）
+
+    Args:
+        cache_key: 快取 key
+        text: 訊息文字
+        response_dict: Agent 處理結果
+        turn_start: 本回合開始時間（time.perf_counter()）
+    """
+    if not isinstance(response_dict, dict) or not response_dict.get("success"):
+        return
+    # 期限前取消、改用備援模型或降級模式的回覆不快取
+    if response_dict.get("deadline_exceeded") or response_dict.get("tools_used") is None:
+        return
+    if response_dict.get("model") != model_router.preferred_model(text):
+        return
+
+    response_cache.put(
+        cache_key,
+        response_dict.get("response", ""),
+        model_id=response_dict["model"],
+        tools_used=response_dict["tools_used"],
+        elapsed_ms=(time.perf_counter() - turn_start) * 1000,
+    )
+
+
+def create_memory_session(user_id: str, secure_user_id: str, session_id: str) -> Any | None:
+    """
+    建立 Memory Session Manager（含審計日誌）
+
+    Args:
+        user_id: 原始用戶 ID
+        secure_user_id: 雜湊後的 actor_id
+        session_id: Session ID
+
+    Returns:
+        Session Manager 或 None（Memory 未啟用或建立失敗）
+    """
+    if not memory_service.enabled:
+        return None
+
+    try:
+        # 建立 Memory 上下文（使用安全的 actor_id）
+        memory_context = type(
+            "MemoryContext",
+            (),
+            {
+                "session_id": session_id,
+                "headers": {"X-Amzn-Bedrock-AgentCore-Runtime-Custom-Actor-Id": secure_user_id},
+            },
+        )()
+
+        # 取得 Session Manager
+        session_manager = memory_service.get_session_manager(memory_context)
+
+        if session_manager:
+            # 記錄審計日誌：Session 創建成功（與對話事件一起延後寫入）
+            _audit(
+                secure_user_id,
+                session_id,
+                "audit_session_created",
+                lambda: MemoryAuditLogger.log_session_created(
+                    user_id=user_id,
+                    actor_id=secure_user_id,
+                    session_id=session_id,
+                    memory_id=memory_service.memory_id,
+                ),
+            )
+
+            logger.info(
+                "Memory session created with secure actor_id",
+                extra={
+                    "user_id": user_id,
+                    "secure_actor_id": secure_user_id,
+                    "session_id": session_id,
+                },
+            )
+
+        return session_manager
+
+    except Exception as mem_error:
+        # 記錄審計日誌：Session 創建失敗（例外變數離開 except 後即失效，先取出訊息）
+        error = str(mem_error)
+        _audit(
+            secure_user_id,
+            session_id,
+            "audit_session_failed",
+            lambda: MemoryAuditLogger.log_session_failed(
+                user_id=user_id,
+                actor_id=secure_user_id,
+                session_id=session_id,
+                error=error,
+            ),
+        )
+
+        logger.warning(
+            f"Failed to create memory session, using stateless mode: {mem_error}",
+            extra={"user_id": user_id, "secure_actor_id": secure_user_id},
+        )
+        return None
+
+
+def _audit(actor_id: str, session_id: str, description: str, record: Any) -> None:
+    """
+    寫入 Memory 審計記錄（延後寫入啟用時與該 session 的對話事件依序排入佇列）
+
+    Args:
+        actor_id: 雜湊後的 actor_id
+        session_id: Session ID
+        description: 描述（用於日誌）
+        record: 寫入審計記錄的函數
+    """
+    if settings.MEMORY_WRITE_BEHIND_ENABLED:
+        memory_write_behind.defer(
+            memory_service.session_key(actor_id, session_id), record, description
+        )
+    else:
+        record()
+
+
+def flush_memory_writes(context: Any) -> dict[str, Any]:
+    """
+    寫入延後的 Memory 事件與審計記錄（在發布回覆之後呼叫）
+
+    保留 MEMORY_FLUSH_RESERVE_MS 的 Lambda 剩餘時間；來不及寫入的項目留在佇列，
+    於下一次 invocation（或同一 session 的下一則訊息前）重試
+
+    Args:
+        context: Lambda context（可為 None）
+
+    Returns:
+        flush 統計
+    """
+    deadline = Deadline.from_context(context)
+    flush_deadline = (
+        deadline.expires_at - settings.MEMORY_FLUSH_RESERVE_MS / 1000 if deadline else None
+    )
+
+    try:
+        return memory_write_behind.flush(deadline=flush_deadline)
+    except Exception as e:
+        logger.error(f"Failed to flush memory writes: {e}", exc_info=True)
+        return {"written": 0, "failed": 0, "pending": memory_write_behind.pending()}
+
+
 def publish_completion_event(original_message: dict[str, Any], result: dict[str, Any]) -> bool:
     """
     發布訊息處理完成事件到 EventBridge
@@ -543,8 +1118,20 @@ def publish_completion_event(original_message: dict[str, Any], result: dict[str,
             "metadata": {
                 "session_id": result.get("session_id", "unknown"),
                 "original_message_id": original_message.get("messageId", "unknown"),
+                "streamed": result.get("streamed", False),
             },
         }
+        # 入口時間與訊息期限，供 Response Router 計算端到端延遲
+        if original_message.get("timestamp"):
+            completion_event["metadata"]["received_at"] = original_message["timestamp"]
+        expires_at = original_message.get("routing", {}).get("expiresAt")
+        if expires_at is not None:
+            completion_event["metadata"]["expires_at"] = expires_at
+        if result.get("expired"):
+            completion_event["metadata"]["expired"] = True
+        # 實際回覆的模型（模型路由或備援後可能不是預設模型）
+        if result.get("model"):
+            completion_event["metadata"]["model"] = result["model"]
 
         response = evb.put_events(
             Entries=[
@@ -575,6 +1162,86 @@ def publish_completion_event(original_message: dict[str, Any], result: dict[str,
         return False
 
 
+def create_stream_publisher(original_message: dict[str, Any]) -> DeltaPublisher | None:
+    """
+    依設定與頻道建立串流發布器
+
+    Args:
+        original_message: 原始標準化訊息
+
+    Returns:
+        DeltaPublisher，或 None（串流未啟用、頻道不支援或未設定 Event Bus）
+    """
+    if not settings.STREAMING_ENABLED or not os.getenv("EVENT_BUS_NAME"):
+        return None
+
+    channel = original_message.get("channel", {})
+    channel_type = channel.get("type") if isinstance(channel, dict) else channel
+    if channel_type not in settings.STREAMING_CHANNELS:
+        return None
+
+    return DeltaPublisher(
+        publish=lambda text, sequence: publish_delta_event(original_message, text, sequence),
+        min_interval=settings.STREAM_DELTA_INTERVAL,
+        min_chars=settings.STREAM_DELTA_MIN_CHARS,
+    )
+
+
+def publish_delta_event(original_message: dict[str, Any], text: str, sequence: int) -> bool:
+    """
+    發布串流片段事件到 EventBridge
+
+    Args:
+        original_message: 原始標準化訊息
+        text: 目前為止累積的回應文字
+        sequence: 遞增序號（接收端只顯示較新的片段）
+
+    Returns:
+        發布是否成功
+    """
+    event_bus_name = os.getenv("EVENT_BUS_NAME")
+    if not event_bus_name:
+        return False
+
+    try:
+        evb = get_eventbridge_client()
+
+        delta_event = {
+            "messageId": original_message.get("messageId", "unknown"),
+            "channel": original_message.get("channel", {}),
+            "user": original_message.get("user", {}),
+            "delta": {"text": text, "sequence": sequence},
+            "metadata": {
+                "session_id": original_message.get("context", {}).get("sessionId", "unknown"),
+                "original_message_id": original_message.get("messageId", "unknown"),
+            },
+        }
+        expires_at = original_message.get("routing", {}).get("expiresAt")
+        if expires_at is not None:
+            delta_event["metadata"]["expires_at"] = expires_at
+
+        response = evb.put_events(
+            Entries=[
+                {
+                    "Source": "agent-processor",
+                    "DetailType": "message.delta",
+                    "Detail": json.dumps(delta_event),
+                    "EventBusName": event_bus_name,
+                }
+            ]
+        )
+
+        if response.get("FailedEntryCount", 0) > 0:
+            logger.warning(f"Failed to publish delta event: {response}")
+            return False
+
+        return True
+
+    except Exception as e:
+        logger.warning(f"Failed to publish delta event: {e}")
+        return False
+
+
 def publish_failure_event(original_message: dict[str, Any], result: dict[str, Any]) -> bool:
     """
     發布訊息處理失敗事件到 EventBridge
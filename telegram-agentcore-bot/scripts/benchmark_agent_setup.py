@@ -0,0 +1,77 @@
+"""
+量測每回合 Agent 建立時間
+比較「每則訊息建立新 ConversationAgent」與「容器內 Agent 池重用」
+（只建立物件，不呼叫 Bedrock，不需要 AWS 憑證）
+"""
+
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from agents.agent_pool import AgentPool, get_shared_model  # noqa: E402
+from agents.conversation_agent import ConversationAgent  # noqa: E402
+from tools import AVAILABLE_TOOLS  # noqa: E402
+
+TURNS = int(os.getenv("BENCHMARK_TURNS", "50"))
+
+
+def measure(setup) -> list[float]:
+    """執行 TURNS 次 setup，回傳每次耗時（毫秒）"""
+    durations = []
+    for _ in range(TURNS):
+        start = time.perf_counter()
+        setup()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def report(name: str, durations: list[float]) -> None:
+    """輸出統計結果"""
+    print(
+        f"{name:<28} mean={statistics.mean(durations):8.3f} ms  "
+        f"p50={statistics.median(durations):8.3f} ms  max={max(durations):8.3f} ms"
+    )
+
+
+def main():
+    print("=" * 80)
+    print(f"⏱️  每回合 Agent 建立時間（{TURNS} 回合）")
+    print("=" * 80)
+
+    # 改版前：每則訊息都建立新的 BedrockModel + Agent
+    before = measure(lambda: ConversationAgent(tools=AVAILABLE_TOOLS, session_manager=None))
+
+    # 改版後：共用模型 + 同一 session 重用 Agent
+    pool = AgentPool(max_size=32, idle_ttl=900)
+    after = measure(
+        lambda: pool.acquire(
+            "actor-benchmark",
+            "session-benchmark",
+            lambda: ConversationAgent(
+                tools=AVAILABLE_TOOLS, session_manager=None, model=get_shared_model()
+            ),
+        )
+    )
+
+    # 新 session 第一則訊息：共用模型，但需建立 Agent
+    counter = iter(range(TURNS))
+    first_turn = measure(
+        lambda: pool.acquire(
+            "actor-benchmark",
+            f"session-{next(counter)}",
+            lambda: ConversationAgent(
+                tools=AVAILABLE_TOOLS, session_manager=None, model=get_shared_model()
+            ),
+        )
+    )
+
+    report("before (new agent per turn)", before)
+    report("after (pooled, warm)", after)
+    report("after (pooled, new session)", first_turn)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+量測網頁擷取時間
+以本機 HTTP 測試網站比較「每次建立瀏覽器 + networkidle + 固定等待」與
+「重用瀏覽器 + 攔截重資源 + DOM 載入後等待內容穩定」
+（以本機 Chromium 代替 AgentCore Browser session，不需要 AWS 憑證；需安裝 playwright 與 chromium）
+"""
+
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from playwright.sync_api import sync_playwright  # noqa: E402
+
+from tools.browser import capture_page, extract_page_content  # noqa: E402
+
+TURNS = int(os.getenv("BENCHMARK_TURNS", "5"))
+
+# 圖片、字型、影音與長輪詢請求的延遲（秒）
+SLOW_RESOURCE_SECONDS = float(os.getenv("BENCHMARK_SLOW_RESOURCE_SECONDS", "1.0"))
+
+FIXTURE_PAGE = """<!doctype html>
+<html>
+<head>
+  <title>測試網站</title>
+  <style>
+    @font-face { font-family: Fixture; src: url(/slow/font.woff2); }
+    body { font-family: Fixture, sans-serif; }
+  </style>
+</head>
+<body>
+  <nav>導覽列</nav>
+  <main>
+    <h1>新聞標題</h1>
+    <p>第一段內容。</p>
+    <img src="/slow/photo-1.png"><img src="/slow/photo-2.png"><img src="/slow/photo-3.png">
+    <video src="/slow/clip.mp4" autoplay muted></video>
+    <div id="late"></div>
+  </main>
+  <script>
+    // 由 JavaScript 產生的內容
+    setTimeout(() => {
+      document.getElementById("late").innerText = "稍後載入的段落。";
+    }, 300);
+    // 追蹤 / 長輪詢請求，讓網路持續忙碌一段時間
+    let polls = 0;
+    const poll = () => {
+      if (polls++ < 3) fetch("/poll").then(poll, poll);
+    };
+    poll();
+  </script>
+</body>
+</html>
+"""
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """本機測試網站"""
+
+    def do_GET(self):
+        if self.path.startswith("/slow/") or self.path == "/poll":
+            time.sleep(SLOW_RESOURCE_SECONDS)
+            body, content_type = b"\0" * 1024, "application/octet-stream"
+        else:
+            body, content_type = FIXTURE_PAGE.encode("utf-8"), "text/html; charset=utf-8"
+
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+def capture_before(playwright, url: str) -> tuple[str, str]:
+    """改版前：每次建立瀏覽器，等待 networkidle，擷取後再固定等待 2 秒"""
+    browser = playwright.chromium.launch()
+    try:
+        page = browser.new_page()
+        page.goto(url, wait_until="networkidle", timeout=30000)
+        title, content = page.title(), extract_page_content(page)
+        time.sleep(2)
+        return title, content
+    finally:
+        browser.close()
+
+
+def measure(capture) -> list[float]:
+    """執行 TURNS 次擷取，回傳每次耗時（毫秒）"""
+    durations = []
+    for _ in range(TURNS):
+        start = time.perf_counter()
+        title, content = capture()
+        durations.append((time.perf_counter() - start) * 1000)
+        assert "稍後載入的段落" in content, content
+    return durations
+
+
+def report(name: str, durations: list[float]) -> None:
+    """輸出統計結果"""
+    print(
+        f"{name:<36} mean={statistics.mean(durations):9.1f} ms  "
+        f"p50={statistics.median(durations):9.1f} ms  max={max(durations):9.1f} ms"
+    )
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/"
+
+    print("=" * 80)
+    print(f"⏱️  網頁擷取時間（{TURNS} 次，慢資源延遲 {SLOW_RESOURCE_SECONDS}s）")
+    print("=" * 80)
+
+    with sync_playwright() as playwright:
+        before = measure(lambda: capture_before(playwright, url))
+
+        # 改版後：重用同一個瀏覽器（對應池中的 session），每次建立新的 context
+        browser = playwright.chromium.launch()
+        try:
+            after = measure(lambda: capture_page(browser, url))
+        finally:
+            browser.close()
+
+    server.shutdown()
+
+    report("before (new browser, networkidle)", before)
+    report("after (reused browser, dom + stable)", after)
+
+
+if __name__ == "__main__":
+    main()
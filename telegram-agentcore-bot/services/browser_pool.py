@@ -0,0 +1,323 @@
+"""
+Browser Session 池
+在同一個 Lambda 容器內重用 AgentCore Browser session，省去每次瀏覽都建立遠端瀏覽器的時間；
+連線到遠端瀏覽器的 Playwright driver 固定在少數執行緒上
+"""
+
+import queue
+import threading
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class BrowserSessionPool:
+    """
+    AgentCore Browser session 池
+
+    - 瀏覽是無狀態的，任何閒置 session 都可重用（優先使用最近用過的）；
+      呼叫端每次瀏覽建立新的 browser context，避免 cookie 在使用者之間共用
+    - 池大小有上限，全部使用中時改用一次性 session
+    - 閒置過久或存活超過 max_age 的 session 不再重用；閒置一段時間後重用前先做健康檢查
+    - 即使 Lambda 在處理中逾時，session 也會在服務端 session_timeout 後自動結束
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        max_size: int = 2,
+        idle_ttl: float = 240.0,
+        session_timeout: int = 900,
+        health_check_after: float = 30.0,
+    ):
+        """
+        初始化 session 池
+
+        Args:
+            factory: 建立 Browser 客戶端的函數（尚未 start）
+            max_size: 最多保留的 session 數量
+            idle_ttl: 閒置多久（秒）後停止
+            session_timeout: 服務端 session 逾時（秒）
+            health_check_after: 閒置超過此秒數時，重用前先檢查狀態
+        """
+        self.factory = factory
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.session_timeout = session_timeout
+        # 保留餘裕，避免拿到即將被服務端結束的 session
+        self.max_age = max(session_timeout - 60, 0)
+        self.health_check_after = health_check_after
+
+        self._entries: list[dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @contextmanager
+    def session(self) -> Iterator[Any]:
+        """
+        取得 session，離開時一定釋放（發生例外時停止該 session）
+
+        Yields:
+            已啟動的 Browser 客戶端
+        """
+        client = self.acquire()
+        healthy = False
+        try:
+            yield client
+            healthy = True
+        finally:
+            self.release(client, healthy=healthy)
+
+    def acquire(self) -> Any:
+        """
+        取得已啟動的 session（優先重用最近使用的閒置 session）
+
+        Returns:
+            Browser 客戶端
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                expired = self._pop_expired(now)
+                entry = next((e for e in reversed(self._entries) if not e["in_use"]), None)
+                if entry is not None:
+                    entry["in_use"] = True
+                    needs_check = now - entry["last_used"] > self.health_check_after
+
+            self._stop_all(expired)
+
+            if entry is None:
+                break
+            if not needs_check or self._is_healthy(entry["client"]):
+                self.hits += 1
+                logger.info(f"♻️ 重用 Browser session: {entry['client'].session_id}")
+                return entry["client"]
+
+            logger.warning("⚠️ Browser session 健康檢查失敗，重新建立")
+            with self._lock:
+                self._entries.remove(entry)
+            self._stop(entry["client"])
+
+        self.misses += 1
+        client = self.factory()
+        client.start(session_timeout_seconds=self.session_timeout)
+        logger.info(f"✅ Browser session 已啟動: {client.session_id}")
+        self._register(client)
+        return client
+
+    def release(self, client: Any, healthy: bool = True) -> None:
+        """
+        釋放 session：池中的 session 標記為閒置，其餘（一次性或不健康）直接停止
+
+        Args:
+            client: Browser 客戶端
+            healthy: session 是否可再使用
+        """
+        with self._lock:
+            entry = next((e for e in self._entries if e["client"] is client), None)
+            if entry is not None:
+                if healthy:
+                    entry["in_use"] = False
+                    entry["last_used"] = time.monotonic()
+                    return
+                self._entries.remove(entry)
+
+        self._stop(client)
+
+    def shutdown(self) -> None:
+        """停止所有閒置 session"""
+        with self._lock:
+            idle = [entry for entry in self._entries if not entry["in_use"]]
+            for entry in idle:
+                self._entries.remove(entry)
+        self._stop_all([entry["client"] for entry in idle])
+
+    def _register(self, client: Any) -> None:
+        """將新 session 加入池（池滿時為一次性 session）"""
+        with self._lock:
+            if len(self._entries) < self.max_size:
+                now = time.monotonic()
+                self._entries.append(
+                    {"client": client, "created_at": now, "last_used": now, "in_use": True}
+                )
+
+    def _pop_expired(self, now: float) -> list[Any]:
+        """移除閒置過久或存活過久的 session（呼叫端需持有鎖）"""
+        expired = [
+            entry
+            for entry in self._entries
+            if not entry["in_use"]
+            and (
+                now - entry["last_used"] > self.idle_ttl or now - entry["created_at"] > self.max_age
+            )
+        ]
+        for entry in expired:
+            self._entries.remove(entry)
+        return [entry["client"] for entry in expired]
+
+    def _is_healthy(self, client: Any) -> bool:
+        """檢查 session 是否仍為 READY"""
+        try:
+            return client.get_session().get("status") == "READY"
+        except Exception as e:
+            logger.warning(f"⚠️ Browser session 狀態查詢失敗: {e}")
+            return False
+
+    def _stop_all(self, clients: list[Any]) -> None:
+        for client in clients:
+            self._stop(client)
+
+    def _stop(self, client: Any) -> None:
+        """停止 session（失敗只記錄，不拋出）"""
+        session_id = getattr(client, "session_id", None)
+        try:
+            client.stop()
+            logger.info(f"✅ Browser session 清理完成: {session_id}")
+        except Exception as e:
+            logger.warning(f"⚠️ Browser session 清理失敗: {session_id} - {str(e)}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> dict[str, Any]:
+        """
+        取得池統計資訊
+
+        Returns:
+            統計資訊字典
+        """
+        with self._lock:
+            in_use = sum(1 for entry in self._entries if entry["in_use"])
+            size = len(self._entries)
+        return {
+            "size": size,
+            "in_use": in_use,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class PlaywrightDriverPool:
+    """
+    固定數量的 Playwright driver 執行緒
+
+    - sync API 只能在建立它的執行緒使用，每個執行緒在第一次工作時啟動自己的 driver
+      （Node 程序），之後的工作都重用它
+    - 執行緒數量固定，工作超過時排隊，容器內的 driver 數量不會隨呼叫端的執行緒增加
+    - shutdown 時由各執行緒停止自己的 driver
+    """
+
+    def __init__(self, factory: Callable[[], Any], size: int = 2):
+        """
+        初始化 driver 池
+
+        Args:
+            factory: 啟動 Playwright 的函數（在 driver 執行緒中呼叫）
+            size: driver 執行緒數量
+        """
+        self.factory = factory
+        self.size = max(1, size)
+
+        self._jobs: queue.Queue = queue.Queue()
+        self._threads: list[threading.Thread] = []
+        self._idle = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self.drivers_started = 0
+
+    def submit(self, func: Callable[..., Any], *args: Any) -> Future:
+        """
+        在 driver 執行緒執行 func(playwright, *args)
+
+        Args:
+            func: 工作函數（第一個參數為該執行緒的 Playwright 實例）
+            *args: 其他參數
+
+        Returns:
+            Future（工作的例外由 result() 拋出）
+
+        Raises:
+            RuntimeError: 已經 shutdown
+        """
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Playwright driver pool is shut down")
+            self._jobs.put((future, func, args))
+            if self._idle == 0 and len(self._threads) < self.size:
+                thread = threading.Thread(
+                    target=self._worker, name=f"playwright-{len(self._threads)}", daemon=True
+                )
+                self._threads.append(thread)
+                thread.start()
+        return future
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        """
+        停止所有 driver（等待進行中的工作完成）
+
+        Args:
+            timeout: 每個執行緒最多等待的秒數
+        """
+        with self._lock:
+            self._closed = True
+            threads = list(self._threads)
+        for _ in threads:
+            self._jobs.put(None)
+        for thread in threads:
+            thread.join(timeout)
+
+    def _worker(self) -> None:
+        """driver 執行緒：依序執行工作，結束時停止自己的 driver"""
+        playwright = None
+        try:
+            while True:
+                with self._lock:
+                    self._idle += 1
+                job = self._jobs.get()
+                with self._lock:
+                    self._idle -= 1
+                if job is None:
+                    return
+
+                future, func, args = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    if playwright is None:
+                        playwright = self.factory()
+                        with self._lock:
+                            self.drivers_started += 1
+                    future.set_result(func(playwright, *args))
+                except BaseException as e:
+                    future.set_exception(e)
+        finally:
+            if playwright is not None:
+                try:
+                    playwright.stop()
+                    logger.info("✅ Playwright driver 已停止")
+                except Exception as e:
+                    logger.warning(f"⚠️ Playwright driver 停止失敗: {str(e)}")
+
+    def get_stats(self) -> dict[str, Any]:
+        """
+        取得 driver 池統計資訊
+
+        Returns:
+            統計資訊字典
+        """
+        with self._lock:
+            return {
+                "size": self.size,
+                "threads": len(self._threads),
+                "drivers_started": self.drivers_started,
+                "queued": self._jobs.qsize(),
+            }
@@ -0,0 +1,232 @@
+"""
+Code Interpreter Session 池
+在同一個 Lambda 容器內，依 affinity key（例如對話）重用 Code Interpreter session
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class CodeInterpreterPool:
+    """
+    以 affinity key 綁定的 Code Interpreter session 池
+
+    - 每個 key 最多一個 session，只會重用給同一個 key（避免不同對話共用檔案）
+    - 池大小有上限，滿了先停止最久未使用的閒置 session，仍不足時改用一次性 session
+    - 閒置過久或存活超過 max_age 的 session 不再重用；閒置一段時間後重用前先做健康檢查
+    - 即使 Lambda 在處理中逾時，session 也會在服務端 session_timeout 後自動結束
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        max_size: int = 2,
+        idle_ttl: float = 120.0,
+        session_timeout: int = 300,
+        health_check_after: float = 30.0,
+    ):
+        """
+        初始化 session 池
+
+        Args:
+            factory: 建立 Code Interpreter 客戶端的函數（尚未 start）
+            max_size: 最多保留的 session 數量
+            idle_ttl: 閒置多久（秒）後停止
+            session_timeout: 服務端 session 逾時（秒）
+            health_check_after: 閒置超過此秒數時，重用前先檢查狀態
+        """
+        self.factory = factory
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.session_timeout = session_timeout
+        # 保留餘裕，避免拿到即將被服務端結束的 session
+        self.max_age = max(session_timeout - 30, 0)
+        self.health_check_after = health_check_after
+
+        self._entries: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @contextmanager
+    def session(self, affinity_key: str | None = None) -> Iterator[Any]:
+        """
+        取得 session，離開時一定釋放（發生例外時停止該 session）
+
+        Args:
+            affinity_key: 綁定的 key（None 表示一次性 session）
+
+        Yields:
+            已啟動的 Code Interpreter 客戶端
+        """
+        client = self.acquire(affinity_key)
+        healthy = False
+        try:
+            yield client
+            healthy = True
+        finally:
+            self.release(affinity_key, client, healthy=healthy)
+
+    def acquire(self, affinity_key: str | None = None) -> Any:
+        """
+        取得已啟動的 session（優先重用同一個 key 的閒置 session）
+
+        Args:
+            affinity_key: 綁定的 key（None 表示一次性 session）
+
+        Returns:
+            Code Interpreter 客戶端
+        """
+        candidate = None
+        needs_check = False
+
+        with self._lock:
+            now = time.monotonic()
+            expired = self._pop_expired(now)
+            entry = self._entries.get(affinity_key) if affinity_key else None
+            if entry is not None and not entry["in_use"]:
+                entry["in_use"] = True
+                self._entries.move_to_end(affinity_key)
+                candidate = entry["client"]
+                needs_check = now - entry["last_used"] > self.health_check_after
+
+        self._stop_all(expired)
+
+        if candidate is not None:
+            if not needs_check or self._is_healthy(candidate):
+                self.hits += 1
+                logger.info(f"♻️ 重用 Code Interpreter session: {candidate.session_id}")
+                return candidate
+
+            logger.warning("⚠️ Code Interpreter session 健康檢查失敗，重新建立")
+            with self._lock:
+                self._entries.pop(affinity_key, None)
+            self._stop(candidate)
+
+        self.misses += 1
+        client = self.factory()
+        client.start(session_timeout_seconds=self.session_timeout)
+        logger.info(f"✅ Code Interpreter session 已啟動: {client.session_id}")
+
+        if affinity_key:
+            self._register(affinity_key, client)
+
+        return client
+
+    def release(self, affinity_key: str | None, client: Any, healthy: bool = True) -> None:
+        """
+        釋放 session：池中的 session 標記為閒置，其餘（一次性或不健康）直接停止
+
+        Args:
+            affinity_key: 取得時使用的 key
+            client: Code Interpreter 客戶端
+            healthy: session 是否可再使用
+        """
+        with self._lock:
+            entry = self._entries.get(affinity_key) if affinity_key else None
+            if entry is not None and entry["client"] is client:
+                if healthy:
+                    entry["in_use"] = False
+                    entry["last_used"] = time.monotonic()
+                    return
+                del self._entries[affinity_key]
+
+        self._stop(client)
+
+    def shutdown(self) -> None:
+        """停止所有閒置 session"""
+        with self._lock:
+            idle_keys = [key for key, entry in self._entries.items() if not entry["in_use"]]
+            clients = [self._entries.pop(key)["client"] for key in idle_keys]
+        self._stop_all(clients)
+
+    def _register(self, affinity_key: str, client: Any) -> None:
+        """將新 session 加入池（池滿時淘汰最久未使用的閒置 session）"""
+        evicted = []
+        with self._lock:
+            if affinity_key in self._entries:
+                # 同一個 key 的 session 正在使用中，新 session 為一次性
+                return
+
+            while len(self._entries) >= self.max_size:
+                idle_key = next(
+                    (key for key, entry in self._entries.items() if not entry["in_use"]), None
+                )
+                if idle_key is None:
+                    break
+                evicted.append(self._entries.pop(idle_key)["client"])
+
+            if len(self._entries) < self.max_size:
+                now = time.monotonic()
+                self._entries[affinity_key] = {
+                    "client": client,
+                    "created_at": now,
+                    "last_used": now,
+                    "in_use": True,
+                }
+
+        if evicted:
+            logger.info(f"♻️ Code Interpreter 池已滿，停止 {len(evicted)} 個閒置 session")
+        self._stop_all(evicted)
+
+    def _pop_expired(self, now: float) -> list[Any]:
+        """移除閒置過久或存活過久的 session（呼叫端需持有鎖）"""
+        expired_keys = [
+            key
+            for key, entry in self._entries.items()
+            if not entry["in_use"]
+            and (
+                now - entry["last_used"] > self.idle_ttl or now - entry["created_at"] > self.max_age
+            )
+        ]
+        return [self._entries.pop(key)["client"] for key in expired_keys]
+
+    def _is_healthy(self, client: Any) -> bool:
+        """檢查 session 是否仍為 READY"""
+        try:
+            return client.get_session().get("status") == "READY"
+        except Exception as e:
+            logger.warning(f"⚠️ Code Interpreter session 狀態查詢失敗: {e}")
+            return False
+
+    def _stop_all(self, clients: list[Any]) -> None:
+        for client in clients:
+            self._stop(client)
+
+    def _stop(self, client: Any) -> None:
+        """停止 session（失敗只記錄，不拋出）"""
+        session_id = getattr(client, "session_id", None)
+        try:
+            client.stop()
+            logger.info(f"✅ Session 清理完成: {session_id}")
+        except Exception as e:
+            logger.warning(f"⚠️ Session 清理失敗: {session_id} - {str(e)}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> dict[str, Any]:
+        """
+        取得池統計資訊
+
+        Returns:
+            統計資訊字典
+        """
+        with self._lock:
+            in_use = sum(1 for entry in self._entries.values() if entry["in_use"])
+            size = len(self._entries)
+        return {
+            "size": size,
+            "in_use": in_use,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,241 @@
+"""
+檔案分析結果快取
+以 (內容 SHA-256, 任務類型, 副檔名, 程式碼產生器版本) 為 key，
+命中時完全略過 Code Interpreter
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+import boto3
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 結果中代表檔名的佔位符（快取內容與檔名無關，讀取時再填入）
+FILENAME_PLACEHOLDER = "\x00FILENAME\x00"
+
+# 分析程式碼輸出中顯示檔名的標頭行（只替換這些行，內容中出現的相同文字保持不變）
+FILENAME_HEADER_PREFIXES = ("檔案名稱: ", "📊 檔案分析: ", "📈 統計分析: ")
+
+# DynamoDB 單筆項目上限為 400KB，過大的結果只保留在記憶體
+MAX_PERSISTED_RESULT_BYTES = 350_000
+
+# DynamoDB 資源（延遲初始化）
+_dynamodb = None
+
+
+def get_dynamodb_resource():
+    """獲取 DynamoDB 資源單例"""
+    global _dynamodb
+    if _dynamodb is None:
+        _dynamodb = boto3.resource("dynamodb")
+    return _dynamodb
+
+
+def build_cache_key(
+    content_sha256: str, task_type: str, filename: str, codegen_version: str
+) -> str:
+    """
+    建立快取 key
+
+    Args:
+        content_sha256: 檔案內容的 SHA-256（hex）
+        task_type: 正規化後的任務類型（summary / analysis / statistics）
+        filename: 檔案名稱（只取副檔名，分析程式碼依副檔名分流）
+        codegen_version: 程式碼產生器版本
+
+    Returns:
+        快取 key
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    return f"{content_sha256}:{task_type}:{extension}:{codegen_version}"
+
+
+class FileResultCache:
+    """
+    兩層檔案分析結果快取
+
+    - 記憶體 LRU：同一個 Lambda 容器內共用
+    - DynamoDB（可選）：跨容器共用，以 ttl 屬性自動過期
+    """
+
+    def __init__(self, max_size: int = 128, ttl: int = 86400, table_name: str = ""):
+        """
+        初始化快取
+
+        Args:
+            max_size: 記憶體層最多保留的項目數
+            ttl: 快取存活時間（秒）
+            table_name: DynamoDB 表名稱（空字串表示只使用記憶體層）
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.table_name = table_name
+
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._table = None
+
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, key: str, filename: str) -> str | None:
+        """
+        讀取快取結果
+
+        Args:
+            key: 快取 key
+            filename: 目前請求的檔案名稱（填回結果中的檔名）
+
+        Returns:
+            快取的結果文字，未命中時為 None
+        """
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+
+        if entry is not None:
+            self._record("hit", "memory", key)
+            return self._render(entry[0], filename)
+
+        template = self._get_persistent(key, now)
+        if template is not None:
+            self.persistent_hits += 1
+            self._put_memory(key, template, now)
+            self._record("hit", "dynamodb", key)
+            return self._render(template, filename)
+
+        self.misses += 1
+        self._record("miss", None, key)
+        return None
+
+    def put(self, key: str, result: str, filename: str) -> None:
+        """
+        寫入快取結果
+
+        Args:
+            key: 快取 key
+            result: 結果文字
+            filename: 產生結果時使用的檔案名稱
+        """
+        now = time.time()
+        template = self._to_template(result, filename) if filename else result
+
+        self._put_memory(key, template, now)
+        self._put_persistent(key, template, now)
+
+    def clear(self) -> None:
+        """清空記憶體層（測試用）"""
+        with self._lock:
+            self._entries.clear()
+
+    def _put_memory(self, key: str, template: str, now: float) -> None:
+        with self._lock:
+            self._entries[key] = (template, now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _get_table(self):
+        if self._table is None:
+            self._table = get_dynamodb_resource().Table(self.table_name)
+        return self._table
+
+    def _get_persistent(self, key: str, now: float) -> str | None:
+        """從 DynamoDB 讀取（失敗視為未命中）"""
+        if not self.table_name:
+            return None
+
+        try:
+            item = self._get_table().get_item(Key={"cache_key": key}).get("Item")
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"⚠️ 檔案結果快取讀取失敗: {e}")
+            return None
+
+        # DynamoDB TTL 刪除有延遲，需自行檢查是否過期
+        if not item or int(item.get("ttl", 0)) <= now:
+            return None
+        return item.get("result")
+
+    def _put_persistent(self, key: str, template: str, now: float) -> None:
+        """寫入 DynamoDB（失敗只記錄，不影響回應）"""
+        if not self.table_name:
+            return
+        if len(template.encode("utf-8")) > MAX_PERSISTED_RESULT_BYTES:
+            logger.info(f"檔案結果過大，只快取在記憶體: {key}")
+            return
+
+        try:
+            self._get_table().put_item(
+                Item={
+                    "cache_key": key,
+                    "result": template,
+                    "created_at": int(now),
+                    "ttl": int(now) + self.ttl,
+                }
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"⚠️ 檔案結果快取寫入失敗: {e}")
+
+    @staticmethod
+    def _to_template(result: str, filename: str) -> str:
+        """將標頭行的檔名換成佔位符"""
+        lines = result.split("\n")
+        for index, line in enumerate(lines):
+            for prefix in FILENAME_HEADER_PREFIXES:
+                if line == prefix + filename:
+                    lines[index] = prefix + FILENAME_PLACEHOLDER
+        return "\n".join(lines)
+
+    @staticmethod
+    def _render(template: str, filename: str) -> str:
+        return template.replace(FILENAME_PLACEHOLDER, filename)
+
+    @staticmethod
+    def _record(outcome: str, tier: str | None, key: str) -> None:
+        """記錄命中 / 未命中（結構化日誌，供 CloudWatch Logs Insights 統計）"""
+        logger.info(
+            f"📦 檔案結果快取 {outcome}" + (f" ({tier})" if tier else ""),
+            extra={
+                "event_type": "file_result_cache",
+                "outcome": outcome,
+                "tier": tier,
+                "cache_key": key,
+            },
+        )
+
+    def get_stats(self) -> dict[str, Any]:
+        """
+        取得快取統計
+
+        Returns:
+            統計資訊字典
+        """
+        lookups = self.memory_hits + self.persistent_hits + self.misses
+        hits = self.memory_hits + self.persistent_hits
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "persistent": bool(self.table_name),
+        }
@@ -3,27 +3,28 @@
 使用 AgentCore Code Interpreter 處理檔案
 """
 
-import base64
+import os
+import re
 from typing import Any
 
-import boto3
-
 from config.settings import settings
+from services import local_analyzers, s3_reader
+from services.code_interpreter_pool import CodeInterpreterPool
+from services.file_result_cache import FileResultCache, build_cache_key
 from utils.audit import audit_log
+from utils.file_types import BINARY_FILE_TYPE, SNIFF_BYTES, detect_file_type
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
-# S3 客戶端（延遲初始化）
-_s3_client = None
+# 批次執行時分隔每個檔案輸出的標記
+BATCH_RESULT_MARKER = "<<<FILE_RESULT_"
 
+# 程式碼產生器版本（修改 _generate_*_code 的輸出時需遞增，使舊的快取結果失效）
+CODEGEN_VERSION = "2"
 
-def get_s3_client():
-    """獲取 S3 客戶端單例"""
-    global _s3_client
-    if _s3_client is None:
-        _s3_client = boto3.client("s3")
-    return _s3_client
+# 批次執行中單一檔案失敗時的輸出前綴（該檔案的輸出中出現時不寫入快取）
+BATCH_FAILURE_PREFIX = "❌ 處理失敗: "
 
 
 class FileService:
@@ -39,7 +40,16 @@ class FileService:
         self.region = region
         self.enabled = settings.FILE_ENABLED
         self.bucket = settings.FILE_STORAGE_BUCKET
-        self.client = None
+        self.pool: CodeInterpreterPool | None = None
+        self.result_cache = (
+            FileResultCache(
+                max_size=settings.FILE_RESULT_CACHE_SIZE,
+                ttl=settings.FILE_RESULT_CACHE_TTL,
+                table_name=settings.FILE_RESULT_CACHE_TABLE,
+            )
+            if settings.FILE_RESULT_CACHE_ENABLED
+            else None
+        )
 
         if self.enabled:
             self._initialize_client()
@@ -52,6 +62,12 @@ class FileService:
             from bedrock_agentcore.tools.code_interpreter_client import CodeInterpreter
 
             self.CodeInterpreter = CodeInterpreter
+            self.pool = CodeInterpreterPool(
+                factory=lambda: self.CodeInterpreter(self.region),
+                max_size=settings.FILE_SESSION_POOL_SIZE,
+                idle_ttl=settings.FILE_SESSION_IDLE_TTL,
+                session_timeout=settings.FILE_SESSION_TIMEOUT,
+            )
             logger.info("✅ File Service 初始化成功")
 
         except ImportError as e:
@@ -62,41 +78,38 @@ class FileService:
         """檢查服務是否可用"""
         return self.enabled and self.bucket != ""
 
-    def read_from_s3(self, s3_url: str) -> bytes | None:
+    def read_from_s3(self, s3_url: str, max_bytes: int | None = None) -> bytes | None:
         """
-        從 S3 讀取檔案
+        從 S3 讀取完整檔案
 
         Args:
             s3_url: S3 URL (格式: s3://bucket/key)
+            max_bytes: 大小上限（超過時不下載內容，回傳 None）
 
         Returns:
             檔案內容（bytes）或 None
         """
-        try:
-            # 解析 S3 URL
-            if not s3_url.startswith("s3://"):
-                logger.error(f"Invalid S3 URL: {s3_url}")
-                return None
+        response = s3_reader.get_object(s3_url)
+        if response is None:
+            return None
 
-            # 移除 s3:// 前綴
-            url_parts = s3_url[5:].split("/", 1)
-            if len(url_parts) != 2:
-                logger.error(f"Invalid S3 URL format: {s3_url}")
+        body = response["Body"]
+        try:
+            size = response.get("ContentLength", 0)
+            if max_bytes is not None and size > max_bytes:
+                logger.warning(
+                    f"⚠️ S3 object too large: {size} bytes (limit {max_bytes})",
+                    extra={"event_type": "s3_read_too_large", "s3_url": s3_url, "size": size},
+                )
                 return None
 
-            bucket, key = url_parts
-
-            # 從 S3 讀取
-            s3_client = get_s3_client()
-            response = s3_client.get_object(Bucket=bucket, Key=key)
-            file_content = response["Body"].read()
+            file_content = body.read()
 
             logger.info(
                 f"✅ Read from S3: {len(file_content)} bytes",
                 extra={
                     "event_type": "s3_read_success",
-                    "bucket": bucket,
-                    "key": key,
+                    "s3_url": s3_url,
                     "size": len(file_content),
                 },
             )
@@ -110,8 +123,29 @@ class FileService:
                 exc_info=True,
             )
             return None
+        finally:
+            body.close()
 
-    def process_file(self, s3_url: str, filename: str, task: str, user_id: str) -> dict[str, Any]:
+    def open_object(self, s3_url: str) -> s3_reader.S3Object | None:
+        """
+        開啟 S3 檔案供串流讀取（大型檔案落地 /tmp 並以 mmap 存取）
+
+        Args:
+            s3_url: S3 URL (格式: s3://bucket/key)
+
+        Returns:
+            S3Object（使用完需 close）或 None
+        """
+        return s3_reader.open_object(s3_url, settings.FILE_SPILL_THRESHOLD_BYTES)
+
+    def process_file(
+        self,
+        s3_url: str,
+        filename: str,
+        task: str,
+        user_id: str,
+        affinity_key: str | None = None,
+    ) -> dict[str, Any]:
         """
         處理檔案
 
@@ -120,136 +154,348 @@ class FileService:
             filename: 檔案名稱
             task: 處理任務描述
             user_id: 用戶 ID（用於審計）
+            affinity_key: Session 綁定的 key（同一對話共用 session，None 表示一次性）
 
         Returns:
             處理結果字典
         """
+        files = [{"s3_url": s3_url, "filename": filename, "task": task}]
+        return self.process_files(files, user_id, affinity_key=affinity_key)[0]
+
+    def process_files(
+        self, files: list[dict[str, str]], user_id: str, affinity_key: str | None = None
+    ) -> list[dict[str, Any]]:
+        """
+        批次處理多個檔案：同一個 session 寫入所有檔案，並以一次執行完成所有分析
+
+        Args:
+            files: 檔案列表，格式 [{"s3_url": ..., "filename": ..., "task": ...}, ...]
+            user_id: 用戶 ID（用於審計）
+            affinity_key: Session 綁定的 key（同一對話共用 session，None 表示一次性）
+
+        Returns:
+            與 files 順序相同的處理結果字典列表
+        """
         if not self.is_available():
-            return {"success": False, "error": "檔案處理功能未啟用或未配置 S3 bucket"}
+            return [
+                {"success": False, "error": "檔案處理功能未啟用或未配置 S3 bucket"} for _ in files
+            ]
 
-        session_id = None
+        results: list[dict[str, Any] | None] = [None] * len(files)
+        prepared = []  # (index, session 內路徑, writeFiles 項目, 檔案類型, 快取 key)
+        used_paths: set[str] = set()
+
+        for index, file_info in enumerate(files):
+            filename = file_info["filename"]
 
-        try:
             # 審計：記錄檔案處理開始
             audit_log(
                 user_id=user_id,
                 action="FILE_PROCESS_START",
                 resource=filename,
-                details={"task": task, "s3_url": s3_url},
+                details={"task": file_info["task"], "s3_url": file_info["s3_url"]},
             )
 
-            # 1. 從 S3 讀取檔案
-            file_content = self.read_from_s3(s3_url)
-            if not file_content:
-                return {"success": False, "error": "無法從 S3 讀取檔案"}
+            # 從 S3 開啟檔案（大型檔案落地 /tmp，不整份載入記憶體）
+            s3_object = self.open_object(file_info["s3_url"])
+            if s3_object is None:
+                results[index] = {"success": False, "error": "無法從 S3 讀取檔案"}
+                continue
+
+            with s3_object:
+                # 以 magic bytes 判斷檔案類型（文字檔需整份可解碼為 UTF-8）
+                file_type = detect_file_type(s3_object.head(SNIFF_BYTES), filename)
+                is_text = file_type["kind"] == "text" and s3_object.is_utf8()
+                if file_type["kind"] == "text" and not is_text:
+                    file_type = dict(BINARY_FILE_TYPE)
+                logger.info(
+                    f"📁 檔案類型: {filename} → {file_type['description']} ({file_type['mime']})"
+                )
+
+                # 支援的文字檔在本地直接分析，不需要 Code Interpreter
+                task_type = self._normalize_task(file_info["task"])
+                local_result = None
+                if is_text:
+                    local_result = self._analyze_locally(s3_object, filename, task_type)
+                if local_result is not None:
+                    results[index] = {
+                        "success": True,
+                        "result": local_result,
+                        "filename": filename,
+                        "local": True,
+                    }
+                    audit_log(
+                        user_id=user_id,
+                        action="FILE_PROCESS_SUCCESS",
+                        resource=filename,
+                        details={
+                            "task": file_info["task"],
+                            "result_length": len(local_result),
+                            "local": True,
+                        },
+                    )
+                    continue
+
+                # 相同內容與任務已分析過時直接使用快取結果
+                cache_key = None
+                if self.result_cache is not None:
+                    cache_key = build_cache_key(
+                        s3_object.sha256(), task_type, filename, CODEGEN_VERSION
+                    )
+                    cached = self.result_cache.get(cache_key, filename)
+                    if cached is not None:
+                        results[index] = {
+                            "success": True,
+                            "result": cached,
+                            "filename": filename,
+                            "cached": True,
+                        }
+                        audit_log(
+                            user_id=user_id,
+                            action="FILE_PROCESS_SUCCESS",
+                            resource=filename,
+                            details={
+                                "task": file_info["task"],
+                                "result_length": len(cached),
+                                "cached": True,
+                            },
+                        )
+                        continue
+
+                logger.info(f"📁 開始處理檔案: {filename} ({s3_object.size} bytes)")
+
+                # 同一批次中檔名重複時加上序號，避免互相覆蓋
+                path = filename if filename not in used_paths else f"{index}_{filename}"
+                used_paths.add(path)
+                prepared.append(
+                    (
+                        index,
+                        path,
+                        self._file_entry(path, s3_object, is_text),
+                        file_type,
+                        cache_key,
+                    )
+                )
+
+        if not prepared:
+            return results
 
-            logger.info(f"📁 開始處理檔案: {filename} ({len(file_content)} bytes)")
+        try:
+            with self.pool.session(affinity_key) as client:
+                # 一次上傳所有檔案（文字檔以 text、其他以 blob 傳送原始 bytes）
+                client.invoke("writeFiles", {"content": [entry for _, _, entry, _, _ in prepared]})
+                logger.info(f"✅ {len(prepared)} 個檔案已上傳到 session")
+
+                # 根據任務類型處理檔案（多個檔案合併為一次執行）
+                tasks = [
+                    (path, files[index]["task"], file_type)
+                    for index, path, _, file_type, _ in prepared
+                ]
+                # 每個檔案的結果為 (輸出, 是否成功)
+                if len(tasks) == 1:
+                    outputs = [self._execute_task(client, *tasks[0])]
+                else:
+                    outputs = self._execute_batch(client, tasks)
+
+            for (index, path, _, _, cache_key), (output, succeeded) in zip(
+                prepared, outputs, strict=True
+            ):
+                filename = files[index]["filename"]
+                results[index] = {"success": True, "result": output, "filename": filename}
+
+                # 執行錯誤（含部分輸出後才失敗）的結果不快取，下次重新分析
+                if cache_key and succeeded:
+                    self.result_cache.put(cache_key, output, path)
+                elif not succeeded:
+                    logger.warning(f"⚠️ 檔案分析執行失敗，結果不快取: {filename}")
+
+                # 審計：記錄處理成功
+                audit_log(
+                    user_id=user_id,
+                    action="FILE_PROCESS_SUCCESS",
+                    resource=filename,
+                    details={"task": files[index]["task"], "result_length": len(str(output))},
+                )
 
-            # 2. 啟動 Code Interpreter session
-            client = self.CodeInterpreter(self.region)
-            client.start()
-            session_id = client.session_id
-            logger.info(f"✅ Code Interpreter session 已啟動: {session_id}")
+        except Exception as e:
+            logger.error(f"❌ 檔案處理錯誤: {str(e)}", exc_info=True)
 
-            # 3. 上傳檔案到 session
-            file_text = self._prepare_file_content(file_content, filename)
+            for index, *_ in prepared:
+                # 審計：記錄處理失敗
+                audit_log(
+                    user_id=user_id,
+                    action="FILE_PROCESS_FAILURE",
+                    resource=files[index]["filename"],
+                    details={"task": files[index]["task"], "error": str(e)},
+                )
+                results[index] = {"success": False, "error": f"處理失敗: {str(e)}"}
+
+        return results
+
+    def _analyze_locally(
+        self, s3_object: s3_reader.S3Object, filename: str, task_type: str
+    ) -> str | None:
+        """
+        在本地分析檔案（僅限支援的文字類型且未超過大小上限）
 
-            client.invoke("writeFiles", {"content": [{"path": filename, "text": file_text}]})
+        Args:
+            s3_object: 已開啟的 S3 檔案
+            filename: 檔案名稱
+            task_type: 任務類型
 
-            logger.info(f"✅ 檔案已上傳到 session: {filename}")
+        Returns:
+            分析結果文字，不適用本地分析時為 None
+        """
+        if not settings.FILE_LOCAL_ANALYSIS_ENABLED:
+            return None
+        if not local_analyzers.supports(
+            filename, s3_object.size, settings.FILE_LOCAL_ANALYSIS_MAX_BYTES
+        ):
+            return None
 
-            # 4. 根據任務類型處理檔案
-            result = self._execute_task(client, filename, task)
+        with s3_object.open() as stream:
+            result = local_analyzers.analyze(stream, filename, s3_object.size, task_type)
+        if result is not None:
+            logger.info(f"⚡ 本地分析完成: {filename} ({task_type})")
+        return result
 
-            # 5. 停止 session
-            client.stop()
-            session_id = None
-            logger.info("✅ Session 已清理")
+    @staticmethod
+    def _file_entry(path: str, s3_object: s3_reader.S3Object, is_text: bool) -> dict[str, Any]:
+        """
+        建立 writeFiles 的檔案項目
 
-            # 審計：記錄處理成功
-            audit_log(
-                user_id=user_id,
-                action="FILE_PROCESS_SUCCESS",
-                resource=filename,
-                details={"task": task, "result_length": len(str(result))},
-            )
+        Args:
+            path: Session 內的檔案路徑
+            s3_object: 已開啟的 S3 檔案
+            is_text: 是否為 UTF-8 文字檔
 
-            return {"success": True, "result": result, "filename": filename}
+        Returns:
+            文字檔為 {"path", "text"}，其他檔案為 {"path", "blob"}（原始 bytes）
+        """
+        if is_text:
+            return {"path": path, "text": s3_object.read_text()}
+        return {"path": path, "blob": s3_object.read_bytes()}
 
-        except Exception as e:
-            logger.error(f"❌ 檔案處理錯誤: {str(e)}", exc_info=True)
+    def _execute_task(
+        self, client, filename: str, task: str, file_type: dict[str, str] | None = None
+    ) -> tuple[str, bool]:
+        """
+        執行處理任務
 
-            # 審計：記錄處理失敗
-            audit_log(
-                user_id=user_id,
-                action="FILE_PROCESS_FAILURE",
-                resource=filename,
-                details={"task": task, "error": str(e)},
-            )
+        Args:
+            client: Code Interpreter 客戶端
+            filename: 檔案名稱
+            task: 任務描述
+            file_type: 檔案類型（None 表示文字檔）
+
+        Returns:
+            (處理結果文字, 是否執行成功)
+        """
+        code = self._generate_task_code(filename, task, file_type)
 
-            return {"success": False, "error": f"處理失敗: {str(e)}"}
+        logger.info(f"執行任務: {task}")
 
-        finally:
-            # 確保 session 被清理
-            if session_id and self.client:
-                try:
-                    self.client.stop()
-                    logger.info(f"✅ Session 清理完成: {session_id}")
-                except Exception as e:
-                    logger.warning(f"⚠️ Session 清理失敗: {str(e)}")
-
-    def _prepare_file_content(self, content: bytes, filename: str) -> str:
+        # 執行程式碼
+        response = client.invoke(
+            "executeCode", {"code": code, "language": "python", "clearContext": False}
+        )
+
+        # 提取結果
+        return self._extract_result(response)
+
+    def _execute_batch(
+        self, client, tasks: list[tuple[str, str, dict[str, str] | None]]
+    ) -> list[tuple[str, bool]]:
         """
-        準備檔案內容（轉換為文字）
+        以一次 executeCode 執行多個檔案的處理任務
 
         Args:
-            content: 檔案內容（bytes）
-            filename: 檔案名稱
+            client: Code Interpreter 客戶端
+            tasks: [(檔案名稱, 任務描述, 檔案類型), ...]
 
         Returns:
-            文字格式的檔案內容
+            與 tasks 順序相同的 (處理結果文字, 是否執行成功) 列表
         """
-        # 嘗試解碼為 UTF-8
-        try:
-            return content.decode("utf-8")
-        except UnicodeDecodeError:
-            # 如果是二進位檔案，使用 base64 編碼
-            logger.info(f"檔案 {filename} 為二進位格式，使用 base64 編碼")
-            return base64.b64encode(content).decode("ascii")
+        snippets = [self._generate_task_code(*task) for task in tasks]
+        code = f"""
+__snippets = {snippets!r}
+for __index, __code in enumerate(__snippets):
+    print(f"{BATCH_RESULT_MARKER}{{__index}}>>>")
+    try:
+        exec(__code, {{}})
+    except Exception as __error:
+        print(f"{BATCH_FAILURE_PREFIX}{{__error}}")
+"""
+
+        logger.info(f"執行批次任務: {len(tasks)} 個檔案")
+
+        response = client.invoke(
+            "executeCode", {"code": code, "language": "python", "clearContext": False}
+        )
 
-    def _execute_task(self, client, filename: str, task: str) -> str:
+        # 依標記切分每個檔案的輸出
+        output, succeeded = self._extract_result(response)
+        parts = {
+            int(index): text.strip()
+            for index, text in re.findall(
+                rf"{re.escape(BATCH_RESULT_MARKER)}(\d+)>>>\n?(.*?)(?={re.escape(BATCH_RESULT_MARKER)}|\Z)",
+                output,
+                flags=re.DOTALL,
+            )
+        }
+        # 程式碼可能先輸出部分結果才失敗，失敗標記出現在該檔案輸出的任何位置
+        return [
+            (
+                parts.get(i) or "處理完成，但無輸出內容",
+                succeeded and i in parts and BATCH_FAILURE_PREFIX not in parts[i],
+            )
+            for i in range(len(tasks))
+        ]
+
+    @staticmethod
+    def _normalize_task(task: str) -> str:
         """
-        執行處理任務
+        將任務描述正規化為任務類型
 
         Args:
-            client: Code Interpreter 客戶端
-            filename: 檔案名稱
             task: 任務描述
 
         Returns:
-            處理結果文字
+            任務類型（summary / analysis / statistics）
         """
-        # 根據任務類型生成不同的處理程式碼
         if "摘要" in task or "summary" in task.lower():
-            code = self._generate_summary_code(filename)
+            return "summary"
         elif "分析" in task or "analyze" in task.lower():
-            code = self._generate_analysis_code(filename)
+            return "analysis"
         elif "統計" in task or "statistics" in task.lower():
-            code = self._generate_statistics_code(filename)
+            return "statistics"
         else:
             # 預設：摘要
-            code = self._generate_summary_code(filename)
+            return "summary"
 
-        logger.info(f"執行任務: {task}")
+    def _generate_task_code(
+        self, filename: str, task: str, file_type: dict[str, str] | None = None
+    ) -> str:
+        """
+        根據任務類型生成處理程式碼
 
-        # 執行程式碼
-        response = client.invoke(
-            "executeCode", {"code": code, "language": "python", "clearContext": False}
-        )
+        Args:
+            filename: 檔案名稱
+            task: 任務描述
+            file_type: 檔案類型（None 表示文字檔）
 
-        # 提取結果
-        result = self._extract_result(response)
-        return result
+        Returns:
+            Python 程式碼
+        """
+        if file_type is not None and file_type["kind"] != "text":
+            return self._generate_binary_code(filename, file_type, self._normalize_task(task))
+
+        generators = {
+            "summary": self._generate_summary_code,
+            "analysis": self._generate_analysis_code,
+            "statistics": self._generate_statistics_code,
+        }
+        return generators[self._normalize_task(task)](filename)
 
     def _generate_summary_code(self, filename: str) -> str:
         """生成摘要程式碼"""
@@ -409,7 +655,87 @@ else:
         print(f"平均每行字數: {{len(words) / len(lines) if lines else 0:.1f}}")
 """
 
-    def _extract_result(self, response: Any) -> str:
+    def _generate_binary_code(
+        self, filename: str, file_type: dict[str, str], task_type: str
+    ) -> str:
+        """生成非文字檔的處理程式碼（依 magic bytes 判斷的類型讀取）"""
+        code = f"""
+import os
+
+path = {filename!r}
+print("📦 檔案資訊")
+print(f"檔案名稱: {{path}}")
+print("檔案類型: {file_type["description"]} ({file_type["mime"]})")
+print(f"檔案大小: {{os.path.getsize(path)}} bytes")
+print()
+"""
+
+        if file_type["kind"] == "image":
+            code += """
+try:
+    from PIL import Image
+    with Image.open(path) as img:
+        print(f"圖片尺寸: {img.width} x {img.height}")
+        print(f"色彩模式: {img.mode}")
+except Exception as e:
+    print(f"⚠️ 無法讀取圖片資訊: {e}")
+"""
+        elif file_type["mime"] == "application/pdf":
+            code += """
+try:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        from PyPDF2 import PdfReader
+    reader = PdfReader(path)
+    print(f"頁數: {len(reader.pages)}")
+    text = (reader.pages[0].extract_text() or "").strip() if reader.pages else ""
+    if text:
+        print("\\n第一頁內容預覽（前 500 字元）:")
+        print(text[:500])
+except Exception as e:
+    print(f"⚠️ 無法讀取 PDF 內容: {e}")
+"""
+        elif os.path.splitext(filename)[1].lower() in (".xls", ".xlsx"):
+            detail = {
+                "summary": "",
+                "analysis": "        print(df.head(5).to_string())",
+                "statistics": "        print(df.count().to_string())",
+            }[task_type]
+            code += f"""
+try:
+    import pandas as pd
+    sheets = pd.read_excel(path, sheet_name=None)
+    print(f"工作表數: {{len(sheets)}}")
+    for name, df in sheets.items():
+        print(f"\\n工作表 {{name}}: {{len(df)}} 列 x {{len(df.columns)}} 欄")
+        print(f"欄位: {{', '.join(map(str, df.columns))}}")
+{detail}
+except Exception as e:
+    print(f"⚠️ 無法讀取試算表: {{e}}")
+"""
+        elif file_type["mime"] == "application/zip" or file_type["mime"].startswith(
+            "application/vnd.openxmlformats"
+        ):
+            code += """
+import zipfile
+with zipfile.ZipFile(path) as zf:
+    names = zf.namelist()
+    print(f"壓縮檔內檔案數: {len(names)}")
+    for name in names[:20]:
+        print(f"  - {name}")
+    if len(names) > 20:
+        print(f"  ... (省略 {len(names) - 20} 個檔案)")
+"""
+        else:
+            code += """
+with open(path, "rb") as f:
+    head = f.read(32)
+print(f"檔案開頭: {head.hex(' ')}")
+"""
+        return code
+
+    def _extract_result(self, response: Any) -> tuple[str, bool]:
         """
         從響應中提取結果
 
@@ -417,9 +743,10 @@ else:
             response: Code Interpreter 響應
 
         Returns:
-            結果文字
+            (結果文字, 是否執行成功)；執行錯誤（isError）或提取失敗時為 False
         """
         result_text = ""
+        succeeded = True
 
         try:
             # 處理 streaming response
@@ -429,8 +756,16 @@ else:
 
                     # 處理不同的結果格式
                     if isinstance(event_result, dict):
+                        if event_result.get("isError"):
+                            succeeded = False
                         # 提取文字輸出
-                        if "output" in event_result:
+                        if isinstance(event_result.get("content"), list):
+                            result_text += "".join(
+                                str(item.get("text", ""))
+                                for item in event_result["content"]
+                                if isinstance(item, dict)
+                            )
+                        elif "output" in event_result:
                             result_text += str(event_result["output"])
                         elif "text" in event_result:
                             result_text += str(event_result["text"])
@@ -445,11 +780,11 @@ else:
             if not result_text:
                 result_text = "處理完成，但無輸出內容"
 
-            return result_text
+            return result_text, succeeded
 
         except Exception as e:
             logger.error(f"結果提取異常: {str(e)}", exc_info=True)
-            return f"結果提取時發生問題: {str(e)}"
+            return f"結果提取時發生問題: {str(e)}", False
 
     def get_status(self) -> dict[str, Any]:
         """
@@ -463,6 +798,8 @@ else:
             "bucket": self.bucket if self.enabled else None,
             "region": self.region,
             "available": self.is_available(),
+            "session_pool": self.pool.get_stats() if self.pool else None,
+            "result_cache": self.result_cache.get_stats() if self.result_cache else None,
         }
 
 
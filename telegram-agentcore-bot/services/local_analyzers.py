@@ -0,0 +1,285 @@
+"""
+本地檔案分析器
+在 Lambda 內以單次串流讀取完成摘要、分析與統計，輸出格式與 Code Interpreter 產生的程式碼相同
+"""
+
+import csv
+import io
+import json
+import os
+from collections.abc import Callable
+from itertools import islice
+from typing import BinaryIO
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 可在本地分析的副檔名（其他類型交給 Code Interpreter）
+LOCAL_TEXT_EXTENSIONS = {".txt", ".log", ".md", ".csv", ".tsv", ".json"}
+
+# CSV 統計時每次處理的列數
+CSV_CHUNK_ROWS = 4096
+
+
+class UnsupportedContentError(Exception):
+    """內容超出本地分析器可保證相同輸出的範圍"""
+
+
+def supports(filename: str, size: int, max_bytes: int) -> bool:
+    """
+    檢查檔案是否可在本地分析
+
+    Args:
+        filename: 檔案名稱
+        size: 檔案大小（bytes）
+        max_bytes: 本地分析的大小上限
+
+    Returns:
+        bool: True 如果副檔名支援且未超過大小上限
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    return extension in LOCAL_TEXT_EXTENSIONS and size <= max_bytes
+
+
+def analyze(stream: BinaryIO, filename: str, size: int, task_type: str) -> str | None:
+    """
+    在本地執行分析任務
+
+    Args:
+        stream: 檔案內容（二進位串流）
+        filename: 檔案名稱（顯示用，副檔名決定分析方式）
+        size: 檔案大小（bytes）
+        task_type: 任務類型（summary / analysis / statistics）
+
+    Returns:
+        分析結果文字；內容不是 UTF-8 或無法保證相同輸出時回傳 None
+    """
+    analyzers: dict[str, Callable[[io.TextIOWrapper, str, int], list[str]]] = {
+        "summary": _summary,
+        "analysis": _analysis,
+        "statistics": _statistics,
+    }
+
+    # 與 Code Interpreter 中 open(..., 'r', encoding='utf-8') 相同的換行處理
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline=None)
+    try:
+        output = analyzers[task_type](text, filename, size)
+    except (UnicodeDecodeError, ValueError, csv.Error, UnsupportedContentError) as e:
+        logger.info(f"本地分析不適用，改用 Code Interpreter: {filename} ({type(e).__name__})")
+        return None
+    finally:
+        text.detach()
+
+    return "\n".join(output).strip() or "處理完成，但無輸出內容"
+
+
+def _extension(filename: str) -> str:
+    return os.path.splitext(filename)[1].lower()
+
+
+def _scan_lines(text: io.TextIOWrapper, keep_lines: int = 0, keep_chars: int = 0) -> dict:
+    """
+    單次掃描文字，統計行數、字元數與字數，並保留開頭內容
+
+    行數與 content.split('\\n') 的結果相同（結尾換行會多出一個空行）
+    """
+    newlines = chars = words = 0
+    head_lines: list[str] = []
+    head_chars: list[str] = []
+    head_length = 0
+    ends_with_newline = True
+
+    for line in text:
+        chars += len(line)
+        words += len(line.split())
+        ends_with_newline = line.endswith("\n")
+        if ends_with_newline:
+            newlines += 1
+        if len(head_lines) < keep_lines:
+            head_lines.append(line.rstrip("\n") if ends_with_newline else line)
+        if head_length < keep_chars:
+            head_chars.append(line[: keep_chars - head_length])
+            head_length += len(head_chars[-1])
+
+    # 與 split('\\n') 一致：最後以換行結尾（或內容為空）時，最後一行為空字串
+    if ends_with_newline and len(head_lines) < keep_lines:
+        head_lines.append("")
+
+    return {
+        "lines": newlines + 1,
+        "chars": chars,
+        "words": words,
+        "head_lines": head_lines,
+        "head": "".join(head_chars),
+    }
+
+
+def _summary(text: io.TextIOWrapper, filename: str, size: int) -> list[str]:
+    scan = _scan_lines(text, keep_lines=15)
+
+    output = [
+        "📄 檔案摘要",
+        f"檔案名稱: {filename}",
+        f"總行數: {scan['lines']}",
+        f"總字元數: {scan['chars']}",
+        f"檔案大小: {size} bytes",
+        "",
+        "📝 前 15 行內容:",
+    ]
+    for i, line in enumerate(scan["head_lines"], 1):
+        # 限制每行最多顯示 100 字元
+        display_line = line[:100] + "..." if len(line) > 100 else line
+        output.append(f"{i:2d}. {display_line}")
+
+    if scan["lines"] > 15:
+        output.append(f"\n... (省略 {scan['lines'] - 15} 行)")
+    return output
+
+
+def _analysis(text: io.TextIOWrapper, filename: str, size: int) -> list[str]:
+    file_ext = _extension(filename)
+    output = [f"📊 檔案分析: {filename}", f"檔案類型: {file_ext}", ""]
+
+    if file_ext == ".csv":
+        reader = csv.DictReader(text)
+        first_rows = list(islice(reader, 5))
+        total = len(first_rows) + sum(1 for _ in reader)
+
+        output += ["✅ CSV 檔案分析", f"總行數: {total}"]
+        if first_rows:
+            output.append("\n欄位清單:")
+            for i, col in enumerate(first_rows[0].keys(), 1):
+                output.append(f"  {i}. {col}")
+
+            output.append("\n前 5 筆資料:")
+            for i, row in enumerate(first_rows, 1):
+                output.append(f"\n第 {i} 筆:")
+                for key, value in row.items():
+                    display_value = str(value)[:50] + "..." if len(str(value)) > 50 else value
+                    output.append(f"  - {key}: {display_value}")
+
+            if total > 5:
+                output.append(f"\n... (省略 {total - 5} 筆資料)")
+
+    elif file_ext == ".json":
+        data = json.loads(text.read())
+
+        output += ["✅ JSON 檔案分析", f"資料類型: {type(data).__name__}"]
+        if isinstance(data, list):
+            output.append(f"元素數量: {len(data)}")
+            if data:
+                output.append("\n第一個元素:")
+                output.append(json.dumps(data[0], indent=2, ensure_ascii=False)[:500])
+
+        elif isinstance(data, dict):
+            output.append("\n主要鍵值:")
+            for i, (key, value) in enumerate(islice(data.items(), 10), 1):
+                value_str = str(value)[:50] + "..." if len(str(value)) > 50 else str(value)
+                output.append(f"  {i}. {key}: {value_str}")
+
+            if len(data) > 10:
+                output.append(f"\n... (省略 {len(data) - 10} 個鍵)")
+
+    else:
+        # 一般文字檔
+        scan = _scan_lines(text, keep_chars=500)
+
+        output += [
+            "✅ 文字檔分析",
+            f"總行數: {scan['lines']}",
+            f"總字元數: {scan['chars']}",
+            "\n內容預覽（前 500 字元）:",
+            scan["head"],
+        ]
+        if scan["chars"] > 500:
+            output.append(f"\n... (剩餘 {scan['chars'] - 500} 字元)")
+
+    return output
+
+
+def _csv_column_counts(text: io.TextIOWrapper) -> tuple[list[str], list[int], int] | None:
+    """
+    分塊統計 CSV 每個欄位的非空值數量
+
+    以 csv.reader 讀取，每塊轉置為欄位後逐欄計算（與 DictReader 的結果相同）
+
+    Returns:
+        (欄位名稱, 各欄位非空值數量, 資料筆數)，沒有資料時回傳 None
+    """
+    reader = csv.reader(text)
+    fieldnames = next(reader, None)
+    if not fieldnames:
+        # 空標題列時 DictReader 的欄位為 None，交給 Code Interpreter
+        if fieldnames == []:
+            raise UnsupportedContentError("empty header row")
+        return None
+
+    # 重複欄位名稱時 DictReader 保留最後出現的值
+    columns = {name: index for index, name in enumerate(fieldnames)}
+    width = len(fieldnames)
+    counts = [0] * width
+    total = 0
+
+    rows = (row for row in reader if row)  # DictReader 略過空白列
+    while chunk := list(islice(rows, CSV_CHUNK_ROWS)):
+        if total == 0 and len(chunk[0]) > width:
+            # 第一筆資料欄位過多時 DictReader 會產生 None 欄位
+            raise UnsupportedContentError("extra fields in first row")
+        if min(map(len, chunk)) < width:
+            # 欄位不足的列其值為 None，原本的程式碼無法處理
+            raise UnsupportedContentError("missing fields")
+
+        for index, column in enumerate(islice(zip(*chunk, strict=False), width)):
+            counts[index] += sum(map(bool, map(str.strip, column)))
+        total += len(chunk)
+
+    if total == 0:
+        return None
+    return list(columns), [counts[index] for index in columns.values()], total
+
+
+def _statistics(text: io.TextIOWrapper, filename: str, size: int) -> list[str]:
+    file_ext = _extension(filename)
+    output = [f"📈 統計分析: {filename}", ""]
+
+    if file_ext == ".csv":
+        result = _csv_column_counts(text)
+
+        if result is None:
+            output.append("檔案為空")
+        else:
+            names, counts, total = result
+            output += [
+                "✅ CSV 統計資訊",
+                f"總行數: {total}",
+                f"欄位數: {len(names)}",
+                "\n欄位清單:",
+            ]
+            for name, non_empty in zip(names, counts, strict=True):
+                output.append(f"  - {name}: {non_empty}/{total} 筆有值")
+
+    elif file_ext == ".json":
+        data = json.loads(text.read())
+
+        output.append("✅ JSON 統計資訊")
+        if isinstance(data, list):
+            output.append(f"陣列長度: {len(data)}")
+            if data and isinstance(data[0], dict):
+                output.append(f"物件欄位: {', '.join(data[0].keys())}")
+        elif isinstance(data, dict):
+            output.append(f"物件鍵數量: {len(data.keys())}")
+            output.append(f"主要鍵值: {', '.join(list(data.keys())[:5])}")
+
+    else:
+        scan = _scan_lines(text)
+
+        output += [
+            "✅ 文字統計",
+            f"總字數: {scan['words']}",
+            f"總行數: {scan['lines']}",
+            f"總字元數: {scan['chars']}",
+            f"平均每行字數: {scan['words'] / scan['lines'] if scan['lines'] else 0:.1f}",
+        ]
+
+    return output
@@ -0,0 +1,306 @@
+"""
+Memory 圖片參照
+寫入 AgentCore Memory 時把圖片 bytes 換成精簡的 S3 參照與說明文字，
+載入時還原為說明文字（或重新從 S3 讀取圖片），讓圖片對話也能保留 Memory
+"""
+
+import dataclasses
+import hashlib
+import html
+import re
+import threading
+from collections import OrderedDict
+from typing import Any
+
+from config.settings import settings
+from utils.file_types import image_dimensions
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+IMAGE_REF_TAG = "image_ref"
+
+# 說明文字長度上限（字元）
+CAPTION_MAX_CHARS = 300
+
+_IMAGE_REF_RE = re.compile(
+    rf"^<{IMAGE_REF_TAG}((?:\s+\w+=\"[^\"]*\")*)>(.*)</{IMAGE_REF_TAG}>$", re.DOTALL
+)
+_ATTR_RE = re.compile(r"(\w+)=\"([^\"]*)\"")
+
+
+def image_sha256(image_bytes: bytes) -> str:
+    """
+    計算圖片內容雜湊（參照的 key）
+
+    Args:
+        image_bytes: 圖片內容
+
+    Returns:
+        SHA-256 前 16 碼
+    """
+    return hashlib.sha256(image_bytes).hexdigest()[:16]
+
+
+class ImageReferenceStore:
+    """
+    圖片內容雜湊 → S3 位置 / 說明文字（同一個 Lambda 容器內共用）
+
+    處理附件時登記 S3 位置，回合結束後以模型回覆更新說明文字
+    """
+
+    def __init__(self, max_size: int = 512):
+        """
+        初始化
+
+        Args:
+            max_size: 最多保留的圖片數
+        """
+        self.max_size = max_size
+        self._refs: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(
+        self, image_bytes: bytes, s3_url: str, image_format: str, file_name: str | None = None
+    ) -> str:
+        """
+        登記圖片的 S3 位置
+
+        Args:
+            image_bytes: 圖片內容
+            s3_url: S3 URL
+            image_format: Converse 圖片格式
+            file_name: 檔案名稱
+
+        Returns:
+            圖片雜湊
+        """
+        sha = image_sha256(image_bytes)
+        with self._lock:
+            ref = self._refs.setdefault(sha, {})
+            ref.update({"uri": s3_url, "format": image_format, "name": file_name or ""})
+            dimensions = image_dimensions(image_bytes)
+            if dimensions:
+                ref["size"] = f"{dimensions[0]}x{dimensions[1]}"
+            self._refs.move_to_end(sha)
+            while len(self._refs) > self.max_size:
+                self._refs.popitem(last=False)
+        return sha
+
+    def set_caption(self, image_bytes: bytes, caption: str) -> None:
+        """
+        更新圖片說明文字（通常取自模型對該圖片的回覆）
+
+        Args:
+            image_bytes: 圖片內容
+            caption: 說明文字
+        """
+        caption = " ".join(caption.split())[:CAPTION_MAX_CHARS]
+        if not caption:
+            return
+        with self._lock:
+            ref = self._refs.get(image_sha256(image_bytes))
+            if ref is not None:
+                ref["caption"] = caption
+
+    def get(self, sha: str) -> dict[str, Any] | None:
+        """取得登記資訊"""
+        with self._lock:
+            ref = self._refs.get(sha)
+            return dict(ref) if ref else None
+
+    def clear(self) -> None:
+        """清空（測試用）"""
+        with self._lock:
+            self._refs.clear()
+
+
+# 全域單例
+image_reference_store = ImageReferenceStore()
+
+
+def _describe(ref: dict[str, Any]) -> str:
+    """沒有說明文字時以檔名與尺寸描述圖片"""
+    details = [value for value in (ref.get("name"), ref.get("size")) if value]
+    return f"使用者上傳的圖片（{', '.join(details)}）" if details else "使用者上傳的圖片"
+
+
+def dehydrate_content(content: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """
+    把圖片 bytes 區塊換成 <image_ref> 文字區塊
+
+    使用者自行輸入、格式與 <image_ref> 相同的文字會被跳脫，載入時不會被當成參照
+
+    Args:
+        content: Converse 內容區塊
+
+    Returns:
+        新的內容區塊列表（沒有圖片與需要跳脫的文字時回傳原列表）
+    """
+    if not any(
+        _image_bytes(block) is not None or _parse_image_ref(block) is not None for block in content
+    ):
+        return content
+
+    dehydrated = []
+    for block in content:
+        if _parse_image_ref(block) is not None:
+            dehydrated.append({**block, "text": html.escape(block["text"], quote=False)})
+            continue
+        image_bytes = _image_bytes(block)
+        if image_bytes is None:
+            dehydrated.append(block)
+            continue
+
+        sha = image_sha256(image_bytes)
+        ref = image_reference_store.get(sha) or {}
+        attrs = {
+            "sha256": sha,
+            "format": block["image"].get("format", ref.get("format", "jpeg")),
+            "uri": ref.get("uri", ""),
+        }
+        caption = ref.get("caption") or _describe(ref)
+        rendered = " ".join(
+            f'{key}="{html.escape(value)}"' for key, value in attrs.items() if value
+        )
+        dehydrated.append(
+            {"text": f"<{IMAGE_REF_TAG} {rendered}>{html.escape(caption)}</{IMAGE_REF_TAG}>"}
+        )
+    return dehydrated
+
+
+def rehydrate_content(
+    content: list[dict[str, Any]], mode: str = "caption", max_bytes: int | None = None
+) -> list[dict[str, Any]]:
+    """
+    還原 <image_ref> 文字區塊
+
+    Args:
+        content: 從 Memory 載入的內容區塊
+        mode: "caption" 還原為說明文字；"bytes" 從 S3 讀回圖片（失敗時使用說明文字）
+        max_bytes: 讀回圖片的大小上限
+
+    Returns:
+        新的內容區塊列表
+    """
+    rehydrated = []
+    for block in content:
+        parsed = _parse_image_ref(block)
+        if parsed is None:
+            rehydrated.append(block)
+            continue
+
+        attrs, caption = parsed
+        # 同一容器內可能已有較新的說明文字（模型對這張圖片的回覆）
+        ref = image_reference_store.get(attrs.get("sha256", "")) or {}
+        caption = ref.get("caption") or caption
+
+        # 只讀回本容器登記過或位於附件 bucket 的圖片，且內容雜湊需與參照相同
+        if mode == "bytes" and _is_trusted_reference(attrs, ref):
+            image_bytes = _read_image(attrs["uri"], max_bytes)
+            if image_bytes and image_sha256(image_bytes) != attrs["sha256"]:
+                logger.warning(f"⚠️ 圖片內容與參照不符，改用說明文字: {attrs['uri']}")
+                image_bytes = None
+            if image_bytes:
+                rehydrated.append(
+                    {
+                        "image": {
+                            "format": attrs.get("format", "jpeg"),
+                            "source": {"bytes": image_bytes},
+                        }
+                    }
+                )
+                continue
+
+        rehydrated.append({"text": f"[先前的圖片：{caption}]"})
+    return rehydrated
+
+
+def _image_bytes(block: Any) -> bytes | None:
+    """取得圖片區塊的 bytes（非圖片區塊回傳 None）"""
+    if not isinstance(block, dict) or "image" not in block:
+        return None
+    data = block["image"].get("source", {}).get("bytes")
+    return data if isinstance(data, bytes | bytearray) else None
+
+
+def _parse_image_ref(block: Any) -> tuple[dict[str, str], str] | None:
+    """解析 <image_ref> 文字區塊"""
+    if not isinstance(block, dict) or not isinstance(block.get("text"), str):
+        return None
+    match = _IMAGE_REF_RE.match(block["text"])
+    if not match:
+        return None
+    attrs = {key: html.unescape(value) for key, value in _ATTR_RE.findall(match.group(1))}
+    return attrs, html.unescape(match.group(2))
+
+
+def _is_trusted_reference(attrs: dict[str, str], ref: dict[str, Any]) -> bool:
+    """
+    參照是否可以從 S3 讀回（由 dehydrate_content 寫入，而非使用者輸入的文字）
+
+    Args:
+        attrs: <image_ref> 屬性
+        ref: 本容器登記的資訊（可為空）
+
+    Returns:
+        URI 與本容器登記的相同，或位於附件 bucket 內
+    """
+    uri = attrs.get("uri", "")
+    if not uri or not attrs.get("sha256"):
+        return False
+    if ref.get("uri") == uri:
+        return True
+    bucket = settings.FILE_STORAGE_BUCKET
+    return bool(bucket) and uri.startswith(f"s3://{bucket}/")
+
+
+def _read_image(s3_url: str, max_bytes: int | None) -> bytes | None:
+    """從 S3 讀回圖片"""
+    try:
+        from services.file_service import file_service
+
+        return file_service.read_from_s3(s3_url, max_bytes=max_bytes)
+    except Exception as e:
+        logger.warning(f"⚠️ 無法從 S3 還原圖片，改用說明文字: {e}")
+        return None
+
+
+def build_image_reference_converter(
+    base: type, mode: str = "caption", max_bytes: int | None = None
+) -> type:
+    """
+    建立寫入時移除圖片 bytes、載入時還原參照的 Memory converter
+
+    Args:
+        base: AgentCoreMemoryConverter（延遲匯入，Memory 未安裝時不需要）
+        mode: 載入時的還原方式（見 rehydrate_content）
+        max_bytes: 讀回圖片的大小上限
+
+    Returns:
+        Converter 類別
+    """
+
+    class ImageReferenceConverter(base):
+        @staticmethod
+        def message_to_payload(session_message: Any) -> list[tuple[str, str]]:
+            message = session_message.message
+            content = dehydrate_content(message.get("content", []))
+            if content is not message.get("content"):
+                session_message = dataclasses.replace(
+                    session_message, message={**message, "content": content}
+                )
+            return base.message_to_payload(session_message)
+
+        @staticmethod
+        def events_to_messages(events: list[dict[str, Any]]) -> list[Any]:
+            messages = base.events_to_messages(events)
+            for session_message in messages:
+                message = session_message.message
+                session_message.message = {
+                    **message,
+                    "content": rehydrate_content(message.get("content", []), mode, max_bytes),
+                }
+            return messages
+
+    return ImageReferenceConverter
@@ -0,0 +1,325 @@
+"""
+Memory 檢索快取
+以 (actor_id, namespace, 查詢指紋) 為 key 快取長期記憶的檢索結果，
+支援在建立 Agent 前預先檢索（與附件下載同時進行），並在長期記憶記錄異動時失效
+
+對話事件（create_event）只是抽取長期記憶的原料，記錄由 AgentCore 非同步抽取，
+寫入事件當下檢索結果不會改變，因此不因事件寫入失效，新抽取的記錄由 TTL 帶入
+"""
+
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 等待預先檢索結果的上限（秒），逾時改為直接檢索
+PREFETCH_WAIT_SECONDS = 5.0
+
+# 會異動長期記憶記錄的 bedrock-agentcore API，呼叫後使該 actor 的結果失效
+RECORD_WRITE_METHODS = frozenset(
+    {
+        "batch_create_memory_records",
+        "batch_update_memory_records",
+        "batch_delete_memory_records",
+        "delete_memory_record",
+    }
+)
+
+
+def query_fingerprint(query: str) -> str:
+    """
+    計算查詢指紋（正規化全形 / 大小寫 / 空白後取 SHA-256 前 16 碼）
+
+    Args:
+        query: 查詢文字
+
+    Returns:
+        指紋字串
+    """
+    normalized = " ".join(unicodedata.normalize("NFKC", query).lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+class _Entry:
+    """快取項目：已完成的結果或進行中的預先檢索"""
+
+    __slots__ = ("future", "expires_at", "pinned")
+
+    def __init__(self, future: Future, expires_at: float, pinned: bool):
+        self.future = future
+        self.expires_at = expires_at
+        # 預先檢索的結果在被本回合取用前不因記錄異動而失效
+        self.pinned = pinned
+
+
+class MemoryRetrievalCache:
+    """
+    Memory 檢索結果快取（同一個 Lambda 容器內共用）
+
+    - 預先檢索：在背景執行緒開始檢索，取用時等待結果
+    - 失效：同一 actor 的長期記憶記錄異動時，移除已取用過的結果
+    """
+
+    def __init__(self, ttl: int = 60, max_size: int = 256, max_workers: int = 4):
+        """
+        初始化快取
+
+        Args:
+            ttl: 結果存活時間（秒）
+            max_size: 最多保留的項目數
+            max_workers: 預先檢索的執行緒數
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.max_workers = max_workers
+
+        self._entries: OrderedDict[tuple[str, str, str, int], _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+
+        self.hits = 0
+        self.prefetch_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(actor_id: str, namespace: str, query: str, top_k: int) -> tuple[str, str, str, int]:
+        return (actor_id, namespace, query_fingerprint(query), top_k)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="memory-prefetch"
+            )
+        return self._executor
+
+    def prefetch(
+        self,
+        actor_id: str,
+        namespaces: dict[str, int],
+        query: str,
+        retrieve: Callable[[str, int], list[dict[str, Any]]],
+    ) -> None:
+        """
+        在背景開始檢索（已有有效結果的 namespace 略過）
+
+        Args:
+            actor_id: Actor ID
+            namespaces: {namespace: top_k}
+            query: 查詢文字
+            retrieve: 實際檢索函數 (namespace, top_k) -> memories
+        """
+        now = time.time()
+        for namespace, top_k in namespaces.items():
+            key = self._key(actor_id, namespace, query, top_k)
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry.expires_at > now:
+                    entry.pinned = True
+                    continue
+                future = self._get_executor().submit(retrieve, namespace, top_k)
+                self._store(key, _Entry(future, now + self.ttl, pinned=True))
+
+    def get_or_retrieve(
+        self,
+        actor_id: str,
+        namespace: str,
+        query: str,
+        top_k: int,
+        retrieve: Callable[[], list[dict[str, Any]]],
+    ) -> list[dict[str, Any]]:
+        """
+        取得檢索結果（命中快取或等待預先檢索，否則直接檢索並寫入快取）
+
+        Args:
+            actor_id: Actor ID
+            namespace: Namespace
+            query: 查詢文字
+            top_k: 結果數量
+            retrieve: 實際檢索函數
+
+        Returns:
+            memories 列表
+        """
+        key = self._key(actor_id, namespace, query, top_k)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.time():
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                prefetched = entry.pinned
+                entry.pinned = False
+
+        if entry is not None:
+            try:
+                memories = entry.future.result(timeout=PREFETCH_WAIT_SECONDS)
+            except Exception as e:
+                logger.warning(f"⚠️ 預先檢索失敗，改為直接檢索: {e}")
+                with self._lock:
+                    if self._entries.get(key) is entry:
+                        del self._entries[key]
+            else:
+                with self._lock:
+                    if prefetched:
+                        self.prefetch_hits += 1
+                    else:
+                        self.hits += 1
+                self._record("prefetch_hit" if prefetched else "hit", namespace)
+                return memories
+
+        with self._lock:
+            self.misses += 1
+        self._record("miss", namespace)
+
+        memories = retrieve()
+        future: Future = Future()
+        future.set_result(memories)
+        with self._lock:
+            self._store(key, _Entry(future, time.time() + self.ttl, pinned=False))
+        return memories
+
+    def invalidate(self, actor_id: str) -> int:
+        """
+        長期記憶記錄異動後使該 actor 的結果失效（保留尚未取用的預先檢索結果）
+
+        Args:
+            actor_id: Actor ID
+
+        Returns:
+            移除的項目數
+        """
+        with self._lock:
+            stale = [
+                key
+                for key, entry in self._entries.items()
+                if key[0] == actor_id and not entry.pinned
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        """清空快取（測試用）"""
+        with self._lock:
+            self._entries.clear()
+
+    def _store(self, key: tuple[str, str, str, int], entry: _Entry) -> None:
+        """寫入項目（呼叫端需持有鎖）"""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _record(outcome: str, namespace: str) -> None:
+        """記錄命中 / 未命中（結構化日誌，供 CloudWatch Logs Insights 統計）"""
+        logger.info(
+            f"🧠 Memory 檢索快取 {outcome}: {namespace}",
+            extra={
+                "event_type": "memory_retrieval_cache",
+                "outcome": outcome,
+                "namespace": namespace,
+            },
+        )
+
+    def get_stats(self) -> dict[str, Any]:
+        """
+        取得快取統計
+
+        Returns:
+            統計資訊字典
+        """
+        lookups = self.hits + self.prefetch_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "prefetch_hits": self.prefetch_hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round((self.hits + self.prefetch_hits) / lookups, 3) if lookups else 0.0,
+        }
+
+
+class CachingMemoryClient:
+    """
+    包裝 MemoryClient：檢索經過快取，異動長期記憶記錄時使快取失效
+
+    寫入對話事件不影響快取；其他屬性與方法直接轉交給原本的 client
+    """
+
+    def __init__(self, client: Any, cache: MemoryRetrievalCache, actor_id: str):
+        """
+        初始化包裝
+
+        Args:
+            client: 原本的 MemoryClient
+            cache: 檢索快取
+            actor_id: 此 Session 的 Actor ID
+        """
+        self._client = client
+        self._cache = cache
+        self._actor_id = actor_id
+        self._gmdp_client = _RecordTrackingClient(client.gmdp_client, self._on_record_write)
+
+    @property
+    def gmdp_client(self) -> Any:
+        return self._gmdp_client
+
+    def retrieve_memories(self, *args: Any, **kwargs: Any) -> list[dict[str, Any]]:
+        namespace = kwargs.get("namespace_path") or kwargs.get("namespace")
+        query = kwargs.get("query")
+        if not namespace or not query or args or kwargs.get("metadata_filters"):
+            return self._client.retrieve_memories(*args, **kwargs)
+
+        return self._cache.get_or_retrieve(
+            self._actor_id,
+            namespace,
+            query,
+            kwargs.get("top_k", 3),
+            lambda: self._client.retrieve_memories(*args, **kwargs),
+        )
+
+    def _on_record_write(self) -> None:
+        self._cache.invalidate(self._actor_id)
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._client, name)
+        if name in RECORD_WRITE_METHODS:
+            return _tracked(attr, self._on_record_write)
+        return attr
+
+
+class _RecordTrackingClient:
+    """包裝 boto3 bedrock-agentcore client，異動長期記憶記錄後通知失效"""
+
+    def __init__(self, client: Any, on_record_write: Callable[[], None]):
+        self._client = client
+        self._on_record_write = on_record_write
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._client, name)
+        if name in RECORD_WRITE_METHODS:
+            return _tracked(attr, self._on_record_write)
+        return attr
+
+
+def _tracked(method: Callable[..., Any], on_record_write: Callable[[], None]) -> Callable[..., Any]:
+    """包裝記錄異動方法：呼叫成功後通知失效"""
+
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        result = method(*args, **kwargs)
+        on_record_write()
+        return result
+
+    return wrapper
@@ -3,9 +3,13 @@ Memory 服務模組
 管理 AgentCore Memory 功能
 """
 
+from datetime import UTC, datetime
 from typing import Any
 
 from config.settings import settings
+from services.memory_image_refs import build_image_reference_converter
+from services.memory_retrieval_cache import CachingMemoryClient, MemoryRetrievalCache
+from services.memory_write_behind import memory_write_behind
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -19,6 +23,17 @@ class MemoryService:
         self.memory_id = settings.MEMORY_ID
         self.enabled = settings.MEMORY_ENABLED
         self.session_manager = None
+        self.retrieval_cache = (
+            MemoryRetrievalCache(
+                ttl=settings.MEMORY_RETRIEVAL_CACHE_TTL,
+                max_size=settings.MEMORY_RETRIEVAL_CACHE_SIZE,
+            )
+            if settings.MEMORY_RETRIEVAL_CACHE_ENABLED
+            else None
+        )
+        self._memory_client = None
+        self._memory_client_class = None
+        self._converter_class = None
 
         if self.enabled:
             self._initialize_memory()
@@ -26,6 +41,10 @@ class MemoryService:
     def _initialize_memory(self):
         """初始化 Memory 配置"""
         try:
+            from bedrock_agentcore.memory import MemoryClient
+            from bedrock_agentcore.memory.integrations.strands.bedrock_converter import (
+                AgentCoreMemoryConverter,
+            )
             from bedrock_agentcore.memory.integrations.strands.config import (
                 AgentCoreMemoryConfig,
                 RetrievalConfig,
@@ -38,6 +57,15 @@ class MemoryService:
             self._memory_config_class = AgentCoreMemoryConfig
             self._retrieval_config_class = RetrievalConfig
             self._session_manager_class = AgentCoreMemorySessionManager
+            self._memory_client_class = MemoryClient
+
+            # 圖片以 S3 參照寫入 Memory（不序列化 bytes）
+            if settings.MEMORY_IMAGE_REFERENCES_ENABLED:
+                self._converter_class = build_image_reference_converter(
+                    AgentCoreMemoryConverter,
+                    mode=settings.MEMORY_IMAGE_REHYDRATE,
+                    max_bytes=settings.IMAGE_MAX_BYTES,
+                )
 
         except ImportError as e:
             logger.error(f"❌ Memory 模組匯入失敗: {str(e)}")
@@ -66,7 +94,22 @@ class MemoryService:
             memory_config = self._create_memory_config(session_id, actor_id)
 
             # 建立 Session Manager
-            session_manager = self._session_manager_class(memory_config, settings.AWS_REGION)
+            converter_kwargs = {}
+            if self._converter_class is not None:
+                converter_kwargs["converter"] = self._converter_class
+            session_manager = self._session_manager_class(
+                memory_config, settings.AWS_REGION, **converter_kwargs
+            )
+
+            # 長期記憶檢索經過容器內快取（含預先檢索的結果）
+            if self.retrieval_cache is not None:
+                session_manager.memory_client = CachingMemoryClient(
+                    session_manager.memory_client, self.retrieval_cache, actor_id
+                )
+
+            # 回合結束時的寫入改為延後執行（回覆發布後再寫入）
+            if settings.MEMORY_WRITE_BEHIND_ENABLED:
+                self._defer_flushes(session_manager, self.session_key(actor_id, session_id))
 
             logger.info(f"✅ Session Manager 建立成功 (Session: {session_id}, Actor: {actor_id})")
             return session_manager
@@ -75,6 +118,41 @@ class MemoryService:
             logger.error(f"❌ Session Manager 建立失敗: {str(e)}", exc_info=True)
             return None
 
+    @staticmethod
+    def session_key(actor_id: str, session_id: str) -> str:
+        """
+        取得延後寫入的 session key（同一 key 的寫入依序執行）
+
+        Args:
+            actor_id: Actor ID
+            session_id: Session ID
+
+        Returns:
+            Session key
+        """
+        return f"{actor_id}:{session_id}"
+
+    @staticmethod
+    def _defer_flushes(session_manager: Any, session_key: str) -> None:
+        """
+        將 Session Manager 的緩衝寫入改為加入延後寫入佇列
+
+        Session Manager 以 batch_size 緩衝訊息與 Agent 狀態，回合結束
+        （AfterInvocationEvent）時呼叫 _flush_messages；這裡改為排入佇列，
+        由 processor 在發布回覆後執行。寫入失敗時事件會回到緩衝區，重試時一併送出。
+
+        Args:
+            session_manager: AgentCoreMemorySessionManager
+            session_key: Session key
+        """
+        flush = session_manager._flush_messages
+
+        def deferred_flush() -> list[dict[str, Any]]:
+            memory_write_behind.defer(session_key, flush, "conversation_events")
+            return []
+
+        session_manager._flush_messages = deferred_flush
+
     def _extract_actor_id(self, context: Any) -> str:
         """
         從上下文提取 Actor ID
@@ -106,19 +184,141 @@ class MemoryService:
             Memory 配置物件
         """
         retrieval_config = {
-            f"/users/{actor_id}/facts": self._retrieval_config_class(top_k=3, relevance_score=0.5),
-            f"/users/{actor_id}/preferences": self._retrieval_config_class(
-                top_k=3, relevance_score=0.5
-            ),
+            namespace: self._retrieval_config_class(top_k=top_k, relevance_score=0.5)
+            for namespace, top_k in self._retrieval_namespaces(actor_id).items()
         }
 
+        config_kwargs = {}
+        if settings.MEMORY_WRITE_BEHIND_ENABLED:
+            config_kwargs["batch_size"] = settings.MEMORY_WRITE_BEHIND_BATCH_SIZE
+
         return self._memory_config_class(
             memory_id=self.memory_id,
             session_id=session_id,
             actor_id=actor_id,
             retrieval_config=retrieval_config,
+            **config_kwargs,
         )
 
+    @staticmethod
+    def _retrieval_namespaces(actor_id: str) -> dict[str, int]:
+        """
+        長期記憶檢索的 namespace 與數量
+
+        Args:
+            actor_id: Actor ID
+
+        Returns:
+            {namespace: top_k}
+        """
+        return {
+            f"/users/{actor_id}/facts": 3,
+            f"/users/{actor_id}/preferences": 3,
+        }
+
+    def prefetch(self, actor_id: str, query: str) -> None:
+        """
+        在背景預先檢索長期記憶（與附件下載、Agent 建立同時進行）
+
+        Session Manager 檢索時以相同的 (actor_id, namespace, 查詢) 取用結果
+
+        Args:
+            actor_id: Actor ID（與 Session 使用的相同）
+            query: 使用者訊息（與送給 Agent 的第一個文字區塊相同）
+        """
+        query = query.strip()
+        if (
+            not self.enabled
+            or self.retrieval_cache is None
+            or self._memory_client_class is None
+            or not query
+        ):
+            return
+
+        def retrieve(namespace: str, top_k: int) -> list[dict[str, Any]]:
+            return self._get_memory_client().retrieve_memories(
+                memory_id=self.memory_id, namespace_path=namespace, query=query, top_k=top_k
+            )
+
+        try:
+            self.retrieval_cache.prefetch(
+                actor_id, self._retrieval_namespaces(actor_id), query, retrieve
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Memory 預先檢索啟動失敗: {e}")
+
+    def has_recent_events(self, actor_id: str, session_id: str, within_seconds: float) -> bool:
+        """
+        Session 最近是否有對話事件（ListEvents 由新到舊排序，只取最新一筆）
+
+        Args:
+            actor_id: Actor ID
+            session_id: Session ID
+            within_seconds: 視為最近的時間範圍（秒）
+
+        Returns:
+            是否有最近的事件；查詢失敗時視為有（寧可不使用快取）
+        """
+        if not self.enabled or self._memory_client_class is None:
+            return False
+
+        try:
+            response = self._get_memory_client().gmdp_client.list_events(
+                memoryId=self.memory_id,
+                actorId=actor_id,
+                sessionId=session_id,
+                maxResults=1,
+                includePayloads=False,
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ 查詢最近對話事件失敗: {e}")
+            return True
+
+        events = response.get("events", [])
+        if not events:
+            return False
+        timestamp = events[0].get("eventTimestamp")
+        if not isinstance(timestamp, datetime):
+            return True
+        return (datetime.now(UTC) - timestamp).total_seconds() < within_seconds
+
+    def append_turn(self, actor_id: str, session_id: str, text: str, response: str) -> None:
+        """
+        將未經 Session Manager 的回合（例如快取回覆）寫入對話事件，維持 session 歷史完整
+
+        延後寫入啟用時排入該 session 的佇列，與其他事件依序寫入
+
+        Args:
+            actor_id: Actor ID
+            session_id: Session ID
+            text: 使用者訊息
+            response: 回覆文字
+        """
+        if not self.enabled or self._memory_client_class is None or not text or not response:
+            return
+
+        def write() -> dict[str, Any]:
+            return self._get_memory_client().create_event(
+                memory_id=self.memory_id,
+                actor_id=actor_id,
+                session_id=session_id,
+                messages=[(text, "USER"), (response, "ASSISTANT")],
+            )
+
+        if settings.MEMORY_WRITE_BEHIND_ENABLED:
+            memory_write_behind.defer(self.session_key(actor_id, session_id), write, "cached_turn")
+            return
+        try:
+            write()
+        except Exception as e:
+            logger.warning(f"⚠️ 對話事件寫入失敗: {e}")
+
+    def _get_memory_client(self) -> Any:
+        """取得 Session Manager 以外使用的 MemoryClient（延遲初始化）"""
+        if self._memory_client is None:
+            self._memory_client = self._memory_client_class(region_name=settings.AWS_REGION)
+        return self._memory_client
+
     def get_status(self) -> dict[str, Any]:
         """
         取得 Memory 服務狀態
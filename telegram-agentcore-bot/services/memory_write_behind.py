@@ -0,0 +1,226 @@
+"""
+Memory 寫入延後（write-behind）
+對話事件與審計記錄不影響本回合的回覆內容，先發布 message.completed，
+再於同一次 invocation 內依 session 順序寫入；失敗的寫入保留到下一次 invocation 重試
+"""
+
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from config.settings import settings
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class PendingWrite:
+    """等待寫入的操作"""
+
+    write: Callable[[], Any]
+    description: str
+    enqueued_at: float = field(default_factory=time.time)
+    attempts: int = 0
+
+
+class MemoryWriteBehind:
+    """
+    依 session 排序的延後寫入佇列（同一個 Lambda 容器內共用）
+
+    - 同一 session 的寫入依加入順序執行；某筆重試用盡後，同 session 的後續寫入
+      保留在佇列中，不會越過它寫入
+    - 不同 session 互不影響
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.2,
+        max_delay: float = 2.0,
+        max_pending: int = 1000,
+    ):
+        """
+        初始化佇列
+
+        Args:
+            max_attempts: 每次 flush 中單筆寫入的最大嘗試次數
+            base_delay: 重試的基礎延遲（秒，指數退避加隨機抖動）
+            max_delay: 單次重試延遲上限（秒）
+            max_pending: 佇列上限，超過時丟棄最舊 session 的寫入
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+
+        self._queues: OrderedDict[str, deque[PendingWrite]] = OrderedDict()
+        self._lock = threading.Lock()
+        # 同一 session 同時只有一個 flush 在執行，維持寫入順序
+        self._session_locks: dict[str, threading.Lock] = {}
+
+        self.written = 0
+        self.retried = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def defer(self, session_key: str, write: Callable[[], Any], description: str = "write") -> None:
+        """
+        加入延後寫入
+
+        Args:
+            session_key: Session key（同一 key 的寫入依序執行）
+            write: 寫入函數，失敗時拋出例外
+            description: 描述（用於日誌）
+        """
+        with self._lock:
+            self._queues.setdefault(session_key, deque()).append(PendingWrite(write, description))
+            self._session_locks.setdefault(session_key, threading.Lock())
+            self._enforce_limit()
+
+    def pending(self, session_key: str | None = None) -> int:
+        """
+        取得等待寫入的數量
+
+        Args:
+            session_key: 只計算指定 session（None 表示全部）
+
+        Returns:
+            等待中的寫入數
+        """
+        with self._lock:
+            if session_key is not None:
+                return len(self._queues.get(session_key, ()))
+            return sum(len(queue) for queue in self._queues.values())
+
+    def flush(
+        self, session_key: str | None = None, deadline: float | None = None
+    ) -> dict[str, Any]:
+        """
+        依序執行等待中的寫入
+
+        Args:
+            session_key: 只寫入指定 session（None 表示全部）
+            deadline: 截止時間（time.time()），到期後剩餘的寫入保留到下一次
+
+        Returns:
+            本次 flush 的統計
+        """
+        with self._lock:
+            keys = [session_key] if session_key is not None else list(self._queues)
+
+        start = time.perf_counter()
+        stats = {"written": 0, "failed": 0, "pending": 0}
+        for key in keys:
+            written, failed = self._flush_session(key, deadline)
+            stats["written"] += written
+            stats["failed"] += failed
+
+        stats["pending"] = self.pending()
+        stats["flush_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        if stats["written"] or stats["failed"] or stats["pending"]:
+            logger.info(
+                f"💾 Memory 延後寫入完成: {stats['written']} 筆，剩餘 {stats['pending']} 筆",
+                extra={"event_type": "memory_write_behind", **stats},
+            )
+        return stats
+
+    def _flush_session(self, session_key: str, deadline: float | None) -> tuple[int, int]:
+        """
+        依序寫入單一 session 的等待項目
+
+        Returns:
+            (成功數, 失敗數)
+        """
+        with self._lock:
+            session_lock = self._session_locks.get(session_key)
+        if session_lock is None:
+            return 0, 0
+
+        written = 0
+        with session_lock:
+            while True:
+                with self._lock:
+                    queue = self._queues.get(session_key)
+                    if not queue:
+                        self._queues.pop(session_key, None)
+                        return written, 0
+                    item = queue[0]
+
+                if deadline is not None and time.time() >= deadline:
+                    return written, 0
+
+                if not self._write_with_retry(session_key, item, deadline):
+                    # 保留在佇列最前面，後續寫入等它成功後才執行
+                    with self._lock:
+                        self.failed += 1
+                    return written, 1
+
+                with self._lock:
+                    queue.popleft()
+                    self.written += 1
+                written += 1
+
+    def _write_with_retry(
+        self, session_key: str, item: PendingWrite, deadline: float | None
+    ) -> bool:
+        """執行單筆寫入，暫時性失敗時以指數退避重試"""
+        for attempt in range(1, self.max_attempts + 1):
+            item.attempts += 1
+            try:
+                item.write()
+                return True
+            except Exception as e:
+                logger.warning(
+                    f"⚠️ Memory 延後寫入失敗 ({item.description}, 第 {attempt} 次): {e}",
+                    extra={
+                        "event_type": "memory_write_behind",
+                        "session_key": session_key,
+                        "attempts": item.attempts,
+                    },
+                )
+                if attempt == self.max_attempts:
+                    return False
+
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                if deadline is not None and time.time() + delay >= deadline:
+                    return False
+                with self._lock:
+                    self.retried += 1
+                time.sleep(delay)
+        return False
+
+    def _enforce_limit(self) -> None:
+        """超過上限時丟棄最舊 session 的寫入（呼叫端需持有鎖）"""
+        total = sum(len(queue) for queue in self._queues.values())
+        while total > self.max_pending and self._queues:
+            session_key, queue = self._queues.popitem(last=False)
+            total -= len(queue)
+            self.dropped += len(queue)
+            logger.error(
+                f"❌ Memory 延後寫入佇列已滿，丟棄 {len(queue)} 筆",
+                extra={"event_type": "memory_write_behind", "session_key": session_key},
+            )
+
+    def get_stats(self) -> dict[str, Any]:
+        """
+        取得累計統計
+
+        Returns:
+            統計資訊字典
+        """
+        return {
+            "pending": self.pending(),
+            "written": self.written,
+            "retried": self.retried,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+
+# 全域單例
+memory_write_behind = MemoryWriteBehind(max_attempts=settings.MEMORY_WRITE_MAX_ATTEMPTS)
@@ -0,0 +1,273 @@
+"""
+回應快取
+跨使用者重複出現的無狀態問題（常見問題、時間、天氣等）直接回覆快取結果，略過 Agent；
+以 (正規化後的訊息, 工具組版本, 模型) 為 key，存活時間依本回合使用的工具類別決定
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 工具名稱 → 類別（未列出的工具視為不可快取）
+TOOL_CATEGORIES = {
+    "get_current_time": "time",
+    "get_weather": "weather",
+    "calculate": "calculator",
+    "browse_website_official": "browse",
+    "browse_website_backup": "browse",
+    "browse_websites": "browse",
+    "read_file": "file",
+}
+
+# 沒有使用工具的回覆
+GENERAL_CATEGORY = "general"
+
+# 回覆依賴對話歷史或個人資料的訊息（不快取）
+_CONTEXTUAL_RE = re.compile(
+    r"我的|我們|剛才|剛剛|上次|之前|先前|記得|繼續|再一次|那個|這個|上面|前面|你說|"
+    r"\b(my|mine|our|previous|earlier|again|continue|remember|above|last time|you said)\b",
+    re.IGNORECASE,
+)
+
+# 正規化時移除的結尾標點
+_TRAILING_PUNCTUATION = "?？!！.。~～ "
+
+
+def normalize_prompt(text: str) -> str:
+    """
+    正規化訊息（全形 / 大小寫 / 空白 / 結尾標點）
+
+    Args:
+        text: 訊息文字
+
+    Returns:
+        正規化後的文字
+    """
+    normalized = " ".join(unicodedata.normalize("NFKC", text).lower().split())
+    return normalized.rstrip(_TRAILING_PUNCTUATION)
+
+
+def toolset_version(tools: list[Any]) -> str:
+    """
+    計算工具組版本（工具名稱與規格的雜湊），工具變更後舊快取自動失效
+
+    Args:
+        tools: 工具列表
+
+    Returns:
+        版本字串（SHA-256 前 12 碼）
+    """
+    specs = []
+    for tool in tools:
+        spec = getattr(tool, "tool_spec", None)
+        specs.append(spec if isinstance(spec, dict) else getattr(tool, "__name__", repr(tool)))
+    payload = json.dumps(specs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def parse_category_ttls(spec: str) -> dict[str, int]:
+    """
+    解析各工具類別的存活時間設定
+
+    Args:
+        spec: 例如 "general=3600,time=30,weather=600"
+
+    Returns:
+        {類別: 秒數}
+    """
+    ttls = {}
+    for part in spec.split(","):
+        category, _, seconds = part.partition("=")
+        if category.strip() and seconds.strip().isdigit():
+            ttls[category.strip()] = int(seconds)
+    return ttls
+
+
+class ResponseCache:
+    """
+    回應快取（同一個 Lambda 容器內共用）
+
+    只用於無狀態的回合：純文字、沒有附件、不參照對話歷史，且 session 最近沒有對話
+    （由 processor 判斷）；
+    回合中使用的工具全部可快取時才寫入，存活時間取各工具類別中最短者
+    """
+
+    def __init__(
+        self,
+        category_ttls: dict[str, int],
+        max_size: int = 512,
+        max_chars: int = 200,
+        bypass_users: list[str] | None = None,
+    ):
+        """
+        初始化快取
+
+        Args:
+            category_ttls: 各工具類別的存活時間（秒，0 或未列出表示不快取）
+            max_size: 最多保留的項目數
+            max_chars: 可快取訊息的字數上限
+            bypass_users: 不使用快取的使用者 ID
+        """
+        self.category_ttls = category_ttls
+        self.max_size = max_size
+        self.max_chars = max_chars
+        self.bypass_users = set(bypass_users or [])
+
+        self._entries: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.latency_saved_ms = 0.0
+
+    @staticmethod
+    def build_key(text: str, tools_version: str, model_id: str) -> str:
+        """
+        建立快取 key
+
+        Args:
+            text: 訊息文字
+            tools_version: 工具組版本
+            model_id: 模型 ID
+
+        Returns:
+            快取 key
+        """
+        digest = hashlib.sha256(normalize_prompt(text).encode("utf-8")).hexdigest()[:24]
+        return f"{digest}:{tools_version}:{model_id}"
+
+    def is_cacheable(self, text: str, user_id: str, has_attachments: bool = False) -> bool:
+        """
+        判斷本回合是否為可快取的無狀態回合
+
+        Args:
+            text: 訊息文字
+            user_id: 使用者 ID
+            has_attachments: 是否含附件
+
+        Returns:
+            是否可使用快取
+        """
+        if user_id in self.bypass_users or has_attachments:
+            return False
+        normalized = normalize_prompt(text or "")
+        if not normalized or len(normalized) > self.max_chars:
+            return False
+        return not _CONTEXTUAL_RE.search(normalized)
+
+    def ttl_for(self, tools_used: list[str]) -> int:
+        """
+        依本回合使用的工具決定存活時間
+
+        Args:
+            tools_used: 使用的工具名稱
+
+        Returns:
+            存活秒數（0 表示不快取）
+        """
+        categories = {TOOL_CATEGORIES.get(name) for name in tools_used} or {GENERAL_CATEGORY}
+        if None in categories:
+            return 0
+        return min(self.category_ttls.get(category, 0) for category in categories)
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """
+        讀取快取的回覆
+
+        Args:
+            key: 快取 key
+
+        Returns:
+            {"response", "model", "category", "elapsed_ms"}，未命中時為 None
+        """
+        start = time.perf_counter()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["expires_at"] <= time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                saved_ms = max(0.0, entry["elapsed_ms"] - (time.perf_counter() - start) * 1000)
+                self.latency_saved_ms += saved_ms
+
+        if entry is None:
+            self._record("miss")
+            return None
+
+        self._record("hit", category=entry["category"], latency_saved_ms=round(saved_ms, 2))
+        return dict(entry)
+
+    def put(self, key: str, response: str, model_id: str, tools_used: list[str], elapsed_ms: float):
+        """
+        寫入回覆（使用不可快取的工具時略過）
+
+        Args:
+            key: 快取 key
+            response: 回覆文字
+            model_id: 產生回覆的模型 ID
+            tools_used: 本回合使用的工具名稱
+            elapsed_ms: 本回合處理時間（命中時計算節省的延遲）
+        """
+        ttl = self.ttl_for(tools_used)
+        if ttl <= 0 or not response:
+            return
+
+        categories = sorted({TOOL_CATEGORIES[name] for name in tools_used}) or [GENERAL_CATEGORY]
+        with self._lock:
+            self._entries[key] = {
+                "response": response,
+                "model": model_id,
+                "category": ",".join(categories),
+                "elapsed_ms": elapsed_ms,
+                "expires_at": time.time() + ttl,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self.stores += 1
+
+        self._record("store", category=",".join(categories), ttl=ttl)
+
+    def clear(self) -> None:
+        """清空快取（測試用）"""
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _record(outcome: str, **fields: Any) -> None:
+        """記錄命中 / 未命中 / 寫入（結構化日誌，供 CloudWatch Logs Insights 統計）"""
+        logger.info(
+            f"💬 回應快取 {outcome}",
+            extra={"event_type": "response_cache", "outcome": outcome, **fields},
+        )
+
+    def get_stats(self) -> dict[str, Any]:
+        """
+        取得快取統計
+
+        Returns:
+            統計資訊字典
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "latency_saved_ms": round(self.latency_saved_ms, 2),
+        }
@@ -0,0 +1,271 @@
+"""
+S3 串流讀取
+提供範圍讀取、分塊迭代、開頭讀取，以及大型物件落地 /tmp 後以 mmap 存取，
+讓記憶體用量不隨附件大小成長
+"""
+
+import codecs
+import contextlib
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+from collections.abc import Iterator
+from typing import Any, BinaryIO
+
+import boto3
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 分塊讀取大小
+DEFAULT_CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+# 大型物件落地的目錄（Lambda 唯一可寫入的位置）
+SPILL_DIR = "/tmp"
+
+# S3 客戶端（延遲初始化）
+_s3_client = None
+
+
+def get_s3_client():
+    """獲取 S3 客戶端單例"""
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client("s3")
+    return _s3_client
+
+
+def parse_s3_url(s3_url: str) -> tuple[str, str] | None:
+    """
+    解析 S3 URL
+
+    Args:
+        s3_url: S3 URL (格式: s3://bucket/key)
+
+    Returns:
+        (bucket, key)，格式錯誤時為 None
+    """
+    if not s3_url.startswith("s3://"):
+        logger.error(f"Invalid S3 URL: {s3_url}")
+        return None
+
+    url_parts = s3_url[5:].split("/", 1)
+    if len(url_parts) != 2 or not all(url_parts):
+        logger.error(f"Invalid S3 URL format: {s3_url}")
+        return None
+
+    return url_parts[0], url_parts[1]
+
+
+def get_object(s3_url: str, byte_range: str | None = None) -> dict[str, Any] | None:
+    """
+    取得 S3 物件回應（Body 尚未讀取）
+
+    Args:
+        s3_url: S3 URL
+        byte_range: HTTP Range（例如 "bytes=0-1023"）
+
+    Returns:
+        get_object 回應，失敗時為 None
+    """
+    location = parse_s3_url(s3_url)
+    if location is None:
+        return None
+
+    bucket, key = location
+    params = {"Bucket": bucket, "Key": key}
+    if byte_range:
+        params["Range"] = byte_range
+
+    try:
+        return get_s3_client().get_object(**params)
+    except Exception as e:
+        logger.error(
+            f"❌ Failed to read from S3: {str(e)}",
+            extra={"event_type": "s3_read_failure", "s3_url": s3_url},
+        )
+        return None
+
+
+def read_range(s3_url: str, start: int, end: int | None = None) -> bytes | None:
+    """
+    以 Range GET 讀取部分內容
+
+    Args:
+        s3_url: S3 URL
+        start: 起始位置（含）
+        end: 結束位置（含），None 表示到結尾
+
+    Returns:
+        讀取的 bytes，失敗時為 None
+    """
+    byte_range = f"bytes={start}-{'' if end is None else end}"
+    response = get_object(s3_url, byte_range)
+    if response is None:
+        return None
+    return response["Body"].read()
+
+
+def head(s3_url: str, n: int) -> bytes | None:
+    """
+    讀取物件開頭 n bytes（用於類型判斷與預覽）
+
+    Args:
+        s3_url: S3 URL
+        n: 讀取長度
+
+    Returns:
+        開頭的 bytes，失敗時為 None
+    """
+    return read_range(s3_url, 0, n - 1)
+
+
+def iter_chunks(s3_url: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    分塊迭代物件內容（同一時間只保留一個區塊）
+
+    Args:
+        s3_url: S3 URL
+        chunk_size: 區塊大小
+
+    Yields:
+        內容區塊
+    """
+    response = get_object(s3_url)
+    if response is None:
+        return
+    yield from response["Body"].iter_chunks(chunk_size)
+
+
+def open_object(s3_url: str, spill_threshold: int) -> "S3Object | None":
+    """
+    開啟 S3 物件：小物件讀入記憶體，超過門檻的物件串流落地 /tmp 並以 mmap 存取
+
+    Args:
+        s3_url: S3 URL
+        spill_threshold: 落地 /tmp 的大小門檻（bytes）
+
+    Returns:
+        S3Object（使用完需 close），失敗時為 None
+    """
+    response = get_object(s3_url)
+    if response is None:
+        return None
+
+    body = response["Body"]
+    size = response.get("ContentLength", 0)
+
+    try:
+        if size <= spill_threshold:
+            return S3Object(body.read())
+
+        with tempfile.NamedTemporaryFile(dir=SPILL_DIR, prefix="s3-", delete=False) as spill:
+            try:
+                for chunk in body.iter_chunks(DEFAULT_CHUNK_SIZE):
+                    spill.write(chunk)
+            except Exception:
+                os.unlink(spill.name)
+                raise
+
+        logger.info(f"💾 大型物件已落地: {spill.name} ({size} bytes)")
+        return S3Object.from_file(spill.name)
+    except Exception as e:
+        logger.error(
+            f"❌ Failed to read from S3: {str(e)}",
+            extra={"event_type": "s3_read_failure", "s3_url": s3_url},
+        )
+        return None
+    finally:
+        body.close()
+
+
+class S3Object:
+    """
+    已取得的 S3 物件內容（唯讀）
+
+    小物件直接持有 bytes；大型物件為 /tmp 檔案的 mmap，由作業系統依需要分頁載入，
+    不會佔用 Lambda 的 Python heap。
+    """
+
+    def __init__(self, data: bytes | mmap.mmap, path: str | None = None):
+        """
+        初始化物件
+
+        Args:
+            data: 內容（bytes 或 mmap）
+            path: 落地檔案路徑（記憶體物件為 None）
+        """
+        self.data = data
+        self.path = path
+        self.size = len(data)
+
+    @classmethod
+    def from_file(cls, path: str) -> "S3Object":
+        """以 mmap 開啟落地檔案（空檔案無法 mmap，直接讀為 bytes）"""
+        if os.path.getsize(path) == 0:
+            os.unlink(path)
+            return cls(b"")
+
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(data, path)
+
+    def head(self, n: int) -> bytes:
+        """取得開頭 n bytes"""
+        return bytes(self.data[:n])
+
+    def iter_chunks(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[memoryview]:
+        """分塊迭代內容（不複製）"""
+        view = memoryview(self.data)
+        for offset in range(0, self.size, chunk_size):
+            yield view[offset : offset + chunk_size]
+
+    def open(self) -> BinaryIO:
+        """開啟可串流讀取的二進位檔案物件"""
+        if self.path is not None:
+            return open(self.path, "rb")
+        return io.BytesIO(self.data)
+
+    def sha256(self) -> str:
+        """計算內容的 SHA-256（直接讀取 buffer，不複製）"""
+        digest = hashlib.sha256()
+        for chunk in self.iter_chunks():
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    def is_utf8(self) -> bool:
+        """以增量解碼器逐塊檢查整份內容是否為 UTF-8"""
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        try:
+            for chunk in self.iter_chunks():
+                decoder.decode(chunk)
+            decoder.decode(b"", final=True)
+            return True
+        except UnicodeDecodeError:
+            return False
+
+    def read_bytes(self) -> bytes:
+        """取得完整內容（需要整份內容時才呼叫，例如上傳到 Code Interpreter）"""
+        return self.data if isinstance(self.data, bytes) else self.data[:]
+
+    def read_text(self) -> str:
+        """取得完整的 UTF-8 文字內容"""
+        return str(self.data, "utf-8")
+
+    def close(self) -> None:
+        """釋放 mmap 並刪除落地檔案"""
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        if self.path is not None:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.path)
+            self.path = None
+
+    def __enter__(self) -> "S3Object":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
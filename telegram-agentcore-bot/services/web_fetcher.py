@@ -0,0 +1,674 @@
+"""
+網頁快速擷取
+大多數網址是不需要 JavaScript 的靜態文章：先以連線池的 HTTP GET 取得 HTML，
+在程式內擷取主要內容；看起來需要 JavaScript 產生內容或擷取不到文字時才改用遠端瀏覽器。
+擷取結果依 URL 快取，以 ETag / Last-Modified 條件請求重新驗證
+"""
+
+import ipaddress
+import re
+import socket
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import Any
+from urllib.parse import urljoin, urlsplit
+
+import urllib3
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.exceptions import ConnectTimeoutError, NameResolutionError, NewConnectionError
+from urllib3.util import connection as urllib3_connection
+
+from config.settings import settings
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (compatible; AgentCoreNexusBot/1.0)"
+
+# 讀取回應的區塊大小（位元組）
+_CHUNK_SIZE = 64 * 1024
+
+# 手動跟隨的轉址次數上限（每一跳都確認目標為公開位址）
+MAX_REDIRECTS = 5
+_REDIRECT_STATUSES = frozenset({301, 302, 303, 307, 308})
+
+# 不屬於主要內容的標籤
+_BOILERPLATE_TAGS = frozenset({"nav", "footer", "aside", "header", "form", "menu", "dialog"})
+
+# 內容不輸出為文字的標籤
+_SKIPPED_TAGS = frozenset(
+    {"script", "style", "noscript", "template", "svg", "canvas", "iframe", "head", "button"}
+)
+
+# 沒有結束標籤的元素
+_VOID_TAGS = frozenset(
+    {
+        "area",
+        "base",
+        "br",
+        "col",
+        "embed",
+        "hr",
+        "img",
+        "input",
+        "link",
+        "meta",
+        "source",
+        "track",
+        "wbr",
+    }
+)
+
+# 換行分隔的區塊元素
+_BLOCK_TAGS = frozenset(
+    {
+        "address",
+        "article",
+        "blockquote",
+        "br",
+        "dd",
+        "div",
+        "dl",
+        "dt",
+        "figcaption",
+        "figure",
+        "h1",
+        "h2",
+        "h3",
+        "h4",
+        "h5",
+        "h6",
+        "hr",
+        "li",
+        "main",
+        "ol",
+        "p",
+        "pre",
+        "section",
+        "table",
+        "td",
+        "th",
+        "tr",
+        "ul",
+    }
+)
+
+# 可能是主要內容容器的 id / class
+_CONTENT_HINT_RE = re.compile(r"\b(article|content|main|post|entry|story|body-text)\b", re.I)
+
+# 單頁應用程式的掛載點
+_APP_ROOT_IDS = frozenset({"root", "app", "__next", "__nuxt", "svelte", "ember-app"})
+
+_CHARSET_RE = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.I)
+
+
+class _Node:
+    """簡化的 HTML 節點"""
+
+    __slots__ = ("tag", "attrs", "children", "parent")
+
+    def __init__(self, tag: str, attrs: dict[str, str], parent: "_Node | None" = None):
+        self.tag = tag
+        self.attrs = attrs
+        self.children: list[Any] = []
+        self.parent = parent
+
+
+class _TreeBuilder(HTMLParser):
+    """將 HTML 解析成簡化的節點樹（容忍未關閉的標籤）"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = _Node("#document", {})
+        self.current = self.root
+        self.title = ""
+        self.scripts = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        attributes = {name: value or "" for name, value in attrs}
+        if tag == "script":
+            self.scripts += 1
+        elif tag == "meta" and attributes.get("property") == "og:title" and not self.title:
+            self.title = attributes.get("content", "").strip()
+        elif tag == "title":
+            self._in_title = True
+
+        node = _Node(tag, attributes, self.current)
+        self.current.children.append(node)
+        if tag not in _VOID_TAGS:
+            self.current = node
+
+    def handle_startendtag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_TAGS and self.current.tag == tag:
+            self.current = self.current.parent
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "title":
+            self._in_title = False
+        node = self.current
+        while node is not None and node.tag != tag:
+            node = node.parent
+        if node is not None and node.parent is not None:
+            self.current = node.parent
+
+    def handle_data(self, data: str) -> None:
+        if self._in_title:
+            self.title = self.title or " ".join(data.split())
+        self.current.children.append(data)
+
+
+def _iter_nodes(node: _Node):
+    """深度優先走訪所有元素節點"""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        yield current
+        stack.extend(reversed([c for c in current.children if isinstance(c, _Node)]))
+
+
+def _render_text(node: _Node) -> str:
+    """輸出節點的可見文字（略過 script / 導覽等區塊，區塊元素之間換行）"""
+    lines: list[str] = []
+    parts: list[str] = []
+
+    def flush() -> None:
+        line = " ".join("".join(parts).split())
+        if line:
+            lines.append(line)
+        parts.clear()
+
+    def walk(current: _Node) -> None:
+        for child in current.children:
+            if isinstance(child, str):
+                parts.append(child)
+            elif child.tag in _SKIPPED_TAGS or child.tag in _BOILERPLATE_TAGS:
+                continue
+            elif child.tag in _BLOCK_TAGS:
+                flush()
+                walk(child)
+                flush()
+            else:
+                walk(child)
+
+    walk(node)
+    flush()
+    return "\n".join(lines)
+
+
+def _text_length(node: _Node) -> int:
+    return len(_render_text(node))
+
+
+def _main_content(root: _Node) -> _Node:
+    """
+    找出主要內容容器（類似 Readability）
+
+    先找 <article> / <main> / role=main / 內容相關 id、class；
+    否則以段落文字長度為分數，累加到父元素與祖父元素，取分數最高者
+    """
+    nodes = list(_iter_nodes(root))
+    body = next((n for n in nodes if n.tag == "body"), root)
+
+    semantic = [
+        n
+        for n in nodes
+        if n.tag in ("article", "main")
+        or n.attrs.get("role") == "main"
+        or (
+            n.tag in ("div", "section")
+            and _CONTENT_HINT_RE.search(f"{n.attrs.get('id', '')} {n.attrs.get('class', '')}")
+        )
+    ]
+    if semantic:
+        best = max(semantic, key=_text_length)
+        if _text_length(best) > 0:
+            return best
+
+    scores: dict[int, float] = {}
+    candidates: dict[int, _Node] = {}
+    for node in nodes:
+        if node.tag not in ("p", "pre", "blockquote") or node.parent is None:
+            continue
+        length = len(_render_text(node))
+        if length < 25:
+            continue
+        for ancestor, weight in ((node.parent, 1.0), (node.parent.parent, 0.5)):
+            if ancestor is None or ancestor is root:
+                continue
+            scores[id(ancestor)] = scores.get(id(ancestor), 0.0) + length * weight
+            candidates[id(ancestor)] = ancestor
+
+    if scores:
+        return candidates[max(scores, key=scores.get)]
+    return body
+
+
+def _looks_script_rendered(root: _Node, scripts: int, text: str, min_chars: int) -> bool:
+    """判斷頁面內容是否由 JavaScript 產生（有 script，且文字過少或掛載點是空的）"""
+    if scripts == 0:
+        return False
+    if len(text) < min_chars:
+        return True
+    return any(
+        node.attrs.get("id") in _APP_ROOT_IDS and not _render_text(node)
+        for node in _iter_nodes(root)
+    )
+
+
+def extract_readable(html: str, min_chars: int = 200) -> tuple[str, str, bool]:
+    """
+    擷取網頁標題與主要內容
+
+    Args:
+        html: HTML 原始碼
+        min_chars: 有 script 的頁面低於此字數時視為需要 JavaScript
+
+    Returns:
+        (標題, 主要內容, 是否需要 JavaScript)
+    """
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+
+    text = _render_text(_main_content(builder.root))
+    script_rendered = _looks_script_rendered(builder.root, builder.scripts, text, min_chars)
+    return builder.title, text, script_rendered
+
+
+@dataclass
+class FetchedPage:
+    """HTTP 擷取結果"""
+
+    url: str
+    status: int
+    title: str = ""
+    text: str = ""
+    # 需要改用瀏覽器的原因（空字串表示可直接使用）
+    escalate_reason: str = ""
+    validators: dict[str, str] = field(default_factory=dict)
+    not_modified: bool = False
+    truncated: bool = False
+
+    @property
+    def needs_browser(self) -> bool:
+        return bool(self.escalate_reason)
+
+
+def _decode(body: bytes, content_type: str) -> str:
+    """依 Content-Type 或 <meta charset> 解碼"""
+    charset = None
+    match = re.search(r"charset=([\w-]+)", content_type, re.I)
+    if match:
+        charset = match.group(1)
+    else:
+        meta = _CHARSET_RE.search(body[:4096])
+        if meta:
+            charset = meta.group(1).decode("ascii", "ignore")
+    try:
+        return body.decode(charset or "utf-8", errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
+def is_public_address(address: str) -> bool:
+    """
+    確認 IP 為公開位址
+
+    Args:
+        address: IP 位址（IPv6 可帶 scope）
+
+    Returns:
+        是否為公開位址
+    """
+    return ipaddress.ip_address(address.split("%", 1)[0]).is_global
+
+
+def is_public_host(host: str) -> bool:
+    """
+    確認主機只解析到公開 IP（在 Lambda 內直接連線，避免存取內部網路）
+
+    Args:
+        host: 主機名稱
+
+    Returns:
+        是否為公開位址
+    """
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None)}
+    except OSError:
+        return False
+    return bool(addresses) and all(is_public_address(a) for a in addresses)
+
+
+class PrivateAddressError(urllib3.exceptions.HTTPError):
+    """連線時主機解析到非公開位址"""
+
+
+class _PublicAddressMixin:
+    """
+    建立連線時只解析一次主機，確認所有位址都是公開位址後連線到該 IP
+
+    Host header 與 TLS SNI / 憑證驗證仍使用原本的主機名稱；檢查與連線使用同一次解析結果，
+    DNS rebinding 無法在檢查之後改指向內部網路
+    """
+
+    def _new_conn(self) -> socket.socket:
+        try:
+            infos = socket.getaddrinfo(self._dns_host, self.port, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+
+        addresses = [info[4][0] for info in infos]
+        if not addresses or not all(is_public_address(a) for a in addresses):
+            raise PrivateAddressError(f"{self.host} resolves to a non-public address")
+
+        try:
+            return urllib3_connection.create_connection(
+                (addresses[0], self.port),
+                self.timeout,
+                source_address=self.source_address,
+                socket_options=self.socket_options,
+            )
+        except TimeoutError as e:
+            raise ConnectTimeoutError(
+                self, f"Connection to {self.host} timed out. (connect timeout={self.timeout})"
+            ) from e
+        except OSError as e:
+            raise NewConnectionError(self, f"Failed to establish a new connection: {e}") from e
+
+
+class _PublicHTTPConnection(_PublicAddressMixin, HTTPConnection):
+    pass
+
+
+class _PublicHTTPSConnection(_PublicAddressMixin, HTTPSConnection):
+    pass
+
+
+class _PublicHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    ConnectionCls = _PublicHTTPConnection
+
+
+class _PublicHTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+    ConnectionCls = _PublicHTTPSConnection
+
+
+class WebFetcher:
+    """
+    以連線池的 HTTP GET 擷取網頁主要內容（同一個 Lambda 容器內共用）
+
+    - 回應大小有上限，超過時只解析已讀取的部分
+    - 擷取結果依 URL 保留（LRU），再次擷取時以條件請求確認未變更
+    - 非公開位址、非 HTML、HTTP 錯誤與需要 JavaScript 的頁面標記為需要瀏覽器
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 2 * 1024 * 1024,
+        timeout: float = 8.0,
+        cache_size: int = 64,
+        pool_size: int = 4,
+        min_text_chars: int = 200,
+        allow_private: bool = False,
+    ):
+        """
+        初始化擷取器
+
+        Args:
+            max_bytes: 回應大小上限（位元組）
+            timeout: 讀取逾時（秒）
+            cache_size: 保留的擷取結果數量
+            pool_size: 每個主機的連線數
+            min_text_chars: 有 script 的頁面低於此字數時改用瀏覽器
+            allow_private: 是否允許非公開位址（測試用）
+        """
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.min_text_chars = min_text_chars
+        self.allow_private = allow_private
+
+        pool_kwargs = {
+            "num_pools": 16,
+            "maxsize": pool_size,
+            # 轉址由 fetch() 逐跳確認目標位址後手動跟隨
+            "retries": urllib3.Retry(total=1, redirect=0, raise_on_redirect=False),
+            "timeout": urllib3.Timeout(connect=min(3.0, timeout), read=timeout),
+            "headers": {
+                "User-Agent": USER_AGENT,
+                "Accept": "text/html,application/xhtml+xml,text/plain;q=0.9,*/*;q=0.5",
+                "Accept-Encoding": "gzip, deflate",
+            },
+        }
+        self._http = urllib3.PoolManager(**pool_kwargs)
+        # 連線時再確認一次位址（_allowed 的檢查與實際連線各自解析 DNS）
+        self._public_http = urllib3.PoolManager(**pool_kwargs)
+        self._public_http.pool_classes_by_scheme = {
+            "http": _PublicHTTPConnectionPool,
+            "https": _PublicHTTPSConnectionPool,
+        }
+        self._pages: OrderedDict[str, FetchedPage] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.fetches = 0
+        self.not_modified = 0
+        self.escalations = 0
+
+    def fetch(self, url: str, validators: dict[str, str] | None = None) -> FetchedPage:
+        """
+        擷取網頁（已擷取過的 URL 以條件請求重新驗證）
+
+        Args:
+            url: 網址
+            validators: 額外的 ETag / Last-Modified（例如其他容器寫入的快取項目）
+
+        Returns:
+            FetchedPage（未變更時 not_modified 為 True）
+
+        Raises:
+            urllib3.exceptions.HTTPError: 連線失敗或逾時
+        """
+        start = time.perf_counter()
+        if not self._allowed(url):
+            return self._record(FetchedPage(url, 0, escalate_reason="private_address"), start)
+
+        with self._lock:
+            cached = self._pages.get(url)
+        conditions = dict(validators or (cached.validators if cached else {}))
+
+        headers = {}
+        if conditions.get("etag"):
+            headers["If-None-Match"] = conditions["etag"]
+        if conditions.get("last_modified"):
+            headers["If-Modified-Since"] = conditions["last_modified"]
+
+        target = url
+        for _ in range(MAX_REDIRECTS + 1):
+            try:
+                http = self._http if self.allow_private else self._public_http
+                response = http.request(
+                    "GET",
+                    target,
+                    headers=headers,
+                    redirect=False,
+                    preload_content=False,
+                    decode_content=True,
+                )
+            except PrivateAddressError:
+                logger.warning(
+                    f"🚫 連線時解析到非公開位址: {urlsplit(target).hostname}",
+                    extra={"url": url, "event_type": "web_fetch_private_address"},
+                )
+                return self._record(FetchedPage(url, 0, escalate_reason="private_address"), start)
+            location = response.headers.get("Location")
+            if response.status not in _REDIRECT_STATUSES or not location:
+                break
+            response.drain_conn()
+            response.release_conn()
+            target = urljoin(target, location)
+            if not self._allowed(target):
+                logger.warning(
+                    f"🚫 拒絕轉址到非公開位址: {urlsplit(target).hostname}",
+                    extra={"url": url, "event_type": "web_fetch_redirect_blocked"},
+                )
+                return self._record(FetchedPage(url, 0, escalate_reason="private_address"), start)
+        else:
+            return self._record(FetchedPage(url, 0, escalate_reason="too_many_redirects"), start)
+
+        try:
+            if response.status == 304:
+                page = FetchedPage(
+                    url,
+                    304,
+                    title=cached.title if cached else "",
+                    text=cached.text if cached else "",
+                    escalate_reason=cached.escalate_reason if cached else "",
+                    validators=conditions,
+                    not_modified=True,
+                )
+                if cached:
+                    self._store(url, cached)
+                return self._record(page, start)
+
+            body, truncated = self._read(response)
+            page = self._build_page(url, response, body, truncated)
+        finally:
+            response.release_conn()
+
+        if page.status == 200:
+            self._store(url, page)
+        return self._record(page, start)
+
+    def validators(self, url: str) -> dict[str, str] | None:
+        """
+        取得 URL 的 ETag / Last-Modified（沒有擷取紀錄時先擷取一次）
+
+        Args:
+            url: 網址
+
+        Returns:
+            {"etag", "last_modified"}，伺服器未提供時為 None
+        """
+        with self._lock:
+            page = self._pages.get(url)
+        if page is None:
+            page = self.fetch(url)
+        return dict(page.validators) or None
+
+    def _allowed(self, url: str) -> bool:
+        """確認網址為 http(s) 且主機為公開位址（allow_private 時只檢查協定）"""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            return False
+        return self.allow_private or is_public_host(parts.hostname or "")
+
+    def clear(self) -> None:
+        """清空擷取結果（測試用）"""
+        with self._lock:
+            self._pages.clear()
+
+    def _read(self, response: Any) -> tuple[bytes, bool]:
+        """讀取回應內容（超過上限時截斷）"""
+        chunks = []
+        size = 0
+        for chunk in response.stream(_CHUNK_SIZE):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= self.max_bytes:
+                return b"".join(chunks)[: self.max_bytes], True
+        return b"".join(chunks), False
+
+    def _build_page(self, url: str, response: Any, body: bytes, truncated: bool) -> FetchedPage:
+        """解析 HTML 並判斷是否需要瀏覽器"""
+        validators = {
+            "etag": response.headers.get("ETag", ""),
+            "last_modified": response.headers.get("Last-Modified", ""),
+        }
+        page = FetchedPage(
+            url,
+            response.status,
+            validators={name: value for name, value in validators.items() if value},
+            truncated=truncated,
+        )
+
+        if response.status >= 400:
+            page.escalate_reason = f"http_{response.status}"
+            return page
+
+        content_type = response.headers.get("Content-Type", "")
+        if "text/plain" in content_type:
+            page.text = _decode(body, content_type).strip()
+        elif "html" in content_type or not content_type:
+            title, text, script_rendered = extract_readable(
+                _decode(body, content_type), self.min_text_chars
+            )
+            page.title, page.text = title, text
+            if script_rendered:
+                page.escalate_reason = "script_rendered"
+        else:
+            page.escalate_reason = "not_html"
+            return page
+
+        if not page.text:
+            page.escalate_reason = page.escalate_reason or "empty"
+        return page
+
+    def _store(self, url: str, page: FetchedPage) -> None:
+        with self._lock:
+            self._pages[url] = page
+            self._pages.move_to_end(url)
+            while len(self._pages) > self.cache_size:
+                self._pages.popitem(last=False)
+
+    def _record(self, page: FetchedPage, start: float) -> FetchedPage:
+        """記錄擷取結果（結構化日誌，供 CloudWatch Logs Insights 統計）"""
+        self.fetches += 1
+        if page.not_modified:
+            self.not_modified += 1
+        if page.needs_browser:
+            self.escalations += 1
+
+        outcome = (
+            "not_modified" if page.not_modified else "escalate" if page.needs_browser else "ok"
+        )
+        logger.info(
+            f"📰 HTTP 擷取 {outcome}: {page.url}"
+            + (f" ({page.escalate_reason})" if page.escalate_reason else ""),
+            extra={
+                "event_type": "web_fetch",
+                "outcome": outcome,
+                "reason": page.escalate_reason,
+                "status": page.status,
+                "truncated": page.truncated,
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+            },
+        )
+        return page
+
+    def get_stats(self) -> dict[str, Any]:
+        """
+        取得擷取統計
+
+        Returns:
+            統計資訊字典
+        """
+        return {
+            "cached": len(self._pages),
+            "fetches": self.fetches,
+            "not_modified": self.not_modified,
+            "escalations": self.escalations,
+        }
+
+
+# 全域網頁擷取器
+web_fetcher = WebFetcher(
+    max_bytes=settings.BROWSE_HTTP_MAX_BYTES,
+    timeout=settings.BROWSE_HTTP_TIMEOUT,
+    cache_size=settings.BROWSE_HTTP_CACHE_SIZE,
+    min_text_chars=settings.BROWSE_MIN_TEXT_CHARS,
+)
@@ -57,7 +57,7 @@ def invoke(payload, context):
             "response": result.get("response", "處理失敗"),
             "success": result.get("success", False),
             "memory_enabled": settings.MEMORY_ENABLED,
-            "model": settings.BEDROCK_MODEL_ID,
+            "model": result.get("model") or settings.BEDROCK_MODEL_ID,
             "region": settings.AWS_REGION,
             "timestamp": datetime.now().isoformat(),
         }
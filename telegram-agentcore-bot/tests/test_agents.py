@@ -3,10 +3,27 @@
 測試 ConversationAgent 類別的功能
 """
 
+import json
+import time
 import unittest
 from unittest.mock import Mock, patch
 
+from strands import Agent, tool
+from strands.models import Model
+from strands.types.exceptions import ModelThrottledException
+
+from agents.agent_pool import AgentPool
+from agents.bounded_tools import bound_tools, reset_tool_limiters
+from agents.context_window import (
+    IMAGE_OMITTED,
+    SUMMARY_TAG,
+    TOOL_RESULT_OMITTED,
+    ContextWindowManager,
+)
 from agents.conversation_agent import ConversationAgent
+from agents.model_router import SIMPLE, STANDARD, ModelRouter, classify_request, model_breaker
+from utils.circuit_breaker import reset_circuit_breakers
+from utils.stream_publisher import DeltaPublisher
 
 
 class TestConversationAgent(unittest.TestCase):
@@ -45,8 +62,21 @@ class TestConversationAgent(unittest.TestCase):
             session_manager=self.session_manager,
             system_prompt=unittest.mock.ANY,
             tools=self.tools,
+            retry_strategy=None,
+            conversation_manager=agent.context_window,
         )
 
+    def test_agent_without_internal_retries(self):
+        """測試 Agent 不使用 strands 內建的重試（只由 RetryHandler 重試）"""
+        from strands.models.bedrock import BedrockModel
+
+        agent = ConversationAgent(
+            self.tools, model=BedrockModel(model_id="model-a", region_name="us-east-1")
+        )
+
+        # strands 以 retry_strategy=None 關閉重試（只嘗試一次）
+        self.assertEqual(agent.agent._retry_strategy._max_attempts, 1)
+
     @patch("agents.conversation_agent.BedrockModel")
     @patch("agents.conversation_agent.Agent")
     def test_init_without_session_manager(self, mock_agent_class, mock_model_class):
@@ -264,6 +294,608 @@ class TestConversationAgent(unittest.TestCase):
         self.assertEqual(result, "直接字串")
 
 
+class TestAttachmentText(unittest.TestCase):
+    """測試附件處理結果以獨立文字區塊傳送"""
+
+    @patch("agents.conversation_agent.Agent")
+    def test_attachment_text_is_separate_block(self, mock_agent_class):
+        mock_agent = Mock()
+        mock_agent.return_value = Mock(message={"content": [{"text": "ok"}]})
+        mock_agent_class.return_value = mock_agent
+
+        agent = ConversationAgent([Mock()], model=Mock())
+        agent.process_message("幫我看這份報告", attachment_text="📄 檔案摘要")
+
+        mock_agent.assert_called_once_with([{"text": "幫我看這份報告"}, {"text": "📄 檔案摘要"}])
+
+
+class TestAgentPool(unittest.TestCase):
+    """測試 AgentPool 類別"""
+
+    def test_acquire_miss_then_hit(self):
+        """測試第一次建立、第二次重用"""
+        pool = AgentPool(max_size=4, idle_ttl=60)
+        factory = Mock(side_effect=lambda: Mock())
+
+        agent1, hit1 = pool.acquire("actor-1", "session-1", factory)
+        agent2, hit2 = pool.acquire("actor-1", "session-1", factory)
+
+        self.assertFalse(hit1)
+        self.assertTrue(hit2)
+        self.assertIs(agent1, agent2)
+        factory.assert_called_once()
+        self.assertEqual(pool.get_stats()["hits"], 1)
+        self.assertEqual(pool.get_stats()["misses"], 1)
+
+    def test_separate_sessions(self):
+        """測試不同 (actor, session) 使用不同 Agent"""
+        pool = AgentPool(max_size=4, idle_ttl=60)
+
+        agent1, _ = pool.acquire("actor-1", "session-1", Mock)
+        agent2, _ = pool.acquire("actor-1", "session-2", Mock)
+        agent3, _ = pool.acquire("actor-2", "session-1", Mock)
+
+        self.assertIsNot(agent1, agent2)
+        self.assertIsNot(agent1, agent3)
+        self.assertEqual(len(pool), 3)
+
+    def test_evict_by_size(self):
+        """測試超過容量時淘汰最久未使用的 Agent"""
+        pool = AgentPool(max_size=2, idle_ttl=60)
+
+        pool.acquire("a", "1", Mock)
+        pool.acquire("a", "2", Mock)
+        pool.acquire("a", "1", Mock)  # 讓 "1" 成為最近使用
+        pool.acquire("a", "3", Mock)
+
+        self.assertEqual(len(pool), 2)
+        _, hit = pool.acquire("a", "1", Mock)
+        self.assertTrue(hit)
+        _, hit = pool.acquire("a", "2", Mock)
+        self.assertFalse(hit)
+
+    @patch("agents.agent_pool.time.monotonic")
+    def test_evict_by_idle_time(self, mock_monotonic):
+        """測試閒置過久的 Agent 被淘汰"""
+        pool = AgentPool(max_size=4, idle_ttl=10)
+
+        mock_monotonic.return_value = 100.0
+        pool.acquire("a", "1", Mock)
+
+        mock_monotonic.return_value = 111.0
+        _, hit = pool.acquire("a", "1", Mock)
+
+        self.assertFalse(hit)
+
+    def test_discard(self):
+        """測試移除指定 Agent"""
+        pool = AgentPool(max_size=4, idle_ttl=60)
+        pool.acquire("a", "1", Mock)
+
+        pool.discard("a", "1")
+
+        self.assertEqual(len(pool), 0)
+
+    @patch("agents.conversation_agent.BedrockModel")
+    @patch("agents.conversation_agent.Agent")
+    def test_conversation_agent_uses_shared_model(self, mock_agent_class, mock_model_class):
+        """測試注入共用模型時不再建立新的 BedrockModel"""
+        shared_model = Mock()
+
+        agent = ConversationAgent([Mock()], model=shared_model)
+
+        mock_model_class.assert_not_called()
+        self.assertIs(agent.model, shared_model)
+        self.assertIs(mock_agent_class.call_args.kwargs["model"], shared_model)
+
+    @patch("agents.conversation_agent.BedrockModel")
+    @patch("agents.conversation_agent.Agent")
+    def test_swap_session_manager_keeps_messages(self, mock_agent_class, mock_model_class):
+        """測試替換 Session Manager 時保留對話訊息"""
+        first_agent = Mock()
+        first_agent.messages = [{"role": "user", "content": [{"text": "hi"}]}]
+        mock_agent_class.side_effect = [first_agent, Mock()]
+
+        agent = ConversationAgent([Mock()], model=Mock())
+        new_session_manager = Mock()
+        agent.swap_session_manager(new_session_manager)
+
+        self.assertIs(agent.session_manager, new_session_manager)
+        second_call = mock_agent_class.call_args_list[1].kwargs
+        self.assertIs(second_call["session_manager"], new_session_manager)
+        self.assertEqual(second_call["messages"], first_agent.messages)
+
+
+class TestStreaming(unittest.TestCase):
+    """測試串流輸出（message.delta）"""
+
+    def setUp(self):
+        """測試前準備"""
+        self.now = 0.0
+        self.published = []
+
+        def publish(text, sequence):
+            self.published.append((text, sequence))
+            return True
+
+        self.publisher = DeltaPublisher(
+            publish=publish, min_interval=1.0, min_chars=5, clock=lambda: self.now
+        )
+
+    def test_first_chunk_published_immediately(self):
+        """測試第一個片段立即發布"""
+        self.publisher(data="你好")
+
+        self.assertEqual(self.published, [("你好", 1)])
+
+    def test_throttled_by_interval_and_chars(self):
+        """測試依時間間隔與字元數節流"""
+        self.publisher(data="開始")
+        self.publisher(data="，這是很長的一段文字")  # 間隔不足
+        self.now = 2.0
+        self.publisher(data="!")  # 間隔足夠，累積字元足夠
+        self.now = 4.0
+        self.publisher(data="?")  # 間隔足夠，新增字元不足
+
+        self.assertEqual(len(self.published), 2)
+        self.assertEqual(self.published[-1], ("開始，這是很長的一段文字!", 2))
+
+    def test_non_text_events_ignored(self):
+        """測試忽略非文字事件"""
+        self.publisher(current_tool_use={"name": "calculate"})
+        self.publisher(result=Mock())
+
+        self.assertEqual(self.published, [])
+
+    def test_publish_failure_does_not_raise(self):
+        """測試發布失敗不影響處理"""
+        publisher = DeltaPublisher(publish=Mock(side_effect=Exception("boom")))
+        publisher(data="文字")
+
+        self.assertEqual(publisher.get_stats()["stream_deltas_failed"], 1)
+
+    @patch("agents.conversation_agent.Agent")
+    def test_stream_handler_swapped_per_call(self, mock_agent_class):
+        """測試處理期間替換 callback_handler，結束後還原"""
+        mock_agent = Mock()
+        original_handler = Mock()
+        mock_agent.callback_handler = original_handler
+        seen_handlers = []
+
+        def run(content):
+            seen_handlers.append(mock_agent.callback_handler)
+            mock_agent.callback_handler(data="串流回應")
+            result = Mock()
+            result.message = {"role": "assistant", "content": [{"text": "串流回應"}]}
+            return result
+
+        mock_agent.side_effect = run
+        mock_agent_class.return_value = mock_agent
+
+        agent = ConversationAgent([Mock()], model=Mock())
+        result = agent.process_message("測試", stream_handler=self.publisher)
+
+        self.assertTrue(result["success"])
+        self.assertIs(seen_handlers[0], self.publisher)
+        self.assertIs(mock_agent.callback_handler, original_handler)
+        self.assertEqual(self.published, [("串流回應", 1)])
+
+
+class TestContextWindowManager(unittest.TestCase):
+    """測試 context 視窗管理"""
+
+    @staticmethod
+    def make_image(width, height):
+        import io
+
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new("RGB", (width, height)).save(buffer, "PNG")
+        return buffer.getvalue()
+
+    @staticmethod
+    def tool_turn(index, result_text):
+        """一個使用工具的完整回合（4 則訊息）"""
+        return [
+            {"role": "user", "content": [{"text": f"問題 {index}"}]},
+            {
+                "role": "assistant",
+                "content": [{"toolUse": {"toolUseId": f"t{index}", "name": "browse", "input": {}}}],
+            },
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "toolResult": {
+                            "toolUseId": f"t{index}",
+                            "content": [{"text": result_text}],
+                            "status": "success",
+                        }
+                    }
+                ],
+            },
+            {"role": "assistant", "content": [{"text": f"回答 {index}"}]},
+        ]
+
+    def test_under_budget_is_untouched(self):
+        messages = self.tool_turn(1, "短結果")
+        manager = ContextWindowManager(token_budget=100000)
+        self.assertEqual(manager.enforce_budget(messages), [])
+        self.assertEqual(messages, self.tool_turn(1, "短結果"))
+
+    def test_cap_memory(self):
+        memory = "\n".join(f"記憶 {i} " + "內容" * 50 for i in range(100))
+        messages = [
+            {
+                "role": "user",
+                "content": [{"text": f"<user_context>{memory}</user_context>"}, {"text": "hi"}],
+            }
+        ]
+        manager = ContextWindowManager(token_budget=100000, memory_max_tokens=500)
+
+        self.assertEqual(manager.enforce_budget(messages), ["cap_memory"])
+        capped = messages[0]["content"][0]["text"]
+        self.assertTrue(capped.startswith("<user_context>記憶 0"))
+        self.assertTrue(capped.endswith("</user_context>"))
+        self.assertLess(len(capped), len(memory) // 5)
+        self.assertEqual(messages[0]["content"][1], {"text": "hi"})
+
+    def test_compress_old_tool_results_keeps_current_turn(self):
+        large = "data " * 20000
+        messages = self.tool_turn(1, large) + self.tool_turn(2, large)
+        manager = ContextWindowManager(token_budget=30000, tool_result_max_tokens=100)
+
+        applied = manager.enforce_budget(messages)
+
+        self.assertEqual(applied, ["compress_tool_results"])
+        old_result = messages[2]["content"][0]["toolResult"]
+        self.assertIn("已截斷", old_result["content"][0]["text"])
+        self.assertEqual(old_result["toolUseId"], "t1")
+        # 目前回合的工具結果不受影響
+        self.assertEqual(messages[6]["content"][0]["toolResult"]["content"][0]["text"], large)
+
+    def test_drop_tool_results_when_compression_is_not_enough(self):
+        messages = []
+        for index in range(5):
+            messages += self.tool_turn(index, "data " * 2000)
+        manager = ContextWindowManager(
+            token_budget=3000, tool_result_max_tokens=1000, keep_turns=10
+        )
+
+        applied = manager.enforce_budget(messages)
+
+        self.assertIn("drop_tool_results", applied)
+        self.assertEqual(
+            messages[2]["content"][0]["toolResult"]["content"], [{"text": TOOL_RESULT_OMITTED}]
+        )
+
+    def test_downsample_old_images(self):
+        image = {"image": {"format": "png", "source": {"bytes": self.make_image(2000, 1500)}}}
+        messages = [
+            {"role": "user", "content": [image, {"text": "看圖"}]},
+            {"role": "assistant", "content": [{"text": "好的"}]},
+            {"role": "user", "content": [{"text": "下一題"}]},
+        ]
+        manager = ContextWindowManager(token_budget=1000, image_max_edge=256)
+
+        applied = manager.enforce_budget(messages)
+
+        self.assertEqual(applied[0], "downsample_images")
+        resized = messages[0]["content"][0]["image"]
+        from utils.file_types import image_dimensions
+
+        self.assertEqual(image_dimensions(resized["source"]["bytes"]), (256, 192))
+
+    def test_unreadable_image_is_replaced(self):
+        image = {"image": {"format": "png", "source": {"bytes": b"\x00" * 100}}}
+        messages = [
+            {"role": "user", "content": [image, {"text": "看圖"}]},
+            {"role": "assistant", "content": [{"text": "好的"}]},
+            {"role": "user", "content": [{"text": "下一題"}]},
+        ]
+        manager = ContextWindowManager(token_budget=1000)
+        manager._downsample_images(messages)
+        self.assertEqual(messages[0]["content"][0], {"text": IMAGE_OMITTED})
+
+    def test_summarize_old_turns(self):
+        messages = []
+        for index in range(6):
+            messages += [
+                {"role": "user", "content": [{"text": f"問題 {index} " + "內容" * 3000}]},
+                {"role": "assistant", "content": [{"text": f"回答 {index}"}]},
+            ]
+        manager = ContextWindowManager(token_budget=15000, keep_turns=2)
+
+        applied = manager.enforce_budget(messages)
+
+        self.assertIn("summarize_history", applied)
+        self.assertEqual(len(messages), 4)
+        self.assertEqual(manager.removed_message_count, 8)
+        summary_block = messages[0]["content"][0]["text"]
+        self.assertTrue(summary_block.startswith(f"<{SUMMARY_TAG}>使用者: 問題 0"))
+        self.assertIn("助理: 回答 3", summary_block)
+        self.assertTrue(messages[0]["content"][1]["text"].startswith("問題 4"))
+
+    def test_window_overflow_folds_into_summary(self):
+        messages = []
+        for index in range(6):
+            messages += self.tool_turn(index, "ok")
+        agent = Mock(messages=messages)
+        manager = ContextWindowManager(token_budget=100000, window_size=10)
+
+        manager.apply_management(agent)
+
+        self.assertLessEqual(len(messages), 10)
+        self.assertTrue(messages[0]["content"][0]["text"].startswith(f"<{SUMMARY_TAG}>"))
+        self.assertIn("助理使用工具: browse", manager.summary)
+
+    def test_summary_survives_session_restore(self):
+        manager = ContextWindowManager(token_budget=100000)
+        manager.summary = "使用者: 之前的問題"
+        restored = ContextWindowManager(token_budget=100000)
+        restored.restore_from_session(manager.get_state())
+
+        messages = [{"role": "user", "content": [{"text": "新問題"}]}]
+        restored.enforce_budget(messages)
+        self.assertEqual(
+            messages[0]["content"][0]["text"],
+            f"<{SUMMARY_TAG}>使用者: 之前的問題</{SUMMARY_TAG}>",
+        )
+
+
+class TestModelRouter(unittest.TestCase):
+    """測試模型路由與備援"""
+
+    def setUp(self):
+        reset_circuit_breakers()
+        self.router = ModelRouter(
+            primary_model_id="primary",
+            fast_model_id="fast",
+            fallback_model_ids=["backup"],
+        )
+
+    def tearDown(self):
+        reset_circuit_breakers()
+
+    def test_classify_request(self):
+        """測試以規則判斷請求複雜度"""
+        self.assertEqual(classify_request("你好")[0], SIMPLE)
+        self.assertEqual(classify_request("thanks!")[0], SIMPLE)
+        self.assertEqual(classify_request("看一下 https://example.com"), (STANDARD, "tool_hint"))
+        self.assertEqual(classify_request("12 * 34 是多少"), (STANDARD, "tool_hint"))
+        self.assertEqual(classify_request("台北天氣如何"), (STANDARD, "tool_hint"))
+        self.assertEqual(classify_request("嗨", has_images=True), (STANDARD, "images"))
+        self.assertEqual(classify_request("嗨", has_attachments=True), (STANDARD, "attachments"))
+        self.assertEqual(classify_request("字" * 200), (STANDARD, "length"))
+
+    def test_simple_request_uses_fast_model(self):
+        """測試簡單請求優先使用快速模型"""
+        route = self.router.route("早安")
+        self.assertEqual(route.tier, SIMPLE)
+        self.assertEqual(route.models, ["fast", "primary", "backup"])
+
+    def test_standard_request_uses_primary_model(self):
+        """測試一般請求使用主要模型，並附上備援順序"""
+        route = self.router.route("幫我搜尋最新的新聞")
+        self.assertEqual(route.models, ["primary", "backup"])
+
+        route = self.router.route("幫我搜尋", primary_model_id="injected")
+        self.assertEqual(route.models, ["injected", "backup"])
+
+    def test_open_breaker_moves_model_last(self):
+        """測試斷路器開啟中的模型排到最後"""
+        breaker = model_breaker("primary")
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+
+        route = self.router.route("幫我搜尋最新的新聞")
+        self.assertEqual(route.models, ["backup", "primary"])
+
+    def test_disabled_router_uses_primary_only(self):
+        """測試停用時只使用主要模型"""
+        router = ModelRouter("primary", fast_model_id="fast", enabled=False)
+        self.assertEqual(router.route("早安").models, ["primary"])
+
+    @patch("agents.conversation_agent.get_shared_model")
+    @patch("agents.conversation_agent.Agent")
+    def test_throttled_model_falls_back(self, mock_agent_class, mock_get_shared_model):
+        """測試 throttling 時改用備援模型，並回報實際使用的模型"""
+        primary_model = Mock()
+        primary_model.get_config.return_value = {"model_id": "primary"}
+        backup_model = Mock()
+        mock_get_shared_model.return_value = backup_model
+
+        result = Mock()
+        result.message = {"content": [{"text": "備援模型的回應"}]}
+        served_by = []
+
+        def invoke(content):
+            served_by.append(mock_agent.model)
+            if mock_agent.model is primary_model:
+                raise Exception("ThrottlingException: Too many requests")
+            return result
+
+        mock_agent = Mock(side_effect=invoke)
+        mock_agent_class.return_value = mock_agent
+
+        agent = ConversationAgent([], model=primary_model)
+        mock_agent.model = primary_model
+
+        with patch("agents.conversation_agent.model_router", self.router):
+            response = agent.process_message("幫我搜尋最新的新聞")
+
+        self.assertTrue(response["success"])
+        self.assertEqual(response["response"], "備援模型的回應")
+        self.assertEqual(response["model"], "backup")
+        self.assertEqual(served_by, [primary_model, backup_model])
+        mock_get_shared_model.assert_called_once_with("backup")
+        # 池中的 Agent 仍使用原本的模型
+        self.assertIs(mock_agent.model, primary_model)
+
+    @patch("agents.conversation_agent.get_shared_model")
+    @patch("agents.conversation_agent.Agent")
+    def test_non_transient_error_does_not_fall_back(self, mock_agent_class, mock_get_shared_model):
+        """測試與請求本身有關的錯誤不改用備援模型"""
+        primary_model = Mock()
+        primary_model.get_config.return_value = {"model_id": "primary"}
+        mock_agent = Mock(side_effect=ValueError("ValidationException: bad input"))
+        mock_agent_class.return_value = mock_agent
+
+        agent = ConversationAgent([], model=primary_model)
+        with patch("agents.conversation_agent.model_router", self.router):
+            response = agent.process_message("幫我搜尋最新的新聞")
+
+        self.assertFalse(response["success"])
+        self.assertEqual(response["model"], "primary")
+        mock_get_shared_model.assert_not_called()
+
+    @patch("agents.conversation_agent.get_shared_model")
+    def test_throttled_primary_switches_within_one_attempt(self, mock_get_shared_model):
+        """測試主要模型 throttling 時只嘗試一次就改用備援模型（不經 strands 內建重試）"""
+        primary_model = CountingModel("primary", throttled=True)
+        backup_model = CountingModel("backup")
+        mock_get_shared_model.return_value = backup_model
+
+        agent = ConversationAgent([], model=primary_model)
+        start = time.perf_counter()
+        with patch("agents.conversation_agent.model_router", self.router):
+            response = agent.process_message("幫我搜尋最新的新聞")
+
+        self.assertTrue(response["success"])
+        self.assertEqual(response["model"], "backup")
+        self.assertEqual(primary_model.calls, 1)
+        self.assertEqual(backup_model.calls, 1)
+        self.assertLess(time.perf_counter() - start, 2.0)
+
+
+class CountingModel(Model):
+    """記錄呼叫次數的模型，throttled 時每次呼叫都回傳 throttling 錯誤"""
+
+    def __init__(self, model_id, throttled=False):
+        self.model_id = model_id
+        self.throttled = throttled
+        self.calls = 0
+
+    def update_config(self, **model_config):
+        pass
+
+    def get_config(self):
+        return {"model_id": self.model_id}
+
+    async def structured_output(self, *args, **kwargs):
+        raise NotImplementedError
+
+    async def stream(self, messages, tool_specs=None, system_prompt=None, **kwargs):
+        self.calls += 1
+        if self.throttled:
+            raise ModelThrottledException("ThrottlingException: Too many requests")
+        yield {"messageStart": {"role": "assistant"}}
+        yield {"contentBlockDelta": {"delta": {"text": f"{self.model_id} 的回應"}}}
+        yield {"contentBlockStop": {}}
+        yield {"messageStop": {"stopReason": "end_turn"}}
+
+
+class ScriptedModel(Model):
+    """第一次回應要求指定的工具呼叫，之後回覆文字"""
+
+    def __init__(self, tool_calls):
+        self.tool_calls = tool_calls
+        self.calls = 0
+
+    def update_config(self, **model_config):
+        pass
+
+    def get_config(self):
+        return {"model_id": "scripted"}
+
+    async def structured_output(self, *args, **kwargs):
+        raise NotImplementedError
+
+    async def stream(self, messages, tool_specs=None, system_prompt=None, **kwargs):
+        self.calls += 1
+        yield {"messageStart": {"role": "assistant"}}
+        if self.calls == 1:
+            for index, (name, args) in enumerate(self.tool_calls):
+                yield {
+                    "contentBlockStart": {
+                        "start": {"toolUse": {"toolUseId": f"t{index}", "name": name}}
+                    }
+                }
+                yield {"contentBlockDelta": {"delta": {"toolUse": {"input": json.dumps(args)}}}}
+                yield {"contentBlockStop": {}}
+            yield {"messageStop": {"stopReason": "tool_use"}}
+        else:
+            yield {"contentBlockDelta": {"delta": {"text": "完成"}}}
+            yield {"contentBlockStop": {}}
+            yield {"messageStop": {"stopReason": "end_turn"}}
+
+
+@tool
+def slow_lookup(city: str) -> str:
+    """
+    模擬耗時的查詢
+
+    Args:
+        city: 城市名稱
+    """
+    time.sleep(0.3)
+    return f"{city} 晴天"
+
+
+class TestBoundedTools(unittest.TestCase):
+    """測試同一回應中的多個工具並行執行"""
+
+    def setUp(self):
+        reset_tool_limiters()
+
+    def tearDown(self):
+        reset_tool_limiters()
+
+    def run_turn(self):
+        """執行一個要求三個工具呼叫的回合，回傳 (耗時, 工具結果文字)"""
+        model = ScriptedModel(
+            [("slow_lookup", {"city": city}) for city in ["台北", "台中", "高雄"]]
+        )
+        agent = Agent(model=model, tools=bound_tools([slow_lookup]), callback_handler=None)
+
+        start = time.perf_counter()
+        agent("查三個城市的天氣")
+        elapsed = time.perf_counter() - start
+
+        results = [
+            block["toolResult"]["content"][0]["text"]
+            for message in agent.messages
+            for block in message["content"]
+            if "toolResult" in block
+        ]
+        return elapsed, results
+
+    def test_tools_run_concurrently_in_order(self):
+        """測試工具並行執行，結果維持原本順序"""
+        elapsed, results = self.run_turn()
+
+        self.assertLess(elapsed, 0.8)  # 依序執行需要 0.9 秒以上
+        self.assertEqual(results, ["台北 晴天", "台中 晴天", "高雄 晴天"])
+
+    def test_per_tool_concurrency_limit(self):
+        """測試各工具的並行上限"""
+        with patch("agents.bounded_tools.settings.TOOL_CONCURRENCY_LIMITS", "slow_lookup=1"):
+            elapsed, results = self.run_turn()
+
+        self.assertGreaterEqual(elapsed, 0.9)
+        self.assertEqual(results, ["台北 晴天", "台中 晴天", "高雄 晴天"])
+
+    def test_per_call_timeout(self):
+        """測試單次呼叫逾時回傳錯誤結果，回合繼續完成"""
+        with patch("agents.bounded_tools.settings.TOOL_TIMEOUTS", "slow_lookup=0.1"):
+            elapsed, results = self.run_turn()
+
+        self.assertLess(elapsed, 0.6)
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all("逾時" in text for text in results))
+
+
 class TestAgentsModule(unittest.TestCase):
     """測試 agents 模組的導入"""
 
@@ -2,15 +2,36 @@
 測試錯誤處理和重試機制
 """
 
-from botocore.exceptions import ClientError, EventStreamError
+import threading
+import time
+from datetime import UTC, datetime
+from unittest.mock import Mock, patch
+
+from botocore.exceptions import (
+    ClientError,
+    EndpointConnectionError,
+    EventStreamError,
+    ReadTimeoutError,
+)
 
+from agents.conversation_agent import ConversationAgent
+from utils.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    get_circuit_breaker,
+    reset_circuit_breakers,
+)
 from utils.context_analyzer import analyze_context_size, estimate_tokens, should_truncate_context
+from utils.deadline import Deadline, message_age
 from utils.error_messages import (
     format_error_response,
     get_user_friendly_error,
     should_suggest_new_conversation,
 )
-from utils.retry_handler import RetryHandler
+from utils.retry_handler import RetryHandler, is_transient_error
 
 
 class TestErrorMessages:
@@ -169,6 +190,27 @@ class TestRetryHandler:
         )
         assert handler._is_retryable(error) is True
 
+    def test_is_retryable_service_errors(self):
+        """測試 5xx、模型未就緒與連線錯誤可重試（依錯誤碼判斷）"""
+        handler = RetryHandler()
+        for code in (
+            "ServiceUnavailableException",
+            "InternalServerException",
+            "ModelNotReadyException",
+            "ModelTimeoutException",
+        ):
+            error = ClientError({"Error": {"Code": code, "Message": "try later"}}, "ConverseStream")
+            assert handler._is_retryable(error) is True, code
+            assert is_transient_error(error) is True, code
+
+        assert handler._is_retryable(EndpointConnectionError(endpoint_url="https://x")) is True
+        assert handler._is_retryable(ReadTimeoutError(endpoint_url="https://x")) is True
+
+        validation = ClientError(
+            {"Error": {"Code": "ValidationException", "Message": "bad"}}, "ConverseStream"
+        )
+        assert handler._is_retryable(validation) is False
+
     def test_calculate_delay(self):
         """測試延遲計算"""
         handler = RetryHandler(base_delay=2.0)
@@ -178,6 +220,244 @@ class TestRetryHandler:
         assert handler._calculate_delay(10) == 10.0  # 最大 10 秒
 
 
+class TestDeadlineAwareRetry:
+    """測試有期限與斷路器的重試"""
+
+    @staticmethod
+    def throttled():
+        return ClientError({"Error": {"Code": "ThrottlingException", "Message": "slow down"}}, "Op")
+
+    def test_backoff_uses_full_jitter(self):
+        """測試等待時間在 0 到指數退避上限之間隨機分布"""
+        handler = RetryHandler(base_delay=2.0)
+        delays = [handler._backoff(3) for _ in range(200)]
+        assert all(0 <= delay <= 8.0 for delay in delays)
+        assert len(set(delays)) > 1
+
+    def test_generic_retryable_error_is_retried(self):
+        """測試非 botocore 的 throttling 錯誤也會重試"""
+        handler = RetryHandler(max_attempts=2, base_delay=0)
+        func = Mock(side_effect=[Exception("ModelThrottledException: throttled"), "ok"])
+
+        result = handler.execute_with_retry(func)
+
+        assert result["success"] is True
+        assert result["attempts"] == 2
+
+    def test_stops_retrying_when_deadline_is_near(self):
+        """測試剩餘時間不足以再嘗試一次時停止重試與降級"""
+        handler = RetryHandler(max_attempts=3, base_delay=0, min_attempt_seconds=20)
+        func = Mock(side_effect=self.throttled())
+        fallback = Mock()
+
+        result = handler.execute_with_retry(
+            func, fallback_func=fallback, deadline=Deadline.after(10)
+        )
+
+        assert result["success"] is False
+        assert func.call_count == 1
+        fallback.assert_not_called()
+
+    def test_retries_when_time_allows(self):
+        """測試時間足夠時照常重試"""
+        handler = RetryHandler(max_attempts=3, base_delay=0, min_attempt_seconds=20)
+        func = Mock(side_effect=[self.throttled(), "ok"])
+
+        result = handler.execute_with_retry(func, deadline=Deadline.after(300))
+
+        assert result["success"] is True
+        assert func.call_count == 2
+
+    def test_open_breaker_fails_fast(self):
+        """測試斷路器開啟時不呼叫函數，也不執行降級"""
+        handler = RetryHandler(max_attempts=3, base_delay=0)
+        breaker = CircuitBreaker("model", failure_threshold=2, recovery_timeout=30)
+        func = Mock(side_effect=self.throttled())
+        fallback = Mock()
+
+        first = handler.execute_with_retry(func, breaker=breaker)
+        assert first["success"] is False
+        assert breaker.state == OPEN
+        assert func.call_count == 2  # 第二次失敗後開啟，第三次不再呼叫
+
+        second = handler.execute_with_retry(func, fallback_func=fallback, breaker=breaker)
+        assert second["error_type"] == "CircuitOpenError"
+        assert func.call_count == 2
+        fallback.assert_not_called()
+        assert "半分鐘" in get_user_friendly_error(second["error"])
+
+    def test_non_retryable_error_does_not_trip_breaker(self):
+        """測試不可重試的錯誤不計入斷路器"""
+        handler = RetryHandler(max_attempts=3, base_delay=0)
+        breaker = CircuitBreaker("model", failure_threshold=1)
+
+        handler.execute_with_retry(Mock(side_effect=ValueError("bad input")), breaker=breaker)
+
+        assert breaker.state == CLOSED
+
+    def test_brownout_opens_breaker(self):
+        """測試 5xx 降級時斷路器會開啟"""
+        handler = RetryHandler(max_attempts=3, base_delay=0)
+        breaker = CircuitBreaker("model", failure_threshold=2)
+        error = ClientError(
+            {"Error": {"Code": "ServiceUnavailableException", "Message": "unavailable"}},
+            "ConverseStream",
+        )
+
+        handler.execute_with_retry(Mock(side_effect=error), breaker=breaker)
+
+        assert breaker.state == OPEN
+
+    def test_non_retryable_error_does_not_reset_failures(self):
+        """測試不可重試的錯誤不重設失敗次數，也不關閉 half_open 的斷路器"""
+        handler = RetryHandler(max_attempts=1, base_delay=0)
+        breaker = CircuitBreaker("model", failure_threshold=2, recovery_timeout=0.05)
+        breaker.record_failure()
+
+        handler.execute_with_retry(Mock(side_effect=ValueError("bad input")), breaker=breaker)
+        assert breaker.get_stats()["failures"] == 1
+
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        time.sleep(0.06)
+        handler.execute_with_retry(Mock(side_effect=ValueError("bad input")), breaker=breaker)
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow() is True  # 試探名額已釋放
+
+
+class TestCircuitBreaker:
+    """測試斷路器"""
+
+    def test_half_open_allows_single_probe(self):
+        breaker = CircuitBreaker("model", failure_threshold=1, recovery_timeout=0.05)
+        breaker.record_failure()
+        assert breaker.allow() is False
+
+        time.sleep(0.06)
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow() is True
+        assert breaker.allow() is False  # 試探呼叫進行中
+
+        breaker.record_success()
+        assert breaker.state == CLOSED
+        assert breaker.allow() is True
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker("model", failure_threshold=3, recovery_timeout=0.05)
+        for _ in range(3):
+            breaker.record_failure()
+        time.sleep(0.06)
+        assert breaker.allow() is True
+
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert breaker.get_stats()["opened"] == 2
+
+    def test_breakers_shared_per_model(self):
+        reset_circuit_breakers()
+        assert get_circuit_breaker("model-a") is get_circuit_breaker("model-a")
+        assert get_circuit_breaker("model-a") is not get_circuit_breaker("model-b")
+        reset_circuit_breakers()
+
+    def test_circuit_open_error_message(self):
+        error = CircuitOpenError("model", 12.3)
+        assert "Circuit open" in str(error)
+        assert error.retry_after == 12.3
+
+
+class TestDeadline:
+    """測試處理期限"""
+
+    def test_from_lambda_context(self):
+        context = Mock()
+        context.get_remaining_time_in_millis.return_value = 30000
+        deadline = Deadline.from_context(context)
+        assert 29 < deadline.remaining() <= 30
+        assert deadline.expired(reserve=31) is True
+
+    def test_missing_context(self):
+        assert Deadline.from_context(None) is None
+        assert (
+            Deadline.from_context(Mock(get_remaining_time_in_millis=Mock(return_value=Mock())))
+            is None
+        )
+
+    def test_from_message(self):
+        """測試從標準化訊息的 routing.expiresAt 取得期限"""
+        deadline = Deadline.from_message({"routing": {"expiresAt": time.time() + 60}})
+        assert 59 < deadline.remaining() <= 60
+        assert Deadline.from_message({"routing": {"priority": "normal"}}) is None
+        assert Deadline.from_message({}) is None
+
+    def test_earliest(self):
+        soon, later = Deadline.after(5), Deadline.after(50)
+        assert Deadline.earliest(later, None, soon) is soon
+        assert Deadline.earliest(None, None) is None
+
+    def test_message_age(self):
+        received = datetime.fromtimestamp(time.time() - 90, tz=UTC)
+        message = {"timestamp": received.replace(tzinfo=None).isoformat() + "Z"}
+        assert 89 < message_age(message) < 91
+        assert message_age({"timestamp": "not-a-time"}) is None
+        assert message_age({}) is None
+
+
+class SlowAgent:
+    """模擬執行到被取消為止的 Agent"""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.callback_handler = None
+        self.messages = []
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def __call__(self, content):
+        self.cancelled.wait(5)
+        return Mock(stop_reason="cancelled")
+
+
+class TestDeadlineReply:
+    """測試期限將至時的回覆"""
+
+    def setup_method(self):
+        reset_circuit_breakers()
+
+    @patch("agents.conversation_agent.Agent")
+    def test_cancelled_turn_replies_still_working(self, mock_agent_class):
+        slow_agent = SlowAgent()
+        mock_agent_class.return_value = slow_agent
+        agent = ConversationAgent([], model=Mock())
+
+        start = time.perf_counter()
+        result = agent.process_message("長時間的問題", deadline=Deadline.after(0.1))
+
+        assert time.perf_counter() - start < 2
+        assert slow_agent.cancelled.is_set()
+        assert result["success"] is True
+        assert result["deadline_exceeded"] is True
+        assert "處理時間" in result["response"]
+
+    @patch("agents.conversation_agent.Agent")
+    def test_cancelled_turn_returns_partial_stream(self, mock_agent_class):
+        mock_agent_class.return_value = SlowAgent()
+        agent = ConversationAgent([], model=Mock())
+        stream_handler = Mock(text="")
+
+        def reset():
+            stream_handler.text = "目前的部分答案"
+
+        stream_handler.reset.side_effect = reset
+
+        result = agent.process_message(
+            "長時間的問題", stream_handler=stream_handler, deadline=Deadline.after(0.1)
+        )
+
+        assert result["response"].startswith("目前的部分答案")
+        assert "以上是目前的進度" in result["response"]
+
+
 class TestContextAnalyzer:
     """測試 Context 分析器"""
 
@@ -186,7 +466,7 @@ class TestContextAnalyzer:
         text = "測試" * 100  # 200 字元
         tokens = estimate_tokens(text)
         assert tokens > 0
-        assert tokens == 80  # 200 / 2.5 = 80
+        assert tokens == 240  # 200 個 CJK 字元 × 1.2
 
     def test_estimate_tokens_with_dict(self):
         """測試字典的 token 估算"""
@@ -209,14 +489,14 @@ class TestContextAnalyzer:
 
     def test_analyze_context_size_warning(self):
         """測試 warning 級別"""
-        large_text = "x" * 300000  # ~120K tokens (確保超過 100K)
+        large_text = "測試" * 50000  # ~120K tokens (確保超過 100K)
         analysis = analyze_context_size(messages=large_text)
         assert analysis["warning_level"] == "warning"
         assert analysis["is_large"] is True
 
     def test_analyze_context_size_critical(self):
         """測試 critical 級別"""
-        huge_text = "x" * 400000  # ~160K tokens
+        huge_text = "測試" * 70000  # ~168K tokens
         analysis = analyze_context_size(messages=huge_text)
         assert analysis["warning_level"] == "critical"
         assert analysis["is_large"] is True
@@ -292,7 +572,7 @@ class TestErrorHandlingIntegration:
     def test_context_analysis_with_error_decision(self):
         """測試 context 分析驅動錯誤決策"""
         # 模擬大 context
-        large_text = "x" * 400000
+        large_text = "測試" * 70000
         analysis = analyze_context_size(messages=large_text)
 
         # 如果 context 過大，應該建議新對話
@@ -7,10 +7,16 @@ from unittest.mock import Mock, patch
 import pytest
 from processor_entry import memory_service, process_normalized_message, process_sqs_event
 
+from agents.agent_pool import agent_pool
+
 
 class TestMemoryIntegration:
     """記憶功能整合測試"""
 
+    def setup_method(self):
+        """每個測試前清空 Agent 池"""
+        agent_pool.clear()
+
     def test_memory_service_initialization(self):
         """測試 Memory 服務初始化"""
         assert memory_service is not None
@@ -92,6 +98,266 @@ class TestMemoryIntegration:
                 call_kwargs = MockAgent.call_args.kwargs
                 assert call_kwargs.get("session_manager") == mock_session_manager
 
+    def test_memory_prefetch_overlaps_attachments(self):
+        """測試長期記憶預先檢索在附件處理前開始，檔案結果以獨立區塊傳送"""
+        normalized = {
+            "messageId": "test-789",
+            "content": {
+                "text": "幫我看這份報告",
+                "messageType": "file",
+                "attachments": [{"type": "document", "fileName": "a.csv", "s3Url": "s3://b/a.csv"}],
+            },
+            "user": {"id": "316743844", "displayName": "Steven"},
+            "context": {"sessionId": "steven-session"},
+        }
+        calls = []
+
+        with (
+            patch.object(
+                memory_service, "prefetch", side_effect=lambda *a: calls.append("prefetch")
+            ) as mock_prefetch,
+            patch(
+                "processor_entry.process_file_attachments",
+                side_effect=lambda *a: calls.append("files") or "📄 檔案摘要",
+            ),
+            patch("processor_entry.ConversationAgent") as MockAgent,
+        ):
+            MockAgent.return_value.process_message.return_value = {"response": "好的"}
+
+            result = process_normalized_message(normalized)
+
+        assert result["success"] is True
+        assert calls == ["prefetch", "files"]
+        actor_id, query = mock_prefetch.call_args.args
+        assert actor_id != "316743844"  # 雜湊後的 actor_id
+        assert query == "幫我看這份報告"
+        MockAgent.return_value.process_message.assert_called_once_with(
+            "幫我看這份報告", stream_handler=None, attachment_text="📄 檔案摘要"
+        )
+
+    def test_image_message_keeps_memory(self):
+        """測試圖片訊息使用帶 Memory 的 Agent，並以回覆更新圖片說明"""
+        from services.memory_image_refs import image_reference_store, image_sha256
+
+        image_bytes = b"\x89PNG\r\n\x1a\n-image"
+        normalized = {
+            "messageId": "test-img",
+            "content": {
+                "text": "這是什麼？",
+                "messageType": "image",
+                "attachments": [{"type": "photo", "s3_url": "s3://b/cat.png"}],
+            },
+            "user": {"id": "316743844", "displayName": "Steven"},
+            "context": {"sessionId": "steven-session"},
+        }
+        image_reference_store.register(image_bytes, "s3://b/cat.png", "png")
+
+        with (
+            patch.object(memory_service, "enabled", True),
+            patch.object(memory_service, "get_session_manager") as mock_get_session,
+            patch(
+                "processor_entry.process_image_attachments",
+                return_value=[{"bytes": image_bytes, "format": "png"}],
+            ),
+            patch("processor_entry.ConversationAgent") as MockAgent,
+        ):
+            mock_get_session.return_value = Mock()
+            MockAgent.return_value.process_message.return_value = {"response": "一隻橘色的貓"}
+
+            result = process_normalized_message(normalized)
+
+        assert result["success"] is True
+        assert MockAgent.call_args.kwargs["session_manager"] is mock_get_session.return_value
+        assert MockAgent.return_value.process_message.call_args.kwargs["images"] == [
+            {"bytes": image_bytes, "format": "png"}
+        ]
+        assert image_reference_store.get(image_sha256(image_bytes))["caption"] == "一隻橘色的貓"
+        image_reference_store.clear()
+
+    def test_repeated_stateless_question_served_from_cache(self):
+        """測試重複的無狀態問題第二次直接回覆快取結果"""
+        from services.response_cache import ResponseCache
+
+        def message(user_id):
+            return {
+                "messageId": f"faq-{user_id}",
+                "content": {"text": "台北天氣如何？", "messageType": "text"},
+                "user": {"id": user_id, "displayName": "User"},
+                "context": {"sessionId": f"session-{user_id}"},
+            }
+
+        cache = ResponseCache(category_ttls={"general": 3600, "weather": 600})
+        with (
+            patch("processor_entry.response_cache", cache),
+            patch("processor_entry.model_router.preferred_model", return_value="model-a"),
+            patch("processor_entry.ConversationAgent") as MockAgent,
+        ):
+            MockAgent.return_value.session_manager = None
+            MockAgent.return_value.process_message.return_value = {
+                "success": True,
+                "response": "台北 25°C",
+                "model": "model-a",
+                "tools_used": ["get_weather"],
+            }
+
+            first = process_normalized_message(message("111"))
+            second = process_normalized_message(message("222"))
+
+        assert first["response"] == second["response"] == "台北 25°C"
+        assert second["cached"] is True
+        assert second["model"] == "model-a"
+        MockAgent.return_value.process_message.assert_called_once()
+        assert cache.get_stats()["hits"] == 1
+
+    def test_cached_answer_does_not_leak_user_memory(self):
+        """測試不同記憶的用戶問相同問題時，快取的回覆不含任一用戶的記憶"""
+        from services.response_cache import ResponseCache
+
+        def message(user_id):
+            return {
+                "messageId": f"faq-{user_id}",
+                "content": {"text": "台北天氣如何？", "messageType": "text"},
+                "user": {"id": user_id, "displayName": "User"},
+                "context": {"sessionId": f"session-{user_id}"},
+            }
+
+        memories = {"111": "用戶住在高雄", "222": "用戶住在台中"}
+
+        def build_agent(tools=None, session_manager=None, model=None):
+            agent = Mock()
+            agent.session_manager = session_manager
+            answer = "台北 25°C"
+            if session_manager is not None:
+                answer += f"（{session_manager.memory}）"
+            agent.process_message.return_value = {
+                "success": True,
+                "response": answer,
+                "model": "model-a",
+                "tools_used": ["get_weather"],
+            }
+            return agent
+
+        def get_session_manager(context):
+            user_id = context.session_id.removeprefix("session-")
+            return Mock(memory=memories[user_id])
+
+        cache = ResponseCache(category_ttls={"general": 3600, "weather": 600})
+        with (
+            patch.object(memory_service, "enabled", True),
+            patch.object(memory_service, "get_session_manager", side_effect=get_session_manager),
+            patch.object(memory_service, "prefetch") as mock_prefetch,
+            patch("processor_entry.response_cache", cache),
+            patch("processor_entry.model_router.preferred_model", return_value="model-a"),
+            patch("processor_entry.ConversationAgent", side_effect=build_agent) as MockAgent,
+        ):
+            first = process_normalized_message(message("111"))
+            second = process_normalized_message(message("222"))
+
+        assert first["response"] == second["response"] == "台北 25°C"
+        assert second["cached"] is True
+        assert MockAgent.call_count == 1
+        assert MockAgent.call_args.kwargs["session_manager"] is None
+        mock_prefetch.assert_not_called()
+
+    def test_cached_turns_are_appended_to_session(self):
+        """測試快取命中與未命中的回合都寫入該用戶的對話事件"""
+        from services.response_cache import ResponseCache
+
+        def message(user_id):
+            return {
+                "messageId": f"faq-{user_id}",
+                "content": {"text": "台北天氣如何？", "messageType": "text"},
+                "user": {"id": user_id, "displayName": "User"},
+                "context": {"sessionId": f"session-{user_id}"},
+            }
+
+        cache = ResponseCache(category_ttls={"weather": 600})
+        with (
+            patch.object(memory_service, "append_turn") as mock_append,
+            patch("processor_entry.response_cache", cache),
+            patch("processor_entry.model_router.preferred_model", return_value="model-a"),
+            patch("processor_entry.ConversationAgent") as MockAgent,
+        ):
+            MockAgent.return_value.session_manager = None
+            MockAgent.return_value.process_message.return_value = {
+                "success": True,
+                "response": "台北 25°C",
+                "model": "model-a",
+                "tools_used": ["get_weather"],
+            }
+
+            process_normalized_message(message("111"))
+            second = process_normalized_message(message("222"))
+
+        assert second["cached"] is True
+        assert [c.args[1:] for c in mock_append.call_args_list] == [
+            ("session-111", "台北天氣如何？", "台北 25°C"),
+            ("session-222", "台北天氣如何？", "台北 25°C"),
+        ]
+
+    def test_follow_up_in_active_session_not_cached(self):
+        """測試 session 最近有對話時，追問以含對話歷史的 Agent 回覆且不使用快取"""
+        from services.response_cache import ResponseCache
+
+        def message(text):
+            return {
+                "messageId": "follow-up",
+                "content": {"text": text, "messageType": "text"},
+                "user": {"id": "111", "displayName": "User"},
+                "context": {"sessionId": "session-111"},
+            }
+
+        cache = ResponseCache(category_ttls={"general": 3600, "weather": 600})
+        with (
+            patch.object(memory_service, "has_recent_events", return_value=False),
+            patch("processor_entry.response_cache", cache),
+            patch("processor_entry.model_router.preferred_model", return_value="model-a"),
+            patch("processor_entry.ConversationAgent") as MockAgent,
+        ):
+            MockAgent.return_value.session_manager = Mock()
+            MockAgent.return_value.process_message.return_value = {
+                "success": True,
+                "response": "因為颱風",
+                "model": "model-a",
+                "tools_used": [],
+            }
+
+            # 第一則訊息需要記憶（不可快取），建立該 session 的 Agent
+            process_normalized_message(message("記住我的住址在台北"))
+            result = process_normalized_message(message("why?"))
+
+        assert result.get("cached") is None
+        assert MockAgent.call_count == 1  # 追問重用該 session 的 Agent，不另建無 Memory 的 Agent
+        assert MockAgent.return_value.process_message.call_count == 2
+        assert cache.get_stats()["misses"] == 0
+
+    def test_recent_memory_events_disable_cache(self):
+        """測試 Memory 中有最近事件（例如 Agent 池已淘汰）時不使用快取"""
+        from services.response_cache import ResponseCache
+
+        cache = ResponseCache(category_ttls={"general": 3600})
+        with (
+            patch.object(memory_service, "has_recent_events", return_value=True) as mock_recent,
+            patch("processor_entry.response_cache", cache),
+            patch("processor_entry.ConversationAgent") as MockAgent,
+        ):
+            MockAgent.return_value.process_message.return_value = {
+                "success": True,
+                "response": "明天也是晴天",
+                "tools_used": [],
+            }
+            process_normalized_message(
+                {
+                    "messageId": "follow-up",
+                    "content": {"text": "and tomorrow?", "messageType": "text"},
+                    "user": {"id": "111", "displayName": "User"},
+                    "context": {"sessionId": "session-111"},
+                }
+            )
+
+        mock_recent.assert_called_once()
+        assert cache.get_stats()["misses"] == 0
+
     def test_process_normalized_message_memory_failure_fallback(self):
         """測試 Memory 失敗時的容錯處理"""
         normalized = {
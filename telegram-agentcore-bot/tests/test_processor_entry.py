@@ -4,7 +4,9 @@
 
 import json
 import os
+import subprocess
 import sys
+import time
 from unittest.mock import Mock, patch
 
 # 添加專案根目錄到路徑
@@ -131,6 +133,102 @@ class TestEventBridgeEventProcessing:
         assert result["statusCode"] == 200
         mock_publish.assert_called_once()
 
+    @patch("processor_entry.process_normalized_message")
+    def test_memory_writes_flushed_after_completion(self, mock_process):
+        """測試延後的 Memory 寫入在發布完成事件之後才執行"""
+        from processor_entry import memory_write_behind, process_eventbridge_event
+
+        calls = []
+        mock_process.side_effect = lambda message, **kwargs: (
+            memory_write_behind.defer("actor:s1", lambda: calls.append("memory_write"))
+            or {"success": True, "response": "Test response"}
+        )
+        event = {
+            "detail-type": "message.received",
+            "detail": {"messageId": "test-uuid", "channel": {"type": "telegram"}},
+        }
+        context = Mock()
+        context.get_remaining_time_in_millis.return_value = 60000
+
+        with patch(
+            "processor_entry.publish_completion_event",
+            side_effect=lambda *args: calls.append("completed"),
+        ):
+            process_eventbridge_event(event, context)
+
+        assert calls == ["completed", "memory_write"]
+        assert memory_write_behind.pending("actor:s1") == 0
+
+    @patch("processor_entry.publish_completion_event")
+    @patch("processor_entry.process_normalized_message")
+    def test_expired_message_skips_model(self, mock_process, mock_publish):
+        """測試超過入口期限的訊息不呼叫模型，回覆請使用者重新傳送"""
+        from processor_entry import ERROR_MESSAGES, process_eventbridge_event
+
+        event = {
+            "detail-type": "message.received",
+            "detail": {
+                "messageId": "old",
+                "timestamp": "2020-01-01T00:00:00Z",
+                "channel": {"type": "telegram"},
+                "user": {"id": "tg:123"},
+                "content": {"text": "Hello", "messageType": "text"},
+                "context": {"sessionId": "123"},
+                "routing": {"priority": "normal", "expiresAt": time.time() - 1},
+            },
+        }
+
+        process_eventbridge_event(event, Mock())
+
+        mock_process.assert_not_called()
+        result = mock_publish.call_args.args[1]
+        assert result["response"] == ERROR_MESSAGES["message_expired"]
+        assert result["expired"] is True
+
+    @patch("processor_entry.publish_completion_event")
+    @patch("processor_entry.process_normalized_message")
+    def test_message_deadline_bounds_processing(self, mock_process, mock_publish):
+        """測試處理期限取 Lambda 期限與訊息期限中較早者"""
+        from processor_entry import process_eventbridge_event
+
+        mock_process.return_value = {"success": True, "response": "ok"}
+        event = {
+            "detail-type": "message.received",
+            "detail": {
+                "messageId": "m1",
+                "channel": {"type": "telegram"},
+                "routing": {"expiresAt": time.time() + 20},
+            },
+        }
+        context = Mock()
+        context.get_remaining_time_in_millis.return_value = 60000
+
+        process_eventbridge_event(event, context)
+
+        deadline = mock_process.call_args.kwargs["deadline"]
+        assert 19 < deadline.remaining() <= 20
+
+    @patch("processor_entry.get_eventbridge_client")
+    def test_completion_event_carries_deadline(self, mock_get_client):
+        """測試完成事件帶入口時間與期限，供 Response Router 計算延遲"""
+        from processor_entry import publish_completion_event
+
+        mock_get_client.return_value.put_events.return_value = {"FailedEntryCount": 0}
+        original = {
+            "messageId": "m1",
+            "timestamp": "2026-01-01T00:00:00Z",
+            "routing": {"expiresAt": 1767225900.0},
+        }
+
+        with patch.dict("os.environ", {"EVENT_BUS_NAME": "test-bus"}):
+            publish_completion_event(original, {"response": "ok", "expired": True})
+
+        entry = mock_get_client.return_value.put_events.call_args.kwargs["Entries"][0]
+        metadata = json.loads(entry["Detail"])["metadata"]
+        assert metadata["received_at"] == "2026-01-01T00:00:00Z"
+        assert metadata["expires_at"] == 1767225900.0
+        assert metadata["expired"] is True
+
     def test_process_eventbridge_wrong_detail_type(self):
         """測試不支援的 detail-type"""
         from processor_entry import process_eventbridge_event
@@ -147,33 +245,51 @@ class TestEventBridgeEventProcessing:
 class TestSQSEventProcessing:
     """測試 SQS 事件處理（向後兼容）"""
 
-    @patch("processor_entry.conversation_agent")
-    def test_process_sqs_event_success(self, mock_agent):
+    def setup_method(self):
+        """每個測試前清空 Agent 池"""
+        from agents.agent_pool import agent_pool
+
+        agent_pool.clear()
+
+    @staticmethod
+    def _record(message_id, chat_id, text):
+        return {
+            "messageId": message_id,
+            "body": json.dumps(
+                {"message": {"from": {"id": chat_id}, "chat": {"id": chat_id}, "text": text}}
+            ),
+        }
+
+    @patch("processor_entry.publish_completion_event")
+    @patch("processor_entry.ConversationAgent")
+    def test_process_sqs_event_success(self, mock_agent_class, mock_publish):
         """測試成功處理 SQS 事件"""
         from processor_entry import process_sqs_event
 
-        event = {
-            "Records": [
-                {
-                    "body": json.dumps(
-                        {"message": {"from": {"id": 123456789}, "text": "Test message"}}
-                    )
-                }
-            ]
-        }
+        event = {"Records": [self._record("m1", 123456789, "Test message")]}
         context = Mock()
 
-        mock_agent.process_message.return_value = "Response"
+        mock_agent_class.return_value.process_message.return_value = {
+            "success": True,
+            "response": "Response",
+        }
 
         result = process_sqs_event(event, context)
 
         assert result["statusCode"] == 200
+        assert result["batchItemFailures"] == []
         body = json.loads(result["body"])
         assert body["processed"] == 1
-        mock_agent.process_message.assert_called_once_with("Test message")
+        mock_agent_class.return_value.process_message.assert_called_once_with("Test message")
 
-    @patch("processor_entry.conversation_agent")
-    def test_process_sqs_event_no_text(self, mock_agent):
+        # 舊版記錄也發布完成事件
+        original, published = mock_publish.call_args.args
+        assert original["messageId"] == "m1"
+        assert original["channel"] == {"type": "telegram", "channelId": "123456789"}
+        assert published["response"] == "Response"
+
+    @patch("processor_entry.ConversationAgent")
+    def test_process_sqs_event_no_text(self, mock_agent_class):
         """測試處理無文字的 SQS 事件"""
         from processor_entry import process_sqs_event
 
@@ -183,7 +299,341 @@ class TestSQSEventProcessing:
         result = process_sqs_event(event, context)
 
         assert result["statusCode"] == 200
-        mock_agent.process_message.assert_not_called()
+        assert result["batchItemFailures"] == []
+        mock_agent_class.return_value.process_message.assert_not_called()
+
+    @patch("processor_entry.publish_completion_event")
+    @patch("processor_entry.process_sqs_record")
+    def test_partial_batch_failure_keeps_chat_order(self, mock_process_record, mock_publish):
+        """測試失敗記錄及同 chat 後續記錄回報失敗，其他 chat 不受影響"""
+        from processor_entry import process_sqs_event
+
+        def process(record, **kwargs):
+            if record["messageId"] == "a2":
+                raise RuntimeError("Bedrock error")
+
+        mock_process_record.side_effect = process
+
+        event = {
+            "Records": [
+                self._record("a1", 111, "first"),
+                self._record("b1", 222, "other chat"),
+                self._record("a2", 111, "second"),
+                self._record("a3", 111, "third"),
+                {"messageId": "bad", "body": "not-json"},
+            ]
+        }
+
+        result = process_sqs_event(event, Mock())
+
+        failed = [f["itemIdentifier"] for f in result["batchItemFailures"]]
+        assert failed == ["a2", "a3"]
+        processed_ids = [c.args[0]["messageId"] for c in mock_process_record.call_args_list]
+        assert processed_ids.index("a1") < processed_ids.index("a2")
+        assert "a3" not in processed_ids
+
+    @patch("processor_entry.ConversationAgent")
+    def test_agent_failure_reported_for_redelivery(self, mock_agent_class):
+        """測試 Agent 回傳失敗時回報該筆記錄"""
+        from processor_entry import process_sqs_event
+
+        mock_agent_class.return_value.process_message.return_value = {
+            "success": False,
+            "response": "抱歉",
+            "error": "ThrottlingException",
+        }
+
+        result = process_sqs_event({"Records": [self._record("m1", 1, "hi")]}, Mock())
+
+        assert result["batchItemFailures"] == [{"itemIdentifier": "m1"}]
+
+
+class TestSessionOrdering:
+    """測試 session 排序佇列（FIFO）"""
+
+    @staticmethod
+    def _message(message_id, session_id):
+        return {
+            "messageId": message_id,
+            "channel": {"type": "telegram"},
+            "user": {"id": "tg:123"},
+            "content": {"text": "hi"},
+            "context": {"sessionId": session_id},
+        }
+
+    def _fifo_record(self, message_id, session_id):
+        from ordering_entry import session_group_id
+
+        message = self._message(message_id, session_id)
+        return {
+            "messageId": message_id,
+            "attributes": {"MessageGroupId": session_group_id(message)},
+            "body": json.dumps({"detail-type": "message.received", "detail": message}),
+        }
+
+    def test_group_id_per_session(self):
+        """測試同一 session 的群組 ID 固定，不同 session 不同"""
+        from ordering_entry import session_group_id
+
+        first = session_group_id(self._message("m1", "s1"))
+
+        assert first == session_group_id(self._message("m2", "s1"))
+        assert first != session_group_id(self._message("m3", "s2"))
+        assert "s1" not in first and len(first) <= 128
+
+    @patch("ordering_entry.get_sqs_client")
+    def test_handler_enqueues_with_group_and_dedup(self, mock_get_client):
+        """測試轉送時帶入 MessageGroupId 與以 messageId 產生的去重 ID"""
+        from ordering_entry import handler, session_group_id, settings
+
+        event = {"detail-type": "message.received", "detail": self._message("m1", "s1")}
+
+        with patch.object(settings, "ORDERING_QUEUE_URL", "https://sqs/queue.fifo"):
+            handler(event, Mock())
+            handler(event, Mock())
+
+        first, second = mock_get_client.return_value.send_message.call_args_list
+        assert first.kwargs["QueueUrl"] == "https://sqs/queue.fifo"
+        assert first.kwargs["MessageGroupId"] == session_group_id(event["detail"])
+        assert first.kwargs["MessageDeduplicationId"] == second.kwargs["MessageDeduplicationId"]
+        assert json.loads(first.kwargs["MessageBody"])["detail"]["messageId"] == "m1"
+
+    @patch("ordering_entry.get_sqs_client")
+    def test_handler_ignores_other_events(self, mock_get_client):
+        from ordering_entry import handler
+
+        handler({"detail-type": "message.completed", "detail": {}}, Mock())
+
+        mock_get_client.return_value.send_message.assert_not_called()
+
+    @patch("processor_entry.publish_completion_event")
+    @patch("processor_entry.process_normalized_message")
+    def test_fifo_records_processed_in_session_order(self, mock_process, mock_publish):
+        """測試同一 session 依序處理並發布完成事件，失敗後同 session 的後續記錄留待重送"""
+        from processor_entry import process_sqs_event
+
+        order = []
+
+        def process(message, deadline=None):
+            order.append(message["messageId"])
+            if message["messageId"] == "a2":
+                raise RuntimeError("Memory error")
+            return {"success": True, "response": "ok"}
+
+        mock_process.side_effect = process
+
+        event = {
+            "Records": [
+                self._fifo_record("a1", "s1"),
+                self._fifo_record("b1", "s2"),
+                self._fifo_record("a2", "s1"),
+                self._fifo_record("a3", "s1"),
+            ]
+        }
+
+        result = process_sqs_event(event, Mock())
+
+        assert [f["itemIdentifier"] for f in result["batchItemFailures"]] == ["a2", "a3"]
+        assert order.index("a1") < order.index("a2")
+        assert "a3" not in order
+        published = sorted(c.args[0]["messageId"] for c in mock_publish.call_args_list)
+        assert published == ["a1", "b1"]
+
+    @patch("ordering_entry.get_sqs_client")
+    def test_high_priority_uses_priority_queue(self, mock_get_client):
+        """測試 routing.priority 為 high 的訊息進入高優先佇列"""
+        from ordering_entry import handler, settings
+
+        high = self._message("m1", "s1")
+        high["routing"] = {"priority": "high"}
+        low = self._message("m2", "s2")
+        low["routing"] = {"priority": "low"}
+
+        with (
+            patch.object(settings, "ORDERING_QUEUE_URL", "https://sqs/queue.fifo"),
+            patch.object(settings, "PRIORITY_ORDERING_QUEUE_URL", "https://sqs/priority.fifo"),
+        ):
+            handler({"detail-type": "message.received", "detail": high}, Mock())
+            handler({"detail-type": "message.received", "detail": low}, Mock())
+
+        queues = [
+            c.kwargs["QueueUrl"] for c in mock_get_client.return_value.send_message.call_args_list
+        ]
+        assert queues == ["https://sqs/priority.fifo", "https://sqs/queue.fifo"]
+
+    @patch("ordering_entry.get_sqs_client")
+    def test_media_uses_media_queue_with_session_group(self, mock_get_client):
+        """測試媒體與帶附件的訊息進入媒體佇列，與同 session 的文字訊息使用相同的 MessageGroupId"""
+        from ordering_entry import handler, session_group_id, settings
+
+        text = self._message("m1", "s1")
+        photo = self._message("m2", "s1")
+        photo["content"] = {"text": "", "messageType": "image"}
+        photo["routing"] = {"priority": "high"}
+        captioned = self._message("m3", "s1")
+        captioned["content"] = {
+            "text": "幫我看這份",
+            "messageType": "text",
+            "attachments": [{"type": "document", "s3Url": "s3://bucket/a.pdf"}],
+        }
+
+        with (
+            patch.object(settings, "ORDERING_QUEUE_URL", "https://sqs/queue.fifo"),
+            patch.object(settings, "PRIORITY_ORDERING_QUEUE_URL", "https://sqs/priority.fifo"),
+            patch.object(settings, "MEDIA_ORDERING_QUEUE_URL", "https://sqs/media.fifo"),
+        ):
+            handler({"detail-type": "message.received", "detail": text}, Mock())
+            handler({"detail-type": "message.received", "detail": photo}, Mock())
+            handler({"detail-type": "message.received", "detail": captioned}, Mock())
+
+        calls = mock_get_client.return_value.send_message.call_args_list
+        assert [c.kwargs["QueueUrl"] for c in calls] == [
+            "https://sqs/queue.fifo",
+            "https://sqs/media.fifo",
+            "https://sqs/media.fifo",
+        ]
+        assert {c.kwargs["MessageGroupId"] for c in calls} == {session_group_id(text)}
+
+    @patch("processor_entry.publish_completion_event")
+    @patch("processor_entry.process_normalized_message")
+    def test_high_priority_sessions_start_first(self, mock_process, mock_publish):
+        """測試 worker 不足時，高優先順序的 session 先處理、低優先最後處理"""
+        from processor_entry import process_sqs_event, settings
+
+        order = []
+        mock_process.side_effect = lambda message, deadline=None: (
+            order.append(message["messageId"]) or {"success": True, "response": "ok"}
+        )
+
+        records = []
+        for message_id, priority in [("low", "low"), ("normal", "normal"), ("high", "high")]:
+            record = self._fifo_record(message_id, message_id)
+            body = json.loads(record["body"])
+            body["detail"]["routing"] = {"priority": priority}
+            record["body"] = json.dumps(body)
+            records.append(record)
+
+        with patch.object(settings, "SQS_MAX_WORKERS", 1):
+            process_sqs_event({"Records": records}, Mock())
+
+        assert order == ["high", "normal", "low"]
+
+    @patch("processor_entry.process_normalized_message")
+    def test_records_deferred_when_time_runs_out(self, mock_process):
+        """測試 Lambda 剩餘時間不足時，尚未處理的記錄回報失敗以重新投遞"""
+        from processor_entry import process_sqs_event
+
+        context = Mock()
+        context.get_remaining_time_in_millis.return_value = 10_000
+
+        result = process_sqs_event({"Records": [self._fifo_record("a1", "s1")]}, context)
+
+        assert result["batchItemFailures"] == [{"itemIdentifier": "a1"}]
+        mock_process.assert_not_called()
+
+    @patch("processor_entry.get_sqs_client")
+    @patch("processor_entry.process_normalized_message")
+    def test_deferred_records_released_immediately(self, mock_process, mock_get_client):
+        """測試因時間不足延後的記錄立即放回佇列，不等待 visibility timeout"""
+        from processor_entry import process_sqs_event
+
+        records = [self._fifo_record("a1", "s1"), self._fifo_record("a2", "s1")]
+        for record in records:
+            record["receiptHandle"] = f"rh-{record['messageId']}"
+            record["eventSourceARN"] = "arn:aws:sqs:us-east-1:123456789012:bot-processor.fifo"
+
+        context = Mock()
+        context.get_remaining_time_in_millis.return_value = 10_000
+
+        process_sqs_event({"Records": records}, context)
+
+        mock_get_client.return_value.change_message_visibility_batch.assert_called_once_with(
+            QueueUrl="https://sqs.us-east-1.amazonaws.com/123456789012/bot-processor.fifo",
+            Entries=[
+                {"Id": "0", "ReceiptHandle": "rh-a1", "VisibilityTimeout": 0},
+                {"Id": "1", "ReceiptHandle": "rh-a2", "VisibilityTimeout": 0},
+            ],
+        )
+
+    @patch("processor_entry.get_sqs_client")
+    @patch("processor_entry.process_normalized_message")
+    def test_failed_records_keep_visibility(self, mock_process, mock_get_client):
+        """測試處理失敗的記錄維持原本的 visibility timeout（重試前等待）"""
+        from processor_entry import process_sqs_event
+
+        mock_process.side_effect = RuntimeError("Memory error")
+        record = self._fifo_record("a1", "s1")
+        record["receiptHandle"] = "rh-a1"
+        record["eventSourceARN"] = "arn:aws:sqs:us-east-1:123456789012:bot-processor.fifo"
+
+        result = process_sqs_event({"Records": [record]}, Mock(spec=[]))
+
+        assert result["batchItemFailures"] == [{"itemIdentifier": "a1"}]
+        mock_get_client.return_value.change_message_visibility_batch.assert_not_called()
+
+
+class TestProcessorProfile:
+    """測試純文字 Processor 不載入重量級相依套件"""
+
+    HEAVY_MODULES = [
+        "bedrock_agentcore.tools.code_interpreter_client",
+        "bedrock_agentcore.tools.browser_client",
+        "playwright",
+        "PIL",
+    ]
+
+    def _import_processor(self, profile):
+        """在獨立行程中載入 processor_entry，回傳工具名稱與已載入的重量級模組"""
+        script = (
+            "import json, sys\n"
+            "import processor_entry\n"
+            "print(json.dumps({\n"
+            "    'tools': [t.tool_name for t in processor_entry.AVAILABLE_TOOLS],\n"
+            f"    'heavy': [m for m in {self.HEAVY_MODULES!r} if m in sys.modules],\n"
+            "}))\n"
+        )
+        env = {
+            **os.environ,
+            "PROCESSOR_PROFILE": profile,
+            "FILE_ENABLED": "true",
+            "BROWSER_ENABLED": "true",
+            "AWS_DEFAULT_REGION": os.environ.get("AWS_DEFAULT_REGION", "us-west-2"),
+        }
+        output = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=os.path.abspath(os.path.join(os.path.dirname(__file__), "..")),
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def test_text_profile_is_lean(self):
+        result = self._import_processor("text")
+
+        assert result["heavy"] == []
+        assert "read_file" not in result["tools"]
+        assert "browse_website_backup" not in result["tools"]
+        assert "browse_website_official" in result["tools"]
+
+    def test_full_profile_keeps_file_tools(self):
+        result = self._import_processor("full")
+
+        assert "read_file" in result["tools"]
+        assert "bedrock_agentcore.tools.code_interpreter_client" in result["heavy"]
+
+    @patch("tools.browser.get_browser_pool")
+    @patch("tools.browser.fetch_static", return_value=None)
+    def test_browser_disabled_does_not_escalate(self, mock_fetch, mock_get_pool):
+        """測試瀏覽器停用時，需要 JavaScript 的網頁回傳錯誤而非建立瀏覽器"""
+        from tools.browser import browse_page, settings
+
+        with patch.object(settings, "BROWSER_ENABLED", False):
+            result = browse_page("https://example.com")
+
+        assert result["error"]
+        mock_get_pool.assert_not_called()
 
 
 class TestNormalizedMessageProcessing:
@@ -276,6 +726,24 @@ class TestEventPublishing:
         entry = call_args["Entries"][0]
         assert entry["Source"] == "agent-processor"
         assert entry["DetailType"] == "message.completed"
+        assert "model" not in json.loads(entry["Detail"])["metadata"]
+
+    @patch.dict("os.environ", {"EVENT_BUS_NAME": "test-bus"})
+    @patch("processor_entry.get_eventbridge_client")
+    def test_publish_completion_event_includes_model(self, mock_get_client):
+        """測試完成事件帶有實際回覆的模型"""
+        from processor_entry import publish_completion_event
+
+        mock_evb = Mock()
+        mock_evb.put_events.return_value = {"FailedEntryCount": 0}
+        mock_get_client.return_value = mock_evb
+
+        publish_completion_event(
+            {"messageId": "test-uuid"}, {"response": "AI response", "model": "fast-model"}
+        )
+
+        entry = mock_evb.put_events.call_args[1]["Entries"][0]
+        assert json.loads(entry["Detail"])["metadata"]["model"] == "fast-model"
 
     @patch.dict("os.environ", {}, clear=True)
     def test_publish_completion_no_bus_configured(self):
@@ -311,3 +779,45 @@ class TestEventPublishing:
 
         detail = json.loads(entry["Detail"])
         assert detail["error"] == "Processing failed"
+
+    @patch.dict("os.environ", {"EVENT_BUS_NAME": "test-bus"})
+    @patch("processor_entry.get_eventbridge_client")
+    def test_publish_delta_event_success(self, mock_get_client):
+        """測試成功發布串流片段事件"""
+        from processor_entry import publish_delta_event
+
+        mock_evb = Mock()
+        mock_evb.put_events.return_value = {"FailedEntryCount": 0}
+        mock_get_client.return_value = mock_evb
+
+        original = {
+            "messageId": "test-uuid",
+            "channel": {"type": "telegram"},
+            "user": {"id": "tg:123"},
+            "context": {"sessionId": "session-123"},
+        }
+
+        success = publish_delta_event(original, "部分回應", 3)
+
+        assert success is True
+        entry = mock_evb.put_events.call_args[1]["Entries"][0]
+        assert entry["DetailType"] == "message.delta"
+
+        detail = json.loads(entry["Detail"])
+        assert detail["delta"] == {"text": "部分回應", "sequence": 3}
+        assert detail["metadata"]["session_id"] == "session-123"
+
+    @patch.dict("os.environ", {"EVENT_BUS_NAME": "test-bus"})
+    def test_create_stream_publisher_respects_settings(self):
+        """測試串流只在啟用且頻道支援時建立"""
+        from processor_entry import create_stream_publisher, settings
+
+        telegram_message = {"messageId": "m1", "channel": {"type": "telegram"}}
+        discord_message = {"messageId": "m2", "channel": {"type": "discord"}}
+
+        with patch.object(settings, "STREAMING_ENABLED", False):
+            assert create_stream_publisher(telegram_message) is None
+
+        with patch.object(settings, "STREAMING_ENABLED", True):
+            assert create_stream_publisher(telegram_message) is not None
+            assert create_stream_publisher(discord_message) is None
@@ -0,0 +1,182 @@
+"""
+測試 Token 計算
+"""
+
+import io
+
+import pytest
+from PIL import Image
+
+from utils.context_analyzer import analyze_context_size
+from utils.file_types import image_dimensions
+from utils.token_accounting import (
+    DEFAULT_IMAGE_TOKENS,
+    MESSAGE_OVERHEAD_TOKENS,
+    TokenCalibration,
+    TokenLedger,
+    count_content_tokens,
+    count_image_tokens,
+    count_text_tokens,
+    reported_input_tokens,
+    set_tokenizer,
+)
+
+
+def make_image(width: int, height: int, image_format: str = "PNG") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height)).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class TestImageDimensions:
+    """測試從檔頭讀取圖片尺寸"""
+
+    @pytest.mark.parametrize("image_format", ["PNG", "GIF", "JPEG", "WEBP"])
+    def test_formats(self, image_format):
+        assert image_dimensions(make_image(321, 123, image_format)) == (321, 123)
+
+    def test_lossless_webp(self):
+        buffer = io.BytesIO()
+        Image.new("RGB", (40, 30)).save(buffer, "WEBP", lossless=True)
+        assert image_dimensions(buffer.getvalue()) == (40, 30)
+
+    def test_unknown_or_truncated(self):
+        assert image_dimensions(b"not an image") is None
+        assert image_dimensions(b"\xff\xd8\xff\xe0") is None
+
+
+class TestTextTokens:
+    """測試文字估算"""
+
+    def test_latin_words(self):
+        # 每個單字至少 1 token，長單字依字母數進位
+        assert count_text_tokens("hello world") == 4
+        assert count_text_tokens("a b c d") == 4
+
+    def test_cjk_counted_per_character(self):
+        assert count_text_tokens("測試" * 100) == 240
+
+    def test_mixed_text(self):
+        mixed = count_text_tokens("今天天氣 sunny")
+        assert mixed == count_text_tokens("今天天氣") + count_text_tokens("sunny")
+
+    def test_empty(self):
+        assert count_text_tokens("") == 0
+
+    def test_pluggable_tokenizer(self):
+        set_tokenizer(lambda text: 42)
+        try:
+            assert count_text_tokens("anything") == 42
+        finally:
+            set_tokenizer(None)
+
+
+class TestContentTokens:
+    """測試 Converse 內容區塊走訪"""
+
+    def test_image_priced_by_dimensions(self):
+        block = {"image": {"format": "png", "source": {"bytes": make_image(200, 150)}}}
+        count = count_content_tokens([block])
+        assert count.image_count == 1
+        assert count.image_tokens == 40  # 200 × 150 / 750
+        assert count.text_tokens == 0
+
+    def test_large_image_is_downscaled(self):
+        assert count_image_tokens(4000, 3000) == count_image_tokens(1238, 928)
+        assert count_image_tokens(4000, 3000) <= 1600
+
+    def test_image_without_bytes_uses_default(self):
+        count = count_content_tokens([{"image": {"format": "png", "source": {"s3Location": {}}}}])
+        assert count.image_tokens == DEFAULT_IMAGE_TOKENS
+
+    def test_image_bytes_not_stringified(self):
+        large = make_image(100, 100) + b"\x00" * 2_000_000
+        count = count_content_tokens([{"image": {"format": "png", "source": {"bytes": large}}}])
+        assert count.total < 100
+
+    def test_tool_blocks(self):
+        content = [
+            {"toolUse": {"toolUseId": "t1", "name": "calculate", "input": {"expr": "1+1"}}},
+            {"toolResult": {"toolUseId": "t1", "content": [{"text": "2"}], "status": "success"}},
+        ]
+        count = count_content_tokens(content)
+        assert count.text_tokens > count_text_tokens("calculate")
+
+    def test_message_overhead(self):
+        message = {"role": "user", "content": [{"text": "hello"}]}
+        assert count_content_tokens(message).text_tokens == (
+            count_text_tokens("hello") + MESSAGE_OVERHEAD_TOKENS
+        )
+
+    def test_analyze_context_size_separates_images(self):
+        content = [
+            {"image": {"format": "png", "source": {"bytes": make_image(750, 100)}}},
+            {"text": "describe"},
+        ]
+        analysis = analyze_context_size(messages=content, history_tokens=500)
+        assert analysis["images_count"] == 1
+        assert analysis["images_tokens"] == 100
+        assert analysis["messages_chars"] == len("describe")
+        assert analysis["total_tokens"] == 500 + 100 + analysis["messages_tokens"]
+
+    def test_analyze_context_size_images_not_double_counted(self):
+        image = {"bytes": make_image(750, 100), "format": "png"}
+        content = [{"image": {"format": "png", "source": {"bytes": image["bytes"]}}}]
+        analysis = analyze_context_size(messages=content, images=[image])
+        assert analysis["images_count"] == 1
+        assert analysis["images_tokens"] == 100
+
+
+class TestTokenLedger:
+    """測試逐回合累加的 token 帳本"""
+
+    def test_sync_counts_only_new_messages(self):
+        messages = [{"role": "user", "content": [{"text": "hello"}]}]
+        ledger = TokenLedger(overhead_tokens=10)
+        first = ledger.sync(messages).total
+
+        messages.append({"role": "assistant", "content": [{"text": "hi there"}]})
+        second = ledger.sync(messages).total
+
+        assert len(ledger) == 2
+        assert second - first == count_content_tokens(messages[1]).total
+        assert ledger.estimate() == 10 + second
+
+    def test_sync_recounts_after_truncation(self):
+        messages = [{"role": "user", "content": [{"text": f"turn {i}"}]} for i in range(4)]
+        ledger = TokenLedger()
+        ledger.sync(messages)
+
+        del messages[:2]
+        totals = ledger.sync(messages)
+        assert len(ledger) == 2
+        assert totals.total == count_content_tokens(messages).total
+
+    def test_estimate_with_pending(self):
+        ledger = TokenLedger(overhead_tokens=5)
+        assert ledger.estimate(pending="hello") == (
+            5 + count_text_tokens("hello") + MESSAGE_OVERHEAD_TOKENS
+        )
+
+
+class TestTokenCalibration:
+    """測試以實際用量校正"""
+
+    def test_reported_input_tokens_includes_cache(self):
+        usage = {"inputTokens": 100, "cacheReadInputTokens": 50, "cacheWriteInputTokens": 25}
+        assert reported_input_tokens(usage) == 175
+        assert reported_input_tokens({}) is None
+
+    def test_record_and_apply(self):
+        calibration = TokenCalibration(smoothing=0.5)
+        error = calibration.record(estimated=80, reported=100)
+        assert error == pytest.approx(-0.2)
+        assert calibration.apply(80) == 100
+
+        calibration.record(estimated=100, reported=100)
+        assert calibration.ratio == pytest.approx(1.125)
+
+    def test_ratio_is_clamped(self):
+        calibration = TokenCalibration()
+        calibration.record(estimated=1, reported=1000)
+        assert calibration.ratio == calibration.max_ratio
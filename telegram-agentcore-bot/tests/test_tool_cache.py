@@ -0,0 +1,215 @@
+"""
+測試工具結果快取
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock, patch
+
+from strands import tool
+
+from services.web_fetcher import web_fetcher
+from tools.browser import fetch_validators, revalidate_page
+from utils.tool_cache import ToolCache, memoize
+
+
+class TestMemoize:
+    """測試 memoize 裝飾器"""
+
+    def setup_method(self):
+        self.cache = ToolCache(max_size=8)
+        self.calls = []
+
+    def make_tool(self, **options):
+        calls = self.calls
+
+        @tool
+        @memoize(cache=self.cache, **options)
+        def lookup(city: str) -> str:
+            """
+            查詢城市
+
+            Args:
+                city: 城市名稱
+            """
+            calls.append(city)
+            return f"{city} 晴天"
+
+        return lookup
+
+    def test_composes_with_tool_decorator(self):
+        """測試保留 @tool 的名稱與參數規格"""
+        lookup = self.make_tool(ttl=60)
+
+        assert lookup.tool_spec["name"] == "lookup"
+        assert lookup.tool_spec["inputSchema"]["json"]["required"] == ["city"]
+
+    def test_repeated_call_hits(self):
+        """測試相同 key 的呼叫重用結果，並記錄各工具的命中"""
+        lookup = self.make_tool(ttl=60, key=lambda city: city.strip())
+
+        assert lookup("台北") == "台北 晴天"
+        assert lookup(" 台北 ") == "台北 晴天"
+        assert self.calls == ["台北"]
+
+        stats = self.cache.get_stats()["tools"]["lookup"]
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_ttl_expiry(self):
+        """測試過期後重新執行"""
+        lookup = self.make_tool(ttl=60)
+
+        with patch("utils.tool_cache.time.time", return_value=1000):
+            lookup("台北")
+        with patch("utils.tool_cache.time.time", return_value=1061):
+            lookup("台北")
+
+        assert self.calls == ["台北", "台北"]
+
+    def test_infinite_ttl(self):
+        """測試永久有效的項目不過期"""
+        lookup = self.make_tool(ttl=None)
+
+        with patch("utils.tool_cache.time.time", return_value=0):
+            lookup("台北")
+        with patch("utils.tool_cache.time.time", return_value=10**9):
+            lookup("台北")
+
+        assert self.calls == ["台北"]
+
+    def test_key_none_bypasses_cache(self):
+        """測試 key 函數回傳 None 時不使用快取"""
+        lookup = self.make_tool(ttl=60, key=lambda city: None)
+
+        lookup("台北")
+        lookup("台北")
+
+        assert self.calls == ["台北", "台北"]
+        assert self.cache.get_stats()["tools"] == {}
+
+    def test_cache_if_skips_errors(self):
+        """測試不快取不符合條件的結果"""
+        lookup = self.make_tool(ttl=60, cache_if=lambda result: "晴天" not in result)
+
+        lookup("台北")
+        lookup("台北")
+
+        assert self.calls == ["台北", "台北"]
+
+    def test_revalidated_entry_is_reused(self):
+        """測試過期後內容未變更時延長存活時間，不重新執行"""
+        revalidate = Mock(return_value=True)
+        lookup = self.make_tool(
+            ttl=60, validators=lambda city: {"etag": '"v1"'}, revalidate=revalidate
+        )
+
+        with patch("utils.tool_cache.time.time", return_value=1000):
+            lookup("台北")
+        with patch("utils.tool_cache.time.time", return_value=2000):
+            assert lookup("台北") == "台北 晴天"
+
+        assert self.calls == ["台北"]
+        revalidate.assert_called_once_with({"etag": '"v1"'}, "台北")
+        assert self.cache.get_stats()["tools"]["lookup"]["revalidated"] == 1
+
+    def test_disabled(self):
+        """測試停用時直接執行工具"""
+        lookup = self.make_tool(ttl=60)
+
+        with patch("utils.tool_cache.settings.TOOL_CACHE_ENABLED", False):
+            lookup("台北")
+            lookup("台北")
+
+        assert self.calls == ["台北", "台北"]
+
+
+class TestToolCachePersistence:
+    """測試 DynamoDB 層"""
+
+    def test_persistent_hit_fills_memory(self):
+        """測試記憶體未命中時讀取 DynamoDB，並填入記憶體層"""
+        cache = ToolCache(table_name="tool-cache")
+        table = Mock()
+        table.get_item.return_value = {
+            "Item": {"cache_key": "k", "result": "結果", "expires_at": 10**10, "validators": {}}
+        }
+        cache._table = table
+
+        entry = cache.get("lookup", "k")
+        assert entry["result"] == "結果"
+        assert entry["tier"] == "dynamodb"
+
+        assert cache.get("lookup", "k")["tier"] == "memory"
+        table.get_item.assert_called_once()
+
+    def test_persistent_failure_is_a_miss(self):
+        """測試 DynamoDB 失敗視為未命中"""
+        cache = ToolCache(table_name="tool-cache")
+        cache._table = Mock()
+        cache._table.get_item.side_effect = Exception("unavailable")
+        cache._table.put_item.side_effect = Exception("unavailable")
+
+        assert cache.get("lookup", "k") is None
+        cache.put("k", "結果", ttl=60)
+        assert cache.get("lookup", "k")["result"] == "結果"
+        assert cache.get_stats()["errors"] == 2
+
+
+class ConditionalHandler(BaseHTTPRequestHandler):
+    """支援 ETag 條件請求的測試伺服器"""
+
+    etag = '"v1"'
+
+    def do_GET(self):
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        body = "<html><head><title>頁面</title></head><body><p>內容</p></body></html>".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", self.etag)
+        self.send_header("Last-Modified", "Mon, 01 Jan 2024 00:00:00 GMT")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestBrowseRevalidation:
+    """測試瀏覽結果以 ETag / Last-Modified 條件請求重新驗證"""
+
+    def setup_method(self):
+        self.fetcher_patch = patch.object(web_fetcher, "allow_private", True)
+        self.fetcher_patch.start()
+        web_fetcher.clear()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), ConditionalHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.task = f"瀏覽 http://127.0.0.1:{self.server.server_port}/page 並總結"
+
+    def teardown_method(self):
+        self.server.shutdown()
+        self.server.server_close()
+        ConditionalHandler.etag = '"v1"'
+        self.fetcher_patch.stop()
+        web_fetcher.clear()
+
+    def test_unchanged_page(self):
+        validators = fetch_validators(self.task)
+
+        assert validators == {
+            "etag": '"v1"',
+            "last_modified": "Mon, 01 Jan 2024 00:00:00 GMT",
+        }
+        assert revalidate_page(validators, self.task) is True
+
+    def test_changed_page(self):
+        validators = fetch_validators(self.task)
+        ConditionalHandler.etag = '"v2"'
+
+        assert revalidate_page(validators, self.task) is False
@@ -0,0 +1,341 @@
+"""
+測試網頁快速擷取
+"""
+
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from config.settings import settings
+from services.web_fetcher import WebFetcher, extract_readable
+from tools import browser
+
+ARTICLE = (
+    "<p>台北今天舉辦年度科技展，吸引超過十萬名民眾參觀，展場涵蓋人工智慧、半導體與綠色能源。</p>"
+    "<p>主辦單位表示，今年參展廠商數量創下新高，並首度設立新創專區，協助年輕團隊與投資人媒合。</p>"
+    "<p>多家業者在現場展示最新的邊緣運算裝置與節能解決方案，預計明年將陸續在國內外市場推出。</p>"
+    "<p>論壇活動同步登場，學者與企業代表討論生成式人工智慧對產業的影響，以及資料治理與人才培育的挑戰。</p>"
+    "<p>市府官員指出，科技展帶動周邊餐飲與旅宿消費，未來也將持續擴大規模，爭取更多國際廠商來台參展。</p>"
+)
+
+STATIC_PAGE = f"""<!doctype html>
+<html>
+<head><meta charset="utf-8"><title>科技展開幕</title><script>var analytics = 1;</script></head>
+<body>
+  <header>網站標頭</header>
+  <nav><a href="/">首頁</a><a href="/news">新聞</a></nav>
+  <div class="layout">
+    <div class="story">{ARTICLE}</div>
+    <aside>熱門文章</aside>
+  </div>
+  <footer>版權所有</footer>
+</body>
+</html>
+"""
+
+JS_PAGE = """<!doctype html>
+<html>
+<head><title>應用程式</title></head>
+<body>
+  <noscript>You need to enable JavaScript to run this app.</noscript>
+  <div id="root"></div>
+  <script src="/static/bundle.js"></script>
+</body>
+</html>
+"""
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """本機測試網站（靜態文章、只有 JavaScript 的頁面、超大頁面、條件請求）"""
+
+    requests = []
+    hosts = []
+
+    def do_GET(self):
+        FixtureHandler.requests.append(self.path)
+        FixtureHandler.hosts.append(self.headers.get("Host"))
+        if self.path == "/article":
+            if self.headers.get("If-None-Match") == '"a1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.reply(STATIC_PAGE, {"ETag": '"a1"'})
+        elif self.path == "/app":
+            self.reply(JS_PAGE)
+        elif self.path == "/big":
+            self.reply("<html><body><p>" + "長" * 200_000 + "</p></body></html>")
+        elif self.path.startswith("/slow/"):
+            time.sleep(0.3)
+            self.reply(STATIC_PAGE.replace("科技展開幕", self.path))
+        elif self.path == "/moved":
+            self.redirect("/article")
+        elif self.path == "/to-metadata":
+            self.redirect("http://169.254.169.254/latest/meta-data/")
+        elif self.path == "/file.zip":
+            self.reply("PK", content_type="application/zip")
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+    def reply(self, html, headers=None, content_type="text/html; charset=utf-8"):
+        body = html.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def redirect(self, location):
+        self.send_response(302)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class FixtureServer:
+    """啟動本機測試網站"""
+
+    def setup_method(self):
+        FixtureHandler.requests = []
+        FixtureHandler.hosts = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        self.fetcher = WebFetcher(max_bytes=64 * 1024, timeout=2, allow_private=True)
+
+    def teardown_method(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestExtractReadable:
+    """測試主要內容擷取"""
+
+    def test_keeps_article_and_drops_boilerplate(self):
+        title, text, script_rendered = extract_readable(STATIC_PAGE)
+
+        assert title == "科技展開幕"
+        assert "新創專區" in text
+        assert "首頁" not in text
+        assert "熱門文章" not in text
+        assert "版權所有" not in text
+        assert script_rendered is False
+
+    def test_paragraph_scoring_without_semantic_markup(self):
+        html = f"<html><body><div>選單</div><div>{ARTICLE}</div><div>廣告</div></body></html>"
+
+        _, text, _ = extract_readable(html)
+
+        assert text.startswith("台北今天舉辦年度科技展")
+        assert "廣告" not in text
+
+    def test_script_only_page(self):
+        title, text, script_rendered = extract_readable(JS_PAGE)
+
+        assert title == "應用程式"
+        assert text == ""
+        assert script_rendered is True
+
+
+class TestWebFetcher(FixtureServer):
+    """測試 HTTP 擷取"""
+
+    def test_static_page(self):
+        page = self.fetcher.fetch(f"{self.base}/article")
+
+        assert page.needs_browser is False
+        assert page.title == "科技展開幕"
+        assert "邊緣運算" in page.text
+        assert page.validators == {"etag": '"a1"'}
+
+    def test_script_rendered_page_escalates(self):
+        page = self.fetcher.fetch(f"{self.base}/app")
+
+        assert page.escalate_reason == "script_rendered"
+
+    def test_non_html_and_errors_escalate(self):
+        assert self.fetcher.fetch(f"{self.base}/file.zip").escalate_reason == "not_html"
+        assert self.fetcher.fetch(f"{self.base}/missing").escalate_reason == "http_404"
+
+    def test_size_cap(self):
+        page = self.fetcher.fetch(f"{self.base}/big")
+
+        assert page.truncated is True
+        assert len(page.text) < 64 * 1024
+
+    def test_conditional_revalidation(self):
+        """測試再次擷取時以 ETag 條件請求，304 時沿用已擷取的內容"""
+        first = self.fetcher.fetch(f"{self.base}/article")
+        second = self.fetcher.fetch(f"{self.base}/article")
+
+        assert second.not_modified is True
+        assert second.text == first.text
+        assert self.fetcher.get_stats()["not_modified"] == 1
+
+    def test_private_address_not_fetched(self):
+        fetcher = WebFetcher(allow_private=False)
+
+        page = fetcher.fetch(f"{self.base}/article")
+
+        assert page.escalate_reason == "private_address"
+        assert FixtureHandler.requests == []
+
+    def test_follows_redirect(self):
+        page = self.fetcher.fetch(f"{self.base}/moved")
+
+        assert page.title == "科技展開幕"
+        assert FixtureHandler.requests == ["/moved", "/article"]
+
+    def test_redirect_to_private_address_not_followed(self):
+        """測試每一跳轉址都確認目標位址（公開網站不能轉址到內部網路）"""
+        fetcher = WebFetcher(timeout=2, allow_private=False)
+
+        with (
+            patch(
+                "services.web_fetcher.is_public_address",
+                side_effect=lambda address: address == "127.0.0.1",
+            ),
+            patch.object(
+                fetcher._public_http, "request", wraps=fetcher._public_http.request
+            ) as mock_request,
+        ):
+            page = fetcher.fetch(f"{self.base}/to-metadata")
+
+        assert page.escalate_reason == "private_address"
+        assert FixtureHandler.requests == ["/to-metadata"]
+        assert mock_request.call_count == 1
+
+    @staticmethod
+    def resolver(*answers):
+        """依序回傳各次解析結果的 getaddrinfo 替身（最後一個結果重複使用）"""
+        remaining = list(answers)
+
+        def getaddrinfo(host, port, *args, **kwargs):
+            address = remaining.pop(0) if len(remaining) > 1 else remaining[0]
+            return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port or 0))]
+
+        return getaddrinfo
+
+    def test_dns_rebinding_not_connected(self):
+        """測試檢查時解析到公開位址、連線時改解析到內部位址的主機不會被連線"""
+        fetcher = WebFetcher(timeout=2, allow_private=False)
+        port = self.server.server_port
+
+        with patch("socket.getaddrinfo", side_effect=self.resolver("93.184.216.34", "127.0.0.1")):
+            page = fetcher.fetch(f"http://rebind.test:{port}/article")
+
+        assert page.escalate_reason == "private_address"
+        assert FixtureHandler.requests == []
+
+    def test_connects_to_checked_address_with_original_host(self):
+        """測試連線到檢查過的 IP，Host header 仍為原本的主機名稱"""
+        fetcher = WebFetcher(timeout=2, allow_private=False)
+        port = self.server.server_port
+
+        with (
+            patch("socket.getaddrinfo", side_effect=self.resolver("127.0.0.1")),
+            patch("services.web_fetcher.is_public_address", return_value=True),
+        ):
+            page = fetcher.fetch(f"http://news.test:{port}/article")
+
+        assert page.title == "科技展開幕"
+        assert FixtureHandler.hosts == [f"news.test:{port}"]
+
+
+class TestBrowseTiers(FixtureServer):
+    """測試 browse_website_official 先 HTTP 擷取，需要時才使用瀏覽器"""
+
+    def setup_method(self):
+        super().setup_method()
+        self.patches = [
+            patch.object(browser, "web_fetcher", self.fetcher),
+            patch.object(browser, "get_browser_pool", side_effect=RuntimeError("no browser")),
+            patch.object(settings, "TOOL_CACHE_ENABLED", False),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def teardown_method(self):
+        for p in self.patches:
+            p.stop()
+        super().teardown_method()
+
+    def browse(self, path):
+        return browser.browse_website_official(task_description=f"瀏覽 {self.base}{path}")
+
+    def test_static_page_skips_browser(self):
+        result = self.browse("/article")
+
+        assert result.startswith("🌐")
+        assert "科技展開幕" in result
+        browser.get_browser_pool.assert_not_called()
+
+    def test_js_page_uses_browser(self):
+        self.browse("/app")
+
+        browser.get_browser_pool.assert_called_once()
+
+    def test_http_disabled_uses_browser(self):
+        with patch.object(settings, "BROWSE_HTTP_FIRST", False):
+            self.browse("/article")
+
+        browser.get_browser_pool.assert_called_once()
+        assert FixtureHandler.requests == []
+
+    def test_multiple_urls_fetched_concurrently(self):
+        """測試多個網址同時擷取，結果依原順序"""
+        start = time.perf_counter()
+        result = json.loads(
+            browser.browse_websites(
+                urls=[f"{self.base}/slow/{i}" for i in range(3)], task_description="比較"
+            )
+        )
+        elapsed = time.perf_counter() - start
+
+        assert elapsed < 0.8  # 依序擷取需要 0.9 秒以上
+        assert [page["title"] for page in result["pages"]] == ["/slow/0", "/slow/1", "/slow/2"]
+        assert all(page["tier"] == "http" and page["error"] is None for page in result["pages"])
+
+    def test_multiple_urls_structured_result(self):
+        """測試去除重複網址、個別錯誤與 token 預算"""
+        urls = [f"{self.base}/article", f"{self.base}/article", f"{self.base}/app"]
+
+        with (
+            patch.object(settings, "BROWSE_MULTI_PAGE_TOKENS", 50),
+            patch.object(settings, "BROWSE_MULTI_TOTAL_TOKENS", 80),
+        ):
+            result = json.loads(browser.browse_websites(urls=urls))
+
+        article, app = result["pages"]
+        assert article["truncated"] is True
+        assert article["tokens"] == 50
+        assert app["tier"] == "browser"
+        assert app["error"] == "no browser"
+        assert result["total_tokens"] <= 80
+
+    def test_multiple_urls_limit(self):
+        with patch.object(settings, "BROWSE_MULTI_MAX_URLS", 1):
+            result = json.loads(
+                browser.browse_websites(urls=[f"{self.base}/article", f"{self.base}/slow/1"])
+            )
+
+        assert len(result["pages"]) == 1
+        assert result["skipped"] == [f"{self.base}/slow/1"]
+
+
+class TestTokenBudgets:
+    """測試多網頁的 token 預算分配"""
+
+    def test_short_pages_leave_budget_for_long_pages(self):
+        assert browser.allocate_token_budgets([100, 5000, 5000], 3000, 4000) == [100, 1950, 1950]
+
+    def test_per_page_cap(self):
+        assert browser.allocate_token_budgets([5000, 10], 1000, 8000) == [1000, 10]
@@ -3,7 +3,9 @@
 提供所有可用的工具函數
 """
 
-from .browser import browse_website_backup, browse_website_official
+from config.settings import settings
+
+from .browser import browse_website_backup, browse_website_official, browse_websites
 from .calculator import calculate
 from .file_reader import read_file
 from .time_utils import get_current_time
@@ -15,15 +17,31 @@ __all__ = [
     "get_current_time",
     "browse_website_official",
     "browse_website_backup",
+    "browse_websites",
     "read_file",
 ]
 
-# 工具列表
-AVAILABLE_TOOLS = [
+# 純文字 Processor（PROCESSOR_PROFILE=text）的工具：不需要 Code Interpreter 與遠端瀏覽器
+# （瀏覽只使用 HTTP 擷取）
+TEXT_TOOLS = [
     get_weather,
     calculate,
     get_current_time,
     browse_website_official,
-    browse_website_backup,
-    read_file,
+    browse_websites,
 ]
+
+# 工具列表
+AVAILABLE_TOOLS = (
+    TEXT_TOOLS
+    if settings.PROCESSOR_PROFILE == "text"
+    else [
+        get_weather,
+        calculate,
+        get_current_time,
+        browse_website_official,
+        browse_website_backup,
+        browse_websites,
+        read_file,
+    ]
+)
@@ -3,14 +3,23 @@
 提供網頁瀏覽和內容提取功能
 """
 
+import atexit
+import json
 import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any
 
 from strands import tool
 
 from config.prompts import get_browser_prompt, get_error_message
 from config.settings import settings
+from services.browser_pool import BrowserSessionPool, PlaywrightDriverPool
+from services.web_fetcher import FetchedPage, web_fetcher
 from utils.logger import get_logger
+from utils.token_accounting import count_text_tokens, truncate_text
+from utils.tool_cache import memoize
 
 logger = get_logger(__name__)
 
@@ -40,10 +49,258 @@ def init_browser_service():
         return False
 
 
+# 回傳給模型的內容字數上限
+MAX_CONTENT_CHARS = 2000
+
+# 從瀏覽器擷取的內容字數上限
+MAX_EXTRACT_CHARS = 20000
+
+# 同時瀏覽多個網址用的執行緒池（HTTP 擷取；瀏覽器工作交給 Playwright driver 池）
+_page_executor: ThreadPoolExecutor | None = None
+_page_executor_lock = threading.Lock()
+
+# 瀏覽器 session 池（延遲初始化）
+_browser_pool: BrowserSessionPool | None = None
+_browser_pool_lock = threading.Lock()
+
+# Playwright driver 池（延遲初始化）：所有 CDP 瀏覽都在固定數量的 driver 執行緒執行
+_driver_pool: PlaywrightDriverPool | None = None
+
+# DOM 載入後等待內容穩定：一段時間內沒有 DOM 變化，或達到等待上限
+_WAIT_FOR_STABLE_JS = """
+([quietMs, maxMs]) => new Promise(resolve => {
+    let quietTimer;
+    const done = () => {
+        observer.disconnect();
+        clearTimeout(quietTimer);
+        clearTimeout(capTimer);
+        resolve();
+    };
+    const observer = new MutationObserver(() => {
+        clearTimeout(quietTimer);
+        quietTimer = setTimeout(done, quietMs);
+    });
+    observer.observe(document.documentElement, {
+        childList: true, subtree: true, characterData: true
+    });
+    quietTimer = setTimeout(done, quietMs);
+    const capTimer = setTimeout(done, maxMs);
+})
+"""
+
+
+def get_browser_pool() -> BrowserSessionPool:
+    """取得瀏覽器 session 池單例"""
+    global _browser_pool
+    with _browser_pool_lock:
+        if _browser_pool is None:
+            from bedrock_agentcore.tools.browser_client import BrowserClient
+
+            _browser_pool = BrowserSessionPool(
+                factory=lambda: BrowserClient(settings.AWS_REGION),
+                max_size=settings.BROWSER_POOL_SIZE,
+                idle_ttl=settings.BROWSER_SESSION_IDLE_TTL,
+                session_timeout=settings.BROWSER_SESSION_TIMEOUT,
+            )
+        return _browser_pool
+
+
+def _get_page_executor() -> ThreadPoolExecutor:
+    global _page_executor
+    with _page_executor_lock:
+        if _page_executor is None:
+            _page_executor = ThreadPoolExecutor(
+                max_workers=settings.BROWSE_MULTI_CONCURRENCY, thread_name_prefix="browse"
+            )
+        return _page_executor
+
+
+def start_playwright():
+    """啟動 Playwright（在 driver 執行緒中呼叫）"""
+    from playwright.sync_api import sync_playwright
+
+    return sync_playwright().start()
+
+
+def get_driver_pool() -> PlaywrightDriverPool:
+    """取得 Playwright driver 池單例（第一次使用時註冊結束時的清理）"""
+    global _driver_pool
+    with _browser_pool_lock:
+        if _driver_pool is None:
+            _driver_pool = PlaywrightDriverPool(
+                factory=start_playwright, size=settings.BROWSER_DRIVER_THREADS
+            )
+            atexit.register(shutdown_browser)
+        return _driver_pool
+
+
+def shutdown_browser() -> None:
+    """停止 Playwright driver 與閒置的 Browser session（容器結束時）"""
+    global _driver_pool, _browser_pool
+    with _browser_pool_lock:
+        driver_pool, _driver_pool = _driver_pool, None
+        session_pool, _browser_pool = _browser_pool, None
+    if driver_pool is not None:
+        driver_pool.shutdown()
+    if session_pool is not None:
+        session_pool.shutdown()
+
+
+def block_heavy_resources(route) -> None:
+    """
+    攔截請求：圖片、字型、影音等不影響文字內容的資源直接中止
+
+    Args:
+        route: Playwright route 物件
+    """
+    if route.request.resource_type in settings.BROWSER_BLOCKED_RESOURCES:
+        route.abort()
+    else:
+        route.continue_()
+
+
+def wait_for_content_stable(page, quiet_ms: int, max_ms: int) -> None:
+    """
+    等待頁面內容穩定（取代 networkidle，不受長輪詢、追蹤請求影響）
+
+    Args:
+        page: Playwright page 物件
+        quiet_ms: 連續多久（毫秒）沒有 DOM 變化視為穩定
+        max_ms: 最多等待的時間（毫秒）
+    """
+    try:
+        page.evaluate(_WAIT_FOR_STABLE_JS, [quiet_ms, max_ms])
+    except Exception as e:
+        # 頁面在等待期間跳轉等情況，直接擷取目前的內容
+        logger.debug(f"內容穩定等待中斷: {e}")
+
+
+def capture_page(browser, url: str) -> tuple[str, str]:
+    """
+    在新的 browser context 中開啟網頁並擷取標題與內容
+
+    Args:
+        browser: Playwright browser 物件
+        url: 網址
+
+    Returns:
+        (標題, 內容)
+    """
+    # 每次瀏覽使用獨立的 context，cookie 不會留在重用的 session 中
+    context = browser.new_context()
+    try:
+        context.route("**/*", block_heavy_resources)
+        page = context.new_page()
+        page.goto(url, wait_until="domcontentloaded", timeout=settings.BROWSER_TIMEOUT)
+        wait_for_content_stable(page, settings.BROWSER_STABLE_MS, settings.BROWSER_STABLE_MAX_MS)
+        return page.title(), extract_page_content(page)
+    finally:
+        context.close()
+
+
+def capture_remote_page(playwright, ws_url: str, headers: dict, url: str) -> dict[str, Any]:
+    """
+    透過 CDP 連線到遠端瀏覽器並擷取網頁（在 Playwright driver 執行緒執行）
+
+    Args:
+        playwright: driver 執行緒的 Playwright 實例
+        ws_url: 遠端瀏覽器的 WebSocket URL
+        headers: WebSocket 簽章標頭
+        url: 網址
+
+    Returns:
+        {"title", "content", "error"}（目標網站的錯誤以 error 回傳）
+
+    Raises:
+        Exception: CDP 連線失敗（呼叫端停止該 session）
+    """
+    browser = playwright.chromium.connect_over_cdp(ws_url, headers=headers)
+    try:
+        title, content = capture_page(browser, url)
+    except Exception as e:
+        # 目標網站的錯誤不影響 session，仍放回池中
+        logger.warning(f"⚠️ 網頁擷取失敗: {url} - {e}")
+        return {"title": "", "content": "", "error": str(e)}
+    finally:
+        # 中斷 CDP 連線（不關閉遠端瀏覽器）
+        try:
+            browser.close()
+        except Exception as cleanup_error:
+            logger.warning(f"⚠️ 瀏覽器連線清理警告: {cleanup_error}")
+
+    logger.info(f"📄 頁面標題: {title}")
+    return {"title": title, "content": content, "error": None}
+
+
+def browse_cache_key(task_description: str) -> str | None:
+    """瀏覽結果只取決於第一個 URL（沒有 URL 時不使用快取）"""
+    urls = extract_urls(task_description)
+    return urls[0] if urls else None
+
+
+def fetch_validators(task_description: str) -> dict[str, str] | None:
+    """
+    取得網頁的 ETag / Last-Modified（沿用 HTTP 擷取時的回應標頭）
+
+    Args:
+        task_description: 瀏覽任務描述（取第一個 URL）
+
+    Returns:
+        {"etag", "last_modified"}，伺服器未提供時為 None
+    """
+    url = browse_cache_key(task_description)
+    if not url:
+        return None
+    return web_fetcher.validators(url)
+
+
+def revalidate_page(validators: dict[str, str], task_description: str) -> bool:
+    """
+    以條件 GET 確認網頁未變更（已變更時新內容留在擷取器中，重新執行工具時直接使用）
+
+    Args:
+        validators: 寫入快取時的 ETag / Last-Modified
+        task_description: 瀏覽任務描述
+
+    Returns:
+        伺服器回應 304 Not Modified 時為 True
+    """
+    url = browse_cache_key(task_description)
+    if not url or not validators:
+        return False
+    return web_fetcher.fetch(url, validators=validators).not_modified
+
+
+def fetch_static(url: str) -> FetchedPage | None:
+    """
+    以 HTTP GET 擷取網頁（失敗時回傳 None，改用瀏覽器）
+
+    Args:
+        url: 網址
+
+    Returns:
+        FetchedPage，停用或連線失敗時為 None
+    """
+    if not settings.BROWSE_HTTP_FIRST:
+        return None
+    try:
+        return web_fetcher.fetch(url)
+    except Exception as e:
+        logger.warning(f"⚠️ HTTP 擷取失敗，改用瀏覽器: {url} - {e}")
+        return None
+
+
 @tool
+@memoize(
+    ttl=settings.TOOL_CACHE_BROWSE_TTL,
+    key=browse_cache_key,
+    cache_if=lambda result: result.startswith("🌐"),
+    validators=fetch_validators,
+    revalidate=revalidate_page,
+)
 def browse_website_official(task_description: str) -> str:
     """
-    使用官方 Playwright + AgentCore Browser 整合瀏覽網站
+    瀏覽網站：靜態網頁直接以 HTTP 擷取，需要 JavaScript 的網頁使用 Playwright + AgentCore Browser
 
     Args:
         task_description: 瀏覽任務描述，例如：
@@ -54,76 +311,169 @@ def browse_website_official(task_description: str) -> str:
     Returns:
         str: 瀏覽結果的詳細描述
     """
-    logger.info(f"🌐 使用官方 Playwright 瀏覽器開始任務: {task_description[:100]}...")
+    logger.info(f"🌐 開始瀏覽任務: {task_description[:100]}...")
 
-    try:
-        from bedrock_agentcore.tools.browser_client import browser_session
-        from playwright.sync_api import sync_playwright
+    # 解析任務描述，提取 URL（沒有 URL 時不需要建立瀏覽器）
+    urls = extract_urls(task_description)
+    if not urls:
+        return get_error_message("invalid_url")
 
-        # 使用官方的 browser_session 和 Playwright 整合
-        with browser_session(settings.AWS_REGION) as client:
-            logger.info("✅ AgentCore Browser 會話已建立")
+    target_url = urls[0]
+    logger.info(f"🎯 訪問目標 URL: {target_url}")
 
-            # 獲取 WebSocket URL 和 headers
-            ws_url, headers = client.generate_ws_headers()
-            logger.info("✅ WebSocket 連接資訊已生成")
+    # 檢查是否為 PDF 檔案
+    if target_url.lower().endswith(".pdf"):
+        logger.warning(get_browser_prompt("pdf_warning"))
 
-            with sync_playwright() as playwright:
-                # 透過 CDP 連接到遠端 Chrome 瀏覽器
-                browser = playwright.chromium.connect_over_cdp(ws_url, headers=headers)
-                context = browser.contexts[0]
-                page = context.pages[0]
+    result = browse_page(target_url)
+    if result["error"]:
+        return get_error_message("browser_navigation_failed", error=result["error"])
+    return format_browse_result(target_url, result["title"], truncate_content(result["content"]))
 
-                try:
-                    # 解析任務描述，嘗試提取 URL
-                    urls = extract_urls(task_description)
 
-                    if urls:
-                        # 如果找到 URL，訪問第一個
-                        target_url = urls[0]
-                        logger.info(f"🎯 訪問目標 URL: {target_url}")
+@tool
+def browse_websites(urls: list[str], task_description: str = "") -> str:
+    """
+    同時瀏覽多個網站並回傳結構化結果（比較或彙整多個網頁時使用，比逐一瀏覽快）
+
+    Args:
+        urls: 網址列表，例如 ["https://a.com/pricing", "https://b.com/pricing"]
+        task_description: 瀏覽目的，例如「比較各家的價格方案」
 
-                        # 檢查是否為 PDF 檔案
-                        if target_url.lower().endswith(".pdf"):
-                            logger.warning(get_browser_prompt("pdf_warning"))
+    Returns:
+        str: JSON 字串，包含各網頁的標題、內容（依 token 預算截斷）與錯誤
+    """
+    targets = list(dict.fromkeys(extract_urls(" ".join(urls))))
+    if not targets:
+        return get_error_message("invalid_url")
 
-                        # 導航到目標頁面
-                        page.goto(
-                            target_url, wait_until="networkidle", timeout=settings.BROWSER_TIMEOUT
-                        )
+    skipped = targets[settings.BROWSE_MULTI_MAX_URLS :]
+    targets = targets[: settings.BROWSE_MULTI_MAX_URLS]
+    logger.info(f"🌐 同時瀏覽 {len(targets)} 個網站: {task_description[:100]}")
+
+    start = time.perf_counter()
+    futures = [_get_page_executor().submit(browse_page, url) for url in targets]
+    done, _ = wait(futures, timeout=settings.BROWSE_MULTI_TIMEOUT)
+
+    pages = []
+    for url, future in zip(targets, futures, strict=True):
+        if future in done:
+            pages.append(future.result())
+        else:
+            future.cancel()
+            error = f"擷取逾時（{settings.BROWSE_MULTI_TIMEOUT:.0f} 秒）"
+            pages.append({"url": url, "title": "", "content": "", "tier": None, "error": error})
+
+    needs = [count_text_tokens(page["content"]) for page in pages]
+    budgets = allocate_token_budgets(
+        needs, settings.BROWSE_MULTI_PAGE_TOKENS, settings.BROWSE_MULTI_TOTAL_TOKENS
+    )
+    for page, need, budget in zip(pages, needs, budgets, strict=True):
+        page["truncated"] = need > budget
+        if page["truncated"]:
+            page["content"] = truncate_text(page["content"], budget)
+        page["tokens"] = min(need, budget)
+
+    total_tokens = sum(page["tokens"] for page in pages)
+    logger.info(
+        f"✅ 多網站瀏覽完成: {len(pages)} 頁, {total_tokens} tokens",
+        extra={
+            "event_type": "browse_multi",
+            "pages": len(pages),
+            "tiers": [page["tier"] for page in pages],
+            "errors": sum(1 for page in pages if page["error"]),
+            "total_tokens": total_tokens,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+        },
+    )
+    return json.dumps(
+        {
+            "task": task_description,
+            "pages": pages,
+            "skipped": skipped,
+            "total_tokens": total_tokens,
+        },
+        ensure_ascii=False,
+    )
+
+
+def browse_page(url: str) -> dict[str, Any]:
+    """
+    擷取單一網頁：靜態網頁以 HTTP 擷取，需要 JavaScript 時改用瀏覽器
 
-                        # 獲取頁面標題
-                        title = page.title()
-                        logger.info(f"📄 頁面標題: {title}")
+    Args:
+        url: 網址
 
-                        # 嘗試提取頁面內容
-                        content = extract_page_content(page)
+    Returns:
+        {"url", "title", "content", "tier", "error"}（成功時 error 為 None）
+    """
+    result: dict[str, Any] = {"url": url, "title": "", "content": "", "tier": "http", "error": None}
 
-                        # 構建結果
-                        result = format_browse_result(target_url, title, content)
+    # 靜態網頁直接使用 HTTP 擷取的內容，不建立瀏覽器
+    page = fetch_static(url)
+    if page is not None and not page.needs_browser:
+        logger.info(
+            f"📰 使用 HTTP 擷取結果: {url}",
+            extra={"event_type": "browse_tier", "tier": "http"},
+        )
+        return {**result, "title": page.title or url, "content": page.text}
 
-                    else:
-                        # 沒有找到 URL，回傳說明
-                        result = get_error_message("invalid_url")
+    if not settings.BROWSER_ENABLED:
+        # 輕量版 Processor（PROCESSOR_PROFILE=text）不使用遠端瀏覽器
+        reason = page.escalate_reason if page is not None else "fetch_failed"
+        logger.info(
+            f"⏭️ 瀏覽器未啟用，無法擷取: {url}",
+            extra={"event_type": "browse_tier", "tier": "http", "reason": reason},
+        )
+        return {**result, "error": get_error_message("content_extraction_failed")}
+
+    result["tier"] = "browser"
+    logger.info(
+        f"🌐 改用瀏覽器: {url}",
+        extra={
+            "event_type": "browse_tier",
+            "tier": "browser",
+            "reason": page.escalate_reason if page is not None else "fetch_failed",
+        },
+    )
 
-                    # 等待一小段時間確保頁面完全載入
-                    time.sleep(2)
+    try:
+        # 重用容器內的 AgentCore Browser session；連線失敗時 session 會被停止
+        with get_browser_pool().session() as client:
+            # WebSocket 簽章有時效，每次重新產生
+            ws_url, headers = client.generate_ws_headers()
 
-                finally:
-                    # 確保清理資源
-                    try:
-                        page.close()
-                        browser.close()
-                        logger.info("✅ 瀏覽器資源已清理")
-                    except Exception as cleanup_error:
-                        logger.warning(f"⚠️ 瀏覽器資源清理警告: {cleanup_error}")
+            # 在 Playwright driver 執行緒透過 CDP 連接到遠端 Chrome 瀏覽器
+            captured = get_driver_pool().submit(capture_remote_page, ws_url, headers, url).result()
 
-                return result
+        return {**result, **captured}
 
     except Exception as e:
-        error_msg = f"官方瀏覽器工具執行失敗: {str(e)}"
-        logger.error(f"❌ {error_msg}", exc_info=True)
-        return get_error_message("browser_navigation_failed", error=str(e))
+        logger.error(f"❌ 官方瀏覽器工具執行失敗: {str(e)}", exc_info=True)
+        return {**result, "error": str(e)}
+
+
+def allocate_token_budgets(needs: list[int], per_page: int, total: int) -> list[int]:
+    """
+    分配各網頁的 token 預算：每頁不超過 per_page、總和不超過 total，
+    較短的網頁用不完的額度分給較長的網頁
+
+    Args:
+        needs: 各網頁內容的 token 數
+        per_page: 單頁上限
+        total: 總上限
+
+    Returns:
+        各網頁的預算（與 needs 同順序）
+    """
+    budgets = [0] * len(needs)
+    remaining = total
+    order = sorted(range(len(needs)), key=lambda i: needs[i])
+    for position, index in enumerate(order):
+        share = remaining // (len(needs) - position)
+        budgets[index] = min(needs[index], per_page, share)
+        remaining -= budgets[index]
+    return budgets
 
 
 @tool
@@ -207,17 +557,33 @@ def extract_page_content(page) -> str:
             }
         """)
 
-        # 限制內容長度避免過長
-        if content and len(content) > 2000:
-            content = content[:2000] + "\n\n" + get_browser_prompt("content_truncated")
-
-        return content if content else get_error_message("content_extraction_failed")
+        # 回傳給模型前再依各工具的上限截斷
+        return (
+            content[:MAX_EXTRACT_CHARS]
+            if content
+            else get_error_message("content_extraction_failed")
+        )
 
     except Exception as e:
         logger.warning(f"⚠️ 內容提取失敗: {e}")
         return get_error_message("content_extraction_failed")
 
 
+def truncate_content(content: str) -> str:
+    """
+    限制內容長度避免過長
+
+    Args:
+        content: 內容文字
+
+    Returns:
+        截斷後的內容
+    """
+    if len(content) > MAX_CONTENT_CHARS:
+        return content[:MAX_CONTENT_CHARS] + "\n\n" + get_browser_prompt("content_truncated")
+    return content
+
+
 def format_browse_result(url: str, title: str, content: str) -> str:
     """
     格式化瀏覽結果
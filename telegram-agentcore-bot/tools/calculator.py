@@ -7,11 +7,17 @@ from strands import tool
 
 from config.prompts import get_error_message
 from utils.logger import get_logger
+from utils.tool_cache import memoize
 
 logger = get_logger(__name__)
 
 
 @tool
+@memoize(
+    ttl=None,  # 純函數，結果永久有效
+    key=lambda expression: "".join(expression.split()),
+    cache_if=lambda result: result.startswith("計算結果"),
+)
 def calculate(expression: str) -> str:
     """
     執行簡單數學計算（安全版本）
@@ -4,12 +4,15 @@
 
 from strands import tool
 
+from config.settings import settings
 from utils.logger import get_logger
+from utils.tool_cache import memoize
 
 logger = get_logger(__name__)
 
 
 @tool
+@memoize(ttl=settings.TOOL_CACHE_WEATHER_TTL, key=lambda city: city.strip())
 def get_weather(city: str) -> str:
     """
     取得城市天氣資訊
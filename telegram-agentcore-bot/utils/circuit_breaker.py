@@ -0,0 +1,182 @@
+"""
+斷路器
+同一個 Lambda 容器內依模型 ID 共用，連續失敗時暫停呼叫，避免在服務降級期間持續重試
+"""
+
+import threading
+import time
+from typing import Any
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """斷路器開啟，呼叫被拒絕"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit open for {name}, retry after {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    斷路器
+
+    - closed：正常呼叫，連續失敗達門檻時開啟
+    - open：直接拒絕，經過 recovery_timeout 後進入 half_open
+    - half_open：只放行一個試探呼叫，成功則關閉，失敗則重新開啟
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        """
+        初始化斷路器
+
+        Args:
+            name: 名稱（例如模型 ID）
+            failure_threshold: 連續失敗次數門檻
+            recovery_timeout: 開啟後等待多久再試探（秒）
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        """目前狀態（open 逾時後視為 half_open）"""
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.time() - self._opened_at >= self.recovery_timeout:
+            return HALF_OPEN
+        return self._state
+
+    def retry_after(self) -> float:
+        """距離可以試探還有多少秒"""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self.recovery_timeout - (time.time() - self._opened_at))
+
+    def allow(self) -> bool:
+        """
+        是否允許呼叫
+
+        Returns:
+            True 表示可以呼叫；half_open 時只放行一個試探呼叫
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._probe_in_flight:
+                self._state = HALF_OPEN
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        """記錄成功（關閉斷路器）"""
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info(
+                    f"✅ 斷路器關閉: {self.name}",
+                    extra={"event_type": "circuit_breaker", "circuit": self.name, "state": CLOSED},
+                )
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """
+        結束呼叫但不影響狀態（錯誤與請求本身有關，無法判斷服務是否恢復）
+
+        half_open 時釋放試探名額，下一個呼叫可以再試探；不重設失敗次數
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """記錄暫時性失敗（連續失敗達門檻或試探失敗時開啟）"""
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.opened += 1
+                self._state = OPEN
+                self._opened_at = time.time()
+                logger.warning(
+                    f"🚧 斷路器開啟: {self.name}（連續失敗 {self._failures} 次）",
+                    extra={
+                        "event_type": "circuit_breaker",
+                        "circuit": self.name,
+                        "state": OPEN,
+                        "failures": self._failures,
+                    },
+                )
+
+    def get_stats(self) -> dict[str, Any]:
+        """
+        取得統計
+
+        Returns:
+            統計資訊字典
+        """
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": self._current_state(),
+                "failures": self._failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(
+    name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0
+) -> CircuitBreaker:
+    """
+    取得指定名稱的斷路器（容器內共用，跨 invocation 保留狀態）
+
+    Args:
+        name: 名稱（例如模型 ID）
+        failure_threshold: 連續失敗次數門檻（僅建立時使用）
+        recovery_timeout: 開啟後等待多久再試探（僅建立時使用）
+
+    Returns:
+        CircuitBreaker
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, failure_threshold, recovery_timeout)
+            _breakers[name] = breaker
+        return breaker
+
+
+def reset_circuit_breakers() -> None:
+    """清除所有斷路器（測試用）"""
+    with _breakers_lock:
+        _breakers.clear()
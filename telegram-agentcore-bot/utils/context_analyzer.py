@@ -6,31 +6,22 @@ Context 大小分析器
 from typing import Any
 
 from utils.logger import get_logger
+from utils.token_accounting import DEFAULT_IMAGE_TOKENS, count_content_tokens, count_image
 
 logger = get_logger(__name__)
 
-# Token 估算：平均每個字元約 0.25 tokens（中文）或 0.33 tokens（英文）
-# 保守估計使用 0.4
-CHARS_PER_TOKEN = 2.5
-
 
 def estimate_tokens(text: str | list | dict) -> int:
     """
     估算文字的 token 數量
 
     Args:
-        text: 文字、列表或字典
+        text: 文字、列表或字典（Converse 內容區塊會直接走訪，不轉為字串）
 
     Returns:
         估算的 token 數量
     """
-    if isinstance(text, (list, dict)) or not isinstance(text, str):
-        text = str(text)
-
-    char_count = len(text)
-    estimated_tokens = int(char_count / CHARS_PER_TOKEN)
-
-    return estimated_tokens
+    return count_content_tokens(text).total
 
 
 def analyze_context_size(
@@ -38,15 +29,17 @@ def analyze_context_size(
     memory_context: Any = None,
     tool_results: Any = None,
     images: list | None = None,
+    history_tokens: int = 0,
 ) -> dict[str, Any]:
     """
     分析 context 各部分的大小
 
     Args:
-        messages: 消息內容
+        messages: 消息內容（字串或 Converse 內容區塊）
         memory_context: Memory 檢索的內容
         tool_results: 工具執行結果
-        images: 圖片列表
+        images: 圖片列表；提供時以此計算圖片，忽略 messages 內的圖片區塊以免重複計算
+        history_tokens: 對話歷史的 token 數（由 TokenLedger 累計）
 
     Returns:
         分析結果字典
@@ -54,43 +47,50 @@ def analyze_context_size(
     analysis = {
         "messages_chars": 0,
         "messages_tokens": 0,
+        "history_tokens": history_tokens,
         "memory_chars": 0,
         "memory_tokens": 0,
         "tool_results_chars": 0,
         "tool_results_tokens": 0,
         "images_count": 0,
-        "images_tokens": 0,  # 每張圖片約 ~1000 tokens
+        "images_tokens": 0,  # 依圖片尺寸計價，尺寸未知時每張 DEFAULT_IMAGE_TOKENS
         "total_tokens": 0,
         "is_large": False,
         "warning_level": "normal",  # normal, warning, critical
     }
 
-    # 分析消息
+    # 分析消息（圖片區塊另計）
     if messages:
-        messages_str = str(messages)
-        analysis["messages_chars"] = len(messages_str)
-        analysis["messages_tokens"] = estimate_tokens(messages_str)
+        count = count_content_tokens(messages)
+        analysis["messages_chars"] = count.chars
+        analysis["messages_tokens"] = count.text_tokens
+        analysis["images_count"] = count.image_count
+        analysis["images_tokens"] = count.image_tokens
 
     # 分析 Memory context
     if memory_context:
-        memory_str = str(memory_context)
-        analysis["memory_chars"] = len(memory_str)
-        analysis["memory_tokens"] = estimate_tokens(memory_str)
+        count = count_content_tokens(memory_context)
+        analysis["memory_chars"] = count.chars
+        analysis["memory_tokens"] = count.total
 
     # 分析工具結果
     if tool_results:
-        tool_str = str(tool_results)
-        analysis["tool_results_chars"] = len(tool_str)
-        analysis["tool_results_tokens"] = estimate_tokens(tool_str)
+        count = count_content_tokens(tool_results)
+        analysis["tool_results_chars"] = count.chars
+        analysis["tool_results_tokens"] = count.total
 
     # 分析圖片
     if images:
         analysis["images_count"] = len(images)
-        analysis["images_tokens"] = len(images) * 1000  # 每張圖片約 1000 tokens
+        analysis["images_tokens"] = sum(
+            count_image(image).image_tokens if isinstance(image, dict) else DEFAULT_IMAGE_TOKENS
+            for image in images
+        )
 
     # 計算總 tokens
     analysis["total_tokens"] = (
         analysis["messages_tokens"]
+        + analysis["history_tokens"]
         + analysis["memory_tokens"]
         + analysis["tool_results_tokens"]
         + analysis["images_tokens"]
@@ -123,6 +123,7 @@ def log_context_analysis(
         "operation": operation,
         "total_tokens": analysis["total_tokens"],
         "messages_tokens": analysis["messages_tokens"],
+        "history_tokens": analysis.get("history_tokens", 0),
         "memory_tokens": analysis["memory_tokens"],
         "tool_results_tokens": analysis["tool_results_tokens"],
         "images_count": analysis["images_count"],
@@ -143,46 +144,53 @@ def log_context_analysis(
         logger.info(f"📊 Context size: {analysis['total_tokens']} tokens", extra=log_extra)
 
 
-def should_truncate_context(analysis: dict[str, Any]) -> bool:
+def should_truncate_context(analysis: dict[str, Any], limit: int = 150000) -> bool:
     """
     判斷是否應該截斷 context
 
     Args:
         analysis: 分析結果
+        limit: token 上限（預設 150K）
 
     Returns:
         是否應該截斷
     """
-    # 超過 150K tokens 建議截斷
-    return analysis["total_tokens"] > 150000
+    # 超過上限建議截斷
+    return analysis["total_tokens"] > limit
 
 
-def get_truncation_suggestion(analysis: dict[str, Any]) -> dict[str, str]:
+def get_truncation_suggestion(analysis: dict[str, Any], limit: int = 150000) -> dict[str, str]:
     """
     提供 context 截斷建議
 
     Args:
         analysis: 分析結果
+        limit: token 上限（預設 150K，各項門檻依比例調整）
 
     Returns:
         截斷建議
     """
     suggestions = []
+    scale = limit / 150000
 
     # Memory 佔用過大
-    if analysis.get("memory_tokens", 0) > 50000:
+    if analysis.get("memory_tokens", 0) > 50000 * scale:
         suggestions.append("limit_memory")
 
     # 工具結果過大
-    if analysis.get("tool_results_tokens", 0) > 30000:
+    if analysis.get("tool_results_tokens", 0) > 30000 * scale:
         suggestions.append("summarize_tool_results")
 
+    # 圖片過多
+    if analysis.get("images_tokens", 0) > 30000 * scale:
+        suggestions.append("downsample_images")
+
     # 消息過長
-    if analysis.get("messages_tokens", 0) > 50000:
+    if analysis.get("messages_tokens", 0) > 50000 * scale:
         suggestions.append("truncate_messages")
 
     return {
-        "should_truncate": should_truncate_context(analysis),
+        "should_truncate": should_truncate_context(analysis, limit),
         "suggestions": suggestions,
-        "reason": f"Total tokens: {analysis.get('total_tokens', 0)} (limit: ~200K)",
+        "reason": f"Total tokens: {analysis.get('total_tokens', 0)} (limit: ~{limit // 1000}K)",
     }
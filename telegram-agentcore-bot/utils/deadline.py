@@ -0,0 +1,125 @@
+"""
+處理期限
+以 Lambda 剩餘時間計算截止時間，讓重試、降級與延後寫入在逾時前收手；
+訊息本身的期限（routing.expiresAt，入口依訊息類型設定）讓各階段略過已過期的訊息
+"""
+
+import time
+from datetime import datetime
+from typing import Any
+
+
+class Deadline:
+    """截止時間（epoch 秒）"""
+
+    def __init__(self, expires_at: float):
+        """
+        初始化截止時間
+
+        Args:
+            expires_at: 截止時間（time.time()）
+        """
+        self.expires_at = expires_at
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        """
+        建立從現在起算的截止時間
+
+        Args:
+            seconds: 秒數
+
+        Returns:
+            Deadline
+        """
+        return cls(time.time() + seconds)
+
+    @classmethod
+    def from_context(cls, context: Any) -> "Deadline | None":
+        """
+        從 Lambda context 取得截止時間
+
+        Args:
+            context: Lambda context（可為 None 或沒有 get_remaining_time_in_millis）
+
+        Returns:
+            Deadline，無法取得時為 None
+        """
+        get_remaining = getattr(context, "get_remaining_time_in_millis", None)
+        if not callable(get_remaining):
+            return None
+        remaining_ms = get_remaining()
+        if not isinstance(remaining_ms, int | float):
+            return None
+        return cls.after(remaining_ms / 1000)
+
+    @classmethod
+    def from_message(cls, message: dict[str, Any]) -> "Deadline | None":
+        """
+        從標準化訊息取得訊息期限（routing.expiresAt，epoch 秒）
+
+        Args:
+            message: 標準化訊息
+
+        Returns:
+            Deadline，訊息沒有期限時為 None
+        """
+        expires_at = (message.get("routing") or {}).get("expiresAt")
+        if not isinstance(expires_at, int | float) or isinstance(expires_at, bool):
+            return None
+        return cls(float(expires_at))
+
+    @staticmethod
+    def earliest(*deadlines: "Deadline | None") -> "Deadline | None":
+        """
+        取最早的截止時間（忽略 None）
+
+        Args:
+            deadlines: 截止時間
+
+        Returns:
+            最早的 Deadline，全部為 None 時為 None
+        """
+        candidates = [deadline for deadline in deadlines if deadline is not None]
+        return min(candidates, key=lambda deadline: deadline.expires_at, default=None)
+
+    def remaining(self, reserve: float = 0.0) -> float:
+        """
+        剩餘秒數
+
+        Args:
+            reserve: 保留給後續步驟的秒數
+
+        Returns:
+            扣除保留時間後的剩餘秒數（可能為負數）
+        """
+        return self.expires_at - time.time() - reserve
+
+    def expired(self, reserve: float = 0.0) -> bool:
+        """是否已到期（扣除保留時間）"""
+        return self.remaining(reserve) <= 0
+
+    def __repr__(self) -> str:
+        return f"Deadline(remaining={self.remaining():.1f}s)"
+
+
+def message_age(message: dict[str, Any]) -> float | None:
+    """
+    訊息從入口收到至今的秒數（依標準化訊息的 timestamp）
+
+    Args:
+        message: 標準化訊息
+
+    Returns:
+        秒數，timestamp 缺少或無法解析時為 None
+    """
+    timestamp = message.get("timestamp")
+    if not isinstance(timestamp, str):
+        return None
+    try:
+        received_at = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if received_at.tzinfo is None:
+        return None
+    return time.time() - received_at.timestamp()
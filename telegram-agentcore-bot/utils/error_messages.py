@@ -14,6 +14,10 @@ ERROR_MESSAGES = {
     "timeout": "⏱️ 處理時間過長，請簡化問題或分段詢問",
     "file_processing_error": "📁 檔案處理失敗，請檢查檔案格式",
     "image_processing_error": "🖼️ 圖片處理失敗，請確認圖片格式正確",
+    "circuit_open": "🚧 AI 服務目前不穩定，已暫停呼叫，請約半分鐘後再試",
+    "deadline_partial": "⏳ 處理時間即將用盡，以上是目前的進度。需要完整回答請再問一次，或把問題拆小一點",
+    "deadline_pending": "⏳ 這個問題需要較長的處理時間，已超過單次處理上限。請稍後再問一次，或把問題拆小一點",
+    "message_expired": "⌛ 抱歉，這則訊息等待處理太久，已經過期了。請再傳送一次",
     "generic": "❌ 系統處理時遇到問題，請稍後再試",
 }
 
@@ -32,6 +36,10 @@ def get_user_friendly_error(error: Exception | str, context: dict[str, Any] | No
     error_str = str(error).lower()
     context = context or {}
 
+    # 斷路器開啟（服務降級期間快速失敗）
+    if "circuit open" in error_str:
+        return ERROR_MESSAGES["circuit_open"]
+
     # Bedrock streaming 錯誤
     if "modelstreamerrorexception" in error_str or "eventstreamerror" in error_str:
         return ERROR_MESSAGES["bedrock_stream_error"]
@@ -0,0 +1,225 @@
+"""
+檔案類型偵測
+以檔案開頭的 magic bytes 判斷類型，不依賴副檔名或 UTF-8 解碼是否成功
+"""
+
+import os
+import struct
+
+# 判斷類型時讀取的開頭長度
+SNIFF_BYTES = 8192
+
+# 無法辨識的二進位檔案
+BINARY_FILE_TYPE = {
+    "kind": "binary",
+    "mime": "application/octet-stream",
+    "description": "二進位檔案",
+}
+
+# (magic bytes, 偏移, kind, MIME, 說明)
+_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", 0, "image", "image/png", "PNG 圖片"),
+    (b"\xff\xd8\xff", 0, "image", "image/jpeg", "JPEG 圖片"),
+    (b"GIF87a", 0, "image", "image/gif", "GIF 圖片"),
+    (b"GIF89a", 0, "image", "image/gif", "GIF 圖片"),
+    (b"II*\x00", 0, "image", "image/tiff", "TIFF 圖片"),
+    (b"MM\x00*", 0, "image", "image/tiff", "TIFF 圖片"),
+    (b"%PDF-", 0, "document", "application/pdf", "PDF 文件"),
+    (
+        b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1",
+        0,
+        "document",
+        "application/x-ole-storage",
+        "Office 97-2003 文件",
+    ),
+    (b"SQLite format 3\x00", 0, "binary", "application/vnd.sqlite3", "SQLite 資料庫"),
+    (b"\x1f\x8b", 0, "archive", "application/gzip", "GZIP 壓縮檔"),
+    (b"7z\xbc\xaf\x27\x1c", 0, "archive", "application/x-7z-compressed", "7-Zip 壓縮檔"),
+    (b"Rar!\x1a\x07", 0, "archive", "application/vnd.rar", "RAR 壓縮檔"),
+    (b"OggS", 0, "audio", "audio/ogg", "OGG 音訊"),
+    (b"ID3", 0, "audio", "audio/mpeg", "MP3 音訊"),
+    (b"fLaC", 0, "audio", "audio/flac", "FLAC 音訊"),
+    (b"\x7fELF", 0, "binary", "application/x-elf", "ELF 執行檔"),
+]
+
+# ZIP 容器內的 Office Open XML 格式（以副檔名區分）
+_ZIP_DOCUMENTS = {
+    ".xlsx": (
+        "document",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "Excel 試算表",
+    ),
+    ".docx": (
+        "document",
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        "Word 文件",
+    ),
+    ".pptx": (
+        "document",
+        "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+        "PowerPoint 簡報",
+    ),
+}
+
+# 文字檔的 MIME（以副檔名區分）
+_TEXT_MIME_TYPES = {
+    ".csv": "text/csv",
+    ".tsv": "text/tab-separated-values",
+    ".json": "application/json",
+    ".md": "text/markdown",
+    ".html": "text/html",
+    ".xml": "application/xml",
+}
+
+# Converse API 支援的圖片格式
+_CONVERSE_IMAGE_FORMATS = {
+    "image/png": "png",
+    "image/jpeg": "jpeg",
+    "image/gif": "gif",
+    "image/webp": "webp",
+}
+
+
+def detect_file_type(head: bytes, filename: str = "") -> dict[str, str]:
+    """
+    以檔案開頭判斷檔案類型
+
+    Args:
+        head: 檔案開頭的 bytes（建議至少 SNIFF_BYTES）
+        filename: 檔案名稱（只用於區分同一容器格式，例如 ZIP 內的 xlsx / docx）
+
+    Returns:
+        {"kind": text|image|document|archive|audio|video|binary, "mime": ..., "description": ...}
+    """
+    extension = os.path.splitext(filename)[1].lower()
+
+    for magic, offset, kind, mime, description in _SIGNATURES:
+        if head[offset : offset + len(magic)] == magic:
+            return _file_type(kind, mime, description)
+
+    # RIFF 容器：WEBP / WAV / AVI
+    if head[:4] == b"RIFF":
+        riff_types = {
+            b"WEBP": ("image", "image/webp", "WEBP 圖片"),
+            b"WAVE": ("audio", "audio/wav", "WAV 音訊"),
+            b"AVI ": ("video", "video/x-msvideo", "AVI 影片"),
+        }
+        if head[8:12] in riff_types:
+            return _file_type(*riff_types[head[8:12]])
+
+    # ISO BMFF 容器：MP4 / MOV / HEIC
+    if head[4:8] == b"ftyp":
+        if head[8:12] in (b"heic", b"heix", b"mif1"):
+            return _file_type("image", "image/heic", "HEIC 圖片")
+        return _file_type("video", "video/mp4", "MP4 影片")
+
+    # ZIP 容器：Office 文件或一般壓縮檔
+    if head[:4] in (b"PK\x03\x04", b"PK\x05\x06"):
+        if extension in _ZIP_DOCUMENTS:
+            return _file_type(*_ZIP_DOCUMENTS[extension])
+        return _file_type("archive", "application/zip", "ZIP 壓縮檔")
+
+    if is_utf8_text(head):
+        return _file_type("text", _TEXT_MIME_TYPES.get(extension, "text/plain"), "文字檔")
+
+    return dict(BINARY_FILE_TYPE)
+
+
+def is_utf8_text(head: bytes) -> bool:
+    """
+    判斷開頭是否為 UTF-8 文字（不含 NUL，結尾被截斷的多位元組字元視為合法）
+
+    Args:
+        head: 檔案開頭的 bytes
+
+    Returns:
+        bool: True 如果是 UTF-8 文字
+    """
+    if b"\x00" in head:
+        return False
+    try:
+        head.decode("utf-8")
+        return True
+    except UnicodeDecodeError as e:
+        # 只允許最後一個字元因截斷而不完整
+        return e.reason == "unexpected end of data" and e.start >= len(head) - 3
+
+
+def converse_image_format(head: bytes) -> str | None:
+    """
+    取得 Converse API 使用的圖片格式
+
+    Args:
+        head: 圖片開頭的 bytes
+
+    Returns:
+        'jpeg' | 'png' | 'gif' | 'webp'，不支援的格式回傳 None
+    """
+    return _CONVERSE_IMAGE_FORMATS.get(detect_file_type(head)["mime"])
+
+
+def image_dimensions(data: bytes) -> tuple[int, int] | None:
+    """
+    從圖片檔頭讀取寬高（不解碼像素）
+
+    支援 PNG、GIF、JPEG、WEBP；JPEG 的 SOF 區段可能位於 EXIF 之後，需傳入完整內容
+
+    Args:
+        data: 圖片內容
+
+    Returns:
+        (寬, 高)，無法辨識時為 None
+    """
+    try:
+        if data[:8] == b"\x89PNG\r\n\x1a\n" and data[12:16] == b"IHDR":
+            return struct.unpack(">II", data[16:24])
+        if data[:6] in (b"GIF87a", b"GIF89a"):
+            return struct.unpack("<HH", data[6:10])
+        if data[:3] == b"\xff\xd8\xff":
+            return _jpeg_dimensions(data)
+        if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+            return _webp_dimensions(data)
+    except struct.error:
+        return None
+    return None
+
+
+def _jpeg_dimensions(data: bytes) -> tuple[int, int] | None:
+    """逐一略過 JPEG 區段，直到 SOF（Start Of Frame）"""
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:  # 填充位元組
+            offset += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:  # 無長度的標記
+            offset += 2
+            continue
+        (length,) = struct.unpack(">H", data[offset + 2 : offset + 4])
+        # SOF0~SOF15（排除 DHT / JPG / DAC）
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[offset + 5 : offset + 9])
+            return width, height
+        offset += 2 + length
+    return None
+
+
+def _webp_dimensions(data: bytes) -> tuple[int, int] | None:
+    chunk = data[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        (bits,) = struct.unpack("<I", data[21:25])
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        return width, height
+    return None
+
+
+def _file_type(kind: str, mime: str, description: str) -> dict[str, str]:
+    return {"kind": kind, "mime": mime, "description": description}
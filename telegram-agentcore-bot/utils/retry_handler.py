@@ -3,30 +3,57 @@
 處理 Bedrock API 的暫時性錯誤，實施降級策略
 """
 
+import random
 import time
 from collections.abc import Callable
 from typing import Any
 
-from botocore.exceptions import ClientError, EventStreamError
+from botocore.exceptions import ClientError, EventStreamError, HTTPClientError
+from botocore.exceptions import ConnectionError as BotoConnectionError
 
+from config.settings import settings
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from utils.deadline import Deadline
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# 服務端暫時性錯誤（throttling、5xx 降級、模型尚未就緒或逾時），可重試並計入斷路器
+RETRYABLE_ERROR_CODES = frozenset(
+    {
+        "ThrottlingException",
+        "TooManyRequestsException",
+        "ServiceUnavailableException",
+        "InternalServerException",
+        "ModelNotReadyException",
+        "ModelTimeoutException",
+    }
+)
+
 
 class RetryHandler:
     """重試處理器，支持降級策略"""
 
-    def __init__(self, max_attempts: int = 3, base_delay: float = 2.0):
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 2.0,
+        max_delay: float = 10.0,
+        min_attempt_seconds: float = 0.0,
+    ):
         """
         初始化重試處理器
 
         Args:
             max_attempts: 最大重試次數
             base_delay: 基礎延遲時間（秒）
+            max_delay: 單次延遲上限（秒）
+            min_attempt_seconds: 有截止時間時，剩餘時間少於此值就不再開始新的嘗試
         """
         self.max_attempts = max_attempts
         self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.min_attempt_seconds = min_attempt_seconds
 
     def execute_with_retry(
         self,
@@ -34,6 +61,8 @@ class RetryHandler:
         *args,
         fallback_func: Callable | None = None,
         context: dict[str, Any] | None = None,
+        deadline: Deadline | None = None,
+        breaker: CircuitBreaker | None = None,
         **kwargs,
     ) -> dict[str, Any]:
         """
@@ -44,6 +73,8 @@ class RetryHandler:
             *args: 函數參數
             fallback_func: 降級函數（如果主函數失敗）
             context: 執行上下文（用於日誌）
+            deadline: 截止時間（剩餘時間不足以再嘗試一次時停止重試與降級）
+            breaker: 斷路器（開啟時直接失敗，不呼叫 func 與降級函數）
             **kwargs: 函數關鍵字參數
 
         Returns:
@@ -53,6 +84,14 @@ class RetryHandler:
         last_error = None
 
         for attempt in range(1, self.max_attempts + 1):
+            if breaker is not None and not breaker.allow():
+                last_error = CircuitOpenError(breaker.name, breaker.retry_after())
+                logger.warning(
+                    f"🚧 Circuit open, failing fast: {breaker.name}",
+                    extra={"attempt": attempt, "context": context},
+                )
+                break
+
             try:
                 logger.info(
                     f"Executing function (attempt {attempt}/{self.max_attempts})",
@@ -61,6 +100,9 @@ class RetryHandler:
 
                 result = func(*args, **kwargs)
 
+                if breaker is not None:
+                    breaker.record_success()
+
                 if attempt > 1:
                     logger.info(
                         f"✅ Function succeeded on attempt {attempt}",
@@ -69,19 +111,26 @@ class RetryHandler:
 
                 return {"success": True, "result": result, "attempts": attempt}
 
-            except (EventStreamError, ClientError) as e:
+            except Exception as e:
                 last_error = e
                 error_type = type(e).__name__
 
-                logger.warning(
-                    f"⚠️ Attempt {attempt} failed: {error_type}",
-                    extra={
-                        "attempt": attempt,
-                        "error_type": error_type,
-                        "error_message": str(e),
-                        "context": context,
-                    },
-                )
+                if isinstance(e, EventStreamError | ClientError) or self._is_retryable(e):
+                    logger.warning(
+                        f"⚠️ Attempt {attempt} failed: {error_type}",
+                        extra={
+                            "attempt": attempt,
+                            "error_type": error_type,
+                            "error_message": str(e),
+                            "context": context,
+                        },
+                    )
+                else:
+                    logger.error(
+                        f"❌ Unexpected error on attempt {attempt}: {error_type}",
+                        extra={"error": str(e), "context": context},
+                        exc_info=True,
+                    )
 
                 # 檢查是否是不可重試的錯誤
                 if not self._is_retryable(e):
@@ -89,28 +138,32 @@ class RetryHandler:
                         f"❌ Non-retryable error: {error_type}",
                         extra={"error": str(e), "context": context},
                     )
+                    # 錯誤與請求本身有關，不計入斷路器失敗，也不視為服務恢復
+                    if breaker is not None:
+                        breaker.release_probe()
                     break
 
+                if breaker is not None:
+                    breaker.record_failure()
+
                 # 如果還有重試機會，等待後重試
                 if attempt < self.max_attempts:
-                    delay = self._calculate_delay(attempt)
+                    delay = self._backoff(attempt)
+                    if deadline is not None and deadline.expired(delay + self.min_attempt_seconds):
+                        logger.warning(
+                            "⏱️ Not enough time left for another attempt",
+                            extra={"attempt": attempt, "remaining": round(deadline.remaining(), 1)},
+                        )
+                        break
+
                     logger.info(
                         f"⏳ Waiting {delay:.1f}s before retry...",
                         extra={"attempt": attempt, "delay": delay},
                     )
                     time.sleep(delay)
 
-            except Exception as e:
-                last_error = e
-                logger.error(
-                    f"❌ Unexpected error on attempt {attempt}: {type(e).__name__}",
-                    extra={"error": str(e), "context": context},
-                    exc_info=True,
-                )
-                break
-
-        # 所有重試都失敗了，嘗試降級策略
-        if fallback_func:
+        # 所有重試都失敗了，嘗試降級策略（斷路器開啟或時間不足時略過）
+        if fallback_func and self._can_fallback(last_error, deadline):
             try:
                 logger.info(
                     "🔄 All retries failed, trying fallback function",
@@ -139,6 +192,15 @@ class RetryHandler:
             "error_type": type(last_error).__name__ if last_error else "Unknown",
         }
 
+    def _can_fallback(self, error: Exception | None, deadline: Deadline | None) -> bool:
+        """降級函數會再呼叫一次模型：斷路器開啟或剩餘時間不足時不執行"""
+        if isinstance(error, CircuitOpenError):
+            return False
+        if deadline is not None and deadline.expired(self.min_attempt_seconds):
+            logger.warning("⏱️ Not enough time left for fallback")
+            return False
+        return True
+
     def _is_retryable(self, error: Exception) -> bool:
         """
         判斷錯誤是否可重試
@@ -149,25 +211,33 @@ class RetryHandler:
         Returns:
             是否可重試
         """
-        error_str = str(error).lower()
-
         # EventStreamError 通常是暫時性的
         if isinstance(error, EventStreamError):
             return True
 
-        # Throttling 錯誤可重試
+        # 依錯誤碼判斷（botocore 的訊息格式為 "(ServiceUnavailableException) ..."）
         if isinstance(error, ClientError):
             error_code = error.response.get("Error", {}).get("Code", "")
-            if error_code in ["ThrottlingException", "TooManyRequestsException"]:
+            if error_code in RETRYABLE_ERROR_CODES:
                 return True
 
-        # 包含這些關鍵字的錯誤可重試
+        # 連線失敗、連線 / 讀取逾時
+        if isinstance(
+            error, BotoConnectionError | HTTPClientError | ConnectionError | TimeoutError
+        ):
+            return True
+
+        # 包含這些關鍵字的錯誤可重試（strands 等包裝過的錯誤）
+        error_str = str(error).lower()
         retryable_keywords = [
             "timeout",
             "throttl",
             "rate limit",
             "service unavailable",
+            "serviceunavailable",
             "internal error",
+            "internalserver",
+            "modelnotready",
             "temporary",
         ]
 
@@ -175,22 +245,60 @@ class RetryHandler:
 
     def _calculate_delay(self, attempt: int) -> float:
         """
-        計算指數退避延遲
+        計算指數退避延遲上限
 
         Args:
             attempt: 當前重試次數
 
         Returns:
-            延遲時間（秒）
+            延遲上限（秒）
         """
         # 指數退避：2, 4, 8...
         delay = self.base_delay * (2 ** (attempt - 1))
         # 最大延遲 10 秒
-        return min(delay, 10.0)
+        return min(delay, self.max_delay)
+
+    def _backoff(self, attempt: int) -> float:
+        """
+        計算實際等待時間（full jitter：0 到指數退避上限之間的隨機值）
+
+        各容器的重試時間錯開，避免服務降級時同步重試加重 throttling
+
+        Args:
+            attempt: 當前重試次數
+
+        Returns:
+            延遲時間（秒）
+        """
+        return random.uniform(0, self._calculate_delay(attempt))
 
 
 # 全域重試處理器實例
-default_retry_handler = RetryHandler(max_attempts=3, base_delay=2.0)
+default_retry_handler = RetryHandler(
+    max_attempts=3, base_delay=2.0, min_attempt_seconds=settings.RETRY_MIN_ATTEMPT_SECONDS
+)
+
+# 還有備援模型時使用：少量重試後改用下一個模型
+cascade_retry_handler = RetryHandler(
+    max_attempts=settings.MODEL_CASCADE_ATTEMPTS,
+    base_delay=1.0,
+    min_attempt_seconds=settings.RETRY_MIN_ATTEMPT_SECONDS,
+)
+
+
+def is_transient_error(error: Exception | None) -> bool:
+    """
+    判斷錯誤是否為服務端的暫時性問題（throttling、5xx、逾時、斷路器開啟），可改用其他模型
+
+    Args:
+        error: 異常物件
+
+    Returns:
+        是否為暫時性錯誤
+    """
+    if error is None:
+        return False
+    return isinstance(error, CircuitOpenError) or default_retry_handler._is_retryable(error)
 
 
 def retry_with_fallback(
@@ -198,6 +306,9 @@ def retry_with_fallback(
     *args,
     fallback_func: Callable | None = None,
     context: dict[str, Any] | None = None,
+    deadline: Deadline | None = None,
+    breaker: CircuitBreaker | None = None,
+    handler: RetryHandler | None = None,
     **kwargs,
 ) -> dict[str, Any]:
     """
@@ -208,11 +319,20 @@ def retry_with_fallback(
         *args: 函數參數
         fallback_func: 降級函數
         context: 執行上下文
+        deadline: 截止時間
+        breaker: 斷路器
+        handler: 重試處理器（預設使用 default_retry_handler）
         **kwargs: 函數關鍵字參數
 
     Returns:
         執行結果字典
     """
-    return default_retry_handler.execute_with_retry(
-        func, *args, fallback_func=fallback_func, context=context, **kwargs
+    return (handler or default_retry_handler).execute_with_retry(
+        func,
+        *args,
+        fallback_func=fallback_func,
+        context=context,
+        deadline=deadline,
+        breaker=breaker,
+        **kwargs,
     )
@@ -0,0 +1,106 @@
+"""
+串流輸出發布器
+收集模型串流的文字片段，節流後以 message.delta 事件發布
+"""
+
+import time
+from collections.abc import Callable
+from typing import Any
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class DeltaPublisher:
+    """
+    Strands callback handler：累積串流文字並節流發布
+
+    每次發布的是「目前為止的完整文字」與遞增的序號，
+    接收端可直接覆蓋顯示，遺失或亂序的事件不影響結果。
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[str, int], bool],
+        min_interval: float = 1.0,
+        min_chars: int = 40,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        初始化發布器
+
+        Args:
+            publish: 發布函數，參數為 (累積文字, 序號)，回傳是否成功
+            min_interval: 兩次發布的最短間隔（秒）
+            min_chars: 兩次發布之間最少新增的字元數
+            clock: 時間來源（測試用）
+        """
+        self.publish = publish
+        self.min_interval = min_interval
+        self.min_chars = min_chars
+        self.clock = clock
+
+        self.text = ""
+        self.sequence = 0
+        self.published = 0
+        self.failed = 0
+        self._published_length = 0
+        self._last_publish_at: float | None = None
+
+    def __call__(self, **kwargs: Any) -> None:
+        """接收 Strands 串流事件（只處理文字片段）"""
+        data = kwargs.get("data")
+        if data:
+            self.on_text(data)
+
+    def on_text(self, chunk: str) -> None:
+        """
+        累積文字片段，達到節流條件時發布
+
+        Args:
+            chunk: 新的文字片段
+        """
+        self.text += chunk
+
+        now = self.clock()
+        if self._last_publish_at is not None:
+            if now - self._last_publish_at < self.min_interval:
+                return
+            if len(self.text) - self._published_length < self.min_chars:
+                return
+
+        self._publish(now)
+
+    def reset(self) -> None:
+        """重試前清空累積文字（序號持續遞增，接收端以最新序號為準）"""
+        self.text = ""
+        self._published_length = 0
+
+    def _publish(self, now: float) -> None:
+        """發布目前累積的文字，失敗不影響 Agent 執行"""
+        self.sequence += 1
+        self._last_publish_at = now
+        self._published_length = len(self.text)
+
+        try:
+            if self.publish(self.text, self.sequence):
+                self.published += 1
+            else:
+                self.failed += 1
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"⚠️ 串流片段發布失敗: {e}")
+
+    def get_stats(self) -> dict[str, Any]:
+        """
+        取得發布統計
+
+        Returns:
+            統計資訊字典
+        """
+        return {
+            "stream_deltas_published": self.published,
+            "stream_deltas_failed": self.failed,
+            "stream_chars": len(self.text),
+        }
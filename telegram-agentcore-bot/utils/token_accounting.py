@@ -0,0 +1,481 @@
+"""
+Token 計算
+直接走訪 Converse API 的內容區塊（text / image / document / toolUse / toolResult），
+不把 bytes 轉成字串；文字以 CJK / 拉丁字元分別估算，圖片依尺寸計價，
+並提供可逐回合累加、以 Bedrock 回報用量校正的 TokenLedger
+"""
+
+import json
+import math
+import re
+import threading
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from typing import Any
+
+from utils.file_types import image_dimensions
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 文字估算係數（預設值，可用 scripts/benchmark_token_accounting.py 依實際用量重新擬合）
+CJK_TOKENS_PER_CHAR = 1.2  # 中日韓文字與全形標點
+LATIN_CHARS_PER_TOKEN = 4.0  # 英文字母（以單字為單位，無條件進位）
+DIGITS_PER_TOKEN = 3.0  # 數字
+SYMBOL_TOKENS_PER_CHAR = 0.7  # 其他標點與符號
+
+# 圖片計價：tokens ≈ 寬 × 高 / 750；超過長邊或像素上限的圖片會先被縮小
+IMAGE_PIXELS_PER_TOKEN = 750
+IMAGE_MAX_LONG_EDGE = 1568
+IMAGE_MAX_PIXELS = 1_150_000
+# 無法取得尺寸時（例如 S3 位置或沒有內容）的預設值
+DEFAULT_IMAGE_TOKENS = 1000
+
+# 文件區塊：非文字格式無法得知抽取後的文字量，以檔案大小粗估
+DOCUMENT_BYTES_PER_TOKEN = 10
+_TEXT_DOCUMENT_FORMATS = {"txt", "csv", "md", "html"}
+
+# 每則訊息與每個工具呼叫的結構開銷
+MESSAGE_OVERHEAD_TOKENS = 4
+TOOL_BLOCK_OVERHEAD_TOKENS = 10
+
+_CJK_RE = re.compile(
+    r"[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff"
+    r"\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]"
+)
+_WORD_RE = re.compile(r"[^\W\d_]+")
+_DIGIT_RE = re.compile(r"\d")
+_SPACE_RE = re.compile(r"\s")
+
+# 可插拔的 tokenizer（設定後取代估算公式）
+_tokenizer: Callable[[str], int] | None = None
+
+
+def set_tokenizer(tokenizer: Callable[[str], int] | None) -> None:
+    """
+    設定文字 tokenizer
+
+    Args:
+        tokenizer: 接收文字、回傳 token 數的函數；None 表示改回估算公式
+    """
+    global _tokenizer
+    _tokenizer = tokenizer
+
+
+@dataclass
+class TokenCount:
+    """Token 計算結果（依內容類型分開累計）"""
+
+    text_tokens: int = 0
+    image_tokens: int = 0
+    image_count: int = 0
+    chars: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.text_tokens + self.image_tokens
+
+    def __add__(self, other: "TokenCount") -> "TokenCount":
+        return TokenCount(
+            self.text_tokens + other.text_tokens,
+            self.image_tokens + other.image_tokens,
+            self.image_count + other.image_count,
+            self.chars + other.chars,
+        )
+
+
+def count_text_tokens(text: str) -> int:
+    """
+    估算文字的 token 數
+
+    CJK 字元每字約 1 token 以上；拉丁字母以單字計算；數字與符號各自計算
+
+    Args:
+        text: 文字
+
+    Returns:
+        token 數
+    """
+    if not text:
+        return 0
+    if _tokenizer is not None:
+        return _tokenizer(text)
+
+    cjk = 0
+    if not text.isascii():
+        # CJK 字元也屬於 \w，先替換為空白再切分單字
+        text, cjk = _CJK_RE.subn(" ", text)
+    words = _WORD_RE.findall(text)
+    letters = sum(map(len, words))
+    word_tokens = sum(math.ceil(len(word) / LATIN_CHARS_PER_TOKEN) for word in words)
+    digits = len(_DIGIT_RE.findall(text))
+    spaces = len(_SPACE_RE.findall(text))
+    symbols = max(len(text) - letters - digits - spaces, 0)
+
+    tokens = (
+        cjk * CJK_TOKENS_PER_CHAR
+        + word_tokens
+        + digits / DIGITS_PER_TOKEN
+        + symbols * SYMBOL_TOKENS_PER_CHAR
+    )
+    return max(1, round(tokens))
+
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    """
+    截斷文字至約 max_tokens 個 token（依估算比例切字元，不逐字計算）
+
+    Args:
+        text: 文字
+        max_tokens: token 上限
+
+    Returns:
+        截斷後的文字（未超過上限時原樣回傳）
+    """
+    tokens = count_text_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    return text[: int(len(text) * max_tokens / tokens)]
+
+
+def count_image_tokens(width: int | None, height: int | None) -> int:
+    """
+    依圖片尺寸計算 token 數（模擬模型端的縮圖規則）
+
+    Args:
+        width: 寬（像素）
+        height: 高（像素）
+
+    Returns:
+        token 數，尺寸未知時為 DEFAULT_IMAGE_TOKENS
+    """
+    if not width or not height:
+        return DEFAULT_IMAGE_TOKENS
+
+    scale = min(
+        1.0,
+        IMAGE_MAX_LONG_EDGE / max(width, height),
+        math.sqrt(IMAGE_MAX_PIXELS / (width * height)),
+    )
+    pixels = int(width * scale) * int(height * scale)
+    return max(1, math.ceil(pixels / IMAGE_PIXELS_PER_TOKEN))
+
+
+def count_content_tokens(content: Any) -> TokenCount:
+    """
+    計算任意內容的 token 數（不將 bytes 轉為字串）
+
+    支援字串、Converse 內容區塊列表、訊息（{"role", "content"}）、訊息列表，
+    以及一般的 dict / list（例如 Memory 檢索結果或工具輸出）
+
+    Args:
+        content: 內容
+
+    Returns:
+        TokenCount
+    """
+    if content is None:
+        return TokenCount()
+    if isinstance(content, str):
+        return TokenCount(text_tokens=count_text_tokens(content), chars=len(content))
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        return _count_binary(content, None)
+    if isinstance(content, dict):
+        if "role" in content and "content" in content:
+            return count_message_tokens(content)
+        return _count_block(content)
+    if isinstance(content, (list, tuple)):
+        total = TokenCount()
+        for item in content:
+            total += count_content_tokens(item)
+        return total
+    return count_content_tokens(str(content))
+
+
+def count_message_tokens(message: dict[str, Any]) -> TokenCount:
+    """
+    計算單則 Converse 訊息的 token 數
+
+    Args:
+        message: {"role": ..., "content": [...]}
+
+    Returns:
+        TokenCount
+    """
+    count = count_content_tokens(message.get("content"))
+    count.text_tokens += MESSAGE_OVERHEAD_TOKENS
+    return count
+
+
+def count_messages_tokens(messages: Iterable[dict[str, Any]]) -> TokenCount:
+    """
+    計算訊息列表的 token 數
+
+    Args:
+        messages: Converse 訊息列表
+
+    Returns:
+        TokenCount
+    """
+    total = TokenCount()
+    for message in messages:
+        total += count_message_tokens(message)
+    return total
+
+
+def _count_block(block: dict[str, Any]) -> TokenCount:
+    """計算單一內容區塊；非 Converse 區塊的 dict 視為 JSON 資料"""
+    if "text" in block and isinstance(block["text"], str):
+        return count_content_tokens(block["text"])
+    if "image" in block and isinstance(block["image"], dict):
+        return count_image(block["image"])
+    if "document" in block and isinstance(block["document"], dict):
+        return _count_document(block["document"])
+    if "toolUse" in block and isinstance(block["toolUse"], dict):
+        tool_use = block["toolUse"]
+        count = count_content_tokens(tool_use.get("name", "")) + _count_json(tool_use.get("input"))
+        count.text_tokens += TOOL_BLOCK_OVERHEAD_TOKENS
+        return count
+    if "toolResult" in block and isinstance(block["toolResult"], dict):
+        count = count_content_tokens(block["toolResult"].get("content"))
+        count.text_tokens += TOOL_BLOCK_OVERHEAD_TOKENS
+        return count
+    if "json" in block and len(block) == 1:
+        return _count_json(block["json"])
+    if "reasoningContent" in block and isinstance(block["reasoningContent"], dict):
+        reasoning = block["reasoningContent"].get("reasoningText") or {}
+        return count_content_tokens(reasoning.get("text", ""))
+    if "cachePoint" in block:
+        return TokenCount()
+
+    # 一般資料：逐一計算鍵與值
+    total = TokenCount()
+    for key, value in block.items():
+        total += count_content_tokens(str(key))
+        total += count_content_tokens(value)
+    return total
+
+
+def _count_json(value: Any) -> TokenCount:
+    """計算 JSON 值（工具輸入 / 輸出）的 token 數"""
+    if isinstance(value, (dict, list)):
+        try:
+            return count_content_tokens(json.dumps(value, ensure_ascii=False, default=str))
+        except (TypeError, ValueError):
+            pass
+    return count_content_tokens(value)
+
+
+def count_image(image: dict[str, Any]) -> TokenCount:
+    """
+    計算單張圖片的 token 數
+
+    Args:
+        image: Converse 圖片區塊 {"format", "source": {"bytes"}}，
+            或處理器使用的 {"bytes", "format"}
+
+    Returns:
+        TokenCount（無法取得尺寸時為 DEFAULT_IMAGE_TOKENS）
+    """
+    source = image.get("source")
+    data = source.get("bytes") if isinstance(source, dict) else image.get("bytes")
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return _count_binary(data, image.get("format"))
+    return TokenCount(image_tokens=DEFAULT_IMAGE_TOKENS, image_count=1)
+
+
+def _count_document(document: dict[str, Any]) -> TokenCount:
+    """文件區塊：文字格式以內容計算，其他格式以大小粗估"""
+    data = document.get("source", {}).get("bytes")
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        return TokenCount()
+    if document.get("format") in _TEXT_DOCUMENT_FORMATS:
+        return count_content_tokens(bytes(data).decode("utf-8", errors="replace"))
+    return TokenCount(text_tokens=math.ceil(len(data) / DOCUMENT_BYTES_PER_TOKEN))
+
+
+def _count_binary(data: bytes | bytearray | memoryview, image_format: str | None) -> TokenCount:
+    """二進位內容：可辨識尺寸的視為圖片，否則以大小粗估"""
+    dimensions = image_dimensions(bytes(data) if isinstance(data, memoryview) else data)
+    if dimensions is None and image_format is None:
+        return TokenCount(text_tokens=math.ceil(len(data) / DOCUMENT_BYTES_PER_TOKEN))
+    width, height = dimensions or (None, None)
+    return TokenCount(image_tokens=count_image_tokens(width, height), image_count=1)
+
+
+def reported_input_tokens(usage: dict[str, Any] | None) -> int | None:
+    """
+    從 Bedrock 回報的 usage 取得 prompt 總 token 數（含 prompt cache 讀寫）
+
+    Args:
+        usage: Converse usage（inputTokens / cacheReadInputTokens / cacheWriteInputTokens）
+
+    Returns:
+        token 數，沒有回報時為 None
+    """
+    if not isinstance(usage, dict) or not isinstance(usage.get("inputTokens"), int):
+        return None
+    return (
+        usage["inputTokens"]
+        + (usage.get("cacheReadInputTokens") or 0)
+        + (usage.get("cacheWriteInputTokens") or 0)
+    )
+
+
+class TokenCalibration:
+    """
+    以 Bedrock 回報的實際用量校正估算值
+
+    估算與實際的比例以指數移動平均（EMA）更新，同一個 Lambda 容器內共用
+    """
+
+    def __init__(self, smoothing: float = 0.2, min_ratio: float = 0.5, max_ratio: float = 2.0):
+        """
+        初始化校正器
+
+        Args:
+            smoothing: EMA 權重（新樣本所佔比例）
+            min_ratio: 校正比例下限
+            max_ratio: 校正比例上限
+        """
+        self.smoothing = smoothing
+        self.min_ratio = min_ratio
+        self.max_ratio = max_ratio
+        self.ratio = 1.0
+        self.samples = 0
+        self._lock = threading.Lock()
+
+    def record(self, estimated: int, reported: int) -> float:
+        """
+        記錄一筆估算 / 實際用量
+
+        Args:
+            estimated: 呼叫前的估算 token 數
+            reported: Bedrock 回報的 prompt token 數
+
+        Returns:
+            本次估算誤差（(估算 - 實際) / 實際）
+        """
+        if estimated <= 0 or reported <= 0:
+            return 0.0
+
+        sample = min(max(reported / estimated, self.min_ratio), self.max_ratio)
+        with self._lock:
+            if self.samples == 0:
+                self.ratio = sample
+            else:
+                self.ratio += self.smoothing * (sample - self.ratio)
+            self.samples += 1
+
+        error = (estimated - reported) / reported
+        logger.info(
+            f"📏 Token 估算誤差: {error:+.1%} (估算 {estimated} / 實際 {reported})",
+            extra={
+                "event_type": "token_accounting",
+                "estimated_tokens": estimated,
+                "reported_tokens": reported,
+                "error_ratio": round(error, 4),
+                "calibration_ratio": round(self.ratio, 4),
+            },
+        )
+        return error
+
+    def apply(self, tokens: int) -> int:
+        """套用校正比例"""
+        return round(tokens * self.ratio)
+
+    def reset(self) -> None:
+        """重設校正狀態（測試用）"""
+        with self._lock:
+            self.ratio = 1.0
+            self.samples = 0
+
+
+class TokenLedger:
+    """
+    對話的累計 token 帳本
+
+    每則訊息只計算一次；Agent 的訊息列表只在結尾新增時逐則累加，
+    被對話管理器截斷或替換時才重新計算
+    """
+
+    def __init__(self, overhead_tokens: int = 0):
+        """
+        初始化帳本
+
+        Args:
+            overhead_tokens: 每次呼叫固定的開銷（system prompt、工具定義）
+        """
+        self.overhead_tokens = overhead_tokens
+        self._entries: list[tuple[int, TokenCount]] = []  # (id(message), count)
+        self._total = TokenCount()
+
+    def add(self, message: dict[str, Any]) -> TokenCount:
+        """
+        加入一則訊息
+
+        Args:
+            message: Converse 訊息
+
+        Returns:
+            該訊息的 TokenCount
+        """
+        count = count_message_tokens(message)
+        self._entries.append((id(message), count))
+        self._total += count
+        return count
+
+    def sync(self, messages: list[dict[str, Any]]) -> TokenCount:
+        """
+        與 Agent 的訊息列表同步（只計算新增的訊息）
+
+        Args:
+            messages: Agent 目前的訊息列表
+
+        Returns:
+            同步後的累計 TokenCount
+        """
+        counted = len(self._entries)
+        unchanged = counted <= len(messages) and all(
+            entry_id == id(message)
+            for (entry_id, _), message in zip(self._entries, messages, strict=False)
+        )
+        if not unchanged:
+            self.reset()
+            counted = 0
+
+        for message in messages[counted:]:
+            self.add(message)
+        return self._total
+
+    def reset(self) -> None:
+        """清空帳本"""
+        self._entries.clear()
+        self._total = TokenCount()
+
+    @property
+    def totals(self) -> TokenCount:
+        """訊息累計 TokenCount（不含固定開銷）"""
+        return self._total
+
+    def estimate(self, pending: Any = None) -> int:
+        """
+        估算下一次呼叫的 prompt token 數
+
+        Args:
+            pending: 尚未加入帳本的新內容（例如本回合的使用者訊息）
+
+        Returns:
+            token 數（含固定開銷）
+        """
+        total = self.overhead_tokens + self._total.total
+        if pending is not None:
+            total += count_content_tokens(pending).total + MESSAGE_OVERHEAD_TOKENS
+        return total
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# 全域校正器（同一個 Lambda 容器內共用）
+calibration = TokenCalibration()
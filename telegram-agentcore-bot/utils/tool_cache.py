@@ -0,0 +1,335 @@
+"""
+工具結果快取
+以裝飾器包裝工具函數（放在 @tool 之下），依各工具宣告的 key 函數與存活時間重用結果；
+記憶體 LRU 在同一個 Lambda 容器內共用，可選的 DynamoDB 層跨容器共用
+"""
+
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+import boto3
+
+from config.settings import settings
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 永久有效（純函數）的項目寫入 DynamoDB 時的存活時間上限（秒）
+MAX_PERSISTED_TTL = 30 * 86400
+
+# DynamoDB 單筆項目上限為 400KB，過大的結果只保留在記憶體
+MAX_PERSISTED_RESULT_BYTES = 350_000
+
+# DynamoDB 資源（延遲初始化）
+_dynamodb = None
+
+
+def get_dynamodb_resource():
+    """獲取 DynamoDB 資源單例"""
+    global _dynamodb
+    if _dynamodb is None:
+        _dynamodb = boto3.resource("dynamodb")
+    return _dynamodb
+
+
+class ToolCache:
+    """
+    兩層工具結果快取
+
+    - 記憶體 LRU：同一個 Lambda 容器內共用
+    - DynamoDB（可選）：跨容器共用，以 ttl 屬性自動過期
+
+    項目可帶有驗證資訊（例如 ETag / Last-Modified），過期後由工具提供的
+    revalidate 函數確認內容未變更時延長存活時間，不必重新執行工具
+    """
+
+    def __init__(self, max_size: int = 256, table_name: str = ""):
+        """
+        初始化快取
+
+        Args:
+            max_size: 記憶體層最多保留的項目數
+            table_name: DynamoDB 表名稱（空字串表示只使用記憶體層）
+        """
+        self.max_size = max_size
+        self.table_name = table_name
+
+        self._entries: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._table = None
+
+        self._stats: dict[str, dict[str, int]] = {}
+        self.errors = 0
+
+    def get(self, tool_name: str, key: str) -> dict[str, Any] | None:
+        """
+        讀取項目（含已過期的項目，由呼叫端決定是否重新驗證）
+
+        Args:
+            tool_name: 工具名稱
+            key: 快取 key
+
+        Returns:
+            {"result", "expires_at", "validators", "tier"}，不存在時為 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return {**entry, "tier": "memory"}
+
+        entry = self._get_persistent(key)
+        if entry is not None:
+            self._put_memory(key, entry)
+            return {**entry, "tier": "dynamodb"}
+        return None
+
+    def put(
+        self,
+        key: str,
+        result: str,
+        ttl: float | None,
+        validators: dict[str, str] | None = None,
+    ) -> None:
+        """
+        寫入項目
+
+        Args:
+            key: 快取 key
+            result: 工具結果
+            ttl: 存活時間（秒，None 表示永久有效）
+            validators: 重新驗證用的資訊（例如 {"etag": ..., "last_modified": ...}）
+        """
+        entry = {
+            "result": result,
+            "expires_at": time.time() + ttl if ttl is not None else None,
+            "validators": validators or {},
+        }
+        self._put_memory(key, entry)
+        self._put_persistent(key, entry)
+
+    def touch(self, key: str, ttl: float) -> None:
+        """
+        重新驗證成功後延長存活時間
+
+        Args:
+            key: 快取 key
+            ttl: 存活時間（秒）
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry["expires_at"] = time.time() + ttl
+            refreshed = dict(entry)
+        self._put_persistent(key, refreshed)
+
+    def record(self, tool_name: str, outcome: str, tier: str | None = None) -> None:
+        """
+        記錄各工具的命中 / 未命中（結構化日誌，供 CloudWatch Logs Insights 統計）
+
+        Args:
+            tool_name: 工具名稱
+            outcome: hit / revalidated / miss
+            tier: 命中的層（memory / dynamodb）
+        """
+        with self._lock:
+            stats = self._stats.setdefault(tool_name, {"hits": 0, "revalidated": 0, "misses": 0})
+            stats["misses" if outcome == "miss" else "hits"] += 1
+            if outcome == "revalidated":
+                stats["revalidated"] += 1
+
+        logger.info(
+            f"🧰 工具快取 {outcome}: {tool_name}" + (f" ({tier})" if tier else ""),
+            extra={
+                "event_type": "tool_cache",
+                "tool": tool_name,
+                "outcome": outcome,
+                "tier": tier,
+            },
+        )
+
+    def clear(self) -> None:
+        """清空記憶體層與統計（測試用）"""
+        with self._lock:
+            self._entries.clear()
+            self._stats.clear()
+
+    def _put_memory(self, key: str, entry: dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = dict(entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _get_table(self):
+        if self._table is None:
+            self._table = get_dynamodb_resource().Table(self.table_name)
+        return self._table
+
+    def _get_persistent(self, key: str) -> dict[str, Any] | None:
+        """從 DynamoDB 讀取（失敗視為未命中）"""
+        if not self.table_name:
+            return None
+
+        try:
+            item = self._get_table().get_item(Key={"cache_key": key}).get("Item")
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"⚠️ 工具快取讀取失敗: {e}")
+            return None
+
+        if not item or "result" not in item:
+            return None
+        expires_at = item.get("expires_at")
+        return {
+            "result": item["result"],
+            "expires_at": float(expires_at) if expires_at is not None else None,
+            "validators": dict(item.get("validators") or {}),
+        }
+
+    def _put_persistent(self, key: str, entry: dict[str, Any]) -> None:
+        """寫入 DynamoDB（失敗只記錄，不影響工具結果）"""
+        if not self.table_name:
+            return
+        if len(entry["result"].encode("utf-8")) > MAX_PERSISTED_RESULT_BYTES:
+            return
+
+        now = int(time.time())
+        # 可重新驗證的項目在過期後仍保留一段時間，供條件請求使用
+        ttl = now + MAX_PERSISTED_TTL
+        item = {
+            "cache_key": key,
+            "result": entry["result"],
+            "validators": entry["validators"],
+            "created_at": now,
+            "ttl": ttl,
+        }
+        if entry["expires_at"] is not None:
+            item["expires_at"] = int(entry["expires_at"])
+            if not entry["validators"]:
+                item["ttl"] = int(entry["expires_at"])
+
+        try:
+            self._get_table().put_item(Item=item)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"⚠️ 工具快取寫入失敗: {e}")
+
+    def get_stats(self) -> dict[str, Any]:
+        """
+        取得快取統計
+
+        Returns:
+            統計資訊字典（含各工具的命中率）
+        """
+        with self._lock:
+            tools = {
+                name: {
+                    **stats,
+                    "hit_rate": round(stats["hits"] / (stats["hits"] + stats["misses"]), 3)
+                    if stats["hits"] + stats["misses"]
+                    else 0.0,
+                }
+                for name, stats in self._stats.items()
+            }
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "errors": self.errors,
+            "persistent": bool(self.table_name),
+            "tools": tools,
+        }
+
+
+# 全域工具快取
+tool_cache = ToolCache(max_size=settings.TOOL_CACHE_SIZE, table_name=settings.TOOL_CACHE_TABLE)
+
+
+def default_key(*args: Any, **kwargs: Any) -> str:
+    """以所有參數作為 key"""
+    return json.dumps([args, kwargs], sort_keys=True, ensure_ascii=False, default=str)
+
+
+def memoize(
+    ttl: float | None,
+    key: Callable[..., str | None] = default_key,
+    cache_if: Callable[[str], bool] | None = None,
+    validators: Callable[..., dict[str, str] | None] | None = None,
+    revalidate: Callable[..., bool] | None = None,
+    cache: ToolCache | None = None,
+) -> Callable:
+    """
+    工具結果快取裝飾器（放在 @tool 之下，保留函數簽名與 docstring）
+
+        @tool
+        @memoize(ttl=600, key=lambda city: city.strip())
+        def get_weather(city: str) -> str: ...
+
+    Args:
+        ttl: 存活時間（秒，None 表示永久有效，適用於純函數）
+        key: 由工具參數產生 key 的函數，回傳 None 表示本次不使用快取
+        cache_if: 判斷結果是否可快取（例如排除錯誤訊息）
+        validators: 寫入時取得重新驗證資訊的函數（接收工具參數）
+        revalidate: 過期後確認內容未變更的函數（接收 validators 與工具參數）
+        cache: 使用的快取（預設為全域 tool_cache）
+
+    Returns:
+        裝飾器
+    """
+
+    def decorator(func: Callable[..., str]) -> Callable[..., str]:
+        tool_name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> str:
+            store = cache or tool_cache
+            if not settings.TOOL_CACHE_ENABLED:
+                return func(*args, **kwargs)
+
+            base_key = key(*args, **kwargs)
+            if base_key is None:
+                return func(*args, **kwargs)
+
+            digest = hashlib.sha256(base_key.encode("utf-8")).hexdigest()[:32]
+            cache_key = f"tool:{tool_name}:{digest}"
+
+            entry = store.get(tool_name, cache_key)
+            if entry is not None:
+                expires_at = entry["expires_at"]
+                if expires_at is None or expires_at > time.time():
+                    store.record(tool_name, "hit", entry["tier"])
+                    return entry["result"]
+                if revalidate is not None and entry["validators"]:
+                    try:
+                        unchanged = revalidate(entry["validators"], *args, **kwargs)
+                    except Exception as e:
+                        logger.warning(f"⚠️ 工具快取重新驗證失敗 ({tool_name}): {e}")
+                        unchanged = False
+                    if unchanged:
+                        store.touch(cache_key, ttl or 0)
+                        store.record(tool_name, "revalidated", entry["tier"])
+                        return entry["result"]
+
+            store.record(tool_name, "miss")
+            result = func(*args, **kwargs)
+
+            if isinstance(result, str) and (cache_if is None or cache_if(result)):
+                entry_validators = None
+                if validators is not None:
+                    try:
+                        entry_validators = validators(*args, **kwargs)
+                    except Exception as e:
+                        logger.warning(f"⚠️ 無法取得重新驗證資訊 ({tool_name}): {e}")
+                store.put(cache_key, result, ttl, entry_validators)
+            return result
+
+        return wrapper
+
+    return decorator
@@ -51,6 +51,28 @@ class MessageDelivery(ABC):
         """
         pass
 
+    def deliver_delta(
+        self, user_id: str, message_id: str, text: str, sequence: int
+    ) -> DeliveryResult:
+        """
+        傳送串流中的部分回應（子類可覆寫；預設不支援，直接忽略）
+
+        Args:
+            user_id: 使用者 ID
+            message_id: 原始訊息 ID（同一回應的所有片段共用）
+            text: 目前為止累積的回應文字
+            sequence: 遞增序號
+
+        Returns:
+            DeliveryResult: 傳送結果
+        """
+        return DeliveryResult(
+            success=True,
+            channel=self.get_channel_name(),
+            user_id=user_id,
+            metadata={"action": "unsupported"},
+        )
+
     @abstractmethod
     def get_channel_name(self) -> str:
         """
@@ -0,0 +1,156 @@
+"""
+Streaming State Store - 串流佔位訊息狀態 (DynamoDB)
+
+message.delta 與 message.completed 由不同的 Lambda 呼叫處理，
+以 messageId 為 key 記錄佔位訊息的 Telegram message_id、最新序號與最後編輯時間。
+"""
+
+import os
+import time
+from typing import Any
+
+import boto3
+from botocore.exceptions import ClientError
+
+# 狀態保留時間（秒）
+STREAM_STATE_TTL_SECONDS = 3600
+
+_table = None
+
+
+def get_table():
+    """取得串流狀態 DynamoDB 表（延遲初始化）"""
+    global _table
+    if _table is None:
+        table_name = os.environ.get("STREAM_STATE_TABLE_NAME", "telegram-stream-state")
+        _table = boto3.resource("dynamodb").Table(table_name)
+    return _table
+
+
+def _is_condition_failure(error: ClientError) -> bool:
+    """判斷是否為條件寫入失敗（另一個呼叫已先處理）"""
+    return error.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException"
+
+
+def claim(message_id: str, chat_id: int, sequence: int) -> bool:
+    """
+    搶佔建立佔位訊息的權利（只有第一個 delta 會成功）
+
+    Args:
+        message_id: 原始訊息 ID
+        chat_id: Telegram chat ID
+        sequence: delta 序號
+
+    Returns:
+        bool: True 如果成功搶佔
+    """
+    try:
+        get_table().put_item(
+            Item={
+                "message_id": message_id,
+                "chat_id": chat_id,
+                "status": "streaming",
+                "last_sequence": sequence,
+                "last_edit_at": 0,
+                "ttl": int(time.time()) + STREAM_STATE_TTL_SECONDS,
+            },
+            ConditionExpression="attribute_not_exists(message_id)",
+        )
+        return True
+    except ClientError as e:
+        if _is_condition_failure(e):
+            return False
+        raise
+
+
+def set_placeholder(message_id: str, telegram_message_id: int, now_ms: int) -> bool:
+    """
+    記錄佔位訊息的 Telegram message_id
+
+    Args:
+        message_id: 原始訊息 ID
+        telegram_message_id: 佔位訊息的 Telegram message_id
+        now_ms: 目前時間（毫秒）
+
+    Returns:
+        bool: False 表示 message.completed 已先處理完畢
+    """
+    try:
+        get_table().update_item(
+            Key={"message_id": message_id},
+            UpdateExpression="SET telegram_message_id = :tid, last_edit_at = :now",
+            ConditionExpression="#status = :streaming",
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues={
+                ":tid": telegram_message_id,
+                ":now": now_ms,
+                ":streaming": "streaming",
+            },
+        )
+        return True
+    except ClientError as e:
+        if _is_condition_failure(e):
+            return False
+        raise
+
+
+def advance(
+    message_id: str, sequence: int, now_ms: int, min_interval_ms: int
+) -> dict[str, Any] | None:
+    """
+    條件式推進序號與編輯時間（序號較舊、間隔不足或已完成時失敗）
+
+    Args:
+        message_id: 原始訊息 ID
+        sequence: delta 序號
+        now_ms: 目前時間（毫秒）
+        min_interval_ms: 兩次編輯的最短間隔（毫秒）
+
+    Returns:
+        Dict | None: 更新後的狀態；None 表示此 delta 不需要編輯訊息
+    """
+    try:
+        response = get_table().update_item(
+            Key={"message_id": message_id},
+            UpdateExpression="SET last_sequence = :seq, last_edit_at = :now",
+            ConditionExpression=(
+                "#status = :streaming AND attribute_exists(telegram_message_id) "
+                "AND last_sequence < :seq AND last_edit_at <= :cutoff"
+            ),
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues={
+                ":seq": sequence,
+                ":now": now_ms,
+                ":cutoff": now_ms - min_interval_ms,
+                ":streaming": "streaming",
+            },
+            ReturnValues="ALL_NEW",
+        )
+        return response.get("Attributes")
+    except ClientError as e:
+        if _is_condition_failure(e):
+            return None
+        raise
+
+
+def complete(message_id: str) -> dict[str, Any] | None:
+    """
+    標記串流已完成（之後到達的 delta 會被忽略）
+
+    Args:
+        message_id: 原始訊息 ID
+
+    Returns:
+        Dict | None: 標記前的狀態（包含 telegram_message_id 時可直接編輯為最終內容）
+    """
+    response = get_table().update_item(
+        Key={"message_id": message_id},
+        UpdateExpression="SET #status = :completed, #ttl = :ttl",
+        ExpressionAttributeNames={"#status": "status", "#ttl": "ttl"},
+        ExpressionAttributeValues={
+            ":completed": "completed",
+            ":ttl": int(time.time()) + STREAM_STATE_TTL_SECONDS,
+        },
+        ReturnValues="ALL_OLD",
+    )
+    return response.get("Attributes") or None
@@ -4,18 +4,32 @@ Telegram Message Delivery Implementation
 
 import os
 import sys
+import time
 from typing import Any
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src"))
 
-from telegram_client import send_message
+from telegram_client import (
+    MAX_MESSAGE_LENGTH,
+    delete_message,
+    edit_message_text,
+    send_message,
+    send_message_with_id,
+)
 
+from router.delivery import stream_state
 from router.delivery.base import DeliveryResult, MessageDelivery
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# 串流編輯的最短間隔（Telegram 對同一聊天的編輯頻率有限制）
+STREAM_EDIT_INTERVAL_MS = int(os.environ.get("STREAM_EDIT_INTERVAL_MS", "1500"))
+
+# 串流中訊息末尾的游標
+STREAM_CURSOR = " ▌"
+
 
 class TelegramDelivery(MessageDelivery):
     """Telegram 訊息傳送實作"""
@@ -43,40 +57,9 @@ class TelegramDelivery(MessageDelivery):
         Returns:
             DeliveryResult: 傳送結果
         """
-        # 移除 "tg:" 前綴（如果存在）
-        clean_user_id = user_id.replace("tg:", "") if user_id.startswith("tg:") else user_id
-
-        # 驗證 user_id
-        if not self.validate_user_id(clean_user_id):
-            error_msg = f"Invalid user_id: {user_id}"
-            logger.error(
-                error_msg,
-                extra={
-                    "event_type": "telegram_delivery_invalid_user_id",
-                    "user_id": user_id,
-                    "clean_user_id": clean_user_id,
-                },
-            )
-            return DeliveryResult(
-                success=False, channel=self.channel, user_id=user_id, error=error_msg
-            )
-
-        # 轉換 user_id 為整數 (Telegram chat_id)
-        try:
-            chat_id = int(clean_user_id)
-        except ValueError:
-            error_msg = f"user_id must be numeric for Telegram: {user_id}"
-            logger.error(
-                error_msg,
-                extra={
-                    "event_type": "telegram_delivery_invalid_chat_id",
-                    "user_id": user_id,
-                    "clean_user_id": clean_user_id,
-                },
-            )
-            return DeliveryResult(
-                success=False, channel=self.channel, user_id=user_id, error=error_msg
-            )
+        chat_id, error_result = self._resolve_chat_id(user_id)
+        if error_result:
+            return error_result
 
         # 取得 parse_mode (預設 None，避免特殊字符問題)
         # 可以通過 context 覆蓋為 'Markdown' 或 'HTML'
@@ -84,6 +67,14 @@ class TelegramDelivery(MessageDelivery):
         if context and "parse_mode" in context:
             parse_mode = context["parse_mode"]
 
+        # 串流回應：將佔位訊息編輯為最終內容
+        if context and context.get("streamed") and context.get("original_message_id"):
+            reconciled = self._reconcile_stream(
+                user_id, chat_id, context["original_message_id"], message, parse_mode
+            )
+            if reconciled:
+                return reconciled
+
         # 記錄傳送嘗試
         logger.info(
             "Attempting to deliver message to Telegram",
@@ -126,6 +117,178 @@ class TelegramDelivery(MessageDelivery):
                 success=False, channel=self.channel, user_id=user_id, error=error_msg
             )
 
+    def deliver_delta(
+        self, user_id: str, message_id: str, text: str, sequence: int
+    ) -> DeliveryResult:
+        """
+        傳送串流中的部分回應：第一個片段發送佔位訊息，之後以限定頻率編輯
+
+        Args:
+            user_id: Telegram chat_id (字串格式，可能包含 "tg:" 前綴)
+            message_id: 原始訊息 ID（同一回應的所有片段共用）
+            text: 目前為止累積的回應文字
+            sequence: 遞增序號
+
+        Returns:
+            DeliveryResult: 傳送結果（metadata.action 為 placeholder / edited / skipped）
+        """
+        chat_id, error_result = self._resolve_chat_id(user_id)
+        if error_result:
+            return error_result
+
+        now_ms = int(time.time() * 1000)
+        preview = self._stream_preview(text)
+
+        if stream_state.claim(message_id, chat_id, sequence):
+            telegram_message_id = send_message_with_id(chat_id, preview)
+            if telegram_message_id is None:
+                return DeliveryResult(
+                    success=False,
+                    channel=self.channel,
+                    user_id=user_id,
+                    error="Failed to send streaming placeholder",
+                )
+
+            if not stream_state.set_placeholder(message_id, telegram_message_id, now_ms):
+                # 最終回應已經送出，移除多餘的佔位訊息
+                delete_message(chat_id, telegram_message_id)
+                return self._delta_result(user_id, "skipped")
+
+            return self._delta_result(user_id, "placeholder")
+
+        # 序號較舊、間隔不足或串流已完成時略過
+        state = stream_state.advance(message_id, sequence, now_ms, STREAM_EDIT_INTERVAL_MS)
+        if state is None:
+            return self._delta_result(user_id, "skipped")
+
+        if not edit_message_text(chat_id, int(state["telegram_message_id"]), preview):
+            return DeliveryResult(
+                success=False,
+                channel=self.channel,
+                user_id=user_id,
+                error="Failed to edit streaming message",
+            )
+
+        return self._delta_result(user_id, "edited")
+
+    def _reconcile_stream(
+        self,
+        user_id: str,
+        chat_id: int,
+        message_id: str,
+        message: str,
+        parse_mode: str | None,
+    ) -> DeliveryResult | None:
+        """
+        將串流佔位訊息編輯為最終內容
+
+        Returns:
+            DeliveryResult，或 None（沒有佔位訊息、超過長度或編輯失敗，改為發送新訊息；
+            此時先刪除佔位訊息，避免未完成的內容留在聊天中）
+        """
+        try:
+            state = stream_state.complete(message_id)
+        except Exception as e:
+            logger.warning(
+                f"Failed to load streaming state: {str(e)}",
+                extra={"event_type": "telegram_stream_state_error", "message_id": message_id},
+            )
+            return None
+
+        telegram_message_id = state.get("telegram_message_id") if state else None
+        if telegram_message_id is None:
+            return None
+
+        if len(message) > MAX_MESSAGE_LENGTH or not edit_message_text(
+            chat_id, int(telegram_message_id), message, parse_mode
+        ):
+            # 最終回應改為分段發送新訊息
+            if not delete_message(chat_id, int(telegram_message_id)):
+                logger.warning(
+                    "Failed to delete streaming placeholder",
+                    extra={
+                        "event_type": "telegram_stream_placeholder_orphaned",
+                        "chat_id": chat_id,
+                    },
+                )
+            return None
+
+        logger.info(
+            "Streaming message reconciled",
+            extra={
+                "event_type": "telegram_stream_reconciled",
+                "chat_id": chat_id,
+                "message_length": len(message),
+            },
+        )
+        return DeliveryResult(
+            success=True,
+            channel=self.channel,
+            user_id=user_id,
+            metadata={
+                "chat_id": chat_id,
+                "message_length": len(message),
+                "parse_mode": parse_mode,
+                "action": "reconciled",
+            },
+        )
+
+    def _resolve_chat_id(self, user_id: str) -> tuple[int | None, DeliveryResult | None]:
+        """
+        將 user_id 轉換為 Telegram chat_id
+
+        Returns:
+            (chat_id, None) 或 (None, 失敗的 DeliveryResult)
+        """
+        # 移除 "tg:" 前綴（如果存在）
+        clean_user_id = user_id.replace("tg:", "") if user_id.startswith("tg:") else user_id
+
+        # 驗證 user_id
+        if not self.validate_user_id(clean_user_id):
+            error_msg = f"Invalid user_id: {user_id}"
+            logger.error(
+                error_msg,
+                extra={
+                    "event_type": "telegram_delivery_invalid_user_id",
+                    "user_id": user_id,
+                    "clean_user_id": clean_user_id,
+                },
+            )
+            return None, DeliveryResult(
+                success=False, channel=self.channel, user_id=user_id, error=error_msg
+            )
+
+        # 轉換 user_id 為整數 (Telegram chat_id)
+        try:
+            return int(clean_user_id), None
+        except ValueError:
+            error_msg = f"user_id must be numeric for Telegram: {user_id}"
+            logger.error(
+                error_msg,
+                extra={
+                    "event_type": "telegram_delivery_invalid_chat_id",
+                    "user_id": user_id,
+                    "clean_user_id": clean_user_id,
+                },
+            )
+            return None, DeliveryResult(
+                success=False, channel=self.channel, user_id=user_id, error=error_msg
+            )
+
+    def _delta_result(self, user_id: str, action: str) -> DeliveryResult:
+        """建立串流片段的傳送結果"""
+        return DeliveryResult(
+            success=True, channel=self.channel, user_id=user_id, metadata={"action": action}
+        )
+
+    @staticmethod
+    def _stream_preview(text: str) -> str:
+        """串流中的預覽文字（純文字，保留游標並符合長度限制）"""
+        limit = MAX_MESSAGE_LENGTH - len(STREAM_CURSOR)
+        if len(text) > limit:
+            text = text[: limit - 1] + "…"
+        return (text or "…") + STREAM_CURSOR
+
     def validate_user_id(self, user_id: str) -> bool:
         """
         驗證 Telegram user_id 格式
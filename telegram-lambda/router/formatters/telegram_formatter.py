@@ -162,6 +162,9 @@ class TelegramFormatter:
         """
         # 常見模型簡化
         simplifications = {
+            "claude-3-7-sonnet": "Sonnet 3.7",
+            "claude-3-5-sonnet": "Sonnet 3.5",
+            "claude-3-5-haiku": "Haiku 3.5",
             "claude-3-opus": "Opus",
             "claude-3-sonnet": "Sonnet",
             "claude-3-haiku": "Haiku",
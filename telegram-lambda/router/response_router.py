@@ -7,12 +7,19 @@ This Lambda function:
 3. Formats the response for the target channel
 4. Delivers the message to the user
 5. Publishes metrics for monitoring
+
+message.delta events (streaming partial responses) are forwarded to the
+channel's deliver_delta(); the following message.completed reconciles the text.
+
+Both event types carry the ingress timestamp / deadline in metadata; the router
+records the end-to-end age and skips deltas for messages past their deadline.
 """
 
 import json
 import os
 import sys
 import time
+from datetime import datetime
 from typing import Any
 
 # Add src directory to path for imports
@@ -79,6 +86,10 @@ def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
         # 解析事件
         detail = event.get("detail", {})
 
+        # 串流片段
+        if event.get("detail-type") == "message.delta":
+            return handle_delta_event(detail, start_time)
+
         # 驗證必要欄位
         required_fields = ["messageId", "channel", "user", "response"]
         missing_fields = [f for f in required_fields if f not in detail]
@@ -94,12 +105,15 @@ def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
 
         # 提取訊息資訊
         message_id = detail["messageId"]
-        channel = detail["channel"]
+        channel = get_channel_type(detail["channel"])
         user_info = detail["user"]
         user_id = user_info.get("id", user_info.get("userId"))
         response_content = detail["response"]
         metadata = detail.get("metadata", {})
 
+        # 最終回應已產生，即使超過期限仍送出（只記錄延遲與過期）
+        check_message_deadline(metadata, message_id)
+
         logger.info(
             "Processing completed message",
             extra={
@@ -183,6 +197,125 @@ def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
         return {"statusCode": 500, "body": json.dumps({"success": False, "error": str(e)})}
 
 
+def handle_delta_event(detail: dict[str, Any], start_time: float) -> dict[str, Any]:
+    """
+    處理 message.delta 事件（串流中的部分回應）
+
+    Args:
+        detail: EventBridge 事件 detail
+        start_time: 處理開始時間
+
+    Returns:
+        Dict: 處理結果
+    """
+    required_fields = ["messageId", "channel", "user", "delta"]
+    missing_fields = [f for f in required_fields if f not in detail]
+    if missing_fields:
+        error_msg = f"Missing required fields: {missing_fields}"
+        logger.error(
+            error_msg,
+            extra={"event_type": "router_invalid_delta", "missing_fields": missing_fields},
+        )
+        publish_metric("RouterInvalidEvent", 1, "Count")
+        return {"statusCode": 400, "body": json.dumps({"error": error_msg})}
+
+    message_id = detail["messageId"]
+    channel = get_channel_type(detail["channel"])
+    user_id = detail["user"].get("id", detail["user"].get("userId"))
+    delta = detail["delta"]
+
+    # 已過期的訊息不再更新串流內容，由 message.completed 送出最終回應
+    if check_message_deadline(detail.get("metadata", {}), message_id):
+        publish_metric("RouterDeltaExpired", 1, "Count")
+        return {
+            "statusCode": 200,
+            "body": json.dumps({"success": True, "messageId": message_id, "action": "expired"}),
+        }
+
+    delivery = get_delivery_for_channel(channel)
+    if delivery is None:
+        return {"statusCode": 200, "body": json.dumps({"success": True, "skipped": True})}
+
+    result = delivery.deliver_delta(
+        user_id=user_id,
+        message_id=message_id,
+        text=delta.get("text", ""),
+        sequence=int(delta.get("sequence", 0)),
+    )
+
+    duration_ms = int((time.time() - start_time) * 1000)
+    action = (result.metadata or {}).get("action", "failed")
+    logger.info(
+        "Delta routed",
+        extra={
+            "event_type": "router_delta",
+            "message_id": message_id,
+            "channel": channel,
+            "action": action,
+            "success": result.success,
+            "duration_ms": duration_ms,
+        },
+    )
+    publish_metric(f"RouterDelta{action.capitalize()}", 1, "Count")
+
+    return {
+        "statusCode": 200 if result.success else 500,
+        "body": json.dumps({"success": result.success, "messageId": message_id, "action": action}),
+    }
+
+
+def check_message_deadline(metadata: dict[str, Any], message_id: str) -> bool:
+    """
+    記錄訊息從入口到 Router 的時間，並檢查是否超過入口設定的期限
+
+    Args:
+        metadata: 事件 metadata（received_at：入口時間 ISO 8601；expires_at：期限 epoch 秒）
+        message_id: 訊息 ID
+
+    Returns:
+        bool: 是否已過期（沒有期限時為 False）
+    """
+    now = time.time()
+
+    received_at = metadata.get("received_at")
+    if isinstance(received_at, str):
+        try:
+            age_ms = int((now - datetime.fromisoformat(received_at).timestamp()) * 1000)
+            publish_metric("RouterMessageAge", age_ms, "Milliseconds")
+        except ValueError:
+            pass
+
+    expires_at = metadata.get("expires_at")
+    if not isinstance(expires_at, int | float) or now <= expires_at:
+        return False
+
+    logger.warning(
+        "Message past its deadline at router",
+        extra={
+            "event_type": "router_message_expired",
+            "message_id": message_id,
+            "overdue_ms": int((now - expires_at) * 1000),
+        },
+    )
+    publish_metric("RouterMessageExpired", 1, "Count")
+    return True
+
+
+def get_channel_type(channel: Any) -> str:
+    """
+    取得頻道名稱（事件中的 channel 可能是字串或 {"type": ...} 字典）
+
+    Args:
+        channel: 事件中的 channel 欄位
+
+    Returns:
+        str: 頻道名稱
+    """
+    if isinstance(channel, dict):
+        return channel.get("type", "unknown")
+    return channel
+
+
 def route_message(
     channel: str, user_id: str, content: str, metadata: dict[str, Any] | None = None
 ) -> DeliveryResult:
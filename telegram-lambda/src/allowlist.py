@@ -3,6 +3,7 @@ Allowlist Module - DynamoDB 允許名單驗證
 """
 
 import os
+from typing import Any
 
 import boto3
 from botocore.exceptions import ClientError
@@ -28,6 +29,20 @@ def check_allowed(chat_id: int, username: str = "") -> bool:
     Returns:
         bool: True 如果允許，False 如果拒絕
     """
+    return get_allowed_entry(chat_id, username) is not None
+
+
+def get_allowed_entry(chat_id: int, username: str = "") -> dict[str, Any] | None:
+    """
+    檢查用戶是否在允許名單中，並回傳允許名單記錄（後續的 routing 直接使用，不再查詢）
+
+    Args:
+        chat_id: Telegram chat ID
+        username: Telegram username (可選)
+
+    Returns:
+        dict: 允許時為允許名單記錄，拒絕或查詢失敗時為 None
+    """
     try:
         # 查詢 DynamoDB
         response = table.get_item(Key={"chat_id": chat_id})
@@ -38,7 +53,7 @@ def check_allowed(chat_id: int, username: str = "") -> bool:
                 "Chat ID not found in allowlist",
                 extra={"chat_id": chat_id, "username": username, "event_type": "allowlist_miss"},
             )
-            return False
+            return None
 
         item = response["Item"]
 
@@ -52,7 +67,7 @@ def check_allowed(chat_id: int, username: str = "") -> bool:
                     "event_type": "allowlist_disabled",
                 },
             )
-            return False
+            return None
 
         # 如果提供了 username，進行額外驗證
         stored_username = item.get("username", "")
@@ -66,13 +81,13 @@ def check_allowed(chat_id: int, username: str = "") -> bool:
                     "event_type": "username_mismatch",
                 },
             )
-            return False
+            return None
 
         logger.info(
             "Access granted",
             extra={"chat_id": chat_id, "username": username, "event_type": "allowlist_hit"},
         )
-        return True
+        return item
 
     except ClientError as e:
         error_code = e.response["Error"]["Code"]
@@ -82,7 +97,7 @@ def check_allowed(chat_id: int, username: str = "") -> bool:
             exc_info=True,
         )
         # 發生錯誤時預設拒絕訪問
-        return False
+        return None
 
     except Exception as e:
         logger.error(
@@ -90,7 +105,7 @@ def check_allowed(chat_id: int, username: str = "") -> bool:
             extra={"chat_id": chat_id, "event_type": "allowlist_error"},
             exc_info=True,
         )
-        return False
+        return None
 
 
 def add_to_allowlist(chat_id: int, username: str, enabled: bool = True) -> bool:
@@ -11,13 +11,14 @@ import uuid
 from typing import Any
 
 import boto3
-from allowlist import check_allowed, check_file_permission
+from allowlist import check_file_permission, get_allowed_entry
 from commands.handlers.admin_handler import AdminCommandHandler
 from commands.handlers.debug_handler import DebugCommandHandler
 from commands.handlers.info_handler import InfoCommandHandler
 from commands.handlers.new_handler import NewCommandHandler
 from commands.router import CommandRouter
 from file_handler import process_file_attachment
+from routing import build_routing
 from secrets_manager import get_telegram_secret_token
 from sqs_client import send_to_queue
 from telegram import Update
@@ -106,7 +107,10 @@ def detect_channel(event: dict[str, Any]) -> str:
 
 
 def normalize_message(
-    raw_data: dict[str, Any], channel: str, event: dict[str, Any]
+    raw_data: dict[str, Any],
+    channel: str,
+    event: dict[str, Any],
+    user_info: dict[str, Any] | None = None,
 ) -> dict[str, Any]:
     """
     將原始訊息標準化為 Universal Message Schema
@@ -115,6 +119,7 @@ def normalize_message(
         raw_data: 原始訊息資料
         channel: 通道類型
         event: 完整的 API Gateway event
+        user_info: 允許名單記錄（用於 routing，避免重複查詢）
 
     Returns:
         標準化的訊息物件
@@ -263,7 +268,9 @@ def normalize_message(
                 "sessionId": str(from_user.get("id")),
                 "threadId": "",
             },
-            "routing": {"priority": "normal", "tags": [], "targetAgent": ""},
+            # 依允許名單角色 / 標籤決定處理優先順序（Processor 依此分流），
+            # 依訊息類型設定處理期限（各階段略過已過期的訊息）
+            "routing": build_routing(chat_id, text or caption, message_type, user_info),
             "raw": raw_data,  # 保留原始資料供後續處理使用
         }
 
@@ -280,7 +287,7 @@ def normalize_message(
         },
         "content": {"text": "", "attachments": [], "messageType": "text"},
         "context": {"conversationId": "unknown", "sessionId": "unknown", "threadId": ""},
-        "routing": {"priority": "normal", "tags": [], "targetAgent": ""},
+        "routing": build_routing(None),
         "raw": raw_data,
     }
 
@@ -503,8 +510,9 @@ def lambda_handler(event: dict[str, Any], context: Any, metrics) -> dict[str, An
                     )
                     return create_response(200, {"status": "command_handled"})
 
-        # 檢查允許名單
-        if not check_allowed(chat_id, username):
+        # 檢查允許名單（記錄同時用於決定 routing）
+        allowed_entry = get_allowed_entry(chat_id, username)
+        if allowed_entry is None:
             logger.warning(
                 "Unauthorized access attempt",
                 extra={"chat_id": chat_id, "username": username, "event_type": "unauthorized"},
@@ -521,7 +529,7 @@ def lambda_handler(event: dict[str, Any], context: Any, metrics) -> dict[str, An
         record_message_type_metric(metrics, update)
 
         # 標準化訊息（轉換為 Universal Message Schema）
-        normalized = normalize_message(body, channel, event)
+        normalized = normalize_message(body, channel, event, user_info=allowed_entry)
         logger.debug(f"Message normalized: {normalized['messageId']}")
 
         # 發布到 EventBridge（新增的多通道事件匯流排）
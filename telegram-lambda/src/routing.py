@@ -0,0 +1,159 @@
+"""
+Routing Module - 訊息處理優先順序與期限
+依允許名單的角色 / 標籤決定 routing.priority，Processor 依優先順序分流到不同佇列；
+依訊息類型設定 routing.expiresAt，各階段略過已過期的訊息
+"""
+
+import os
+import time
+from typing import Any
+
+from allowlist import get_user_info
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+PRIORITY_HIGH = "high"
+PRIORITY_NORMAL = "normal"
+PRIORITY_LOW = "low"
+PRIORITIES = (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)
+
+# 帶有這些標籤的用戶進入高 / 低優先順序（逗號分隔）
+HIGH_PRIORITY_TAGS = {
+    tag.strip()
+    for tag in os.environ.get("HIGH_PRIORITY_TAGS", "paid,vip").split(",")
+    if tag.strip()
+}
+LOW_PRIORITY_TAGS = {
+    tag.strip() for tag in os.environ.get("LOW_PRIORITY_TAGS", "bulk").split(",") if tag.strip()
+}
+
+
+def parse_message_ttls(spec: str) -> dict[str, int]:
+    """
+    解析各訊息類型的期限設定
+
+    Args:
+        spec: 逗號分隔的 type=秒數，例如 "text=300,video=1800"
+
+    Returns:
+        dict: 訊息類型 -> 秒數（格式錯誤的項目略過）
+    """
+    ttls = {}
+    for item in spec.split(","):
+        message_type, _, seconds = item.partition("=")
+        if message_type.strip() and seconds.strip().isdigit():
+            ttls[message_type.strip()] = int(seconds)
+    return ttls
+
+
+# 訊息從入口起算的處理期限（秒）；檔案與影音需要較長的處理時間
+MESSAGE_TTLS = parse_message_ttls(
+    os.environ.get("MESSAGE_TTLS", "text=300,image=900,file=900,audio=900,video=1800")
+)
+DEFAULT_MESSAGE_TTL = int(os.environ.get("DEFAULT_MESSAGE_TTL", "300"))
+
+
+def message_expires_at(message_type: str, now: float | None = None) -> float:
+    """
+    計算訊息期限
+
+    Args:
+        message_type: 訊息類型（text、image、file、audio、video）
+        now: 入口收到的時間（epoch 秒，預設為現在）
+
+    Returns:
+        float: 期限（epoch 秒）
+    """
+    now = time.time() if now is None else now
+    return round(now + MESSAGE_TTLS.get(message_type, DEFAULT_MESSAGE_TTL), 3)
+
+
+def assign_priority(user_info: dict[str, Any] | None, text: str = "") -> str:
+    """
+    決定訊息的處理優先順序
+
+    規則依序為：允許名單明確設定的 priority、admin 角色、/ 指令、
+    高優先標籤、低優先標籤，其餘為 normal
+
+    Args:
+        user_info: 允許名單中的用戶資料（可為 None）
+        text: 訊息文字
+
+    Returns:
+        str: 'high'、'normal' 或 'low'
+    """
+    user_info = user_info or {}
+    tags = set(get_user_tags(user_info))
+
+    explicit = user_info.get("priority")
+    if explicit in PRIORITIES:
+        return explicit
+    if user_info.get("role") == "admin":
+        return PRIORITY_HIGH
+    # 送到 Processor 的 / 指令（未被 receiver 處理的指令）通常期待立即回應
+    if text.strip().startswith("/"):
+        return PRIORITY_HIGH
+    if tags & HIGH_PRIORITY_TAGS:
+        return PRIORITY_HIGH
+    if tags & LOW_PRIORITY_TAGS:
+        return PRIORITY_LOW
+    return PRIORITY_NORMAL
+
+
+def get_user_tags(user_info: dict[str, Any]) -> list[str]:
+    """
+    取得用戶標籤（DynamoDB 可能存為 list 或 string set）
+
+    Args:
+        user_info: 允許名單中的用戶資料
+
+    Returns:
+        list: 排序後的標籤
+    """
+    tags = user_info.get("tags") or []
+    return sorted(str(tag) for tag in tags)
+
+
+def build_routing(
+    chat_id: int | None,
+    text: str = "",
+    message_type: str = "text",
+    user_info: dict[str, Any] | None = None,
+) -> dict[str, Any]:
+    """
+    建立標準化訊息的 routing 欄位
+
+    Args:
+        chat_id: Telegram chat ID
+        text: 訊息文字
+        message_type: 訊息類型（決定處理期限）
+        user_info: 允許名單檢查取得的記錄（未提供時依 chat_id 查詢）
+
+    Returns:
+        dict: {"priority", "tags", "targetAgent", "expiresAt"}
+    """
+    if user_info is None and chat_id:
+        try:
+            user_info = get_user_info(chat_id)
+        except Exception as e:
+            # 查詢失敗不影響訊息處理，以 normal 優先順序送出
+            logger.warning(
+                f"Failed to look up routing priority: {str(e)}",
+                extra={"chat_id": chat_id, "event_type": "routing_priority_error"},
+            )
+
+    priority = assign_priority(user_info, text)
+    tags = get_user_tags(user_info or {})
+
+    logger.debug(
+        f"Routing priority: {priority}",
+        extra={"chat_id": chat_id, "priority": priority, "event_type": "routing_priority"},
+    )
+    return {
+        "priority": priority,
+        "tags": tags,
+        "targetAgent": "",
+        "expiresAt": message_expires_at(message_type),
+    }
@@ -121,6 +121,160 @@ async def _send_message_async(chat_id: int, text: str, parse_mode: str | None =
         return False
 
 
+def _to_telegram_parse_mode(parse_mode: str | None) -> str | None:
+    """將 'Markdown' / 'HTML' 轉換為 python-telegram-bot 的 ParseMode"""
+    if parse_mode == "Markdown":
+        return ParseMode.MARKDOWN_V2
+    if parse_mode == "HTML":
+        return ParseMode.HTML
+    return None
+
+
+def send_message_with_id(chat_id: int, text: str, parse_mode: str | None = None) -> int | None:
+    """
+    發送單則訊息並回傳 message_id (同步包裝，用於串流佔位訊息)
+
+    Args:
+        chat_id: Telegram chat ID
+        text: 訊息內容（不可超過 MAX_MESSAGE_LENGTH）
+        parse_mode: 解析模式 ('Markdown', 'HTML', 或 None 表示純文字)
+
+    Returns:
+        int | None: 成功時回傳 Telegram message_id
+    """
+    try:
+        return asyncio.run(_send_message_with_id_async(chat_id, text, parse_mode))
+    except Exception as e:
+        logger.error(
+            f"Failed to send message: {str(e)}",
+            extra={"chat_id": chat_id, "event_type": "telegram_send_error"},
+            exc_info=True,
+        )
+        return None
+
+
+async def _send_message_with_id_async(
+    chat_id: int, text: str, parse_mode: str | None = None
+) -> int | None:
+    """異步發送單則訊息並回傳 message_id"""
+    bot_token = get_bot_token()
+    if not bot_token:
+        return None
+
+    try:
+        bot = Bot(token=bot_token)
+        message = await bot.send_message(
+            chat_id=chat_id, text=text, parse_mode=_to_telegram_parse_mode(parse_mode)
+        )
+        return message.message_id
+
+    except TelegramError as e:
+        logger.error(
+            f"Telegram error: {str(e)}",
+            extra={
+                "chat_id": chat_id,
+                "error_type": type(e).__name__,
+                "event_type": "telegram_api_error",
+            },
+        )
+        return None
+
+
+def edit_message_text(
+    chat_id: int, message_id: int, text: str, parse_mode: str | None = None
+) -> bool:
+    """
+    編輯已發送的訊息 (同步包裝)
+
+    Args:
+        chat_id: Telegram chat ID
+        message_id: 要編輯的 Telegram message_id
+        text: 新的訊息內容（不可超過 MAX_MESSAGE_LENGTH）
+        parse_mode: 解析模式 ('Markdown', 'HTML', 或 None 表示純文字)
+
+    Returns:
+        bool: True 如果成功編輯（內容未變更也視為成功）
+    """
+    try:
+        return asyncio.run(_edit_message_text_async(chat_id, message_id, text, parse_mode))
+    except Exception as e:
+        logger.error(
+            f"Failed to edit message: {str(e)}",
+            extra={
+                "chat_id": chat_id,
+                "message_id": message_id,
+                "event_type": "telegram_edit_error",
+            },
+            exc_info=True,
+        )
+        return False
+
+
+async def _edit_message_text_async(
+    chat_id: int, message_id: int, text: str, parse_mode: str | None = None
+) -> bool:
+    """異步編輯已發送的訊息"""
+    bot_token = get_bot_token()
+    if not bot_token:
+        return False
+
+    try:
+        bot = Bot(token=bot_token)
+        await bot.edit_message_text(
+            chat_id=chat_id,
+            message_id=message_id,
+            text=text,
+            parse_mode=_to_telegram_parse_mode(parse_mode),
+        )
+        return True
+
+    except TelegramError as e:
+        # 內容相同時 Telegram 回傳錯誤，但畫面已是最新狀態
+        if "message is not modified" in str(e).lower():
+            return True
+
+        logger.warning(
+            f"Telegram edit error: {str(e)}",
+            extra={
+                "chat_id": chat_id,
+                "message_id": message_id,
+                "error_type": type(e).__name__,
+                "event_type": "telegram_edit_error",
+            },
+        )
+        return False
+
+
+def delete_message(chat_id: int, message_id: int) -> bool:
+    """
+    刪除已發送的訊息 (同步包裝)
+
+    Args:
+        chat_id: Telegram chat ID
+        message_id: 要刪除的 Telegram message_id
+
+    Returns:
+        bool: True 如果成功刪除
+    """
+    try:
+        bot_token = get_bot_token()
+        if not bot_token:
+            return False
+
+        bot = Bot(token=bot_token)
+        return bool(asyncio.run(bot.delete_message(chat_id=chat_id, message_id=message_id)))
+    except Exception as e:
+        logger.warning(
+            f"Failed to delete message: {str(e)}",
+            extra={
+                "chat_id": chat_id,
+                "message_id": message_id,
+                "event_type": "telegram_delete_error",
+            },
+        )
+        return False
+
+
 def send_long_message(chat_id: int, text: str, parse_mode: str = "Markdown") -> bool:
     """
     發送長訊息（自動分段）- 同步包裝
@@ -80,15 +80,15 @@ def mock_allowlist():
     """Mock DynamoDB allowlist"""
     mock_db = MockDynamoDB()
 
-    def mock_check(chat_id, username):
-        return mock_db.check_allowed(chat_id, username)
+    def mock_get_allowed_entry(chat_id, username):
+        return mock_db.get_allowed_entry(chat_id, username)
 
     def mock_file_permission(chat_id):
         # 預設允許檔案權限（避免錯誤）
         return True
 
     with (
-        patch("handler.check_allowed", side_effect=mock_check),
+        patch("handler.get_allowed_entry", side_effect=mock_get_allowed_entry),
         patch("handler.check_file_permission", side_effect=mock_file_permission),
     ):
         yield mock_db
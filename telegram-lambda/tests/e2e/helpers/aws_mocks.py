@@ -88,6 +88,10 @@ class MockDynamoDB:
         """檢查用戶是否在 allowlist"""
         return chat_id in self.allowed_users
 
+    def get_allowed_entry(self, chat_id: int, username: str) -> dict | None:
+        """取得 allowlist 記錄（不在 allowlist 時為 None）"""
+        return self.allowed_users.get(chat_id)
+
     def add_user(self, chat_id: int, username: str):
         """添加用戶到 allowlist"""
         self.allowed_users[chat_id] = {"chat_id": chat_id, "username": username}
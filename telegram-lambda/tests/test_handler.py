@@ -9,6 +9,8 @@ from unittest.mock import MagicMock, patch
 import pytest
 from src.handler import lambda_handler
 
+ALLOWED_ENTRY = {"chat_id": 123456789, "username": "test_user", "enabled": True}
+
 
 class TestLambdaHandler:
     """測試 Lambda Handler 功能"""
@@ -49,13 +51,13 @@ class TestLambdaHandler:
         return context
 
     @patch("src.handler.send_to_queue")
-    @patch("src.handler.check_allowed")
+    @patch("src.handler.get_allowed_entry")
     def test_valid_user_message(
-        self, mock_check_allowed, mock_send_to_queue, valid_telegram_event, mock_context
+        self, mock_get_allowed_entry, mock_send_to_queue, valid_telegram_event, mock_context
     ):
         """測試有效用戶訊息處理"""
         # 設定 mock 返回值
-        mock_check_allowed.return_value = True
+        mock_get_allowed_entry.return_value = ALLOWED_ENTRY
         mock_send_to_queue.return_value = True
 
         # 執行 handler
@@ -68,14 +70,14 @@ class TestLambdaHandler:
         assert body["status"] == "ok"
 
         # 驗證函數被正確調用
-        mock_check_allowed.assert_called_once_with(123456789, "test_user")
+        mock_get_allowed_entry.assert_called_once_with(123456789, "test_user")
         mock_send_to_queue.assert_called_once()
 
-    @patch("src.handler.check_allowed")
-    def test_unauthorized_user(self, mock_check_allowed, valid_telegram_event, mock_context):
+    @patch("src.handler.get_allowed_entry")
+    def test_unauthorized_user(self, mock_get_allowed_entry, valid_telegram_event, mock_context):
         """測試未授權用戶訪問"""
         # 設定 mock 返回值
-        mock_check_allowed.return_value = False
+        mock_get_allowed_entry.return_value = None
 
         # 執行 handler
         response = lambda_handler(valid_telegram_event, mock_context)
@@ -85,8 +87,31 @@ class TestLambdaHandler:
         body = json.loads(response["body"])
         assert body["status"] == "ignored"
 
-        # 驗證 check_allowed 被調用
-        mock_check_allowed.assert_called_once_with(123456789, "test_user")
+        # 驗證 get_allowed_entry 被調用
+        mock_get_allowed_entry.assert_called_once_with(123456789, "test_user")
+
+    @patch("src.handler.publish_to_eventbridge")
+    @patch("src.handler.send_to_queue")
+    @patch("src.handler.get_allowed_entry")
+    def test_routing_uses_allowlist_entry(
+        self,
+        mock_get_allowed_entry,
+        mock_send_to_queue,
+        mock_publish,
+        valid_telegram_event,
+        mock_context,
+    ):
+        """測試 routing 直接使用允許名單檢查取得的記錄，不再查詢 DynamoDB"""
+        mock_get_allowed_entry.return_value = {**ALLOWED_ENTRY, "role": "admin"}
+        mock_send_to_queue.return_value = True
+        mock_publish.return_value = True
+        valid_telegram_event["path"] = "/webhook/telegram"
+
+        with patch("routing.get_user_info") as mock_get_user_info:
+            lambda_handler(valid_telegram_event, mock_context)
+
+        mock_get_user_info.assert_not_called()
+        assert mock_publish.call_args.args[0]["routing"]["priority"] == "high"
 
     def test_malformed_payload(self, mock_context):
         """測試格式錯誤的 payload"""
@@ -113,13 +138,13 @@ class TestLambdaHandler:
         assert body["error"] == "Invalid webhook payload"
 
     @patch("src.handler.send_to_queue")
-    @patch("src.handler.check_allowed")
+    @patch("src.handler.get_allowed_entry")
     def test_sqs_send_failure(
-        self, mock_check_allowed, mock_send_to_queue, valid_telegram_event, mock_context
+        self, mock_get_allowed_entry, mock_send_to_queue, valid_telegram_event, mock_context
     ):
         """測試 SQS 發送失敗"""
         # 設定 mock 返回值
-        mock_check_allowed.return_value = True
+        mock_get_allowed_entry.return_value = ALLOWED_ENTRY
         mock_send_to_queue.return_value = False
 
         # 執行 handler
@@ -130,11 +155,11 @@ class TestLambdaHandler:
         body = json.loads(response["body"])
         assert body["status"] == "sqs_failed"
 
-    @patch("src.handler.check_allowed")
-    def test_check_allowed_exception(self, mock_check_allowed, valid_telegram_event, mock_context):
-        """測試 check_allowed 拋出異常"""
+    @patch("src.handler.get_allowed_entry")
+    def test_allowlist_exception(self, mock_get_allowed_entry, valid_telegram_event, mock_context):
+        """測試 get_allowed_entry 拋出異常"""
         # 設定 mock 拋出異常
-        mock_check_allowed.side_effect = Exception("Database error")
+        mock_get_allowed_entry.side_effect = Exception("Database error")
 
         # 執行 handler
         response = lambda_handler(valid_telegram_event, mock_context)
@@ -146,9 +171,9 @@ class TestLambdaHandler:
 
     @patch.dict(os.environ, {"TELEGRAM_SECRET_TOKEN": "test_secret_token_abc123"})
     @patch("src.handler.send_to_queue")
-    @patch("src.handler.check_allowed")
+    @patch("src.handler.get_allowed_entry")
     def test_valid_secret_token(
-        self, mock_check_allowed, mock_send_to_queue, valid_telegram_event, mock_context
+        self, mock_get_allowed_entry, mock_send_to_queue, valid_telegram_event, mock_context
     ):
         """測試有效的 secret token"""
         # 設定 event 包含正確的 token
@@ -157,7 +182,7 @@ class TestLambdaHandler:
         }
 
         # 設定 mock 返回值
-        mock_check_allowed.return_value = True
+        mock_get_allowed_entry.return_value = ALLOWED_ENTRY
         mock_send_to_queue.return_value = True
 
         # 執行 handler
@@ -169,14 +194,14 @@ class TestLambdaHandler:
         assert body["status"] == "ok"
 
     @patch.dict(os.environ, {"TELEGRAM_SECRET_TOKEN": "test_secret_token_abc123"})
-    @patch("src.handler.check_allowed")
-    def test_invalid_secret_token(self, mock_check_allowed, valid_telegram_event, mock_context):
+    @patch("src.handler.get_allowed_entry")
+    def test_invalid_secret_token(self, mock_get_allowed_entry, valid_telegram_event, mock_context):
         """測試無效的 secret token"""
         # 設定 event 包含錯誤的 token
         valid_telegram_event["headers"] = {"X-Telegram-Bot-Api-Secret-Token": "wrong_token"}
 
-        # Mock check_allowed 以避免實際檢查
-        mock_check_allowed.return_value = False
+        # Mock get_allowed_entry 以避免實際檢查
+        mock_get_allowed_entry.return_value = None
 
         # 執行 handler
         response = lambda_handler(valid_telegram_event, mock_context)
@@ -187,14 +212,14 @@ class TestLambdaHandler:
         assert body["status"] == "ignored"
 
     @patch.dict(os.environ, {"TELEGRAM_SECRET_TOKEN": "test_secret_token_abc123"})
-    @patch("src.handler.check_allowed")
-    def test_missing_secret_token(self, mock_check_allowed, valid_telegram_event, mock_context):
+    @patch("src.handler.get_allowed_entry")
+    def test_missing_secret_token(self, mock_get_allowed_entry, valid_telegram_event, mock_context):
         """測試缺少 secret token"""
         # event 不包含 token header
         valid_telegram_event["headers"] = {}
 
-        # Mock check_allowed 以避免實際檢查
-        mock_check_allowed.return_value = False
+        # Mock get_allowed_entry 以避免實際檢查
+        mock_get_allowed_entry.return_value = None
 
         # 執行 handler
         response = lambda_handler(valid_telegram_event, mock_context)
@@ -206,9 +231,9 @@ class TestLambdaHandler:
 
     @patch.dict(os.environ, {"TELEGRAM_SECRET_TOKEN": "test_secret_token_abc123"})
     @patch("src.handler.send_to_queue")
-    @patch("src.handler.check_allowed")
+    @patch("src.handler.get_allowed_entry")
     def test_lowercase_secret_token_header(
-        self, mock_check_allowed, mock_send_to_queue, valid_telegram_event, mock_context
+        self, mock_get_allowed_entry, mock_send_to_queue, valid_telegram_event, mock_context
     ):
         """測試小寫的 secret token header"""
         # 設定 event 包含小寫 header key 的正確 token
@@ -217,7 +242,7 @@ class TestLambdaHandler:
         }
 
         # 設定 mock 返回值
-        mock_check_allowed.return_value = True
+        mock_get_allowed_entry.return_value = ALLOWED_ENTRY
         mock_send_to_queue.return_value = True
 
         # 執行 handler
@@ -230,16 +255,16 @@ class TestLambdaHandler:
 
     @patch.dict(os.environ, {"TELEGRAM_SECRET_TOKEN": ""})
     @patch("src.handler.send_to_queue")
-    @patch("src.handler.check_allowed")
+    @patch("src.handler.get_allowed_entry")
     def test_no_secret_token_configured(
-        self, mock_check_allowed, mock_send_to_queue, valid_telegram_event, mock_context
+        self, mock_get_allowed_entry, mock_send_to_queue, valid_telegram_event, mock_context
     ):
         """測試未設定 secret token 時（向後相容）"""
         # 沒有設定 token header
         valid_telegram_event["headers"] = {}
 
         # 設定 mock 返回值
-        mock_check_allowed.return_value = True
+        mock_get_allowed_entry.return_value = ALLOWED_ENTRY
         mock_send_to_queue.return_value = True
 
         # 執行 handler
@@ -250,9 +275,9 @@ class TestLambdaHandler:
         body = json.loads(response["body"])
         assert body["status"] == "ok"
 
-    @patch("src.handler.check_allowed")
+    @patch("src.handler.get_allowed_entry")
     @patch("src.commands.handlers.debug_handler.telegram_client.send_debug_info")
-    def test_debug_command(self, mock_send_debug, mock_check_allowed, mock_context):
+    def test_debug_command(self, mock_send_debug, mock_get_allowed_entry, mock_context):
         """測試 /debug test 指令（通過指令路由器）"""
         # 創建 debug 指令的 event
         event = {
@@ -278,7 +303,7 @@ class TestLambdaHandler:
 
         # 設定 mock 返回值
         mock_send_debug.return_value = True
-        mock_check_allowed.return_value = True
+        mock_get_allowed_entry.return_value = ALLOWED_ENTRY
 
         # 執行 handler
         response = lambda_handler(event, mock_context)
@@ -291,9 +316,9 @@ class TestLambdaHandler:
         # 驗證 send_debug_info 被正確調用
         mock_send_debug.assert_called_once_with(123456789, event)
 
-    @patch("src.handler.check_allowed")
+    @patch("src.handler.get_allowed_entry")
     @patch("src.commands.handlers.debug_handler.telegram_client.send_debug_info")
-    def test_debug_command_alone(self, mock_send_debug, mock_check_allowed, mock_context):
+    def test_debug_command_alone(self, mock_send_debug, mock_get_allowed_entry, mock_context):
         """測試單獨的 /debug 指令"""
         event = {
             "headers": {},
@@ -317,7 +342,7 @@ class TestLambdaHandler:
         }
 
         mock_send_debug.return_value = True
-        mock_check_allowed.return_value = True
+        mock_get_allowed_entry.return_value = ALLOWED_ENTRY
         response = lambda_handler(event, mock_context)
 
         assert response["statusCode"] == 200
@@ -325,9 +350,9 @@ class TestLambdaHandler:
         assert body["status"] == "command_handled"
         mock_send_debug.assert_called_once()
 
-    @patch("src.handler.check_allowed")
+    @patch("src.handler.get_allowed_entry")
     @patch("src.commands.handlers.debug_handler.telegram_client.send_debug_info")
-    def test_debug_command_with_number(self, mock_send_debug, mock_check_allowed, mock_context):
+    def test_debug_command_with_number(self, mock_send_debug, mock_get_allowed_entry, mock_context):
         """測試 /debug 123 指令"""
         event = {
             "headers": {},
@@ -351,17 +376,17 @@ class TestLambdaHandler:
         }
 
         mock_send_debug.return_value = True
-        mock_check_allowed.return_value = True
+        mock_get_allowed_entry.return_value = ALLOWED_ENTRY
         response = lambda_handler(event, mock_context)
 
         assert response["statusCode"] == 200
         body = json.loads(response["body"])
         assert body["status"] == "command_handled"
 
-    @patch("src.handler.check_allowed")
+    @patch("src.handler.get_allowed_entry")
     @patch("src.commands.handlers.debug_handler.telegram_client.send_debug_info")
     def test_debug_command_with_multiple_words(
-        self, mock_send_debug, mock_check_allowed, mock_context
+        self, mock_send_debug, mock_get_allowed_entry, mock_context
     ):
         """測試 /debug any string 指令"""
         event = {
@@ -386,7 +411,7 @@ class TestLambdaHandler:
         }
 
         mock_send_debug.return_value = True
-        mock_check_allowed.return_value = True
+        mock_get_allowed_entry.return_value = ALLOWED_ENTRY
         response = lambda_handler(event, mock_context)
 
         assert response["statusCode"] == 200
@@ -394,9 +419,9 @@ class TestLambdaHandler:
         assert body["status"] == "command_handled"
 
     @patch("src.handler.send_to_queue")
-    @patch("src.handler.check_allowed")
+    @patch("src.handler.get_allowed_entry")
     def test_debug_without_space_should_not_trigger(
-        self, mock_check_allowed, mock_send_to_queue, mock_context
+        self, mock_get_allowed_entry, mock_send_to_queue, mock_context
     ):
         """測試 /debugtest 不應該觸發除錯功能"""
         event = {
@@ -412,7 +437,7 @@ class TestLambdaHandler:
             ),
         }
 
-        mock_check_allowed.return_value = True
+        mock_get_allowed_entry.return_value = ALLOWED_ENTRY
         mock_send_to_queue.return_value = True
 
         response = lambda_handler(event, mock_context)
@@ -421,12 +446,12 @@ class TestLambdaHandler:
         assert response["statusCode"] == 200
         body = json.loads(response["body"])
         assert body["status"] == "ok"
-        mock_check_allowed.assert_called_once()
+        mock_get_allowed_entry.assert_called_once()
         mock_send_to_queue.assert_called_once()
 
-    @patch("src.handler.check_allowed")
+    @patch("src.handler.get_allowed_entry")
     @patch("src.commands.handlers.debug_handler.telegram_client.send_debug_info")
-    def test_debug_command_with_spaces(self, mock_send_debug, mock_check_allowed, mock_context):
+    def test_debug_command_with_spaces(self, mock_send_debug, mock_get_allowed_entry, mock_context):
         """測試 /debug test 指令（帶空格）"""
         # 創建帶空格的 debug 指令
         event = {
@@ -452,7 +477,7 @@ class TestLambdaHandler:
 
         # 設定 mock
         mock_send_debug.return_value = True
-        mock_check_allowed.return_value = True
+        mock_get_allowed_entry.return_value = ALLOWED_ENTRY
 
         # 執行
         response = lambda_handler(event, mock_context)
@@ -463,10 +488,10 @@ class TestLambdaHandler:
         assert body["status"] == "command_handled"
 
     @patch("src.handler.send_to_queue")
-    @patch("src.handler.check_allowed")
+    @patch("src.handler.get_allowed_entry")
     @patch("src.commands.handlers.debug_handler.telegram_client.send_debug_info")
     def test_debug_command_send_failure(
-        self, mock_send_debug, mock_check_allowed, mock_send_to_queue, mock_context
+        self, mock_send_debug, mock_get_allowed_entry, mock_send_to_queue, mock_context
     ):
         """測試 debug 指令發送失敗"""
         event = {
@@ -492,7 +517,7 @@ class TestLambdaHandler:
 
         # 設定 mock 返回失敗
         mock_send_debug.return_value = False
-        mock_check_allowed.return_value = True
+        mock_get_allowed_entry.return_value = ALLOWED_ENTRY
         mock_send_to_queue.return_value = False  # SQS 也失敗
 
         # 執行
@@ -504,8 +529,8 @@ class TestLambdaHandler:
         assert body["status"] == "sqs_failed"
 
     @patch("src.handler.send_to_queue")
-    @patch("src.handler.check_allowed")
-    def test_non_debug_command(self, mock_check_allowed, mock_send_to_queue, mock_context):
+    @patch("src.handler.get_allowed_entry")
+    def test_non_debug_command(self, mock_get_allowed_entry, mock_send_to_queue, mock_context):
         """測試非 debug 指令的正常處理"""
         event = {
             "headers": {},
@@ -521,7 +546,7 @@ class TestLambdaHandler:
         }
 
         # 設定 mock
-        mock_check_allowed.return_value = True
+        mock_get_allowed_entry.return_value = ALLOWED_ENTRY
         mock_send_to_queue.return_value = True
 
         # 執行
@@ -531,7 +556,7 @@ class TestLambdaHandler:
         assert response["statusCode"] == 200
         body = json.loads(response["body"])
         assert body["status"] == "ok"
-        mock_check_allowed.assert_called_once()
+        mock_get_allowed_entry.assert_called_once()
         mock_send_to_queue.assert_called_once()
 
     @patch("src.telegram_client.send_debug_info")
@@ -564,11 +589,11 @@ class TestLambdaHandler:
             "AWS_LAMBDA_FUNCTION_NAME": "test-function",
         },
     )
-    @patch("src.handler.check_allowed")
+    @patch("src.handler.get_allowed_entry")
     @patch("src.commands.handlers.info_handler.telegram_client.send_message")
     @patch("src.commands.handlers.info_handler.boto3.client")
     def test_info_command(
-        self, mock_boto_client, mock_send_message, mock_check_allowed, mock_context
+        self, mock_boto_client, mock_send_message, mock_get_allowed_entry, mock_context
     ):
         """測試 /info 指令（通過指令路由器）"""
         from datetime import datetime
@@ -613,7 +638,7 @@ class TestLambdaHandler:
 
         # 設定 mock 返回值
         mock_send_message.return_value = True
-        mock_check_allowed.return_value = True
+        mock_get_allowed_entry.return_value = ALLOWED_ENTRY
 
         # 執行 handler
         response = lambda_handler(event, mock_context)
@@ -634,11 +659,11 @@ class TestLambdaHandler:
         assert "UPDATE_COMPLETE" in info_text
 
     @patch.dict(os.environ, {"STACK_NAME": "test-stack", "AWS_REGION": "us-west-2"})
-    @patch("src.handler.check_allowed")
+    @patch("src.handler.get_allowed_entry")
     @patch("src.commands.handlers.info_handler.telegram_client.send_message")
     @patch("src.commands.handlers.info_handler.boto3.client")
     def test_info_command_with_text(
-        self, mock_boto_client, mock_send_message, mock_check_allowed, mock_context
+        self, mock_boto_client, mock_send_message, mock_get_allowed_entry, mock_context
     ):
         """測試 /info test 指令（帶額外文字）"""
         from datetime import datetime
@@ -678,7 +703,7 @@ class TestLambdaHandler:
         }
 
         mock_send_message.return_value = True
-        mock_check_allowed.return_value = True
+        mock_get_allowed_entry.return_value = ALLOWED_ENTRY
 
         response = lambda_handler(event, mock_context)
 
@@ -688,11 +713,11 @@ class TestLambdaHandler:
         mock_send_message.assert_called_once()
 
     @patch.dict(os.environ, {"STACK_NAME": "test-stack", "AWS_REGION": "us-west-2"})
-    @patch("src.handler.check_allowed")
+    @patch("src.handler.get_allowed_entry")
     @patch("src.commands.handlers.info_handler.telegram_client.send_message")
     @patch("src.commands.handlers.info_handler.boto3.client")
     def test_info_command_cloudformation_access_denied(
-        self, mock_boto_client, mock_send_message, mock_check_allowed, mock_context
+        self, mock_boto_client, mock_send_message, mock_get_allowed_entry, mock_context
     ):
         """測試 /info 指令遇到權限不足錯誤"""
         from botocore.exceptions import ClientError
@@ -727,7 +752,7 @@ class TestLambdaHandler:
         mock_cfn.exceptions.ClientError = ClientError
 
         mock_send_message.return_value = True
-        mock_check_allowed.return_value = True
+        mock_get_allowed_entry.return_value = ALLOWED_ENTRY
 
         response = lambda_handler(event, mock_context)
 
@@ -738,11 +763,11 @@ class TestLambdaHandler:
         assert "權限不足" in call_args
 
     @patch.dict(os.environ, {"STACK_NAME": "non-existent-stack", "AWS_REGION": "us-west-2"})
-    @patch("src.handler.check_allowed")
+    @patch("src.handler.get_allowed_entry")
     @patch("src.commands.handlers.info_handler.telegram_client.send_message")
     @patch("src.commands.handlers.info_handler.boto3.client")
     def test_info_command_stack_not_found(
-        self, mock_boto_client, mock_send_message, mock_check_allowed, mock_context
+        self, mock_boto_client, mock_send_message, mock_get_allowed_entry, mock_context
     ):
         """測試 /info 指令找不到 Stack"""
         from botocore.exceptions import ClientError
@@ -778,7 +803,7 @@ class TestLambdaHandler:
         mock_cfn.exceptions.ClientError = ClientError
 
         mock_send_message.return_value = True
-        mock_check_allowed.return_value = True
+        mock_get_allowed_entry.return_value = ALLOWED_ENTRY
 
         response = lambda_handler(event, mock_context)
 
@@ -788,11 +813,11 @@ class TestLambdaHandler:
         assert "找不到 Stack" in call_args
 
     @patch.dict(os.environ, {"STACK_NAME": "test-stack", "AWS_REGION": "us-west-2"})
-    @patch("src.handler.check_allowed")
+    @patch("src.handler.get_allowed_entry")
     @patch("src.commands.handlers.info_handler.telegram_client.send_message")
     @patch("src.commands.handlers.info_handler.boto3.client")
     def test_info_command_api_error(
-        self, mock_boto_client, mock_send_message, mock_check_allowed, mock_context
+        self, mock_boto_client, mock_send_message, mock_get_allowed_entry, mock_context
     ):
         """測試 /info 指令遇到一般 API 錯誤"""
         from botocore.exceptions import ClientError
@@ -827,7 +852,7 @@ class TestLambdaHandler:
         mock_cfn.exceptions.ClientError = ClientError
 
         mock_send_message.return_value = True
-        mock_check_allowed.return_value = True
+        mock_get_allowed_entry.return_value = ALLOWED_ENTRY
 
         response = lambda_handler(event, mock_context)
 
@@ -837,9 +862,9 @@ class TestLambdaHandler:
         assert "API 錯誤" in call_args
 
     @patch("src.handler.send_to_queue")
-    @patch("src.handler.check_allowed")
+    @patch("src.handler.get_allowed_entry")
     def test_info_without_space_should_not_trigger(
-        self, mock_check_allowed, mock_send_to_queue, mock_context
+        self, mock_get_allowed_entry, mock_send_to_queue, mock_context
     ):
         """測試 /infotest 不應該觸發 info 指令"""
         event = {
@@ -855,7 +880,7 @@ class TestLambdaHandler:
             ),
         }
 
-        mock_check_allowed.return_value = True
+        mock_get_allowed_entry.return_value = ALLOWED_ENTRY
         mock_send_to_queue.return_value = True
 
         response = lambda_handler(event, mock_context)
@@ -864,5 +889,5 @@ class TestLambdaHandler:
         assert response["statusCode"] == 200
         body = json.loads(response["body"])
         assert body["status"] == "ok"
-        mock_check_allowed.assert_called_once()
+        mock_get_allowed_entry.assert_called_once()
         mock_send_to_queue.assert_called_once()
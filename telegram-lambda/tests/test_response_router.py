@@ -0,0 +1,216 @@
+"""
+Tests for response router streaming (message.delta) - 串流片段與最終回應對齊
+"""
+
+import json
+import time
+from unittest.mock import patch
+
+import pytest
+from moto import mock_aws
+from router.delivery import stream_state
+from router.delivery.telegram_delivery import MAX_MESSAGE_LENGTH, TelegramDelivery
+from router.response_router import lambda_handler
+
+
+@pytest.fixture
+def mock_stream_table():
+    """Mock 串流狀態 DynamoDB table"""
+    with mock_aws():
+        import boto3
+
+        dynamodb = boto3.resource("dynamodb", region_name="us-west-2")
+        table = dynamodb.create_table(
+            TableName="telegram-stream-state",
+            KeySchema=[{"AttributeName": "message_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "message_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+        stream_state._table = table
+        yield table
+        stream_state._table = None
+
+
+@pytest.fixture
+def telegram_api():
+    """Mock Telegram API 呼叫"""
+    with (
+        patch("router.delivery.telegram_delivery.send_message_with_id", return_value=777) as send,
+        patch("router.delivery.telegram_delivery.edit_message_text", return_value=True) as edit,
+        patch("router.delivery.telegram_delivery.send_message", return_value=True) as send_full,
+        patch("router.delivery.telegram_delivery.delete_message", return_value=True) as delete,
+    ):
+        yield {"send": send, "edit": edit, "send_full": send_full, "delete": delete}
+
+
+def delta_event(text: str, sequence: int) -> dict:
+    return {
+        "source": "agent-processor",
+        "detail-type": "message.delta",
+        "detail": {
+            "messageId": "msg-1",
+            "channel": {"type": "telegram"},
+            "user": {"id": "tg:12345"},
+            "delta": {"text": text, "sequence": sequence},
+        },
+    }
+
+
+def completed_event(text: str, streamed: bool = True) -> dict:
+    return {
+        "source": "agent-processor",
+        "detail-type": "message.completed",
+        "detail": {
+            "messageId": "msg-1",
+            "channel": {"type": "telegram"},
+            "user": {"id": "tg:12345"},
+            "response": text,
+            "metadata": {"original_message_id": "msg-1", "streamed": streamed},
+        },
+    }
+
+
+def action_of(result: dict) -> str:
+    return json.loads(result["body"])["action"]
+
+
+class TestDeltaRouting:
+    """測試 message.delta 處理"""
+
+    def test_first_delta_sends_placeholder(self, mock_stream_table, telegram_api):
+        """測試第一個片段發送佔位訊息"""
+        result = lambda_handler(delta_event("你好", 1), None)
+
+        assert result["statusCode"] == 200
+        assert action_of(result) == "placeholder"
+        telegram_api["send"].assert_called_once()
+        assert telegram_api["send"].call_args.args[0] == 12345
+
+        item = mock_stream_table.get_item(Key={"message_id": "msg-1"})["Item"]
+        assert item["telegram_message_id"] == 777
+
+    def test_edits_are_rate_limited(self, mock_stream_table, telegram_api):
+        """測試編輯頻率受限，超過間隔後才編輯"""
+        with patch("router.delivery.telegram_delivery.time.time", return_value=1000.0):
+            lambda_handler(delta_event("你好", 1), None)
+            too_soon = lambda_handler(delta_event("你好，世界", 2), None)
+
+        with patch("router.delivery.telegram_delivery.time.time", return_value=1002.0):
+            later = lambda_handler(delta_event("你好，世界！", 3), None)
+            stale = lambda_handler(delta_event("你好", 2), None)
+
+        assert action_of(too_soon) == "skipped"
+        assert action_of(later) == "edited"
+        assert action_of(stale) == "skipped"
+        telegram_api["edit"].assert_called_once()
+        assert telegram_api["edit"].call_args.args[:2] == (12345, 777)
+
+    def test_unsupported_channel_delta_ignored(self, mock_stream_table, telegram_api):
+        """測試不支援串流的頻道直接略過"""
+        event = delta_event("hi", 1)
+        event["detail"]["channel"] = {"type": "discord"}
+
+        result = lambda_handler(event, None)
+
+        assert result["statusCode"] == 200
+        telegram_api["send"].assert_not_called()
+
+
+class TestStreamReconciliation:
+    """測試 message.completed 對齊串流內容"""
+
+    def test_completed_edits_placeholder(self, mock_stream_table, telegram_api):
+        """測試最終回應編輯佔位訊息，而非發送新訊息"""
+        lambda_handler(delta_event("部分", 1), None)
+
+        result = lambda_handler(completed_event("完整的回應"), None)
+
+        assert result["statusCode"] == 200
+        telegram_api["send_full"].assert_not_called()
+        assert telegram_api["edit"].call_args.args[:3] == (12345, 777, "完整的回應")
+
+        # 完成後到達的片段被忽略
+        with patch("router.delivery.telegram_delivery.time.time", return_value=9999999999.0):
+            late = lambda_handler(delta_event("部分回應", 2), None)
+        assert action_of(late) == "skipped"
+
+    def test_completed_without_placeholder_sends_message(self, mock_stream_table, telegram_api):
+        """測試沒有佔位訊息時直接發送"""
+        result = lambda_handler(completed_event("完整的回應"), None)
+
+        assert result["statusCode"] == 200
+        telegram_api["send_full"].assert_called_once()
+        telegram_api["edit"].assert_not_called()
+
+    def test_over_length_response_replaces_placeholder(self, mock_stream_table, telegram_api):
+        """測試超過長度的最終回應刪除佔位訊息後分段發送"""
+        lambda_handler(delta_event("部分", 1), None)
+
+        result = TelegramDelivery().deliver(
+            "tg:12345",
+            "長" * (MAX_MESSAGE_LENGTH + 1),
+            {"streamed": True, "original_message_id": "msg-1"},
+        )
+
+        assert result.success is True
+        telegram_api["edit"].assert_not_called()
+        telegram_api["delete"].assert_called_once_with(12345, 777)
+        telegram_api["send_full"].assert_called_once()
+
+    def test_failed_edit_replaces_placeholder(self, mock_stream_table, telegram_api):
+        """測試編輯失敗時刪除佔位訊息後發送新訊息"""
+        lambda_handler(delta_event("部分", 1), None)
+        telegram_api["edit"].return_value = False
+
+        lambda_handler(completed_event("完整的回應"), None)
+
+        telegram_api["delete"].assert_called_once_with(12345, 777)
+        telegram_api["send_full"].assert_called_once()
+
+    def test_placeholder_after_completion_is_deleted(self, mock_stream_table, telegram_api):
+        """測試最終回應先完成時，晚到的佔位訊息會被刪除"""
+        with patch.object(stream_state, "set_placeholder", return_value=False):
+            result = lambda_handler(delta_event("部分", 1), None)
+
+        assert action_of(result) == "skipped"
+        telegram_api["delete"].assert_called_once_with(12345, 777)
+
+    def test_not_streamed_skips_state_lookup(self, telegram_api):
+        """測試非串流回應不讀取串流狀態"""
+        with patch.object(stream_state, "complete") as mock_complete:
+            result = lambda_handler(completed_event("回應", streamed=False), None)
+
+        assert result["statusCode"] == 200
+        mock_complete.assert_not_called()
+        telegram_api["send_full"].assert_called_once()
+
+
+class TestMessageDeadline:
+    """測試 Router 檢查入口設定的訊息期限"""
+
+    def test_expired_delta_skipped(self, mock_stream_table, telegram_api):
+        """測試已過期訊息的串流片段不再更新"""
+        event = delta_event("部分", 1)
+        event["detail"]["metadata"] = {"expires_at": time.time() - 1}
+
+        result = lambda_handler(event, None)
+
+        assert action_of(result) == "expired"
+        telegram_api["send"].assert_not_called()
+
+    def test_expired_completed_still_delivered(self, telegram_api):
+        """測試最終回應即使過期仍送出，並記錄延遲與過期"""
+        event = completed_event("回應", streamed=False)
+        event["detail"]["metadata"].update(
+            {"received_at": "2026-01-01T00:00:00Z", "expires_at": time.time() - 1}
+        )
+
+        with patch("router.response_router.publish_metric") as mock_metric:
+            result = lambda_handler(event, None)
+
+        assert result["statusCode"] == 200
+        telegram_api["send_full"].assert_called_once()
+        metric_names = [c.args[0] for c in mock_metric.call_args_list]
+        assert "RouterMessageAge" in metric_names
+        assert "RouterMessageExpired" in metric_names
@@ -0,0 +1,99 @@
+"""
+測試訊息處理優先順序
+"""
+
+import time
+from unittest.mock import patch
+
+import routing
+from routing import assign_priority, build_routing, message_expires_at, parse_message_ttls
+
+
+class TestAssignPriority:
+    """測試 assign_priority 函數"""
+
+    def test_default_normal(self):
+        """測試一般用戶為 normal"""
+        assert assign_priority({"role": "user", "enabled": True}, "你好") == "normal"
+        assert assign_priority(None) == "normal"
+
+    def test_admin_is_high(self):
+        """測試 admin 角色為 high"""
+        assert assign_priority({"role": "admin"}, "你好") == "high"
+
+    def test_command_is_high(self):
+        """測試送到 Processor 的 / 指令為 high"""
+        assert assign_priority({"role": "user"}, "/summary 今天的新聞") == "high"
+
+    def test_tags(self):
+        """測試高 / 低優先標籤（DynamoDB string set 也可）"""
+        assert assign_priority({"tags": {"paid"}}, "你好") == "high"
+        assert assign_priority({"tags": ["bulk"]}, "你好") == "low"
+
+    def test_explicit_priority_wins(self):
+        """測試允許名單明確設定的 priority 優先於角色與標籤"""
+        assert assign_priority({"role": "admin", "priority": "low"}, "/start") == "low"
+        assert assign_priority({"role": "user", "priority": "urgent"}, "你好") == "normal"
+
+
+class TestBuildRouting:
+    """測試 build_routing 函數"""
+
+    @patch.object(routing, "get_user_info")
+    def test_routing_from_allowlist(self, mock_get_user_info):
+        """測試依允許名單產生 routing 欄位"""
+        mock_get_user_info.return_value = {"chat_id": 123, "role": "user", "tags": {"vip", "beta"}}
+
+        result = build_routing(123, "你好")
+
+        mock_get_user_info.assert_called_once_with(123)
+        assert result["priority"] == "high"
+        assert result["tags"] == ["beta", "vip"]
+
+    @patch.object(routing, "get_user_info")
+    def test_routing_without_chat_id(self, mock_get_user_info):
+        """測試缺少 chat_id 時不查詢允許名單"""
+        result = build_routing(None, "你好")
+
+        mock_get_user_info.assert_not_called()
+        assert result["priority"] == "normal"
+
+    @patch.object(routing, "get_user_info")
+    def test_routing_from_allowlist_entry(self, mock_get_user_info):
+        """測試傳入允許名單記錄時不再查詢"""
+        result = build_routing(123, "你好", user_info={"chat_id": 123, "tags": {"bulk"}})
+
+        mock_get_user_info.assert_not_called()
+        assert result["priority"] == "low"
+
+    @patch.object(routing, "get_user_info")
+    def test_lookup_failure_falls_back_to_normal(self, mock_get_user_info):
+        """測試查詢失敗時以 normal 送出，不影響訊息處理"""
+        mock_get_user_info.side_effect = Exception("Unable to locate credentials")
+
+        assert build_routing(123, "你好")["priority"] == "normal"
+
+
+class TestMessageDeadline:
+    """測試依訊息類型設定的處理期限"""
+
+    def test_parse_ttls(self):
+        assert parse_message_ttls("text=300, video=1800,bad,image=x") == {
+            "text": 300,
+            "video": 1800,
+        }
+
+    def test_expires_at_per_type(self):
+        with patch.object(routing, "MESSAGE_TTLS", {"text": 300, "video": 1800}):
+            assert message_expires_at("text", now=1000.0) == 1300.0
+            assert message_expires_at("video", now=1000.0) == 2800.0
+            assert message_expires_at("sticker", now=1000.0) == 1000.0 + routing.DEFAULT_MESSAGE_TTL
+
+    @patch.object(routing, "get_user_info", return_value=None)
+    def test_routing_includes_deadline(self, mock_get_user_info):
+        """測試 routing 欄位帶有期限（epoch 秒）"""
+        before = time.time()
+
+        result = build_routing(123, "你好", "file")
+
+        assert result["expiresAt"] >= before + routing.MESSAGE_TTLS["file"] - 1
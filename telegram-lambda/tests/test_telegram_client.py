@@ -2,15 +2,18 @@
 Unit tests for telegram_client.py (using python-telegram-bot)
 """
 
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
 
 from src.telegram_client import (
     MAX_MESSAGE_LENGTH,
     _split_message,
+    edit_message_text,
     send_debug_info,
     send_long_message,
     send_message,
+    send_message_with_id,
 )
+from telegram.error import BadRequest
 
 
 class TestTelegramClient:
@@ -192,3 +195,48 @@ class TestTelegramClient:
 
         # 驗證
         assert result is False
+
+    @patch("src.telegram_client.get_bot_token")
+    @patch("src.telegram_client.Bot")
+    def test_send_message_with_id_returns_message_id(self, mock_bot_class, mock_get_token):
+        """測試發送佔位訊息並取得 message_id"""
+        mock_get_token.return_value = "test_bot_token"
+        mock_bot_class.return_value.send_message = AsyncMock(
+            return_value=type("Message", (), {"message_id": 42})()
+        )
+
+        assert send_message_with_id(12345, "▌") == 42
+
+    @patch("src.telegram_client.get_bot_token")
+    @patch("src.telegram_client.Bot")
+    def test_edit_message_text_success(self, mock_bot_class, mock_get_token):
+        """測試編輯訊息成功"""
+        mock_get_token.return_value = "test_bot_token"
+        mock_bot_class.return_value.edit_message_text = AsyncMock()
+
+        assert edit_message_text(12345, 42, "更新內容") is True
+        mock_bot_class.return_value.edit_message_text.assert_awaited_once_with(
+            chat_id=12345, message_id=42, text="更新內容", parse_mode=None
+        )
+
+    @patch("src.telegram_client.get_bot_token")
+    @patch("src.telegram_client.Bot")
+    def test_edit_message_text_not_modified(self, mock_bot_class, mock_get_token):
+        """測試內容未變更時視為成功"""
+        mock_get_token.return_value = "test_bot_token"
+        mock_bot_class.return_value.edit_message_text = AsyncMock(
+            side_effect=BadRequest("Message is not modified")
+        )
+
+        assert edit_message_text(12345, 42, "相同內容") is True
+
+    @patch("src.telegram_client.get_bot_token")
+    @patch("src.telegram_client.Bot")
+    def test_edit_message_text_failure(self, mock_bot_class, mock_get_token):
+        """測試編輯失敗"""
+        mock_get_token.return_value = "test_bot_token"
+        mock_bot_class.return_value.edit_message_text = AsyncMock(
+            side_effect=BadRequest("Message to edit not found")
+        )
+
+        assert edit_message_text(12345, 42, "內容") is False
@@ -6,9 +6,12 @@
 import { config } from '@/config/env'
 
 export interface Message {
-  type: 'message' | 'error' | 'connected' | 'disconnected'
+  type: 'message' | 'delta' | 'error' | 'connected' | 'disconnected'
   content: string
   timestamp: string
+  // Set on streamed responses: deltas and the final message share the same messageId
+  messageId?: string
+  sequence?: number
 }
 
 type MessageHandler = (message: Message) => void
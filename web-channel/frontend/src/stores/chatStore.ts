@@ -6,6 +6,9 @@ import { create } from 'zustand'
 import { websocket, Message } from '@/services/websocket'
 import { api } from '@/services/api'
 
+// Latest streamed sequence per response; deltas may arrive out of order
+const latestStreamSequence = new Map<string, number>()
+
 export interface ChatMessage {
   id: string
   role: 'user' | 'assistant'
@@ -49,6 +52,7 @@ interface ChatState {
   // Actions - Messages
   sendMessage: (content: string) => Promise<void>
   addMessage: (message: ChatMessage) => void
+  upsertMessage: (message: ChatMessage) => void
   getCurrentMessages: () => ChatMessage[]
   
   // Actions - Connection
@@ -343,6 +347,32 @@ export const useChatStore = create<ChatState>((set, get) => ({
     }))
   },
   
+  upsertMessage: (message: ChatMessage) => {
+    const state = get()
+    const currentConvId = state.currentConversationId
+    
+    if (!currentConvId) return
+    
+    const currentConv = state.conversations.find(c => c.id === currentConvId)
+    if (!currentConv?.messages.some(m => m.id === message.id)) {
+      get().addMessage(message)
+      return
+    }
+    
+    // Replace content of an existing (streaming) message in place
+    set(state => ({
+      conversations: state.conversations.map(c =>
+        c.id === currentConvId
+          ? {
+              ...c,
+              messages: c.messages.map(m => (m.id === message.id ? message : m)),
+              lastMessageTime: message.timestamp
+            }
+          : c
+      )
+    }))
+  },
+  
   getCurrentMessages: () => {
     const state = get()
     const currentConv = state.conversations.find(
@@ -372,13 +402,29 @@ export const useChatStore = create<ChatState>((set, get) => ({
     const unsubscribeMessage = websocket.onMessage((message: Message) => {
       if (message.type === 'message') {
         const chatMessage: ChatMessage = {
-          id: Date.now().toString(),
+          id: message.messageId ? `stream-${message.messageId}` : Date.now().toString(),
           role: 'assistant',
           content: message.content,
           timestamp: message.timestamp,
           channel: 'web'
         }
-        get().addMessage(chatMessage)
+        // The final message replaces any streamed partial text
+        if (message.messageId) {
+          latestStreamSequence.set(message.messageId, Infinity)
+        }
+        get().upsertMessage(chatMessage)
+      } else if (message.type === 'delta' && message.messageId) {
+        const sequence = message.sequence ?? 0
+        if (sequence <= (latestStreamSequence.get(message.messageId) ?? -1)) return
+        latestStreamSequence.set(message.messageId, sequence)
+        
+        get().upsertMessage({
+          id: `stream-${message.messageId}`,
+          role: 'assistant',
+          content: message.content,
+          timestamp: message.timestamp,
+          channel: 'web'
+        })
       }
     })
     